@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, List, Dict, Iterator, Optional, Tuple
+import threading
+import numpy as np
 import pandas as pd
 import logging
 
@@ -27,6 +31,64 @@ def _calc_atr(df: pd.DataFrame, length: int = 14) -> pd.Series:
 # WEEKLY PIVOT
 # ─────────────────────────────────────────────
 
+def _fractal_flags(high: np.ndarray, low: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """fractal 2 แท่งซ้าย/ขวา: high >= เพื่อนบ้านทั้ง 4 / low <= เพื่อนบ้านทั้ง 4 (แท่ง 0,1,n-2,n-1 = False)"""
+    n = len(high)
+    is_h = np.zeros(n, dtype=bool)
+    is_l = np.zeros(n, dtype=bool)
+    if n < 5:
+        return is_h, is_l
+    h = high[2 : n - 2]
+    l = low[2 : n - 2]
+    is_h[2 : n - 2] = (h >= high[0 : n - 4]) & (h >= high[1 : n - 3]) & (h >= high[3 : n - 1]) & (h >= high[4:n])
+    is_l[2 : n - 2] = (l <= low[0 : n - 4]) & (l <= low[1 : n - 3]) & (l <= low[3 : n - 1]) & (l <= low[4:n])
+    return is_h, is_l
+
+
+def _raw_weekly_pivots(df: pd.DataFrame) -> List[Dict]:
+    """pivot ดิบเรียงตาม index (แท่งเดียวกันเป็นทั้ง H และ L → H ก่อน)"""
+    high = df["high"].to_numpy(dtype=float)
+    low = df["low"].to_numpy(dtype=float)
+    is_h, is_l = _fractal_flags(high, low)
+
+    idx = np.concatenate([np.flatnonzero(is_h), np.flatnonzero(is_l)])
+    kind = np.concatenate([np.zeros(int(is_h.sum()), dtype=int), np.ones(int(is_l.sum()), dtype=int)])
+    order = np.argsort(idx * 2 + kind, kind="stable")
+
+    has_date = len(df) > 0 and hasattr(df.index[0], "date")
+    raw = []
+    for k in order:
+        i = int(idx[k])
+        is_high = kind[k] == 0
+        raw.append({
+            "index": i,
+            "type": "H" if is_high else "L",
+            "price": float(high[i] if is_high else low[i]),
+            "ts": df.index[i] if has_date else None,
+        })
+    return raw
+
+
+def _zigzag_step(zigzag: List[Dict], p: Dict, atr: np.ndarray, atr_mult: float) -> None:
+    """ZigZag — สลับ H/L เอา extreme (แก้ zigzag ในที่)"""
+    if not zigzag:
+        zigzag.append(p)
+        return
+    last = zigzag[-1]
+    if p["type"] == last["type"]:
+        # เอา extreme
+        if p["type"] == "H" and p["price"] > last["price"]:
+            zigzag[-1] = p
+        elif p["type"] == "L" and p["price"] < last["price"]:
+            zigzag[-1] = p
+    else:
+        # ATR filter — swing ต้องใหญ่พอ
+        atr_val = float(atr[p["index"]]) if p["index"] < len(atr) else 0
+        min_move = atr_val * atr_mult
+        if abs(p["price"] - last["price"]) >= min_move:
+            zigzag.append(p)
+
+
 def _find_weekly_pivots(df: pd.DataFrame, atr_mult: float = 2.5) -> List[Dict]:
     """
     หา swing ใหญ่จาก 1W ด้วย ZigZag + ATR filter
@@ -35,52 +97,10 @@ def _find_weekly_pivots(df: pd.DataFrame, atr_mult: float = 2.5) -> List[Dict]:
     if df is None or len(df) < 20:
         return []
 
-    atr = _calc_atr(df, length=14)
-    highs_idx = []
-    lows_idx  = []
-
-    for i in range(2, len(df) - 2):
-        h = float(df["high"].iloc[i])
-        l = float(df["low"].iloc[i])
-
-        is_h = all(h >= float(df["high"].iloc[i + k]) for k in [-2, -1, 1, 2])
-        is_l = all(l <= float(df["low"].iloc[i + k])  for k in [-2, -1, 1, 2])
-
-        if is_h:
-            highs_idx.append(i)
-        if is_l:
-            lows_idx.append(i)
-
-    # รวม H และ L เรียงตาม index
-    raw = []
-    for i in highs_idx:
-        raw.append({"index": i, "type": "H", "price": float(df["high"].iloc[i]),
-                    "ts": df.index[i] if hasattr(df.index[i], 'date') else None})
-    for i in lows_idx:
-        raw.append({"index": i, "type": "L", "price": float(df["low"].iloc[i]),
-                    "ts": df.index[i] if hasattr(df.index[i], 'date') else None})
-
-    raw.sort(key=lambda x: x["index"])
-
-    # ZigZag — สลับ H/L เอา extreme
+    atr = _calc_atr(df, length=14).to_numpy(dtype=float)
     zigzag: List[Dict] = []
-    for p in raw:
-        if not zigzag:
-            zigzag.append(p)
-            continue
-        last = zigzag[-1]
-        if p["type"] == last["type"]:
-            # เอา extreme
-            if p["type"] == "H" and p["price"] > last["price"]:
-                zigzag[-1] = p
-            elif p["type"] == "L" and p["price"] < last["price"]:
-                zigzag[-1] = p
-        else:
-            # ATR filter — swing ต้องใหญ่พอ
-            atr_val = float(atr.iloc[p["index"]]) if p["index"] < len(atr) else 0
-            min_move = atr_val * atr_mult
-            if abs(p["price"] - last["price"]) >= min_move:
-                zigzag.append(p)
+    for p in _raw_weekly_pivots(df):
+        _zigzag_step(zigzag, p, atr, atr_mult)
 
     return zigzag
 
@@ -231,9 +251,12 @@ def analyze_primary_wave(symbol: str, df_1w: Optional[pd.DataFrame] = None) -> D
 def get_primary_bias(symbol: str = "BTCUSDT") -> Dict:
     """
     wrapper เดิม — ใช้ analyze_primary_wave แทน hardcode
+    (ดึง 1W ทุกครั้ง — งานที่เรียกถี่ใช้ get_cached_primary_bias)
     """
-    result = analyze_primary_wave(symbol)
+    return _to_bias(analyze_primary_wave(symbol))
 
+
+def _to_bias(result: Dict) -> Dict:
     if not result:
         return {
             "wave": "?", "degree": "Primary",
@@ -251,4 +274,271 @@ def get_primary_bias(symbol: str = "BTCUSDT") -> Dict:
         "fib_targets": result.get("fib_targets", {}),
         "wave_high":  result.get("wave_high"),
         "wave_low":   result.get("wave_low"),
-    }
\ No newline at end of file
+    }
+
+
+# ─────────────────────────────────────────────
+# POINT-IN-TIME: Primary Wave ณ ทุกแท่ง 1W
+# ─────────────────────────────────────────────
+
+_PRIMARY_LABELS = ["1", "2", "3", "4", "5", "A", "B", "C"]
+
+
+def primary_wave_series(df_1w: pd.DataFrame, atr_mult: float = 2.5) -> pd.DataFrame:
+    """
+    Primary Wave แบบ point-in-time — แถว t = ผลของ analyze_primary_wave(df_1w.iloc[:t+1])
+
+    pivot ที่แท่ง i ยืนยันเมื่อมีแท่งขวาครบ 2 แท่ง (t >= i+2) และ ATR เป็น rolling ย้อนหลัง
+    → fold ZigZag รอบเดียวทั้ง frame แล้ว snapshot wave ล่าสุดทุกแท่ง
+    คอลัมน์: wave, direction, bias, start_price, end_price, pct, pivot_count
+    (ยังวิเคราะห์ไม่ได้ = wave "?", direction UNKNOWN, bias NEUTRAL)
+    """
+    n = 0 if df_1w is None else len(df_1w)
+    wave = np.full(n, "?", dtype=object)
+    direction = np.full(n, "UNKNOWN", dtype=object)
+    bias = np.full(n, "NEUTRAL", dtype=object)
+    start_price = np.full(n, np.nan)
+    end_price = np.full(n, np.nan)
+    pct = np.full(n, np.nan)
+    pivot_count = np.zeros(n, dtype=int)
+
+    if n >= 20:
+        atr = _calc_atr(df_1w, length=14).to_numpy(dtype=float)
+        raw = _raw_weekly_pivots(df_1w)
+        zigzag: List[Dict] = []
+        j = 0
+        for t in range(n):
+            while j < len(raw) and raw[j]["index"] <= t - 2:
+                _zigzag_step(zigzag, raw[j], atr, atr_mult)
+                j += 1
+            if t + 1 < 20:
+                continue
+            m = len(zigzag)
+            pivot_count[t] = m
+            if m < 4:
+                continue
+            p0 = zigzag[-2]["price"]
+            p1 = zigzag[-1]["price"]
+            up = p1 > p0
+            wave[t] = _PRIMARY_LABELS[(m - 2) % len(_PRIMARY_LABELS)]
+            direction[t] = "UP" if up else "DOWN"
+            bias[t] = "BULLISH" if up else "BEARISH"
+            start_price[t] = p0
+            end_price[t] = p1
+            pct[t] = round(abs(p1 - p0) / p0 * 100, 2)
+
+    return pd.DataFrame(
+        {
+            "wave": wave,
+            "direction": direction,
+            "bias": bias,
+            "start_price": start_price,
+            "end_price": end_price,
+            "pct": pct,
+            "pivot_count": pivot_count,
+        },
+        index=None if df_1w is None else df_1w.index,
+    )
+
+
+def primary_bias_at(series: pd.DataFrame, pos: int) -> Dict:
+    """bias (รูปแบบเดียวกับ get_primary_bias) จากแถว pos ของ primary_wave_series — O(1)"""
+    if pos < 0 or pos >= len(series):
+        return _to_bias({})
+    row = series.iloc[pos]
+    if row["bias"] == "NEUTRAL":
+        return _to_bias({})
+    last_wave = {
+        "wave":      row["wave"],
+        "direction": row["direction"],
+        "start":     {"price": float(row["start_price"])},
+        "end":       {"price": float(row["end_price"])},
+        "pct":       float(row["pct"]),
+    }
+    # current_price ใช้แค่ retrace_pct ซึ่ง _to_bias ไม่ได้ส่งต่อ
+    return _to_bias(_get_current_wave([last_wave], float(row["end_price"])))
+
+
+# ─────────────────────────────────────────────
+# CACHE: bias ต่อ symbol ต่อแท่ง 1W ที่ปิดแล้ว
+# ─────────────────────────────────────────────
+
+_WEEK = pd.Timedelta(days=7)
+
+
+def _utc(ts: Any) -> pd.Timestamp:
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+
+def _weekly_open_times(df: pd.DataFrame) -> Optional[pd.DatetimeIndex]:
+    if "open_time" in df.columns:
+        return pd.DatetimeIndex(pd.to_datetime(df["open_time"], utc=True))
+    if isinstance(df.index, pd.DatetimeIndex):
+        return df.index.tz_localize("UTC") if df.index.tz is None else df.index.tz_convert("UTC")
+    return None
+
+
+def closed_weekly_bars(df_1w: pd.DataFrame, as_of: Any) -> pd.DataFrame:
+    """แท่ง 1W ที่ปิดแล้ว ณ เวลา as_of (open + 7 วัน <= as_of) — ไม่มี timestamp = ใช้ทั้ง frame"""
+    if df_1w is None or len(df_1w) == 0:
+        return pd.DataFrame()
+    opens = _weekly_open_times(df_1w)
+    if opens is None:
+        return df_1w
+    return df_1w[(opens + _WEEK <= _utc(as_of))]
+
+
+def last_closed_week_open(now: Any) -> pd.Timestamp:
+    """open time ของแท่ง 1W ล่าสุดที่ปิดแล้ว (Binance 1W เปิดวันจันทร์ 00:00 UTC)"""
+    now = _utc(now)
+    monday = now.normalize() - pd.Timedelta(days=now.weekday())
+    return monday - _WEEK
+
+
+def fetch_weekly(symbol: str, limit: int = 500) -> pd.DataFrame:
+    """ดึง 1W ที่ปิดแล้วครั้งเดียว (ใช้ inject ให้ PrimaryBiasProvider ตอน backtest)"""
+    from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle
+    df = fetch_ohlcv(symbol, interval="1w", limit=limit)
+    return drop_unclosed_candle(df)
+
+
+class PrimaryBiasProvider:
+    """
+    Primary Wave bias ที่คำนวณครั้งเดียวต่อ symbol ต่อแท่ง 1W ที่ปิด
+
+    - weekly: {symbol: df_1w} ที่ inject มา (backtest) → สร้าง primary_wave_series ครั้งเดียว
+      แล้วหาแถวของแท่งที่ปิดล่าสุด ณ as_of (searchsorted), ไม่เรียก network
+    - ไม่มี frame ของ symbol นั้น → ดึง 1W เมื่อมีแท่งใหม่ปิด (allow_fetch=False = NEUTRAL)
+    - ดึงไม่สำเร็จจะไม่ cache (รอบหน้าลองใหม่)
+    - fixed: {symbol: bias} ที่คิดไว้แล้ว (จาก pin) → ตอบค่านั้นทุก as_of
+    """
+
+    def __init__(
+        self,
+        weekly: Optional[Dict[str, pd.DataFrame]] = None,
+        allow_fetch: bool = True,
+        fixed: Optional[Dict[str, Dict]] = None,
+    ) -> None:
+        self._weekly: Dict[str, pd.DataFrame] = dict(weekly or {})
+        self._fixed: Dict[str, Dict] = dict(fixed or {})
+        self._allow_fetch = allow_fetch
+        self._cache: Dict[str, Tuple[Any, Dict]] = {}
+        self._series: Dict[str, Tuple[Optional[np.ndarray], pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "computed": 0, "fetched": 0}
+
+    def set_weekly(self, symbol: str, df_1w: Optional[pd.DataFrame]) -> None:
+        with self._lock:
+            if df_1w is None:
+                self._weekly.pop(symbol, None)
+            else:
+                self._weekly[symbol] = df_1w
+            self._cache.pop(symbol, None)
+            self._series.pop(symbol, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def pin(self, symbol: str, as_of: Any = None) -> "PrimaryBiasProvider":
+        """
+        bias ของ symbol ณ as_of (ดึง / cache ตามปกติ) เป็น provider ที่ไม่เรียก network
+        ฝั่ง I/O (load_context) เรียกก่อน แล้วส่ง provider นี้ให้ analyze()
+        """
+        return PrimaryBiasProvider(allow_fetch=False, fixed={symbol: self.get(symbol, as_of=as_of)})
+
+    def get(self, symbol: str, as_of: Any = None) -> Dict:
+        fixed = self._fixed.get(symbol)
+        if fixed is not None:
+            return dict(fixed)
+        as_of = pd.Timestamp.now(tz="UTC") if as_of is None else _utc(as_of)
+        df_1w = self._weekly.get(symbol)
+
+        if df_1w is not None:
+            close_times, series = self._series_for(symbol, df_1w)
+            if close_times is None:
+                pos = len(series) - 1
+            else:
+                pos = int(np.searchsorted(close_times, as_of.to_datetime64(), side="right")) - 1
+            key = pos
+            hit = self._lookup(symbol, key)
+            if hit is not None:
+                return hit
+            return self._store(symbol, key, primary_bias_at(series, pos))
+
+        if not self._allow_fetch:
+            return _to_bias({})
+
+        key = last_closed_week_open(as_of)
+        hit = self._lookup(symbol, key)
+        if hit is not None:
+            return hit
+        self.stats["fetched"] += 1
+        result = analyze_primary_wave(symbol)
+        if not result:
+            return _to_bias({})
+        return self._store(symbol, key, _to_bias(result))
+
+    def _series_for(
+        self, symbol: str, df_1w: pd.DataFrame
+    ) -> Tuple[Optional[np.ndarray], pd.DataFrame]:
+        with self._lock:
+            cached = self._series.get(symbol)
+        if cached is not None:
+            return cached
+        opens = _weekly_open_times(df_1w) if len(df_1w) else None
+        close_times = None
+        if opens is not None:
+            close_times = (opens + _WEEK).tz_convert("UTC").tz_localize(None).to_numpy()
+        built = (close_times, primary_wave_series(df_1w))
+        with self._lock:
+            self._series[symbol] = built
+        return built
+
+    def _lookup(self, symbol: str, key: Any) -> Optional[Dict]:
+        with self._lock:
+            cached = self._cache.get(symbol)
+            if cached is not None and cached[0] == key:
+                self.stats["hits"] += 1
+                return dict(cached[1])
+        return None
+
+    def _store(self, symbol: str, key: Any, bias: Dict) -> Dict:
+        with self._lock:
+            self.stats["computed"] += 1
+            self._cache[symbol] = (key, bias)
+        return dict(bias)
+
+
+_DEFAULT_PROVIDER = PrimaryBiasProvider()
+_ACTIVE_PROVIDER: ContextVar[Optional[Tuple[PrimaryBiasProvider, Any]]] = ContextVar(
+    "primary_bias_provider", default=None
+)
+
+
+@contextmanager
+def use_primary_bias(provider: PrimaryBiasProvider, as_of: Any = None) -> Iterator[PrimaryBiasProvider]:
+    """
+    ภายใน scope นี้ get_cached_primary_bias ใช้ provider + as_of ที่ระบุ
+    (backtest: as_of = เวลาปิดของแท่งที่กำลังตัดสินใจ → bias แบบ point-in-time)
+    """
+    token = _ACTIVE_PROVIDER.set((provider, as_of))
+    try:
+        yield provider
+    finally:
+        _ACTIVE_PROVIDER.reset(token)
+
+
+def get_cached_primary_bias(symbol: str = "BTCUSDT") -> Dict:
+    """bias จาก provider ของ scope ปัจจุบัน (ไม่มี scope = provider กลางแบบ live)"""
+    active = _ACTIVE_PROVIDER.get()
+    if active is None:
+        return _DEFAULT_PROVIDER.get(symbol)
+    provider, as_of = active
+    return provider.get(symbol, as_of=as_of)
+
+
+def pin_primary_bias(symbol: str, as_of: Any = None) -> PrimaryBiasProvider:
+    """bias แบบ live (provider กลาง) ของ symbol ณ as_of ตรึงเป็น provider ที่ไม่เรียก network"""
+    return _DEFAULT_PROVIDER.pin(symbol, as_of=as_of)
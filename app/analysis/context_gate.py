@@ -1,5 +1,67 @@
 from typing import Dict, Optional
 
+import numpy as np
+import pandas as pd
+
+
+def _gate_columns(
+    directions: np.ndarray,
+    conf: np.ndarray,
+    bias: np.ndarray,
+    bias_strength: np.ndarray,
+    allow_long: np.ndarray,
+    allow_short: np.ndarray,
+    min_confidence: float,
+) -> Dict[str, list]:
+    """gate ของทุกแถวพร้อมกัน — reason ตัวหลังทับตัวก่อนเหมือน apply_context_gate"""
+    low_conf = conf < min_confidence
+    blocked = ((directions == "LONG") & ~allow_long) | ((directions == "SHORT") & ~allow_short)
+
+    reasons = []
+    for c, b, lc, bl in zip(conf.tolist(), bias, low_conf, blocked):
+        if bl:
+            reasons.append(f"BLOCKED_BY_MACRO({b})")
+        elif lc:
+            reasons.append(f"LOW_CONF({c})")
+        else:
+            reasons.append("")
+
+    return {
+        "allowed": [not (lc or bl) for lc, bl in zip(low_conf, blocked)],
+        "gate_reason": reasons,
+        "context_score": [
+            round((c * 0.7) + (s * 0.3), 2) for c, s in zip(conf.tolist(), bias_strength.tolist())
+        ],
+    }
+
+
+def context_gate_series(
+    directions,
+    confidences,
+    macro: pd.DataFrame,
+    min_confidence: float = 60.0,
+) -> pd.DataFrame:
+    """
+    apply_context_gate ของทุกแท่ง — directions/confidences ต่อแท่ง + macro จาก macro_bias_series
+    คืน allowed / gate_reason / context_score (index เดียวกับ macro)
+    """
+    dirs = np.array([str(d or "").upper() for d in directions], dtype=object)
+    conf = np.array([float(c or 0) for c in confidences], dtype=float)
+    if len(dirs) != len(macro) or len(conf) != len(macro):
+        raise ValueError("directions/confidences ต้องยาวเท่ากับ macro")
+
+    out = _gate_columns(
+        dirs,
+        conf,
+        np.array([str(b or "NEUTRAL").upper() for b in macro["bias"]], dtype=object),
+        np.array([float(x or 0) for x in macro["strength"]], dtype=float),
+        macro["allow_long"].astype(bool).to_numpy(),
+        macro["allow_short"].astype(bool).to_numpy(),
+        min_confidence,
+    )
+    return pd.DataFrame(out, index=macro.index)
+
+
 def apply_context_gate(
     scenario: Dict,
     macro_bias: Dict,
@@ -21,32 +83,23 @@ def apply_context_gate(
     allow_long = bool(macro_bias.get("allow_long", True))
     allow_short = bool(macro_bias.get("allow_short", True))
 
-    allowed = True
-    reason = ""
-
-    # ---- confidence filter ----
-    if conf < min_confidence:
-        allowed = False
-        reason = f"LOW_CONF({conf})"
-
-    # ---- macro direction filter (Strict) ----
-    if direction == "LONG" and not allow_long:
-        allowed = False
-        reason = f"BLOCKED_BY_MACRO({bias})"
-    if direction == "SHORT" and not allow_short:
-        allowed = False
-        reason = f"BLOCKED_BY_MACRO({bias})"
-
-    # ---- context score ----
-    context_score = round((conf * 0.7) + (bias_strength * 0.3), 2)
+    gate = _gate_columns(
+        np.array([direction], dtype=object),
+        np.array([conf]),
+        np.array([bias], dtype=object),
+        np.array([bias_strength]),
+        np.array([allow_long]),
+        np.array([allow_short]),
+        min_confidence,
+    )
 
     # ❌ ถ้าไม่ผ่าน: คืน None ให้ wave_engine ตัดทิ้ง
-    if not allowed:
+    if not gate["allowed"][0]:
         return None
 
     # ✅ ถ้าผ่าน: คืน “scenario เดิม” + แนบฟิลด์ debug
     out = dict(scenario)
     out["allowed"] = True
-    out["gate_reason"] = reason
-    out["context_score"] = context_score
-    return out
\ No newline at end of file
+    out["gate_reason"] = gate["gate_reason"][0]
+    out["context_score"] = gate["context_score"][0]
+    return out
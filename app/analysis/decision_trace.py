@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config.wave_settings import DECISION_TRACE_DIR
+from app.data.binance_fetcher import to_utc
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────
+# decision trace: 1 record ต่อ (symbol, scenario) ต่อ scan
+# ─────────────────────────────────────────────
+# record ขนาดคงที่ (numpy structured dtype) ต่อท้ายไฟล์รายวัน {dir}/{YYYY-MM-DD}.v{N}.dec (วันตาม UTC ของแท่ง)
+# อ่านทั้งวันด้วย np.fromfile ครั้งเดียว → ทุก field เป็น numpy column สำหรับ mask / นับ
+# เปลี่ยน schema = เพิ่ม TRACE_VERSION (ไฟล์เก่าอ่านด้วย dtype เดิมไม่ได้ จึงแยกชื่อไฟล์)
+
+TRACE_VERSION = 1
+
+DECISION_DTYPE = np.dtype([
+    ("as_of", "<i8"),          # เวลาปิดแท่งที่ตัดสินใจ (ms UTC)
+    ("scan_ts", "<i8"),        # เวลาที่ scan จริง (ms UTC)
+    ("symbol", "S16"),
+    ("timeframe", "S4"),
+    ("mode", "S8"),            # TREND / SIDEWAY
+    ("type", "S24"),           # "" = scan ที่ไม่มี scenario (rank = -1)
+    ("direction", "S5"),
+    ("rank", "<i1"),           # ลำดับ scenario ใน result (เรียงตาม score แล้ว)
+    ("weekly_ok", "?"),
+    ("mtf_ok", "?"),
+    ("context_allowed", "?"),
+    ("trend_ok", "?"),
+    ("volume_ok", "?"),
+    ("valid", "?"),            # trade plan ผ่าน (รวม RR ≥ MIN_RR)
+    ("allowed", "?"),          # allowed_to_trade (READY)
+    ("triggered", "?"),
+    ("confidence", "<f4"),
+    ("probability", "<f4"),
+    ("context_score", "<f4"),
+    ("rr", "<f4"),             # RR ที่ TP2 แบบเดียวกับ build_trade_plan (ไม่มีแผน = NaN)
+    ("price", "<f8"),
+    ("entry", "<f8"),
+    ("sl", "<f8"),
+    ("tp1", "<f8"),
+    ("tp2", "<f8"),
+    ("tp3", "<f8"),
+])
+
+_STR_FIELDS = ("symbol", "timeframe", "mode", "type", "direction")
+
+
+def _ms(ts: Any) -> int:
+    return int(to_utc(ts).value // 1_000_000)
+
+
+def _num(x: Any) -> float:
+    try:
+        return float(x) if x is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _rr(entry: float, sl: float, tp2: float) -> float:
+    risk = abs(entry - sl)
+    return abs(tp2 - entry) / risk if risk > 0 else np.nan
+
+
+def decision_records(
+    symbol: str,
+    timeframe: str,
+    as_of: Any,
+    result: Optional[Dict],
+    scan_ts: Any = None,
+) -> np.ndarray:
+    """
+    แปลงผล analyze() เป็น record ของ DECISION_DTYPE
+    - TREND: scenario ใน result มี weekly_ok / mtf_ok / context_allowed / trade_plan ครบ
+    - SIDEWAY: setup ผ่าน weekly permit มาแล้ว → flag ที่ไม่มีใน scenario = True, allowed = plan valid
+    - ไม่มี scenario → 1 record type="" rank=-1 (นับจำนวน scan เป็นตัวหารได้)
+    result None (ข้อมูลไม่พอ) → array ว่าง
+    """
+    if result is None:
+        return np.zeros(0, dtype=DECISION_DTYPE)
+    scenarios = result.get("scenarios") or []
+    rec = np.zeros(max(1, len(scenarios)), dtype=DECISION_DTYPE)
+    rec["as_of"] = _ms(as_of)
+    rec["scan_ts"] = _ms(scan_ts if scan_ts is not None else pd.Timestamp.now(tz="UTC"))
+    rec["symbol"] = str(symbol).encode()
+    rec["timeframe"] = str(timeframe).encode()
+    rec["mode"] = str(result.get("mode") or "").encode()
+    rec["price"] = _num(result.get("price"))
+    rec["rank"] = -1
+    for f in ("confidence", "probability", "context_score", "rr", "entry", "sl", "tp1", "tp2", "tp3"):
+        rec[f] = np.nan
+
+    for i, sc in enumerate(scenarios):
+        plan = sc.get("trade_plan") or {}
+        valid = plan.get("valid") is True
+        r = rec[i]
+        r["type"] = str(sc.get("type") or "").encode()
+        r["direction"] = str(sc.get("direction") or "").upper().encode()
+        r["rank"] = min(i, 127)
+        r["weekly_ok"] = bool(sc.get("weekly_ok", True))
+        r["mtf_ok"] = bool(sc.get("mtf_ok", True))
+        r["context_allowed"] = bool(sc.get("context_allowed", True))
+        r["trend_ok"] = bool(plan.get("trend_ok", True))
+        r["volume_ok"] = bool(plan.get("volume_ok", result.get("volume_spike", False)))
+        r["valid"] = valid
+        r["allowed"] = bool(plan.get("allowed_to_trade", valid))
+        r["triggered"] = bool(plan.get("triggered", False))
+        for f in ("confidence", "probability", "context_score"):
+            r[f] = _num(sc.get(f))
+        for f in ("entry", "sl", "tp1", "tp2", "tp3"):
+            r[f] = _num(plan.get(f))
+        r["rr"] = _rr(_num(plan.get("entry")), _num(plan.get("sl")), _num(plan.get("tp2")))
+    return rec
+
+
+def _day(ms: int) -> str:
+    return pd.Timestamp(ms, unit="ms", tz="UTC").strftime("%Y-%m-%d")
+
+
+class DecisionTrace:
+    """
+    เขียน / อ่าน decision trace รายวัน
+    - record: ต่อท้ายไฟล์ของวัน (เปิด "ab" ต่อ scan) — เขียนไม่สำเร็จแค่ log ไม่กระทบ analysis
+    - ไฟล์ที่ record สุดท้ายเขียนไม่ครบ (process ตายกลางทาง) → ตัดเศษท้ายทิ้งตอนอ่าน
+    directory ว่าง = ปิด trace
+    """
+
+    def __init__(self, directory: Optional[str] = DECISION_TRACE_DIR) -> None:
+        self.directory = directory or ""
+        self._lock = threading.Lock()
+        self.stats = {"scans": 0, "records": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def path(self, day: str) -> str:
+        return os.path.join(self.directory, f"{day}.v{TRACE_VERSION}.dec")
+
+    def record(
+        self,
+        symbol: str,
+        timeframe: str,
+        as_of: Any,
+        result: Optional[Dict],
+        scan_ts: Any = None,
+    ) -> int:
+        """เขียน record ของ scan นี้ → จำนวน record ที่เขียน (ปิดอยู่ / ไม่มีเวลาแท่ง / error = 0)"""
+        if not self.enabled or as_of is None:
+            return 0
+        try:
+            rec = decision_records(symbol, timeframe, as_of, result, scan_ts=scan_ts)
+            if len(rec) == 0:
+                return 0
+            path = self.path(_day(int(rec["as_of"][0])))
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, "ab") as fh:
+                    fh.write(rec.tobytes())
+                self.stats["scans"] += 1
+                self.stats["records"] += len(rec)
+            return len(rec)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"[{symbol}] เขียน decision trace ไม่สำเร็จ: {e}")
+            return 0
+
+    def days(self) -> List[str]:
+        if not self.enabled or not os.path.isdir(self.directory):
+            return []
+        suffix = f".v{TRACE_VERSION}.dec"
+        return sorted(f[: -len(suffix)] for f in os.listdir(self.directory) if f.endswith(suffix))
+
+    def load(self, start: Any = None, end: Any = None) -> np.ndarray:
+        """
+        record ทุกวันในช่วง [start, end] (วันที่ UTC, None = ไม่จำกัด) ต่อกันเป็น array เดียว
+        ใช้ field เป็น column ได้ตรง ๆ เช่น rec["weekly_ok"], rec["rr"]
+        """
+        lo = to_utc(start).strftime("%Y-%m-%d") if start is not None else None
+        hi = to_utc(end).strftime("%Y-%m-%d") if end is not None else None
+        parts = []
+        for day in self.days():
+            if (lo is not None and day < lo) or (hi is not None and day > hi):
+                continue
+            path = self.path(day)
+            count = os.path.getsize(path) // DECISION_DTYPE.itemsize
+            if count:
+                parts.append(np.fromfile(path, dtype=DECISION_DTYPE, count=count))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=DECISION_DTYPE)
+
+    def frame(self, start: Any = None, end: Any = None) -> pd.DataFrame:
+        """load() เป็น DataFrame (string เป็น str, เวลาเป็น Timestamp UTC) สำหรับดู / groupby"""
+        return decision_frame(self.load(start, end))
+
+
+def decision_frame(rec: np.ndarray) -> pd.DataFrame:
+    df = pd.DataFrame({name: rec[name] for name in DECISION_DTYPE.names})
+    for f in _STR_FIELDS:
+        df[f] = np.char.decode(rec[f], "utf-8")
+    for f in ("as_of", "scan_ts"):
+        df[f] = pd.to_datetime(rec[f], unit="ms", utc=True)
+    return df
+
+
+def blocked_by(rec: np.ndarray, flag: str, **where: Any) -> Dict[str, int]:
+    """
+    นับ scenario ที่ plan ผ่าน (valid) แต่ถูก flag นี้กั้น (flag=False) เทียบกับ valid ทั้งหมด
+    where = เงื่อนไขเพิ่มต่อ field เช่น symbol="BTCUSDT", direction="LONG"
+    เช่น blocked_by(trace.load("2026-07-01", "2026-09-30"), "weekly_ok")
+    """
+    mask = rec["valid"].copy()
+    for name, value in where.items():
+        if name in _STR_FIELDS and isinstance(value, str):
+            value = value.encode()
+        mask &= rec[name] == value
+    return {"valid": int(mask.sum()), "blocked": int((mask & ~rec[flag]).sum())}
+
+
+_TRACE = DecisionTrace()
+
+
+def decision_trace() -> DecisionTrace:
+    return _TRACE
+
+
+def record_decisions(
+    symbol: str,
+    timeframe: str,
+    as_of: Any,
+    result: Optional[Dict],
+) -> int:
+    return decision_trace().record(symbol, timeframe, as_of, result)
+
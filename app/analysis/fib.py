@@ -32,23 +32,23 @@ def fib_extension(a: float, b: float, c: float):
     return targets
 
 
-def fib_zone_match(value: float):
-    zones = {
-        "0.236": 0.236,
-        "0.382": 0.382,
-        "0.5": 0.5,
-        "0.618": 0.618,
-        "0.786": 0.786,
-        "1.0": 1.0,
-        "1.618": 1.618,
-    }
+FIB_ZONE_LEVELS = {
+    "0.236": 0.236,
+    "0.382": 0.382,
+    "0.5": 0.5,
+    "0.618": 0.618,
+    "0.786": 0.786,
+    "1.0": 1.0,
+    "1.618": 1.618,
+}
+FIB_ZONE_TOLERANCE = 0.03
 
-    tolerance = 0.03
 
+def fib_zone_match(value: float):
     matches = []
 
-    for name, level in zones.items():
-        if abs(value - level) <= tolerance:
+    for name, level in FIB_ZONE_LEVELS.items():
+        if abs(value - level) <= FIB_ZONE_TOLERANCE:
             matches.append(name)
 
-    return matches  
\ No newline at end of file
+    return matches
\ No newline at end of file
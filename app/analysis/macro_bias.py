@@ -4,6 +4,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict
 
+import numpy as np
+import pandas as pd
+
 
 @dataclass
 class MacroBias:
@@ -18,6 +21,91 @@ def _clamp(x: float, lo: float = 0.0, hi: float = 100.0) -> float:
     return max(lo, min(float(x), hi))
 
 
+def _macro_columns(
+    rg: np.ndarray,
+    tr: np.ndarray,
+    vol: np.ndarray,
+    trend_strength: np.ndarray,
+    vol_score: np.ndarray,
+    rsi14: np.ndarray,
+) -> Dict[str, list]:
+    """macro bias ของทุกแถวพร้อมกัน — ลำดับการบวก/ลบเหมือน compute_macro_bias ทุกขั้น"""
+    n = len(rg)
+    trend_rg = rg == "TREND"
+    range_rg = rg == "RANGE"
+    chop_rg = ~(trend_rg | range_rg)
+
+    bias = np.full(n, "NEUTRAL", dtype=object)
+    strength = np.full(n, 25.0)
+
+    # ---- core bias from trend ----
+    bull = trend_rg & (tr == "BULL")
+    bear = trend_rg & (tr == "BEAR")
+    bias[bull] = "LONG"
+    bias[bear] = "SHORT"
+    strength = np.where(bull | bear, 55.0 + (trend_strength * 0.35), strength)
+    strength = np.where(trend_rg & ~(bull | bear), 35.0, strength)
+    strength = np.where((bull & (rsi14 >= 55)) | (bear & (rsi14 <= 45)), strength + 5.0, strength)
+
+    # range: neutral เป็นหลัก เว้นแต่ rsi เอียงชัด
+    range_long = range_rg & (rsi14 >= 60)
+    range_short = range_rg & ~range_long & (rsi14 <= 40)
+    bias[range_long] = "LONG"
+    bias[range_short] = "SHORT"
+    strength = np.where(range_rg, np.where(range_long | range_short, 45.0, 35.0), strength)
+
+    # chop + vol สูง => ระวังสุด
+    strength = np.where(chop_rg & (vol == "HIGH"), strength - 5.0, strength)
+
+    # ---- volatility penalty ----
+    strength = np.where(vol_score >= 75, strength - 8.0, np.where(vol_score <= 30, strength + 3.0, strength))
+
+    # _clamp แบบ Python: min แล้ว max (NaN → 0)
+    strength = np.where(100.0 < strength, 100.0, strength)
+    strength = np.where(strength > 0.0, strength, 0.0)
+
+    allow_long = ~((bias == "SHORT") & (strength >= 50))
+    allow_short = ~((bias == "LONG") & (strength >= 50))
+
+    return {
+        "bias": list(bias),
+        "strength": [round(float(x), 2) for x in strength],
+        "allow_long": [bool(x) for x in allow_long],
+        "allow_short": [bool(x) for x in allow_short],
+        "notes": [
+            f"rg={g} tr={t} vol={v} rsi={r:.1f} ts={ts:.1f} vs={vs:.1f}"
+            for g, t, v, r, ts, vs in zip(
+                rg, tr, vol, rsi14.tolist(), trend_strength.tolist(), vol_score.tolist()
+            )
+        ],
+    }
+
+
+def macro_bias_series(regimes: pd.DataFrame, rsi14) -> pd.DataFrame:
+    """
+    compute_macro_bias ของทุกแถว — regimes จาก market_regime_series, rsi14 = คอลัมน์ RSI ของ frame เดียวกัน
+    แถว i = compute_macro_bias(regime แถว i, rsi14=rsi14[i])
+    """
+    cols = list(MacroBias.__dataclass_fields__)
+    if regimes is None or len(regimes) == 0:
+        return pd.DataFrame(columns=cols)
+
+    def _num(values, default: float) -> np.ndarray:
+        # float(x or default): 0 → default, NaN คงเป็น NaN
+        arr = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+        return np.where(arr == 0, default, arr)
+
+    out = _macro_columns(
+        regimes["regime"].fillna("CHOP").to_numpy(dtype=object),
+        regimes["trend"].fillna("NEUTRAL").to_numpy(dtype=object),
+        regimes["vol"].fillna("MID").to_numpy(dtype=object),
+        _num(regimes["trend_strength"].to_numpy(), 0.0),
+        _num(regimes["vol_score"].to_numpy(), 0.0),
+        _num(np.asarray(rsi14), 50.0),
+    )
+    return pd.DataFrame(out, index=regimes.index, columns=cols)
+
+
 def compute_macro_bias(regime: Dict, rsi14: float = 50.0) -> Dict:
     """
     Input:
@@ -35,69 +123,13 @@ def compute_macro_bias(regime: Dict, rsi14: float = 50.0) -> Dict:
     vol_score = float((regime or {}).get("vol_score", 0) or 0)
     rsi14 = float(rsi14 or 50.0)
 
-    bias = "NEUTRAL"
-    strength = 0.0
-
-    # ---- core bias from trend ----
-    if rg == "TREND":
-        if tr == "BULL":
-            bias = "LONG"
-            strength = 55.0 + (trend_strength * 0.35)
-            if rsi14 >= 55:
-                strength += 5.0
-        elif tr == "BEAR":
-            bias = "SHORT"
-            strength = 55.0 + (trend_strength * 0.35)
-            if rsi14 <= 45:
-                strength += 5.0
-        else:
-            bias = "NEUTRAL"
-            strength = 35.0
-
-    elif rg == "RANGE":
-        # range: ไม่ bias แรง ให้ neutral เป็นหลัก
-        bias = "NEUTRAL"
-        strength = 35.0
-        # แต่ถ้า rsi เอียงชัด ก็ให้ bias เบา ๆ
-        if rsi14 >= 60:
-            bias = "LONG"
-            strength = 45.0
-        elif rsi14 <= 40:
-            bias = "SHORT"
-            strength = 45.0
-
-    else:  # CHOP
-        bias = "NEUTRAL"
-        strength = 25.0
-        # chop + vol สูง => ระวังสุด
-        if vol == "HIGH":
-            strength -= 5.0
-
-    # ---- volatility penalty (กันมั่วใน vol สูง) ----
-    if vol_score >= 75:
-        strength -= 8.0
-    elif vol_score <= 30:
-        strength += 3.0
-
-    strength = _clamp(strength)
-
-    # ---- allow gates ----
-    # FIX: ลด threshold จาก 60 → 50
-    # เดิม strength>=60 แทบไม่เคยถึง → allow_long/allow_short เป็น True ตลอด
-    # ใหม่ strength>=50 ทำให้ TREND regime ที่มี bias ชัดบล็อกฝั่งสวนได้จริง
-    allow_long = True
-    allow_short = True
-
-    if bias == "LONG" and strength >= 50:
-        allow_short = False
-    if bias == "SHORT" and strength >= 50:
-        allow_long = False
-
-    mb = MacroBias(
-        bias=bias,
-        strength=round(strength, 2),
-        allow_long=allow_long,
-        allow_short=allow_short,
-        notes=f"rg={rg} tr={tr} vol={vol} rsi={rsi14:.1f} ts={trend_strength:.1f} vs={vol_score:.1f}",
+    out = _macro_columns(
+        np.array([rg], dtype=object),
+        np.array([tr], dtype=object),
+        np.array([vol], dtype=object),
+        np.array([trend_strength]),
+        np.array([vol_score]),
+        np.array([rsi14]),
     )
-    return mb.__dict__
\ No newline at end of file
+    mb = MacroBias(**{k: v[0] for k, v in out.items()})
+    return mb.__dict__
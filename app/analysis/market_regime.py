@@ -4,6 +4,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Optional
 
+import numpy as np
 import pandas as pd
 
 
@@ -33,6 +34,112 @@ def _pct(a: float, b: float) -> float:
     return abs((float(a) - b) / b) * 100.0
 
 
+def _column(df: pd.DataFrame, col: str, default: float) -> np.ndarray:
+    """คอลัมน์เป็น float แบบ _safe_float: ไม่มีคอลัมน์/แปลงไม่ได้ = default (NaN เดิมคงเป็น NaN)"""
+    if col not in df.columns:
+        return np.full(len(df), float(default))
+    raw = df[col]
+    values = pd.to_numeric(raw, errors="coerce")
+    bad = values.isna() & raw.notna()
+    return values.mask(bad, float(default)).to_numpy(dtype=float)
+
+
+def _regime_columns(
+    df: pd.DataFrame,
+    ema_fast_col: str,
+    ema_slow_col: str,
+    atr_col: str,
+    rsi_col: str,
+) -> Dict[str, list]:
+    """regime ของทุกแท่ง (ใช้แท่งนั้น + แท่งก่อนหน้า) — ไม่เช็คความยาว"""
+    close = _column(df, "close", 0.0)
+    ema_fast = _column(df, ema_fast_col, 0.0)
+    ema_slow = _column(df, ema_slow_col, 0.0)
+    atr = _column(df, atr_col, 0.0)
+    rsi = _column(df, rsi_col, 50.0)
+
+    # แท่งแรกไม่มี prev → ใช้ตัวเอง; ไม่มีคอลัมน์ → ใช้ค่าปัจจุบัน (slope = 0)
+    ema_fast_prev = np.concatenate([ema_fast[:1], ema_fast[:-1]]) if ema_fast_col in df.columns else ema_fast
+    ema_slow_prev = np.concatenate([ema_slow[:1], ema_slow[:-1]]) if ema_slow_col in df.columns else ema_slow
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ema_gap_pct = np.where(ema_slow == 0, 0.0, np.abs((ema_fast - ema_slow) / ema_slow) * 100.0)
+        atr_pct = np.where(close == 0, 0.0, atr / close * 100.0)
+
+    fast_slope = ema_fast - ema_fast_prev
+    slow_slope = ema_slow - ema_slow_prev
+
+    trend = np.full(len(df), "NEUTRAL", dtype=object)
+    trend[(ema_fast < ema_slow) & (fast_slope <= 0)] = "BEAR"
+    trend[(ema_fast > ema_slow) & (fast_slope >= 0)] = "BULL"
+
+    vol = np.where(atr_pct <= 1.2, "LOW", np.where(atr_pct <= 2.8, "MID", "HIGH")).astype(object)
+    vol_score = np.where(atr_pct <= 1.2, 25.0, np.where(atr_pct <= 2.8, 55.0, 80.0))
+
+    same_slope_dir = ((fast_slope >= 0) & (slow_slope >= 0)) | ((fast_slope <= 0) & (slow_slope <= 0))
+
+    # min/max แบบ Python (NaN ผ่าน min แล้วโดน max(0.0, ·) เป็น 0)
+    gap_score = ema_gap_pct * 10.0
+    trend_strength = np.where(60.0 < gap_score, 60.0, gap_score)
+    trend_strength = trend_strength + np.where(same_slope_dir, 20.0, 0.0)
+    rsi_bonus = ((trend == "BULL") & (rsi >= 55)) | ((trend == "BEAR") & (rsi <= 45))
+    trend_strength = trend_strength + np.where(rsi_bonus, 10.0, 0.0)
+    trend_strength = np.where(100.0 < trend_strength, 100.0, trend_strength)
+    trend_strength = np.where(trend_strength > 0.0, trend_strength, 0.0)
+
+    regime = np.full(len(df), "CHOP", dtype=object)
+    regime[(ema_gap_pct <= 0.5) & (45.0 <= rsi) & (rsi <= 55.0)] = "RANGE"
+    regime[(ema_gap_pct >= 1.0) & same_slope_dir] = "TREND"
+
+    return {
+        "regime": list(regime),
+        "trend": list(trend),
+        "vol": list(vol),
+        "trend_strength": [round(float(x), 2) for x in trend_strength],
+        "vol_score": [round(float(x), 2) for x in vol_score],
+        "notes": [
+            f"ema_gap={g:.2f}% atr%={a:.2f} rsi={r:.1f}"
+            for g, a, r in zip(ema_gap_pct.tolist(), atr_pct.tolist(), rsi.tolist())
+        ],
+    }
+
+
+_SHORT_REGIME = MarketRegime(
+    regime="CHOP",
+    trend="NEUTRAL",
+    vol="MID",
+    trend_strength=0.0,
+    vol_score=0.0,
+    notes="len<250",
+)
+
+
+def market_regime_series(
+    df: pd.DataFrame,
+    ema_fast_col: str = "ema50",
+    ema_slow_col: str = "ema200",
+    atr_col: str = "atr14",
+    rsi_col: str = "rsi14",
+) -> pd.DataFrame:
+    """
+    detect_market_regime ของทุกแท่งในรอบเดียว — แถว i = detect_market_regime(df.iloc[:i+1])
+    (ใช้แค่แท่ง i กับ i-1 จึงไม่ต้องตัด frame ทีละแท่ง; 249 แถวแรก = len<250)
+    """
+    cols = list(MarketRegime.__dataclass_fields__)
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=cols)
+
+    out = pd.DataFrame(
+        _regime_columns(df, ema_fast_col, ema_slow_col, atr_col, rsi_col),
+        index=df.index,
+        columns=cols,
+    )
+    short = min(len(df), 249)
+    for col in cols:
+        out.iloc[:short, out.columns.get_loc(col)] = getattr(_SHORT_REGIME, col)
+    return out
+
+
 def detect_market_regime(
     df: pd.DataFrame,
     ema_fast_col: str = "ema50",
@@ -46,84 +153,8 @@ def detect_market_regime(
     """
 
     if df is None or len(df) < 250:
-        mr = MarketRegime(
-            regime="CHOP",
-            trend="NEUTRAL",
-            vol="MID",
-            trend_strength=0.0,
-            vol_score=0.0,
-            notes="len<250",
-        )
-        return mr.__dict__
-
-    last = df.iloc[-1]
-    prev = df.iloc[-2] if len(df) >= 2 else last
-
-    close = _safe_float(last.get("close"))
-    ema_fast = _safe_float(last.get(ema_fast_col))
-    ema_slow = _safe_float(last.get(ema_slow_col))
-    atr = _safe_float(last.get(atr_col))
-    rsi = _safe_float(last.get(rsi_col), 50.0)
-
-    # -------- Trend direction (macro-ish) ----------
-    # ใช้ระยะห่าง EMA + slope คร่าว ๆ
-    ema_gap_pct = _pct(ema_fast, ema_slow)  # % ระยะห่างระหว่าง ema50 กับ ema200
-    ema_fast_prev = _safe_float(prev.get(ema_fast_col), ema_fast)
-    ema_slow_prev = _safe_float(prev.get(ema_slow_col), ema_slow)
+        return dict(_SHORT_REGIME.__dict__)
 
-    fast_slope = ema_fast - ema_fast_prev
-    slow_slope = ema_slow - ema_slow_prev
-
-    trend = "NEUTRAL"
-    if ema_fast > ema_slow and fast_slope >= 0:
-        trend = "BULL"
-    elif ema_fast < ema_slow and fast_slope <= 0:
-        trend = "BEAR"
-
-    # -------- Volatility ----------
-    # ATR เป็นหน่วยราคา → ทำให้เป็น % ของ close
-    atr_pct = (atr / close * 100.0) if close else 0.0
-
-    # แปลงเป็น vol_score 0-100 แบบง่าย (พอใช้ gate)
-    # 1% = ต่ำ, 2.5% = กลาง, 4%+ = สูง (ปรับได้ทีหลัง)
-    if atr_pct <= 1.2:
-        vol = "LOW"
-        vol_score = 25.0
-    elif atr_pct <= 2.8:
-        vol = "MID"
-        vol_score = 55.0
-    else:
-        vol = "HIGH"
-        vol_score = 80.0
-
-    # -------- Regime (TREND / RANGE / CHOP) ----------
-    # หลักง่าย: ถ้า EMA gap ใหญ่ + slope ไปทางเดียวกัน -> TREND
-    # ถ้า gap เล็ก + RSI กลาง ๆ -> RANGE
-    # นอกนั้น -> CHOP
-    same_slope_dir = (fast_slope >= 0 and slow_slope >= 0) or (fast_slope <= 0 and slow_slope <= 0)
-
-    trend_strength = 0.0
-    # strength คร่าว ๆ จาก gap + slope + RSI bias
-    trend_strength += min(ema_gap_pct * 10.0, 60.0)  # gap 6% -> +60
-    trend_strength += 20.0 if same_slope_dir else 0.0
-    if trend == "BULL":
-        trend_strength += 10.0 if rsi >= 55 else 0.0
-    elif trend == "BEAR":
-        trend_strength += 10.0 if rsi <= 45 else 0.0
-    trend_strength = max(0.0, min(trend_strength, 100.0))
-
-    regime = "CHOP"
-    if ema_gap_pct >= 1.0 and same_slope_dir:
-        regime = "TREND"
-    elif ema_gap_pct <= 0.5 and 45.0 <= rsi <= 55.0:
-        regime = "RANGE"
-
-    mr = MarketRegime(
-        regime=regime,
-        trend=trend,
-        vol=vol,
-        trend_strength=round(trend_strength, 2),
-        vol_score=round(vol_score, 2),
-        notes=f"ema_gap={ema_gap_pct:.2f}% atr%={atr_pct:.2f} rsi={rsi:.1f}",
-    )
-    return mr.__dict__
\ No newline at end of file
+    cols = _regime_columns(df.iloc[-2:], ema_fast_col, ema_slow_col, atr_col, rsi_col)
+    mr = MarketRegime(**{k: v[-1] for k, v in cols.items()})
+    return mr.__dict__
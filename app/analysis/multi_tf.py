@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import logging
 logger = logging.getLogger(__name__)
 
-from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle
-from app.indicators.ema import add_ema
+from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle, bar_close_time, bar_close_times
+from app.indicators.ema import add_ema, ema
 from app.indicators.rsi import add_rsi
 from app.indicators.atr import add_atr
 from app.indicators.trend_filter import trend_filter_ema
@@ -81,19 +85,11 @@ def _h4_structure_confirm(df4h: pd.DataFrame) -> Tuple[bool, bool, str]:
     confirm_short = close < lastL
     return confirm_long, confirm_short, f"4H close={close:.2f} lastH={lastH:.2f} lastL={lastL:.2f}"
 
-def get_mtf_summary(
-    symbol: str,
-    weekly_limit: int = 300,
-    h4_limit: int = 800,
-) -> Dict:
+def _summarize(symbol: str, dfw: pd.DataFrame, df4: pd.DataFrame) -> Dict:
     """
     1W = permit direction
     4H = confirm entry
     """
-
-    dfw = _prepare_df(symbol, "1w", weekly_limit)
-    df4 = _prepare_df(symbol, "4h", h4_limit)
-
     if dfw is None or len(dfw) < 250:
         logger.warning(f"[{symbol}] MTF weekly data ไม่พอ (len={len(dfw) if dfw is not None else 0}) → permit both, h4 skip")
         s = MTFSummary(
@@ -149,3 +145,313 @@ def get_mtf_summary(
         notes=note4,
     )
     return s.__dict__
+
+
+# ─────────────────────────────────────────────
+# CACHE: frame ต่อ (symbol, interval) หมดอายุเมื่อแท่งถัดไปปิด
+# ─────────────────────────────────────────────
+
+def _frame_key(df: pd.DataFrame) -> Any:
+    """ตัวแทนเนื้อหา frame สำหรับ cache summary (แท่งสุดท้าย + ความยาว)"""
+    if df is None or len(df) == 0:
+        return None
+    last = df.index[-1] if "open_time" not in df.columns else df["open_time"].iloc[-1]
+    return (last, len(df), float(df["close"].iloc[-1]))
+
+
+def _valid_until(df: pd.DataFrame) -> Optional[pd.Timestamp]:
+    """เวลาปิดของแท่งที่กำลังวิ่ง (แท่งสุดท้ายใน df ปิดแล้ว) — ไม่มี timestamp = None (ไม่ cache)"""
+    if df is None or len(df) < 2:
+        return None
+    close_last = bar_close_time(df)
+    if close_last is None:
+        return None
+    if "open_time" in df.columns:
+        last_open = pd.Timestamp(df["open_time"].iloc[-1])
+    else:
+        last_open = pd.Timestamp(df.index[-1])
+    last_open = last_open.tz_localize("UTC") if last_open.tz is None else last_open.tz_convert("UTC")
+    return close_last + (close_last - last_open)
+
+
+class MTFService:
+    """
+    MTF summary ที่ cache ต่อ (symbol, interval) — ดึง/คำนวณใหม่เมื่อมีแท่งใหม่ปิดเท่านั้น
+    - frame ที่ไม่มี timestamp หรือแท่งถัดไปปิดไปแล้ว (ข้อมูลย้อนหลังใน backtest) = ไม่ใช้ cache
+    - summary cache ตามเนื้อหา frame 1W/4H ที่ใช้ → frame เดิมทั้งคู่ = ไม่คำนวณซ้ำ
+    - timings[symbol] = เวลาของการเรียกล่าสุด (ms) + ว่า hit cache หรือไม่
+    """
+
+    def __init__(self, clock: Optional[Callable[[], pd.Timestamp]] = None) -> None:
+        self._clock = clock or (lambda: pd.Timestamp.now(tz="UTC"))
+        self._frames: Dict[Tuple[str, str, int], Tuple[pd.Timestamp, pd.DataFrame]] = {}
+        self._summaries: Dict[str, Tuple[Any, Dict]] = {}
+        self._lock = threading.Lock()
+        self.timings: Dict[str, Dict] = {}
+        self.stats = {"frame_hits": 0, "frame_fetches": 0, "summary_hits": 0, "summaries": 0}
+
+    def frame(self, symbol: str, interval: str, limit: int) -> Tuple[pd.DataFrame, str]:
+        """(df พร้อม indicator, สถานะ "hit" / "stored" / "uncached")"""
+        key = (symbol, interval, int(limit))
+        now = self._clock()
+        with self._lock:
+            cached = self._frames.get(key)
+            if cached is not None and now < cached[0]:
+                self.stats["frame_hits"] += 1
+                return cached[1], "hit"
+
+        df = _prepare_df(symbol, interval, limit)
+        valid_until = _valid_until(df)
+        with self._lock:
+            self.stats["frame_fetches"] += 1
+            if valid_until is not None and now < valid_until:
+                self._frames[key] = (valid_until, df)
+                return df, "stored"
+            self._frames.pop(key, None)
+        return df, "uncached"
+
+    def summary(self, symbol: str, weekly_limit: int = 300, h4_limit: int = 800) -> Dict:
+        t0 = perf_counter()
+        dfw, w_state = self.frame(symbol, "1w", weekly_limit)
+        t1 = perf_counter()
+        df4, h_state = self.frame(symbol, "4h", h4_limit)
+        t2 = perf_counter()
+
+        key = (_frame_key(dfw), _frame_key(df4))
+        cacheable = "uncached" not in (w_state, h_state)
+        with self._lock:
+            cached = self._summaries.get(symbol)
+        if cacheable and cached is not None and cached[0] == key:
+            result, s_cached = dict(cached[1]), True
+        else:
+            result, s_cached = _summarize(symbol, dfw, df4), False
+            with self._lock:
+                if cacheable:
+                    self._summaries[symbol] = (key, dict(result))
+                else:
+                    self._summaries.pop(symbol, None)
+        t3 = perf_counter()
+
+        timing = {
+            "weekly_ms": round((t1 - t0) * 1000, 2),
+            "h4_ms": round((t2 - t1) * 1000, 2),
+            "compute_ms": round((t3 - t2) * 1000, 2),
+            "total_ms": round((t3 - t0) * 1000, 2),
+            "weekly": w_state,
+            "h4": h_state,
+            "summary_cached": s_cached,
+        }
+        with self._lock:
+            self.stats["summary_hits" if s_cached else "summaries"] += 1
+            self.timings[symbol] = timing
+        logger.debug(f"[{symbol}] MTF {timing}")
+        return result
+
+    def summaries(
+        self,
+        symbols: Iterable[str],
+        workers: int = 4,
+        weekly_limit: int = 300,
+        h4_limit: int = 800,
+    ) -> Dict[str, Dict]:
+        """summary ของหลาย symbol พร้อมกัน (งานส่วนใหญ่รอ network → thread pool)"""
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+
+        def _one(symbol: str) -> Dict:
+            try:
+                return self.summary(symbol, weekly_limit=weekly_limit, h4_limit=h4_limit)
+            except Exception as e:
+                logger.error(f"[{symbol}] MTF summary error: {e}")
+                return {}
+
+        if workers <= 1 or len(symbols) == 1:
+            return {symbol: _one(symbol) for symbol in symbols}
+        with ThreadPoolExecutor(max_workers=min(workers, len(symbols))) as pool:
+            return dict(zip(symbols, pool.map(_one, symbols)))
+
+    def invalidate(self, symbol: Optional[str] = None) -> None:
+        with self._lock:
+            if symbol is None:
+                self._frames.clear()
+                self._summaries.clear()
+                return
+            for key in [k for k in self._frames if k[0] == symbol]:
+                del self._frames[key]
+            self._summaries.pop(symbol, None)
+
+
+_SERVICE = MTFService()
+
+
+def mtf_service() -> MTFService:
+    return _SERVICE
+
+
+def get_mtf_summary(
+    symbol: str,
+    weekly_limit: int = 300,
+    h4_limit: int = 800,
+) -> Dict:
+    """
+    1W = permit direction
+    4H = confirm entry
+    (ผ่าน cache ของ MTFService — ดึงใหม่เมื่อแท่ง 1W/4H ปิดเท่านั้น)
+    """
+    return _SERVICE.summary(symbol, weekly_limit=weekly_limit, h4_limit=h4_limit)
+
+
+def get_mtf_summaries(
+    symbols: Iterable[str],
+    workers: int = 4,
+    weekly_limit: int = 300,
+    h4_limit: int = 800,
+) -> Dict[str, Dict]:
+    """get_mtf_summary ทั้งรายการพร้อมกัน — {symbol: summary} (error = {})"""
+    return _SERVICE.summaries(symbols, workers=workers, weekly_limit=weekly_limit, h4_limit=h4_limit)
+
+
+# ─────────────────────────────────────────────
+# POINT-IN-TIME: permit/confirm เป็น time series (backtest)
+# ─────────────────────────────────────────────
+
+def _window_trend(close: pd.Series) -> str:
+    """trend_filter_ema ของ frame ที่มีแค่ close (EMA คิดบน window เดียวกับที่ live ดึงมา)"""
+    last = pd.DataFrame({
+        "close": [close.iloc[-1]],
+        "ema50": [ema(close, 50).iloc[-1]],
+        "ema200": [ema(close, 200).iloc[-1]],
+    })
+    return trend_filter_ema(last)
+
+
+def weekly_permit_series(df_1w: pd.DataFrame, limit: int = 300) -> pd.DataFrame:
+    """
+    weekly_trend / weekly_permit_long / weekly_permit_short ณ การปิดของแต่ละแท่ง 1W
+    แถว k = ผลแบบ get_mtf_summary เมื่อแท่งที่ปิดแล้วคือ df_1w.iloc[:k+1] (ใช้ tail(limit) เหมือน live)
+    index = เวลาปิดแท่ง; weekly_ok=False = ข้อมูลไม่ถึง 250 แท่ง (live จะ permit ทั้งสองทาง)
+    """
+    close_times = bar_close_times(df_1w)
+    if close_times is None:
+        return pd.DataFrame(columns=["weekly_ok", "weekly_trend", "weekly_permit_long", "weekly_permit_short"])
+
+    close = df_1w["close"].astype(float).reset_index(drop=True)
+    rows: List[Dict] = []
+    for k in range(len(close)):
+        window = close.iloc[max(0, k + 1 - limit) : k + 1]
+        if len(window) < 250:
+            rows.append({"weekly_ok": False, "weekly_trend": "NEUTRAL",
+                         "weekly_permit_long": True, "weekly_permit_short": True})
+            continue
+
+        weekly_trend = _window_trend(window)
+        w_momentum_bull = float(window.iloc[-1]) > float(window.iloc[-5])
+        w_momentum_bear = float(window.iloc[-1]) < float(window.iloc[-5])
+        permit_long = permit_short = True
+        if weekly_trend == "BULL":
+            permit_short = False
+            if not w_momentum_bull:
+                permit_long = False
+        elif weekly_trend == "BEAR":
+            permit_long = False
+            if not w_momentum_bear:
+                permit_short = False
+        rows.append({"weekly_ok": True, "weekly_trend": weekly_trend,
+                     "weekly_permit_long": permit_long, "weekly_permit_short": permit_short})
+
+    return pd.DataFrame(rows, index=close_times)
+
+
+def h4_confirm_series(
+    df_4h: pd.DataFrame,
+    limit: int = 800,
+    positions: Optional[Iterable[int]] = None,
+) -> pd.DataFrame:
+    """
+    h4_trend / h4_confirm_long / h4_confirm_short ณ การปิดของแท่ง 4H
+    แถว k ใช้ tail(limit) ของ df_4h.iloc[:k+1] เหมือน live (pivot ขึ้นกับต้น window จึงคิดทีละ window)
+    positions = คิดเฉพาะแท่งที่ต้องใช้ (เช่นแท่งที่ as-of join ชี้ถึง) — None = ทุกแท่ง
+    """
+    cols = ["h4_trend", "h4_confirm_long", "h4_confirm_short", "h4_note"]
+    close_times = bar_close_times(df_4h)
+    if close_times is None:
+        return pd.DataFrame(columns=cols)
+
+    frame = df_4h.reset_index(drop=True)
+    ks = range(len(frame)) if positions is None else sorted(set(int(k) for k in positions))
+    rows: List[Dict] = []
+    for k in ks:
+        window = frame.iloc[max(0, k + 1 - limit) : k + 1]
+        h4_trend = _window_trend(window["close"].astype(float)) if len(window) >= 250 else "NEUTRAL"
+        confirm_long, confirm_short, note = _h4_structure_confirm(window)
+        rows.append({"h4_trend": h4_trend, "h4_confirm_long": confirm_long,
+                     "h4_confirm_short": confirm_short, "h4_note": note})
+
+    return pd.DataFrame(rows, index=close_times[list(ks)], columns=cols)
+
+
+def _asof_positions(close_times: Optional[pd.DatetimeIndex], times: pd.DatetimeIndex) -> np.ndarray:
+    """ตำแหน่งแท่งล่าสุดที่ปิดแล้ว (close <= t) ของแต่ละเวลา — ยังไม่มี = -1"""
+    if close_times is None or len(close_times) == 0:
+        return np.full(len(times), -1)
+    return np.searchsorted(close_times.to_numpy(), times.to_numpy(), side="right") - 1
+
+
+def mtf_asof(
+    times: Iterable[Any],
+    df_1w: Optional[pd.DataFrame],
+    df_4h: Optional[pd.DataFrame],
+    symbol: str = "",
+    weekly_limit: int = 300,
+    h4_limit: int = 800,
+) -> pd.DataFrame:
+    """
+    MTF summary แบบ point-in-time ของทุกเวลาใน times (เช่นเวลาปิดแท่ง 1D)
+    - as-of join กับเวลาปิดแท่ง 1W/4H → ใช้เฉพาะแท่งที่ปิดแล้ว ณ เวลานั้น (ไม่มี lookahead)
+    - คิด weekly ครั้งเดียวทั้งประวัติ, 4H เฉพาะแท่งที่ถูกอ้างถึง
+    คืน DataFrame index = times, คอลัมน์ = field ของ MTFSummary (อ่านทีละแถวได้ O(1))
+    """
+    times = pd.DatetimeIndex(pd.to_datetime(list(times), utc=True))
+    n = len(times)
+
+    weekly = weekly_permit_series(df_1w, limit=weekly_limit) if df_1w is not None and len(df_1w) else None
+    w_pos = _asof_positions(None if weekly is None else weekly.index, times)
+
+    h4_close = bar_close_times(df_4h) if df_4h is not None and len(df_4h) else None
+    h_pos = _asof_positions(h4_close, times)
+    h4_ks = np.unique(h_pos[h_pos >= 0])
+    h4 = h4_confirm_series(df_4h, limit=h4_limit, positions=h4_ks) if h4_close is not None else None
+
+    rows: List[Dict] = []
+    for t in range(n):
+        w = weekly.iloc[w_pos[t]] if w_pos[t] >= 0 else None
+        if w is None or not bool(w["weekly_ok"]):
+            rows.append(MTFSummary(
+                symbol=symbol, weekly_trend="NEUTRAL", h4_trend="NEUTRAL",
+                weekly_permit_long=True, weekly_permit_short=True,
+                h4_confirm_long=False, h4_confirm_short=False,
+                notes="weekly len<250",
+            ).__dict__)
+            continue
+
+        if h_pos[t] >= 0:
+            h = h4.iloc[int(np.searchsorted(h4_ks, h_pos[t]))]
+            h4_trend, confirm_long, confirm_short, note = (
+                h["h4_trend"], bool(h["h4_confirm_long"]), bool(h["h4_confirm_short"]), h["h4_note"],
+            )
+        else:
+            h4_trend, confirm_long, confirm_short, note = "NEUTRAL", False, False, "4H len<250"
+
+        rows.append(MTFSummary(
+            symbol=symbol,
+            weekly_trend=w["weekly_trend"],
+            h4_trend=h4_trend,
+            weekly_permit_long=bool(w["weekly_permit_long"]),
+            weekly_permit_short=bool(w["weekly_permit_short"]),
+            h4_confirm_long=confirm_long,
+            h4_confirm_short=confirm_short,
+            notes=note,
+        ).__dict__)
+
+    return pd.DataFrame(rows, index=times)
@@ -48,22 +48,34 @@ def find_fractal_pivots(
     atr_series = _calc_atr(df, length=atr_length)
 
     # --- Step 1: หา fractal pivot เบื้องต้น (เหมือนเดิม) ---
-    raw_pivots: List[Dict] = []
+    # max/min ของหน้าต่าง [i-left, i+right] ทีละแท่งด้วย sliding window (fmax/fmin ข้าม NaN เหมือน Series.max)
+    high = df["high"].to_numpy(dtype=float)
+    low = df["low"].to_numpy(dtype=float)
+    close = df["close"].to_numpy(dtype=float)
+    atr_arr = atr_series.to_numpy(dtype=float)
+    n = len(df)
+    width = left + right + 1
+
+    centers = np.arange(left, n - right)
+    high_max = np.fmax.reduce(np.lib.stride_tricks.sliding_window_view(high, width), axis=1)
+    low_min = np.fmin.reduce(np.lib.stride_tricks.sliding_window_view(low, width), axis=1)
+    is_high = high[left : n - right] == high_max
+    is_low = low[left : n - right] == low_min
 
-    for i in range(left, len(df) - right):
-        high_slice = df["high"].iloc[i - left: i + right + 1]
-        low_slice  = df["low"].iloc[i - left: i + right + 1]
+    raw_pivots: List[Dict] = []
 
-        current_high = float(df["high"].iloc[i])
-        current_low  = float(df["low"].iloc[i])
-        atr_val      = float(atr_series.iloc[i]) if not pd.isna(atr_series.iloc[i]) else 0.0
+    for k in np.flatnonzero(is_high | is_low):
+        i = int(centers[k])
+        current_high = float(high[i])
+        current_low  = float(low[i])
+        atr_val      = float(atr_arr[i]) if not np.isnan(atr_arr[i]) else 0.0
 
-        is_pivot_high = (current_high == high_slice.max())
-        is_pivot_low  = (current_low  == low_slice.min())
+        is_pivot_high = bool(is_high[k])
+        is_pivot_low  = bool(is_low[k])
 
         # กัน H+L บนแท่งเดียวกัน
         if is_pivot_high and is_pivot_low:
-            prev_close = float(df["close"].iloc[i - 1])
+            prev_close = float(close[i - 1])
             if abs(current_high - prev_close) >= abs(current_low - prev_close):
                 is_pivot_low = False
             else:
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from app.data.binance_fetcher import to_utc
+
+logger = logging.getLogger(__name__)
+
+
+def config_hash() -> str:
+    """
+    hash ของค่าคงที่ใน wave_settings + runtime config snapshot (เช่น MAX_TP_R)
+    แก้ config / reload_config() เมื่อไร ผลที่เก็บไว้ใช้ไม่ได้ทันที
+    """
+    from app.config import wave_settings
+    from app.config.runtime_config import get_config
+
+    items = sorted((k, repr(v)) for k, v in vars(wave_settings).items() if k.isupper())
+    items.append(("runtime", get_config().content_hash()))
+    return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()[:12]
+
+
+_UNITS = {"m": "min", "h": "h", "d": "D"}
+
+
+def expected_close(now: Any, timeframe: str) -> pd.Timestamp:
+    """
+    เวลาปิดของแท่งล่าสุดที่ควรปิดแล้ว ณ now (ไม่ต้องดึงข้อมูล)
+    Binance: 1D/4H นับจาก 00:00 UTC, 1W เปิดวันจันทร์
+    """
+    now = to_utc(now)
+    tf = timeframe.lower()
+    if tf == "1w":
+        return now.normalize() - pd.Timedelta(days=now.weekday())
+    step = pd.to_timedelta(int(tf[:-1]), unit=_UNITS[tf[-1]])
+    return now.floor(step)
+
+
+class AnalysisStore:
+    """
+    ผล analyze_symbol ล่าสุดต่อ (symbol, timeframe)
+    key = (symbol, timeframe, เวลาปิดแท่งล่าสุดที่ปิดแล้ว, config hash)
+    - get: key ตรง = คืนสำเนาผลเดิม (ไม่มีแท่งใหม่ปิด/ config เดิม → input ของ analysis เหมือนเดิม)
+    - ผลที่เก็บมี MTF snapshot ตอนคำนวณ (4H confirm เป็นข้อมูลประกอบ ไม่ใช่ gate ของ allowed_to_trade)
+    - frame ที่ไม่มี timestamp (as_of=None) ไม่เก็บ
+    """
+
+    def __init__(self, clock: Optional[Callable[[], pd.Timestamp]] = None) -> None:
+        self._clock = clock or (lambda: pd.Timestamp.now(tz="UTC"))
+        self._items: Dict[Tuple[str, str], Tuple[Tuple, Optional[Dict]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+
+    def key(self, symbol: str, timeframe: str, as_of: Any = None) -> Tuple:
+        close = expected_close(self._clock(), timeframe) if as_of is None else to_utc(as_of)
+        return (symbol, timeframe, close, config_hash())
+
+    def get(self, symbol: str, timeframe: str) -> Tuple[bool, Optional[Dict]]:
+        """(hit, ผลที่เก็บไว้) — ผล None (ข้อมูลไม่พอ) ก็นับเป็น hit"""
+        key = self.key(symbol, timeframe)
+        with self._lock:
+            cached = self._items.get((symbol, timeframe))
+            if cached is not None and cached[0] == key:
+                self.stats["hits"] += 1
+                return True, copy.deepcopy(cached[1])
+            self.stats["misses"] += 1
+        return False, None
+
+    def put(self, symbol: str, timeframe: str, as_of: Any, result: Optional[Dict]) -> None:
+        if as_of is None:
+            return
+        key = self.key(symbol, timeframe, as_of=as_of)
+        with self._lock:
+            self._items[(symbol, timeframe)] = (key, copy.deepcopy(result))
+            self.stats["stored"] += 1
+
+    def invalidate(self, symbol: Optional[str] = None) -> None:
+        with self._lock:
+            if symbol is None:
+                self._items.clear()
+            else:
+                for k in [k for k in self._items if k[0] == symbol]:
+                    del self._items[k]
+
+
+_STORE = AnalysisStore()
+
+
+def analysis_store() -> AnalysisStore:
+    return _STORE
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+
+# ─────────────────────────────────────────────
+# STAGE TIMINGS: เวลา (wall) + จำนวนครั้งต่อขั้นของ analysis
+# ─────────────────────────────────────────────
+
+class StageTimings:
+    """
+    {stage: {"ms": เวลารวม, "calls": จำนวนครั้ง}} — ใช้คู่กับ collect_stage_timings() / stage()
+    รวมข้าม symbol / ข้าม process ได้ด้วย merge() (รับ dict จาก as_dict() ก็ได้)
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, ms: float, calls: int = 1) -> None:
+        row = self.stages.get(name)
+        if row is None:
+            row = self.stages[name] = {"ms": 0.0, "calls": 0}
+        row["ms"] += ms
+        row["calls"] += calls
+
+    def merge(self, other: Union["StageTimings", Dict, None]) -> "StageTimings":
+        stages = other.stages if isinstance(other, StageTimings) else (other or {})
+        for name, row in stages.items():
+            self.record(name, float(row.get("ms", 0.0)), int(row.get("calls", 0)))
+        return self
+
+    @classmethod
+    def merged(cls, items: Iterable[Union["StageTimings", Dict, None]]) -> "StageTimings":
+        out = cls()
+        for item in items:
+            out.merge(item)
+        return out
+
+    def total_ms(self) -> float:
+        return sum(row["ms"] for row in self.stages.values())
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {"ms": round(row["ms"], 3), "calls": int(row["calls"])}
+            for name, row in self.stages.items()
+        }
+
+    def summary(self) -> str:
+        """ข้อความบรรทัดเดียว เรียงจากขั้นที่ใช้เวลามากสุด"""
+        rows = sorted(self.stages.items(), key=lambda kv: -kv[1]["ms"])
+        return " ".join(f"{name}={row['ms']:.1f}ms×{int(row['calls'])}" for name, row in rows)
+
+
+_ACTIVE_TIMINGS: ContextVar[Optional[StageTimings]] = ContextVar("analysis_stage_timings", default=None)
+
+
+@contextmanager
+def collect_stage_timings(timings: Optional[StageTimings] = None) -> Iterator[StageTimings]:
+    """
+    ภายใน scope นี้ stage() จะบันทึกเวลาลง timings
+    scope ซ้อนกัน: ออกจาก scope ใน → เวลาถูกรวมเข้า scope นอกด้วย (ต่อ symbol → ต่อรอบ scheduler)
+    """
+    timings = timings if timings is not None else StageTimings()
+    outer = _ACTIVE_TIMINGS.get()
+    token = _ACTIVE_TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _ACTIVE_TIMINGS.reset(token)
+        if outer is not None and outer is not timings:
+            outer.merge(timings)
+
+
+def record_stage_timings(timings: Union[StageTimings, Dict, None]) -> None:
+    """รวมเวลาที่วัดมาจากที่อื่น (เช่น worker process) เข้า scope ปัจจุบัน"""
+    active = _ACTIVE_TIMINGS.get()
+    if active is not None and timings:
+        active.merge(timings)
+
+
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("analysis_deadline", default=None)
+
+
+@contextmanager
+def analysis_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    ภายใน scope นี้ stage() ถัดไปที่เริ่มหลังหมดเวลา → TimeoutError
+    ตรวจแค่ตอนเริ่ม stage (ระหว่างขั้น) — ไม่ตัดกลางขั้นที่กำลังแก้ cache อยู่
+    seconds None / 0 = ไม่จำกัด
+    """
+    if not seconds:
+        yield
+        return
+    token = _DEADLINE.set(perf_counter() + float(seconds))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """จับเวลา 1 ขั้น — นอก collect_stage_timings() ไม่จับเวลา; เลย analysis_deadline() → TimeoutError"""
+    deadline = _DEADLINE.get()
+    if deadline is not None and perf_counter() > deadline:
+        raise TimeoutError(f"analysis deadline เกินก่อนขั้น {name}")
+    timings = _ACTIVE_TIMINGS.get()
+    if timings is None:
+        yield
+        return
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(name, (perf_counter() - t0) * 1000.0)
@@ -1,3 +1,36 @@
+import numpy as np
+import pandas as pd
+
+
+def _mode_columns(ema50: np.ndarray, ema200: np.ndarray, atr: np.ndarray, price: np.ndarray) -> np.ndarray:
+    """TREND / SIDEWAY ต่อแท่ง (ใช้แค่ค่าของแท่งนั้น)"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # ถ้า EMA ใกล้กันมาก + ATR ต่ำ → sideway
+        ema_gap_pct = np.abs(ema50 - ema200) / price * 100
+        sideway = (ema_gap_pct < 0.5) & (atr / price < 0.02)
+    return np.where(sideway, "SIDEWAY", "TREND")
+
+
+def market_mode_series(df: pd.DataFrame) -> pd.Series:
+    """
+    detect_market_mode ของทุกแท่งในรอบเดียว — แถว i = detect_market_mode(df.iloc[:i+1])
+    (ใช้แค่แท่ง i จึงไม่ต้องตัด frame ทีละแท่ง)
+    """
+    if df is None or len(df) == 0:
+        return pd.Series([], dtype=object)
+    if "ema50" not in df.columns or "ema200" not in df.columns:
+        return pd.Series("TREND", index=df.index, dtype=object)
+
+    atr = df["atr14"].to_numpy(dtype=float) if "atr14" in df.columns else np.zeros(len(df))
+    modes = _mode_columns(
+        df["ema50"].to_numpy(dtype=float),
+        df["ema200"].to_numpy(dtype=float),
+        atr,
+        df["close"].to_numpy(dtype=float),
+    )
+    return pd.Series(modes, index=df.index, dtype=object)
+
+
 def detect_market_mode(df):
     """
     แยกตลาดเป็น TREND หรือ SIDEWAY แบบง่าย
@@ -12,10 +45,5 @@ def detect_market_mode(df):
     atr = float(df["atr14"].iloc[-1]) if "atr14" in df.columns else 0.0
     price = float(df["close"].iloc[-1])
 
-    # ถ้า EMA ใกล้กันมาก + ATR ต่ำ → sideway
-    ema_gap_pct = abs(ema50 - ema200) / price * 100
-
-    if ema_gap_pct < 0.5 and atr / price < 0.02:
-        return "SIDEWAY"
-
-    return "TREND"
\ No newline at end of file
+    mode = _mode_columns(np.array([ema50]), np.array([ema200]), np.array([atr]), np.array([price]))
+    return str(mode[0])
@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from app.analysis.wave_rules import (
+    WindowValidationMemo,
+    validate_abc,
+    validate_impulse,
+    window_memo_for,
+)
+from app.config.wave_settings import (
+    MAX_SCENARIOS,
+    WAVE_COUNT_BEAM_WIDTH,
+    WAVE_COUNT_MAX_DEPTH,
+    WAVE_COUNT_TIME_BUDGET_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────
+# ALTERNATE COUNTS: beam search ย้อนจาก pivot ล่าสุด
+#
+# count = segment ต่อกันจนถึง pivot ล่าสุด (segment ติดกันใช้ pivot ร่วม 1 จุด)
+# - root (segment ล่าสุด) บอกตำแหน่งปัจจุบัน:
+#     IMPULSE_W2   L-H-L       → IN_WAVE_2 (รอ wave 3)
+#     IMPULSE_W4   L-H-L-H-L   → IN_WAVE_4 (รอ wave 5)
+#     IMPULSE_DONE 6 pivots    → WAVE_5_END (ไม่มี entry)
+#     ABC_DONE     4 pivots    → WAVE_C_END_LONG/SHORT
+# - segment ก่อนหน้า (context) ต้องผ่านกฎ EW ถึงจะต่อได้ → เพิ่มคะแนน
+# ─────────────────────────────────────────────
+
+_FLIP = {"LONG": "SHORT", "SHORT": "LONG"}
+# ABC ที่ "แก้" impulse ทิศนั้น (impulse LONG → ABC DOWN)
+_CORRECTION = {"LONG": "DOWN", "SHORT": "UP"}
+_CORRECTED = {"DOWN": "LONG", "UP": "SHORT"}
+
+_BASE_SCORE = {"IMPULSE_W2": 82.0, "IMPULSE_W4": 82.0, "ABC_DONE": 68.0, "IMPULSE_DONE": 60.0}
+
+# (segment ก่อนหน้า, โบนัส) — โบนัสลดลงตามความลึก
+_CONTEXT_BONUS = {"IMPULSE": 8.0, "ABC": 5.0, "REVERSAL": 4.0, "COMPLEX": 2.0}
+_DEPTH_DECAY = 0.6
+
+
+@dataclass
+class WaveCount:
+    kind: str                  # root: IMPULSE_W2 / IMPULSE_W4 / IMPULSE_DONE / ABC_DONE
+    direction: str             # ทิศของ root (impulse: LONG/SHORT, ABC: UP/DOWN)
+    score: float               # คะแนน root + context
+    start_index: int           # pivot แรกของ count (ใน chain ที่ clean แล้ว)
+    end_index: int             # pivot สุดท้าย (= pivot ล่าสุด)
+    segments: List[str]        # เรียงเก่า → ใหม่ เช่น ["IMPULSE_LONG", "ABC_DOWN"]
+    warnings: List[str]
+    wave_pos: Dict             # รูปแบบเดียวกับ _determine_wave_position
+
+
+@dataclass
+class _BeamState:
+    root: WaveCount
+    start: int                 # pivot แรกของ segment เก่าสุด
+    last_kind: str             # "IMPULSE" / "ABC"
+    last_dir: str
+    score: float
+    segments: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    depth: int = 0
+    context: Dict = field(default_factory=dict)
+
+
+def clean_alternating(pivots: List[Dict]) -> List[Dict]:
+    """รวม pivot ชนิดเดียวกันที่ติดกัน (เก็บตัว extreme) ให้ H/L สลับกัน"""
+    clean: List[Dict] = []
+    for p in pivots:
+        if not clean:
+            clean.append(p)
+            continue
+        if p["type"] == clean[-1]["type"]:
+            # เอา extreme
+            if p["type"] == "H" and p["price"] > clean[-1]["price"]:
+                clean[-1] = p
+            elif p["type"] == "L" and p["price"] < clean[-1]["price"]:
+                clean[-1] = p
+        else:
+            clean.append(p)
+    return clean
+
+
+def _beyond(a: float, b: float, direction: str) -> bool:
+    """b ไปไกลกว่า a ตามทิศ (LONG = สูงกว่า)"""
+    return b > a if direction == "LONG" else b < a
+
+
+def _types_ok(window: List[Dict], direction: str) -> bool:
+    first = "L" if direction == "LONG" else "H"
+    other = "H" if first == "L" else "L"
+    return all(p["type"] == (first if k % 2 == 0 else other) for k, p in enumerate(window))
+
+
+def _fib_bonus(ratio: Optional[float]) -> float:
+    if ratio is None:
+        return 0.0
+    if abs(ratio - 0.618) <= 0.02:
+        return 6.0
+    if abs(ratio - 0.5) <= 0.02 or abs(ratio - 0.786) <= 0.02:
+        return 3.0
+    return 0.0
+
+
+def _near(ratio: float, zones: Tuple[float, ...], tolerance: float = 0.06) -> bool:
+    return any(abs(ratio - z) <= tolerance for z in zones)
+
+
+def _root_w2(chain: List[Dict], direction: str) -> Optional[WaveCount]:
+    n = len(chain)
+    w = chain[n - 3 :]
+    if not _types_ok(w, direction):
+        return None
+    p0, p1, p2 = (float(p["price"]) for p in w)
+    w1 = abs(p1 - p0)
+    if w1 == 0 or not _beyond(p0, p1, direction) or not _beyond(p0, p2, direction):
+        return None
+
+    warnings: List[str] = []
+    ratio = abs(p1 - p2) / w1
+    if not _near(ratio, (0.5, 0.618, 0.786)):
+        warnings.append(f"Wave2 retrace {ratio:.2f} นอกโซน 0.5–0.786")
+
+    side = "low" if direction == "LONG" else "high"
+    wave_pos = {
+        "position": "IN_WAVE_2",
+        "entry_type": "IMPULSE",
+        "direction": direction,
+        "fib_ratio": ratio,
+        "wave_1_start": p0,
+        "wave_1_end": p1,
+        f"wave_2_{side}": p2,
+        "note": f"Count: Wave 2 retrace {ratio:.1%} — เตรียม {direction} wave 3",
+    }
+    score = _BASE_SCORE["IMPULSE_W2"] - len(warnings) * 4 + _fib_bonus(ratio)
+    return WaveCount("IMPULSE_W2", direction, score, n - 3, n - 1, [], warnings, wave_pos)
+
+
+def _root_w4(chain: List[Dict], direction: str) -> Optional[WaveCount]:
+    n = len(chain)
+    w = chain[n - 5 :]
+    if not _types_ok(w, direction):
+        return None
+    p0, p1, p2, p3, p4 = (float(p["price"]) for p in w)
+    w1 = abs(p1 - p0)
+    w3 = abs(p3 - p2)
+    if w1 == 0 or w3 == 0:
+        return None
+    # กฎ hard: wave2 ไม่หลุดจุดเริ่ม / wave3 ทะลุ wave1 / wave4 ไม่ overlap wave1
+    if not (_beyond(p0, p2, direction) and _beyond(p1, p3, direction) and _beyond(p1, p4, direction)):
+        return None
+
+    warnings: List[str] = []
+    if w3 < w1:
+        warnings.append("Wave3 สั้นกว่า Wave1 (wave 5 ต้องสั้นกว่า wave 3)")
+    ratio = abs(p3 - p4) / w3
+    if not _near(ratio, (0.236, 0.382, 0.5)):
+        warnings.append(f"Wave4 retrace {ratio:.2f} นอกโซน 0.236–0.5")
+
+    side = "low" if direction == "LONG" else "high"
+    wave_pos = {
+        "position": "IN_WAVE_4",
+        "entry_type": "IMPULSE",
+        "direction": direction,
+        "fib_ratio": ratio,
+        "wave_1_start": p0,
+        "wave_3_end": p3,
+        "wave_4_end": p4,
+        f"wave_4_{side}": p4,
+        "note": f"Count: Wave 4 retrace {ratio:.1%} — เตรียม {direction} wave 5",
+    }
+    score = _BASE_SCORE["IMPULSE_W4"] - len(warnings) * 4
+    return WaveCount("IMPULSE_W4", direction, score, n - 5, n - 1, [], warnings, wave_pos)
+
+
+def _root_impulse_done(
+    chain: List[Dict], direction: str, memo: WindowValidationMemo
+) -> Optional[WaveCount]:
+    n = len(chain)
+    ok, warnings = memo.validate(n - 6, 6, direction, validate_impulse)
+    if not ok:
+        return None
+    w = chain[n - 6 :]
+    wave_pos = {
+        "position": "WAVE_5_END",
+        "entry_type": None,
+        "direction": direction,
+        "fib_ratio": None,
+        "wave_1_start": float(w[0]["price"]),
+        "wave_5_end": float(w[5]["price"]),
+        "note": f"Count: Impulse {direction} ครบ 5 คลื่น — รอ ABC",
+    }
+    score = _BASE_SCORE["IMPULSE_DONE"] - len(warnings) * 4
+    return WaveCount("IMPULSE_DONE", direction, score, n - 6, n - 1, [], list(warnings), wave_pos)
+
+
+def _root_abc_done(
+    chain: List[Dict], abc_dir: str, memo: WindowValidationMemo
+) -> Optional[WaveCount]:
+    n = len(chain)
+    ok, warnings = memo.validate(n - 4, 4, abc_dir, validate_abc)
+    if not ok:
+        return None
+    w = chain[n - 4 :]
+    a_len = abs(float(w[1]["price"]) - float(w[0]["price"]))
+    c_len = abs(float(w[3]["price"]) - float(w[2]["price"]))
+    c_ext = c_len / a_len if a_len > 0 else 0
+    entry_dir = _CORRECTED[abc_dir]
+    wave_pos = {
+        "position": "WAVE_C_END_LONG" if entry_dir == "LONG" else "WAVE_C_END_SHORT",
+        "entry_type": "ABC",
+        "direction": entry_dir,
+        "fib_ratio": c_ext,
+        "note": f"Count: ABC {abc_dir} จบ C={c_ext:.2f}x A",
+    }
+    score = _BASE_SCORE["ABC_DONE"] - len(warnings) * 4
+    return WaveCount("ABC_DONE", abc_dir, score, n - 4, n - 1, [], list(warnings), wave_pos)
+
+
+def _roots(chain: List[Dict], memo: WindowValidationMemo) -> List[_BeamState]:
+    n = len(chain)
+    states: List[_BeamState] = []
+    for direction in ("LONG", "SHORT"):
+        candidates = []
+        if n >= 3:
+            candidates.append(_root_w2(chain, direction))
+        if n >= 5:
+            candidates.append(_root_w4(chain, direction))
+        if n >= 6:
+            candidates.append(_root_impulse_done(chain, direction, memo))
+        if n >= 4:
+            candidates.append(_root_abc_done(chain, _CORRECTION[direction], memo))
+        for root in candidates:
+            if root is None:
+                continue
+            is_abc = root.kind == "ABC_DONE"
+            label = f"ABC_{root.direction}" if is_abc else f"{root.kind}_{root.direction}"
+            states.append(
+                _BeamState(
+                    root=root,
+                    start=root.start_index,
+                    last_kind="ABC" if is_abc else "IMPULSE",
+                    last_dir=root.direction,
+                    score=root.score,
+                    segments=[label],
+                    warnings=list(root.warnings),
+                )
+            )
+    return states
+
+
+def _expand(state: _BeamState, memo: WindowValidationMemo) -> List[_BeamState]:
+    """ต่อ segment ที่จบที่ pivot แรกของ state (เฉพาะที่ผ่านกฎ EW)"""
+    s = state.start
+    options: List[Tuple[str, str, int, str]] = []  # (kind, dir, length, bonus key)
+    if state.last_kind == "IMPULSE":
+        # impulse เริ่มหลัง correction ทิศตรงข้าม / หรือหลัง impulse ทิศตรงข้าม (กลับตัว)
+        options.append(("ABC", _CORRECTION[state.last_dir], 4, "ABC"))
+        options.append(("IMPULSE", _FLIP[state.last_dir], 6, "REVERSAL"))
+    else:
+        # ABC แก้ impulse ก่อนหน้า / หรือเป็นส่วนของ correction ซ้อน (W-X-Y)
+        options.append(("IMPULSE", _CORRECTED[state.last_dir], 6, "IMPULSE"))
+        options.append(("ABC", "UP" if state.last_dir == "DOWN" else "DOWN", 4, "COMPLEX"))
+
+    out: List[_BeamState] = []
+    for kind, direction, length, bonus_key in options:
+        i = s - (length - 1)
+        if i < 0:
+            continue
+        validator = validate_impulse if kind == "IMPULSE" else validate_abc
+        ok, warnings = memo.validate(i, length, direction, validator)
+        if not ok:
+            continue
+        depth = state.depth + 1
+        bonus = _CONTEXT_BONUS[bonus_key] * (_DEPTH_DECAY ** (depth - 1)) - len(warnings)
+        context = dict(state.context)
+        if kind == "IMPULSE" and "impulse" not in context:
+            context["impulse"] = (i, direction)
+        out.append(
+            _BeamState(
+                root=state.root,
+                start=i,
+                last_kind=kind,
+                last_dir=direction,
+                score=state.score + bonus,
+                segments=[f"{kind}_{direction}"] + state.segments,
+                warnings=state.warnings,
+                depth=depth,
+                context=context,
+            )
+        )
+    return out
+
+
+def _finish(state: _BeamState, chain: List[Dict]) -> WaveCount:
+    root = state.root
+    wave_pos = dict(root.wave_pos)
+    imp = state.context.get("impulse")
+    # ABC ที่มี impulse นำหน้าโดยตรง → ใส่จุดเริ่ม/จบ impulse แบบเดียวกับ _determine_wave_position
+    if root.kind == "ABC_DONE" and imp is not None and imp[0] + 5 == root.start_index:
+        wave_pos["wave_1_start"] = float(chain[imp[0]]["price"])
+        wave_pos["wave_5_end"] = float(chain[imp[0] + 5]["price"])
+    return WaveCount(
+        kind=root.kind,
+        direction=root.direction,
+        score=round(state.score, 2),
+        start_index=state.start,
+        end_index=root.end_index,
+        segments=state.segments,
+        warnings=state.warnings,
+        wave_pos=wave_pos,
+    )
+
+
+def find_wave_counts(
+    pivots: List[Dict],
+    top_k: int = MAX_SCENARIOS,
+    beam_width: int = WAVE_COUNT_BEAM_WIDTH,
+    max_depth: int = WAVE_COUNT_MAX_DEPTH,
+    time_budget_ms: float = WAVE_COUNT_TIME_BUDGET_MS,
+    memo: Optional[WindowValidationMemo] = None,
+) -> List[WaveCount]:
+    """
+    หา wave count ทางเลือกที่จบที่ pivot ล่าสุด (beam search ย้อนหลัง)
+    - ตัด state ที่ผิดกฎทันที, เก็บไว้ไม่เกิน beam_width ต่อระดับ
+    - หมดเวลา time_budget_ms → คืนผลที่ดีที่สุดที่มี
+    คืน top_k count เรียงตาม score (1 count ต่อ root)
+    """
+    if not pivots or top_k <= 0:
+        return []
+
+    chain = clean_alternating(pivots)
+    if len(chain) < 3:
+        return []
+    memo = window_memo_for(chain, memo)
+    deadline = perf_counter() + time_budget_ms / 1000.0
+
+    beam = sorted(_roots(chain, memo), key=lambda st: st.score, reverse=True)[:beam_width]
+    best: Dict[Tuple[str, str], _BeamState] = {}
+
+    def _keep(st: _BeamState) -> None:
+        key = (st.root.kind, st.root.direction)
+        if key not in best or st.score > best[key].score:
+            best[key] = st
+
+    for st in beam:
+        _keep(st)
+
+    depth = 0
+    while beam and depth < max_depth:
+        if perf_counter() > deadline:
+            logger.debug(f"wave counts: time budget {time_budget_ms}ms หมดที่ depth={depth}")
+            break
+        children: List[_BeamState] = []
+        for st in beam:
+            children.extend(_expand(st, memo))
+        children.sort(key=lambda st: st.score, reverse=True)
+        beam = children[:beam_width]
+        for st in beam:
+            _keep(st)
+        depth += 1
+
+    ranked = sorted(best.values(), key=lambda st: st.score, reverse=True)[:top_k]
+    return [_finish(st, chain) for st in ranked]
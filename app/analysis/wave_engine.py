@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import logging
 logger = logging.getLogger(__name__)
 
+import numpy as np
 import pandas as pd
 import os
+import multiprocessing
+import pickle
+import signal
+import threading
 import requests as req
 
-from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle
+from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle, bar_close_time
+from app.analysis.btc_cycle import PrimaryBiasProvider, pin_primary_bias, use_primary_bias
 from app.analysis.pivot import find_fractal_pivots, filter_pivots
 from app.analysis.wave_scenarios import build_scenarios
 from app.risk.risk_manager import build_trade_plan
+from app.services.log_shipper import ship_log
+from app.services.signal_dispatcher import dispatch_signal
 
 from app.indicators.ema import add_ema
 from app.indicators.rsi import add_rsi
@@ -19,13 +32,37 @@ from app.indicators.atr import add_atr
 from app.indicators.volume import add_volume_ma, volume_spike
 from app.indicators.trend_filter import trend_filter_ema
 
-from app.analysis.wave_labeler import label_pivot_chain
+from app.analysis.wave_labeler import (
+    IncrementalWaveLabeler,
+    drop_incremental_labeler,
+    incremental_labeler,
+    incremental_labeling,
+    label_pivot_chain,
+)
+from app.analysis.wave_rules import shared_window_validation
 from app.analysis.context_gate import apply_context_gate
+from app.analysis.decision_trace import record_decisions
 from app.analysis.market_regime import detect_market_regime
 from app.analysis.macro_bias import compute_macro_bias
-from app.analysis.multi_tf import get_mtf_summary
-from app.analysis.zones import build_zones_from_pivots, nearest_support_resist
-from app.analysis.trend_detector import detect_market_mode
+from app.analysis.multi_tf import get_mtf_summary, mtf_asof
+from app.analysis.result_store import analysis_store
+from app.analysis.stage_timer import (
+    StageTimings,
+    analysis_deadline,
+    collect_stage_timings,
+    record_stage_timings,
+    stage,
+)
+from app.analysis.zones import (
+    ZoneIndex,
+    build_zones_from_pivots,
+    drop_zone_cache,
+    nearest_support_resist,
+    shared_pivots,
+    zone_cache,
+)
+from app.analysis.trend_detector import detect_market_mode, market_mode_series
+from app.config.runtime_config import RuntimeConfig, get_config, install_config
 from app.config.wave_settings import (
     BARS,
     TIMEFRAME,
@@ -36,18 +73,8 @@ from app.config.wave_settings import (
 
 
 def _send_log(msg: str) -> None:
-    try:
-        vps_url = os.getenv("VPS_URL", "")
-        exec_token = os.getenv("EXEC_TOKEN", "")
-        if vps_url:
-            req.post(
-                f"{vps_url}/log",
-                json={"msg": msg},
-                headers={"X-EXEC-TOKEN": exec_token},
-                timeout=5,
-            )
-    except Exception:
-        pass
+    # เข้าคิวของ log shipper (ส่งเป็น batch เบื้องหลัง) — ไม่ block analysis
+    ship_log(msg)
 
 
 def _safe_float(x, default: float = 0.0) -> float:
@@ -157,21 +184,106 @@ def _check_trigger(
 
 
 def _try_send_vps(symbol: str, direction: str, trade_plan: Dict) -> None:
+    # เข้าคิว dispatcher (ส่ง/retry เบื้องหลัง, กันส่งซ้ำ) — ไม่รอ VPS
     try:
-        vps_url = (os.getenv("VPS_URL", "") or "").strip()
-        exec_token = (os.getenv("EXEC_TOKEN", "") or "").strip()
-        if not vps_url.startswith("http"):
+        if not get_config().vps_url.startswith("http"):
             logger.info(f"[{symbol}] SKIP execute (VPS_URL not set)")
             return
-        req.post(
-            f"{vps_url}/execute",
-            json={"symbol": symbol, "direction": direction, "trade_plan": trade_plan},
-            headers={"X-EXEC-TOKEN": exec_token},
-            timeout=10,
-        )
-        logger.info(f"[{symbol}] ส่ง signal ไป VPS สำเร็จ")
+        if not dispatch_signal(symbol, direction, trade_plan):
+            logger.info(f"[{symbol}] signal ซ้ำกับที่อยู่ในคิว/ส่งไปแล้ว → ข้าม")
     except Exception as e:
-        logger.error(f"[{symbol}] ส่ง signal ไป VPS ล้มเหลว: {e}")
+        logger.error(f"[{symbol}] เข้าคิว signal ไม่สำเร็จ: {e}")
+
+
+SIDEWAY_CONFIDENCE = 65.0
+
+
+def sideway_scenario(direction: str, range_low: float, range_high: float, atr: Optional[float], rsi14: float) -> Dict:
+    """scenario SIDEWAY_RANGE (mean revert) ของ run_sideway_engine — ใช้ร่วมกับ backtest"""
+    if direction == "LONG":
+        reasons = [f"Near range low ({range_low:,.2f})", f"RSI14 low ({rsi14:.1f})"]
+    else:
+        reasons = [f"Near range high ({range_high:,.2f})", f"RSI14 high ({rsi14:.1f})"]
+    return {"type": "SIDEWAY_RANGE", "phase": "MEAN_REVERT", "direction": direction,
+            "probability": 0.0, "confidence": SIDEWAY_CONFIDENCE, "range_low": range_low,
+            "range_high": range_high, "atr": atr, "reasons": reasons}
+
+
+def _sideway_columns(
+    price: np.ndarray,
+    rsi14: np.ndarray,
+    range_low: np.ndarray,
+    range_high: np.ndarray,
+    atr: np.ndarray,
+    permit_long: Any,
+    permit_short: Any,
+) -> Dict[str, np.ndarray]:
+    """
+    เงื่อนไขเข้าของ sideway engine ต่อแท่ง (ไม่มีกรอบ/ATR = NaN)
+    permit_long/short = bool เดียวหรือ array ต่อแท่ง
+    """
+    with np.errstate(invalid="ignore"):
+        valid = (range_low > 0) & (range_high > range_low)
+        buffer = np.where(atr > 0, atr * 0.5, price * 0.005)
+        near_support = price <= (range_low + buffer)
+        near_resist = price >= (range_high - buffer)
+        long_setup = near_support & (rsi14 <= 45) & np.asarray(permit_long, dtype=bool)
+        short_setup = near_resist & (rsi14 >= 55) & np.asarray(permit_short, dtype=bool)
+    return {
+        "buffer": buffer,
+        "near_support": near_support & valid,
+        "near_resist": near_resist & valid,
+        "long_setup": long_setup & valid,
+        "short_setup": short_setup & valid,
+    }
+
+
+def range_levels_series(df: pd.DataFrame, lookback: int = 60) -> pd.DataFrame:
+    """
+    _range_levels ของทุกแท่งในรอบเดียว — แถว i = _range_levels(df.iloc[:i+1], lookback)
+    (rolling min/max แทนการตัด frame ทีละแท่ง; None ของ _range_levels = NaN)
+    """
+    cols = ["range_low", "range_high", "atr"]
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=cols)
+    out = pd.DataFrame({
+        "range_low": df["low"].astype(float).rolling(lookback, min_periods=1).min(),
+        "range_high": df["high"].astype(float).rolling(lookback, min_periods=1).max(),
+        "atr": df["atr14"].astype(float) if "atr14" in df.columns else np.nan,
+    }, index=df.index, columns=cols)
+    # `x if x else None` ของ _range_levels → 0 = ไม่มีค่า
+    out = out.mask(out == 0)
+    out.iloc[: min(len(df), max(lookback, 20) - 1)] = np.nan
+    return out
+
+
+def sideway_setup_series(
+    df: pd.DataFrame,
+    weekly_permit_long: Any = True,
+    weekly_permit_short: Any = True,
+    lookback: int = 60,
+) -> pd.DataFrame:
+    """
+    run_sideway_engine ของทุกแท่งในรอบเดียว — แถว i = เงื่อนไขที่ engine เห็นจาก df.iloc[:i+1]
+    (ราคา = close, RSI = rsi14 ของแท่งนั้น, mode = market_mode_series)
+    permit = bool เดียวหรือ series ต่อแท่ง (เช่นจาก mtf_asof)
+    long_setup / short_setup = แท่งที่ engine จะสร้าง scenario ฝั่งนั้น (ยังไม่ดู mode)
+    """
+    cols = ["mode", "range_low", "range_high", "atr", "buffer",
+            "near_support", "near_resist", "long_setup", "short_setup"]
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=cols)
+    levels = range_levels_series(df, lookback=lookback)
+    price = df["close"].astype(float).to_numpy()
+    rsi14 = df["rsi14"].astype(float).to_numpy() if "rsi14" in df.columns else np.full(len(df), 50.0)
+    setup = _sideway_columns(
+        price, rsi14,
+        levels["range_low"].to_numpy(), levels["range_high"].to_numpy(), levels["atr"].to_numpy(),
+        np.asarray(weekly_permit_long, dtype=bool), np.asarray(weekly_permit_short, dtype=bool),
+    )
+    out = pd.concat([levels, pd.DataFrame(setup, index=df.index)], axis=1)
+    out.insert(0, "mode", market_mode_series(df))
+    return out[cols]
 
 
 def run_sideway_engine(symbol: str, df: pd.DataFrame, base: Dict) -> Dict:
@@ -180,7 +292,8 @@ def run_sideway_engine(symbol: str, df: pd.DataFrame, base: Dict) -> Dict:
     rsi14 = _safe_float(base.get("rsi14"), 50.0)
     weekly_permit_long = bool(base.get("weekly_permit_long", True))
     weekly_permit_short = bool(base.get("weekly_permit_short", True))
-    lv = _range_levels(df, lookback=60)
+    with stage("sideway_range"):
+        lv = _range_levels(df, lookback=60)
     range_low = lv.get("range_low")
     range_high = lv.get("range_high")
     atr = lv.get("atr")
@@ -189,25 +302,17 @@ def run_sideway_engine(symbol: str, df: pd.DataFrame, base: Dict) -> Dict:
         base["scenarios"] = []
         base["message"] = "SIDEWAY: ข้อมูลยังไม่พอคำนวณกรอบ"
         return base
-    buffer = float(atr) * 0.5 if atr and atr > 0 else float(price) * 0.005
-    near_support = price <= (range_low + buffer)
-    near_resist = price >= (range_high - buffer)
+    setup = _sideway_columns(
+        np.array([price]), np.array([rsi14]), np.array([range_low]), np.array([range_high]),
+        np.array([atr if atr is not None else np.nan]), weekly_permit_long, weekly_permit_short,
+    )
     scenarios: List[Dict] = []
-    if near_support and rsi14 <= 45 and weekly_permit_long:
-        sc = {"type": "SIDEWAY_RANGE", "phase": "MEAN_REVERT", "direction": "LONG",
-              "probability": 0.0, "confidence": 65.0, "range_low": range_low,
-              "range_high": range_high, "atr": atr,
-              "reasons": [f"Near range low ({range_low:,.2f})", f"RSI14 low ({rsi14:.1f})"]}
-        plan = build_trade_plan(sc, current_price=price, min_rr=2.0)
-        plan["triggered"] = True
-        sc["trade_plan"] = plan
-        scenarios.append(sc)
-    if near_resist and rsi14 >= 55 and weekly_permit_short:
-        sc = {"type": "SIDEWAY_RANGE", "phase": "MEAN_REVERT", "direction": "SHORT",
-              "probability": 0.0, "confidence": 65.0, "range_low": range_low,
-              "range_high": range_high, "atr": atr,
-              "reasons": [f"Near range high ({range_high:,.2f})", f"RSI14 high ({rsi14:.1f})"]}
-        plan = build_trade_plan(sc, current_price=price, min_rr=2.0)
+    for direction, col in (("LONG", "long_setup"), ("SHORT", "short_setup")):
+        if not setup[col][0]:
+            continue
+        sc = sideway_scenario(direction, range_low, range_high, atr, rsi14)
+        with stage("trade_plan"):
+            plan = build_trade_plan(sc, current_price=price, min_rr=2.0)
         plan["triggered"] = True
         sc["trade_plan"] = plan
         scenarios.append(sc)
@@ -219,36 +324,141 @@ def run_sideway_engine(symbol: str, df: pd.DataFrame, base: Dict) -> Dict:
     return base
 
 
-def analyze_symbol(symbol: str) -> Optional[Dict]:
-    df = fetch_ohlcv(symbol, interval=TIMEFRAME, limit=BARS)
-    df = drop_unclosed_candle(df)
-    if df is None or len(df) < 250:
-        return None
+@dataclass
+class AnalysisContext:
+    """
+    input ทั้งหมดของ analyze() — โหลด/คำนวณมาก่อน ไม่มี I/O ใน core
+    - df: 1D ที่ปิดแล้ว + indicator ครบ (prepare_frame)
+    - mtf: summary 1W/4H ที่คิดไว้แล้ว; None = คิดจาก df_1w/df_4h ณ as_of (ไม่มี frame = {})
+    - primary / df_1w: แหล่ง primary bias; ไม่ระบุทั้งคู่ = provider ของ scope ปัจจุบัน
+    - as_of: เวลาตัดสินใจ (None = เวลาปิดแท่งสุดท้ายของ df)
+    - timeframe: timeframe ของ df (primary) — แยก state ของ labeler/zone และ position ต่อ timeframe
+    - labeler / zone_index: state ข้าม call (ผลเท่าการคิดใหม่ทั้งหมด) — None = ไม่ใช้ cache ข้าม call
+      live ได้ตัวกลางต่อ symbol:timeframe จาก load_context; backtest/replay ห้ามใช้ตัวเดียวกับ live
+    """
+    symbol: str
+    df: pd.DataFrame
+    mtf: Optional[Dict] = None
+    df_4h: Optional[pd.DataFrame] = None
+    df_1w: Optional[pd.DataFrame] = None
+    primary: Optional[PrimaryBiasProvider] = None
+    as_of: Any = None
+    timeframe: str = TIMEFRAME
+    labeler: Optional[IncrementalWaveLabeler] = None
+    zone_index: Optional[ZoneIndex] = None
+
+
+@dataclass
+class AnalysisResult:
+    result: Optional[Dict]
+    effects: List[Dict] = field(default_factory=list)   # {"kind": "log"|"signal", ...} ตามลำดับที่ต้องทำ
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """indicator ชุดที่ analyze() ใช้"""
     df = add_ema(df, lengths=(50, 200))
     df = add_rsi(df, length=14)
     df = add_atr(df, length=14)
     df = add_volume_ma(df, length=20)
+    return df
+
+
+def load_context(symbol: str, timeframe: str = TIMEFRAME) -> Optional[AnalysisContext]:
+    """
+    ฝั่ง I/O ของ analyze_symbol: ดึง frame ของ timeframe หลัก + MTF summary + primary bias (ข้อมูลไม่พอ = None)
+    MTF summary (1W permit / 4H confirm) มาจาก MTFService → ทุก primary timeframe ใช้ชุดเดียวกัน
+    คำนวณใหม่เมื่อแท่ง 1W/4H ปิดเท่านั้น
+    primary bias ตรึงไว้ใน context.primary → analyze() ไม่ไปดึง 1W ผ่าน provider กลางเอง
+    """
+    with stage("fetch"):
+        df = fetch_ohlcv(symbol, interval=timeframe, limit=BARS)
+        df = drop_unclosed_candle(df)
+    if df is None or len(df) < 250:
+        return None
+    with stage("indicators"):
+        df = prepare_frame(df)
+    with stage("mtf"):
+        mtf = get_mtf_summary(symbol) or {}
+    with stage("primary"):
+        primary = _load_primary(symbol, bar_close_time(df))
+    key = f"{symbol}:{timeframe}"
+    return AnalysisContext(
+        symbol=symbol, df=df, mtf=mtf, primary=primary, timeframe=timeframe,
+        labeler=incremental_labeler(key), zone_index=zone_cache(key),
+    )
+
+
+def _load_primary(symbol: str, as_of: Any) -> PrimaryBiasProvider:
+    try:
+        return pin_primary_bias(symbol, as_of=as_of)
+    except Exception as e:
+        # เหมือน build_scenarios เดิม: คิด bias ไม่ได้ = ไม่มี primary bias
+        logger.warning(f"[{symbol}] primary bias ไม่ได้: {e}")
+        return PrimaryBiasProvider(allow_fetch=False, fixed={symbol: {}})
+
+
+def apply_side_effects(effects: List[Dict]) -> None:
+    """ทำ side effect ที่ analyze() ขอไว้ตามลำดับ"""
+    for effect in effects:
+        kind = effect.get("kind")
+        if kind == "log":
+            _send_log(effect["msg"])
+        elif kind == "signal":
+            _try_send_vps(effect["symbol"], effect["direction"], effect["trade_plan"])
+
+
+def _context_mtf(context: AnalysisContext, as_of: Any) -> Dict:
+    if context.mtf is not None:
+        return context.mtf
+    if context.df_1w is None and context.df_4h is None or as_of is None:
+        return {}
+    with stage("mtf"):
+        return mtf_asof([as_of], context.df_1w, context.df_4h, symbol=context.symbol).iloc[0].to_dict()
+
+
+def _primary_scope(context: AnalysisContext, as_of: Any):
+    provider = context.primary
+    if provider is None and context.df_1w is not None and len(context.df_1w) > 0:
+        provider = PrimaryBiasProvider(weekly={context.symbol: context.df_1w}, allow_fetch=False)
+    if provider is None:
+        return nullcontext()
+    return use_primary_bias(provider, as_of=as_of)
+
+
+def analyze(context: AnalysisContext) -> AnalysisResult:
+    """
+    core ของ analyze_symbol แบบไม่มี I/O: frame/indicator/MTF มาจาก context
+    คืนผลเหมือน analyze_symbol + side effect ที่ต้องทำ (log / ส่ง signal) แทนการยิง HTTP เอง
+    """
+    symbol = context.symbol
+    timeframe = context.timeframe
+    df = context.df
+    if df is None or len(df) < 250:
+        return AnalysisResult(None)
+    as_of = context.as_of if context.as_of is not None else bar_close_time(df)
+    effects: List[Dict] = []
     last_close = float(df["close"].iloc[-1])
     current_price = last_close
     close_today = last_close
     close_yesterday = float(df["close"].iloc[-2]) if len(df) >= 2 else None
-    macro_trend = trend_filter_ema(df)
-    rsi14 = float(df["rsi14"].iloc[-1])
-    is_vol_spike = bool(volume_spike(df, length=20, multiplier=1.5))
-    ema50 = float(df["ema50"].iloc[-1])
-    ema200 = float(df["ema200"].iloc[-1])
-    ema200_prev = float(df["ema200"].iloc[-2]) if len(df) >= 2 else ema200
-    trend_ok_long  = (ema50 > ema200) and (ema200 > ema200_prev)
-    trend_ok_short = (ema50 < ema200) and (ema200 < ema200_prev)
-    mode = detect_market_mode(df)
+    with stage("mode"):
+        macro_trend = trend_filter_ema(df)
+        rsi14 = float(df["rsi14"].iloc[-1])
+        is_vol_spike = bool(volume_spike(df, length=20, multiplier=1.5))
+        ema50 = float(df["ema50"].iloc[-1])
+        ema200 = float(df["ema200"].iloc[-1])
+        ema200_prev = float(df["ema200"].iloc[-2]) if len(df) >= 2 else ema200
+        trend_ok_long  = (ema50 > ema200) and (ema200 > ema200_prev)
+        trend_ok_short = (ema50 < ema200) and (ema200 < ema200_prev)
+        mode = detect_market_mode(df)
     size_mult = 1.0 if mode == "TREND" else 0.5
-    mtf = get_mtf_summary(symbol) or {}
+    mtf = _context_mtf(context, as_of)
     weekly_permit_long  = bool(mtf.get("weekly_permit_long", True))
     weekly_permit_short = bool(mtf.get("weekly_permit_short", True))
     h4_confirm_long     = bool(mtf.get("h4_confirm_long", False))
     h4_confirm_short    = bool(mtf.get("h4_confirm_short", False))
     base = {
-        "symbol": symbol, "price": current_price, "close_today": close_today,
+        "symbol": symbol, "timeframe": timeframe, "price": current_price, "close_today": close_today,
         "close_yesterday": close_yesterday, "macro_trend": macro_trend,
         "rsi14": rsi14, "volume_spike": is_vol_spike, "mtf": mtf,
         "mode": mode, "position_size_mult": size_mult,
@@ -256,29 +466,43 @@ def analyze_symbol(symbol: str) -> Optional[Dict]:
     if mode == "SIDEWAY":
         base["weekly_permit_long"] = weekly_permit_long
         base["weekly_permit_short"] = weekly_permit_short
-        return run_sideway_engine(symbol, df, base)
-    pivots = find_fractal_pivots(df)
-    pivots = filter_pivots(pivots, min_pct_move=1.5)
-    wave_label = label_pivot_chain(pivots)
-    zones = build_zones_from_pivots(df)
-    sr = nearest_support_resist(zones, price=current_price)
-    if len(pivots) < 4:
-        out = dict(base)
-        out.update({"scenarios": [], "message": "โครงสร้างยังไม่ชัด",
-                    "wave_label": wave_label, "sideway": None,
-                    "zones": zones if zones else [], "sr": sr if sr else {}})
-        return out
-    scenarios = (
-        build_scenarios(pivots, macro_trend=macro_trend, rsi14=rsi14,
-                        volume_spike=is_vol_spike, symbol=symbol) or []
-    )
+        return AnalysisResult(run_sideway_engine(symbol, df, base))
+    with stage("pivots"):
+        pivots = find_fractal_pivots(df)
+        pivots = filter_pivots(pivots, min_pct_move=1.5)
+    # memo ผลตรวจ window ต่อ scan — label_pivot_chain กับ build_scenarios ใช้ร่วมกัน
+    # labeler ต่อ symbol เก็บผลจาก scan ก่อน → ตรวจใหม่เฉพาะ window ที่แตะ pivot ใหม่
+    with shared_window_validation(pivots) as memo:
+        labeling = incremental_labeling(context.labeler) if context.labeler is not None else nullcontext()
+        with stage("label"), labeling:
+            wave_label = label_pivot_chain(pivots)
+        # โซน S/R ใช้ pivot ชุดเดียวกับด้านบน — ไม่หา fractal ซ้ำบน df เดิม
+        with stage("zones"):
+            with shared_pivots(df, pivots, min_pct_move=1.5, cache=context.zone_index):
+                zones = build_zones_from_pivots(df)
+            # zone_index ได้ set_zones(zones) ใน build_zones_from_pivots แล้ว → bisect ไม่ต้อง sort ใหม่
+            if context.zone_index is not None:
+                sr = context.zone_index.nearest(current_price)
+            else:
+                sr = nearest_support_resist(zones, price=current_price)
+        if len(pivots) < 4:
+            out = dict(base)
+            out.update({"scenarios": [], "message": "โครงสร้างยังไม่ชัด",
+                        "wave_label": wave_label, "sideway": None,
+                        "zones": zones if zones else [], "sr": sr if sr else {}})
+            return AnalysisResult(out)
+        with stage("scenarios"):
+            scenarios = _build_scenarios_at(context, as_of, pivots, macro_trend, rsi14, is_vol_spike)
+    logger.debug(f"[{symbol}] window validation {memo.summary()}")
     for sc in scenarios:
         if "pivots" not in sc or not sc.get("pivots"):
             sc["pivots"] = pivots
-    regime = detect_market_regime(df)
-    macro_bias = compute_macro_bias(regime, rsi14=rsi14)
-    scenarios = _gate_scenarios(scenarios, macro_bias, MIN_CONFIDENCE_LIVE)
+    with stage("gate"):
+        regime = detect_market_regime(df)
+        macro_bias = compute_macro_bias(regime, rsi14=rsi14)
+        scenarios = _gate_scenarios(scenarios, macro_bias, MIN_CONFIDENCE_LIVE)
     results: List[Dict] = []
+    signal_sent = False
     for scenario in scenarios:
         direction = (scenario.get("direction") or "").upper()
         if not direction:
@@ -292,10 +516,11 @@ def analyze_symbol(symbol: str) -> Optional[Dict]:
         if mode == "TREND" and not trend_ok:
             continue
         context_allowed = bool(scenario.get("context_allowed", True))
-        trade_plan = build_trade_plan(
-            scenario, current_price=current_price,
-            min_rr=float(MIN_RR) if MIN_RR else 3.0, sr=sr,
-        )
+        with stage("trade_plan"):
+            trade_plan = build_trade_plan(
+                scenario, current_price=current_price,
+                min_rr=float(MIN_RR) if MIN_RR else 3.0, sr=sr,
+            )
         allowed_to_trade = bool(weekly_ok and context_allowed and trade_plan.get("valid") is True)
         if not allowed_to_trade:
             trade_plan["triggered"] = False
@@ -310,11 +535,12 @@ def analyze_symbol(symbol: str) -> Optional[Dict]:
         trade_plan["context_reason"] = scenario.get("context_reason")
         trade_plan["volume_ok"] = is_vol_spike
         trade_plan["trend_ok"] = trend_ok
-        _send_log(
+        trade_plan["timeframe"] = timeframe
+        effects.append({"kind": "log", "msg": (
             f"[{symbol}] dir={direction} conf={scenario.get('confidence')} "
             f"weekly_ok={weekly_ok} mtf_ok={mtf_ok} context={context_allowed} "
             f"valid={trade_plan.get('valid')} triggered={trade_plan.get('triggered')}"
-        )
+        )})
         blocked = []
         if not weekly_ok:
             blocked.append("weekly_permit_block")
@@ -334,8 +560,10 @@ def analyze_symbol(symbol: str) -> Optional[Dict]:
             "status": status, "blocked_reasons": blocked,
             "trade_plan": trade_plan, "reasons": scenario.get("reasons", []),
         })
-        if trade_plan.get("triggered"):
-            _try_send_vps(symbol, direction, trade_plan)
+        # scenario เรียงตาม score แล้ว (รวม alternate count) → ส่ง signal แค่ตัวแรกที่ trigger
+        if trade_plan.get("triggered") and not signal_sent:
+            effects.append({"kind": "signal", "symbol": symbol, "direction": direction, "trade_plan": trade_plan})
+            signal_sent = True
     msg = None
     if scenarios and not results:
         msg = f"ไม่มี scenario ที่สร้างได้ (1D={macro_trend}, rsi14={rsi14:.1f})"
@@ -344,4 +572,243 @@ def analyze_symbol(symbol: str) -> Optional[Dict]:
         "scenarios": results, "message": msg, "wave_label": wave_label,
         "sideway": None, "zones": zones if zones else [], "sr": sr if sr else {},
     })
+    return AnalysisResult(out, effects)
+
+
+def _build_scenarios_at(
+    context: AnalysisContext,
+    as_of: Any,
+    pivots: List[Dict],
+    macro_trend: str,
+    rsi14: float,
+    is_vol_spike: bool,
+) -> List[Dict]:
+    with _primary_scope(context, as_of):
+        return build_scenarios(pivots, macro_trend=macro_trend, rsi14=rsi14,
+                               volume_spike=is_vol_spike, symbol=context.symbol) or []
+
+
+def analyze_symbol(
+    symbol: str,
+    bypass_cache: bool = False,
+    timings: bool = False,
+    timeframe: str = TIMEFRAME,
+) -> Optional[Dict]:
+    """
+    โหลดข้อมูล → analyze() → ทำ side effect (log / ส่ง signal ไป VPS)
+    ยังไม่มีแท่งใหม่ปิดและ config เดิม → คืนผลที่เก็บไว้ทันที (ไม่ส่ง side effect ซ้ำ)
+    bypass_cache=True = คำนวณใหม่เสมอ
+    timings=True = แนบเวลาต่อขั้นของรอบนี้ไว้ใน result["timings"] (จับเวลาเสมอ รวมเข้า scope ของผู้เรียก)
+    timeframe = primary timeframe (ผลที่เก็บไว้แยกต่อ timeframe — 4H ไม่ทับผล 1D)
+    """
+    with collect_stage_timings() as stages:
+        result = _analyze_symbol(symbol, bypass_cache, timeframe)
+    if timings and result is not None:
+        result = dict(result)
+        result["timings"] = stages.as_dict()
+    return result
+
+
+def _analyze_symbol(symbol: str, bypass_cache: bool, timeframe: str) -> Optional[Dict]:
+    store = analysis_store()
+    if not bypass_cache:
+        with stage("cache"):
+            hit, cached = store.get(symbol, timeframe)
+        if hit:
+            return cached
+    context = load_context(symbol, timeframe=timeframe)
+    if context is None:
+        return None
+    analysis = analyze(context)
+    as_of = bar_close_time(context.df)
+    with stage("side_effects"):
+        apply_side_effects(analysis.effects)
+        record_decisions(symbol, timeframe, as_of, analysis.result)
+    store.put(symbol, timeframe, as_of, analysis.result)
+    return analysis.result
+
+
+# ─────────────────────────────────────────────
+# BATCH: หลาย symbol พร้อมกันใน process pool
+# ─────────────────────────────────────────────
+
+@dataclass
+class SymbolAnalysis:
+    symbol: str
+    result: Optional[Dict]
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+    timings: Dict[str, Dict[str, float]] = field(default_factory=dict)   # StageTimings.as_dict()
+
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _warm_worker() -> None:
+    # import ตอนเริ่ม worker → งานแรกไม่ต้องรอ import pandas/numpy/module วิเคราะห์
+    import app.analysis.wave_engine  # noqa: F401
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            # forkserver: process หลักมี thread (position watcher / log shipper / dispatcher) อยู่แล้ว
+            # fork ตรง ๆ อาจติด lock ที่ thread อื่นถือค้างไว้ตอน fork → worker ค้าง
+            _POOL = ProcessPoolExecutor(
+                max_workers=workers, initializer=_warm_worker, mp_context=_mp_context(),
+            )
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def shutdown_pool() -> None:
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL, _POOL_WORKERS = None, 0
+
+
+_HARD_TIMEOUT_MULT = 2.0
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("analysis timeout")
+
+
+def _analyze_task(
+    symbol: str,
+    fn: Optional[Callable],
+    timeout: Optional[float],
+    timeframe: str = TIMEFRAME,
+    config: Optional[RuntimeConfig] = None,
+) -> Tuple:
+    """
+    งานของ 1 symbol (รันใน worker) → (result, effects, error, elapsed_ms, เวลาปิดแท่งล่าสุด, เวลาต่อขั้น)
+    fn=None = load_context + analyze โดยคืน side effect ให้ parent ทำตามลำดับ
+    timeout: ตรวจ deadline ตอนเริ่มแต่ละ stage (ไม่ตัดกลางขั้น) เป็นหลัก
+    SIGALRM ที่ timeout × _HARD_TIMEOUT_MULT เป็นตัวกันค้าง (เช่น fetch ไม่ตอบ) → ตัดเฉพาะ symbol นั้น
+    config: snapshot ของ parent — worker ที่ถือ snapshot เก่า (ก่อน /config/reload) เปลี่ยนมาใช้ก่อนเริ่มงาน
+    """
+    if config is not None and get_config() != config:
+        install_config(config)
+    t0 = perf_counter()
+    as_of = None
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, float(timeout) * _HARD_TIMEOUT_MULT)
+    try:
+        with collect_stage_timings() as stages, analysis_deadline(timeout):
+            if fn is None:
+                context = load_context(symbol, timeframe=timeframe)
+                analysis = analyze(context) if context is not None else AnalysisResult(None)
+                result, effects = analysis.result, analysis.effects
+                as_of = bar_close_time(context.df) if context is not None else None
+            else:
+                result, effects = fn(symbol), []
+        error = None
+    except TimeoutError:
+        result, effects, error = None, [], f"timeout>{timeout}s"
+    except Exception as e:
+        result, effects, error = None, [], f"{type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    if error is not None:
+        # SIGALRM / exception อาจตัดกลางการแก้ cache (labeler / ZoneIndex) → ทิ้งให้ scan หน้าสร้างใหม่
+        _reset_symbol_state(symbol, timeframe)
+    return result, effects, error, round((perf_counter() - t0) * 1000, 2), as_of, stages.as_dict()
+
+
+def _reset_symbol_state(symbol: str, timeframe: str) -> None:
+    key = f"{symbol}:{timeframe}"
+    drop_incremental_labeler(key)
+    drop_zone_cache(key)
+
+
+def _picklable(fn: Optional[Callable]) -> bool:
+    try:
+        pickle.dumps(fn)
+        return True
+    except Exception:
+        return False
+
+
+def analyze_symbols(
+    symbols: Iterable[str],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    fn: Optional[Callable[[str], Optional[Dict]]] = None,
+    bypass_cache: bool = False,
+    timeframe: str = TIMEFRAME,
+) -> List[SymbolAnalysis]:
+    """
+    analyze_symbol หลาย symbol ใน process pool (worker ค้างไว้ใช้ซ้ำข้ามรอบ)
+    - คืนตามลำดับที่ส่งเข้า; error/timeout ของ symbol ใด → result=None + error (ตัวอื่นไม่กระทบ)
+    - side effect (log / signal / decision trace) ทำใน process หลักตามลำดับ symbol เหมือน loop เดิม
+    - workers=None = จำนวน core; workers<=1 หรือ fn ส่งข้าม process ไม่ได้ = รันทีละตัวใน process นี้
+    - timeout ต่อ symbol: deadline ตรวจระหว่าง stage + SIGALRM กันค้าง (ดู _analyze_task)
+      SIGALRM ใช้ได้เฉพาะ main thread — เรียกจาก thread อื่น เช่น request ของ Flask = มีแค่ deadline ระหว่าง stage
+    - fn = analysis แบบอื่นต่อ symbol (ต้องเป็น function ระดับ module ถึงจะเข้า pool ได้)
+    - ทางหลัก (fn=None) ใช้ผลที่เก็บไว้ถ้ายังไม่มีแท่งใหม่ปิด — bypass_cache=True = คำนวณใหม่ทุกตัว
+    - timeframe = primary timeframe; fn แบบอื่นจะได้ timeframe=... เมื่อไม่ใช่ค่า default
+    """
+    symbols = list(symbols)
+    if fn is analyze_symbol:
+        fn = None
+    elif fn is not None and timeframe != TIMEFRAME:
+        fn = partial(fn, timeframe=timeframe)
+
+    store = analysis_store()
+    raw: Dict[int, Tuple] = {}
+    if fn is None and not bypass_cache:
+        for i, symbol in enumerate(symbols):
+            hit, cached = store.get(symbol, timeframe)
+            if hit:
+                raw[i] = (cached, [], None, 0.0, None, {})
+    pending = [i for i in range(len(symbols)) if i not in raw]
+
+    workers = int(workers or os.cpu_count() or 1)
+    workers = max(1, min(workers, len(pending)))
+    if workers <= 1 or not _picklable(fn):
+        for i in pending:
+            raw[i] = _analyze_task(symbols[i], fn, timeout, timeframe)
+    else:
+        pool = _pool(workers)
+        config = get_config()
+        futures = {i: pool.submit(_analyze_task, symbols[i], fn, timeout, timeframe, config) for i in pending}
+        for i, fut in futures.items():
+            try:
+                raw[i] = fut.result()
+                # เวลาที่วัดใน worker → รวมเข้า scope ของผู้เรียก (รันใน process นี้รวมให้เองแล้ว)
+                record_stage_timings(raw[i][5])
+            except Exception as e:
+                # worker ตาย (BrokenProcessPool) → symbol นี้ error, รอบหน้าสร้าง pool ใหม่
+                logger.error(f"[{symbols[i]}] analysis worker ล้มเหลว: {e}")
+                raw[i] = (None, [], f"{type(e).__name__}: {e}", 0.0, None, {})
+                shutdown_pool()
+
+    out: List[SymbolAnalysis] = []
+    for i, symbol in enumerate(symbols):
+        result, effects, error, elapsed_ms, as_of, timings = raw[i]
+        if error:
+            logger.error(f"[{symbol}] analyze ล้มเหลว: {error}")
+        with stage("side_effects"):
+            apply_side_effects(effects)
+        if fn is None and error is None and i in pending:
+            record_decisions(symbol, timeframe, as_of, result)
+            store.put(symbol, timeframe, as_of, result)
+        out.append(SymbolAnalysis(symbol=symbol, result=result, error=error, elapsed_ms=elapsed_ms, timings=timings))
     return out
@@ -1,9 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from app.analysis.wave_rules import validate_impulse, validate_abc
+from app.analysis.wave_rules import (
+    WindowValidationMemo,
+    current_window_memo,
+    validate_impulse,
+    validate_abc,
+    window_memo_for,
+)
 
 
 @dataclass
@@ -28,32 +37,37 @@ def _score_from_reasons(base: float, reasons: List[str]) -> float:
     return score
 
 
-def label_pivot_chain(pivots: List[Dict]) -> Dict:
+def _scan_matches(
+    chain: List[Dict],
+    memo: WindowValidationMemo,
+    offset: int = 0,
+    impulse_from: int = 0,
+    abc_from: int = 0,
+) -> Tuple[List[WaveLabel], List[WaveLabel]]:
     """
-    สแกน pivot chain ทั้งเส้น แล้วหา pattern ที่ "จบล่าสุด" (ใกล้ท้ายที่สุด)
-    คืนค่า label เดียวที่ดีที่สุด (หรือ None)
-    - IMPULSE ใช้ 6 pivots
-    - ABC ใช้ 4 pivots
+    สแกน window ของ chain (memo ต้อง bind กับ chain นี้)
+    - offset: ตำแหน่งของ chain[0] ใน pivot chain เต็ม (start_index/end_index อิง chain เต็ม)
+    - impulse_from / abc_from: ข้าม window ที่ start < ค่านี้ (index ภายใน chain)
+    คืน (impulse_matches, abc_matches) เรียงตาม start เหมือนการสแกนเต็ม
     """
-
-    if not pivots or len(pivots) < 4:
-        return {"label": None, "matches": []}
-
-    matches: List[WaveLabel] = []
+    impulse_matches: List[WaveLabel] = []
+    abc_matches: List[WaveLabel] = []
 
     # --- Scan IMPULSE windows (6 pivots) ---
-    if len(pivots) >= 6:
-        for i in range(0, len(pivots) - 6 + 1):
-            window = pivots[i : i + 6]
+    impulse_long = {i for i in memo.passing(6, "LONG") if i >= impulse_from}
+    impulse_short = {i for i in memo.passing(6, "SHORT") if i >= impulse_from}
+    for i in sorted(impulse_long | impulse_short):
+        window = chain[i : i + 6]
 
-            okL, reasonsL = validate_impulse(window, "LONG")
+        if i in impulse_long:
+            okL, reasonsL = memo.validate(i, 6, "LONG", validate_impulse)
             if okL:
-                matches.append(
+                impulse_matches.append(
                     WaveLabel(
                         pattern="IMPULSE_LONG",
                         direction="LONG",
-                        start_index=i,
-                        end_index=i + 5,
+                        start_index=offset + i,
+                        end_index=offset + i + 5,
                         pivot_count=6,
                         confidence=_score_from_reasons(85.0, reasonsL),
                         reasons=reasonsL,
@@ -61,14 +75,15 @@ def label_pivot_chain(pivots: List[Dict]) -> Dict:
                     )
                 )
 
-            okS, reasonsS = validate_impulse(window, "SHORT")
+        if i in impulse_short:
+            okS, reasonsS = memo.validate(i, 6, "SHORT", validate_impulse)
             if okS:
-                matches.append(
+                impulse_matches.append(
                     WaveLabel(
                         pattern="IMPULSE_SHORT",
                         direction="SHORT",
-                        start_index=i,
-                        end_index=i + 5,
+                        start_index=offset + i,
+                        end_index=offset + i + 5,
                         pivot_count=6,
                         confidence=_score_from_reasons(85.0, reasonsS),
                         reasons=reasonsS,
@@ -77,39 +92,47 @@ def label_pivot_chain(pivots: List[Dict]) -> Dict:
                 )
 
     # --- Scan ABC windows (4 pivots) ---
-    for i in range(0, len(pivots) - 4 + 1):
-        window = pivots[i : i + 4]
-
-        okD, reasonsD = validate_abc(window, "DOWN")
-        if okD:
-            matches.append(
-                WaveLabel(
-                    pattern="ABC_DOWN",
-                    direction="SHORT",
-                    start_index=i,
-                    end_index=i + 3,
-                    pivot_count=4,
-                    confidence=_score_from_reasons(65.0, reasonsD),
-                    reasons=reasonsD,
-                    pivots=window,
+    abc_down = {i for i in memo.passing(4, "DOWN") if i >= abc_from}
+    abc_up = {i for i in memo.passing(4, "UP") if i >= abc_from}
+    for i in sorted(abc_down | abc_up):
+        window = chain[i : i + 4]
+
+        if i in abc_down:
+            okD, reasonsD = memo.validate(i, 4, "DOWN", validate_abc)
+            if okD:
+                abc_matches.append(
+                    WaveLabel(
+                        pattern="ABC_DOWN",
+                        direction="SHORT",
+                        start_index=offset + i,
+                        end_index=offset + i + 3,
+                        pivot_count=4,
+                        confidence=_score_from_reasons(65.0, reasonsD),
+                        reasons=reasonsD,
+                        pivots=window,
+                    )
                 )
-            )
 
-        okU, reasonsU = validate_abc(window, "UP")
-        if okU:
-            matches.append(
-                WaveLabel(
-                    pattern="ABC_UP",
-                    direction="LONG",
-                    start_index=i,
-                    end_index=i + 3,
-                    pivot_count=4,
-                    confidence=_score_from_reasons(65.0, reasonsU),
-                    reasons=reasonsU,
-                    pivots=window,
+        if i in abc_up:
+            okU, reasonsU = memo.validate(i, 4, "UP", validate_abc)
+            if okU:
+                abc_matches.append(
+                    WaveLabel(
+                        pattern="ABC_UP",
+                        direction="LONG",
+                        start_index=offset + i,
+                        end_index=offset + i + 3,
+                        pivot_count=4,
+                        confidence=_score_from_reasons(65.0, reasonsU),
+                        reasons=reasonsU,
+                        pivots=window,
+                    )
                 )
-            )
 
+    return impulse_matches, abc_matches
+
+
+def _build_result(matches: List[WaveLabel]) -> Dict:
     if not matches:
         return {"label": None, "matches": []}
 
@@ -138,3 +161,188 @@ def label_pivot_chain(pivots: List[Dict]) -> Dict:
     }
 
     return {"label": label, "matches": matches}
+
+
+def label_pivot_chain(pivots: List[Dict], memo: Optional[WindowValidationMemo] = None) -> Dict:
+    """
+    สแกน pivot chain ทั้งเส้น แล้วหา pattern ที่ "จบล่าสุด" (ใกล้ท้ายที่สุด)
+    คืนค่า label เดียวที่ดีที่สุด (หรือ None)
+    - IMPULSE ใช้ 6 pivots
+    - ABC ใช้ 4 pivots
+    - memo: ผลตรวจ window ที่แชร์กับ wave_scenarios (ไม่ส่ง = ใช้ของ scan ปัจจุบัน)
+    """
+
+    if not pivots or len(pivots) < 4:
+        return {"label": None, "matches": []}
+
+    # อยู่ใน incremental_labeling scope → ตรวจเฉพาะ window ท้าย chain
+    labeler = _ACTIVE_LABELER.get()
+    if labeler is not None:
+        return labeler.update(pivots, memo)
+
+    # ตรวจทุก window ทั้งสองทิศใน pass เดียว แล้วค่อยสร้าง reasons เฉพาะ window ที่ผ่าน
+    memo = window_memo_for(pivots, memo)
+    impulse_matches, abc_matches = _scan_matches(pivots, memo)
+
+    return _build_result(impulse_matches + abc_matches)
+
+
+# ─────────────────────────────────────────────
+# INCREMENTAL: สแกนเฉพาะ window ที่แตะ pivot ใหม่
+# ─────────────────────────────────────────────
+
+def _pivot_key(p: Dict) -> Tuple:
+    # เฉพาะ field ที่ validator ใช้ — index/degree เปลี่ยนได้ (เช่น window เลื่อน) โดยไม่กระทบผล
+    return (p.get("type"), p.get("price"))
+
+
+# จำนวน pivot หัว chain ที่ยอมให้หลุดออกไประหว่าง scan (window ข้อมูลเลื่อนไปข้างหน้า)
+_MAX_HEAD_SHIFT = 8
+
+
+class IncrementalWaveLabeler:
+    """
+    label_pivot_chain แบบเก็บ state ระหว่าง scan (เช่น backtest ที่เรียกทีละแท่ง)
+
+    ทุกครั้งที่ update:
+    - จัดแนว chain ใหม่กับ chain เดิม (รองรับ pivot หัว chain หลุดเมื่อ window เลื่อน)
+    - เก็บ match ที่ window อยู่ในช่วงที่ไม่เปลี่ยนไว้ทั้งหมด
+    - ตรวจใหม่เฉพาะ window ที่แตะ pivot ที่เพิ่ม/ขยับ (ท้าย chain)
+    ผลลัพธ์เท่ากับ label_pivot_chain(pivots) ทุกครั้ง
+    """
+
+    def __init__(self) -> None:
+        self._keys: List[Tuple] = []
+        self._impulse: List[WaveLabel] = []
+        self._abc: List[WaveLabel] = []
+        self._lock = threading.Lock()
+        self.stats = {"updates": 0, "full_rescans": 0, "windows_rescanned": 0}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._keys = []
+            self._impulse = []
+            self._abc = []
+
+    def _align(self, keys: List[Tuple]) -> Tuple[int, int]:
+        """
+        คืน (shift, k): keys[j] == self._keys[j + shift] สำหรับทุก j < k
+        เลือก shift ที่ให้ช่วงตรงกันยาวสุด (k=0 = ต้องสแกนใหม่ทั้งเส้น)
+        """
+        best_shift, best_k = 0, 0
+        if not keys or not self._keys:
+            return best_shift, best_k
+        for shift in range(min(_MAX_HEAD_SHIFT, len(self._keys))):
+            if self._keys[shift] != keys[0]:
+                continue
+            old = self._keys[shift:]
+            n = min(len(keys), len(old))
+            if keys[:n] == old[:n]:
+                k = n
+            else:
+                k = 0
+                while k < n and keys[k] == old[k]:
+                    k += 1
+            if k > best_k:
+                best_shift, best_k = shift, k
+            if best_k == n:
+                break
+        return best_shift, best_k
+
+    def update(self, pivots: List[Dict], memo: Optional[WindowValidationMemo] = None) -> Dict:
+        with self._lock:
+            self.stats["updates"] += 1
+            keys = [_pivot_key(p) for p in (pivots or [])]
+
+            if not pivots or len(pivots) < 4:
+                self._keys, self._impulse, self._abc = keys, [], []
+                return {"label": None, "matches": []}
+
+            shift, k = self._align(keys)
+            if k == 0:
+                self.stats["full_rescans"] += 1
+
+            # match ที่อยู่ในช่วงที่ตรงกัน = ผลเดิม (เลื่อนตำแหน่ง + ชี้ pivots ไปที่ object ชุดใหม่)
+            kept_impulse = [
+                self._rebase(m, pivots, shift)
+                for m in self._impulse
+                if m.start_index >= shift and m.end_index - shift < k
+            ]
+            kept_abc = [
+                self._rebase(m, pivots, shift)
+                for m in self._abc
+                if m.start_index >= shift and m.end_index - shift < k
+            ]
+
+            impulse_from = max(0, k - 5)
+            abc_from = max(0, k - 3)
+
+            memo = memo if memo is not None else current_window_memo()
+            if memo is not None:
+                # อยู่ใน scan scope → ใช้ memo ของ chain เต็มร่วมกับ wave_scenarios
+                chain, offset = pivots, 0
+                chain_memo = memo.bind(pivots)
+            else:
+                offset = min(impulse_from, abc_from)
+                chain = pivots[offset:]
+                chain_memo = WindowValidationMemo(chain)
+
+            new_impulse, new_abc = _scan_matches(
+                chain,
+                chain_memo,
+                offset=offset,
+                impulse_from=impulse_from - offset,
+                abc_from=abc_from - offset,
+            )
+            self.stats["windows_rescanned"] += (
+                max(0, len(pivots) - 5 - impulse_from) + max(0, len(pivots) - 3 - abc_from)
+            )
+
+            self._keys = keys
+            self._impulse = kept_impulse + new_impulse
+            self._abc = kept_abc + new_abc
+
+            return _build_result(self._impulse + self._abc)
+
+    @staticmethod
+    def _rebase(m: WaveLabel, pivots: List[Dict], shift: int) -> WaveLabel:
+        start = m.start_index - shift
+        window = pivots[start : start + m.pivot_count]
+        if shift == 0 and all(a is b for a, b in zip(window, m.pivots)):
+            return m
+        return replace(m, start_index=start, end_index=start + m.pivot_count - 1, pivots=window)
+
+
+_ACTIVE_LABELER: ContextVar[Optional[IncrementalWaveLabeler]] = ContextVar(
+    "active_wave_labeler", default=None
+)
+_LABELERS: Dict[str, IncrementalWaveLabeler] = {}
+_LABELERS_LOCK = threading.Lock()
+
+
+def incremental_labeler(key: str) -> IncrementalWaveLabeler:
+    """labeler ต่อ key (เช่น "BTCUSDT:1d") — สร้างครั้งแรกที่ถูกขอ"""
+    with _LABELERS_LOCK:
+        labeler = _LABELERS.get(key)
+        if labeler is None:
+            labeler = _LABELERS[key] = IncrementalWaveLabeler()
+        return labeler
+
+
+def drop_incremental_labeler(key: str) -> None:
+    """ทิ้ง labeler ของ key (state อาจค้างครึ่งทาง เช่นโดน timeout กลาง update) → scan หน้าสร้างใหม่"""
+    with _LABELERS_LOCK:
+        _LABELERS.pop(key, None)
+
+
+@contextmanager
+def incremental_labeling(labeler: IncrementalWaveLabeler) -> Iterator[IncrementalWaveLabeler]:
+    """
+    ภายใน scope นี้ label_pivot_chain(pivots) จะใช้ labeler (เก็บผลจาก scan ก่อนหน้า)
+    ผลลัพธ์เท่ากับการสแกนเต็มทุกครั้ง
+    """
+    token = _ACTIVE_LABELER.set(labeler)
+    try:
+        yield labeler
+    finally:
+        _ACTIVE_LABELER.reset(token)
@@ -1,5 +1,17 @@
-from typing import Dict, List, Tuple
-from app.analysis.fib import fib_retracement, fib_extension, fib_zone_match
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.analysis.fib import (
+    FIB_ZONE_LEVELS,
+    FIB_ZONE_TOLERANCE,
+    fib_retracement,
+    fib_extension,
+    fib_zone_match,
+)
 
 
 def _is_alternating_types(points: List[Dict]) -> bool:
@@ -16,137 +28,286 @@ def _price(points: List[Dict], i: int) -> float:
     return float(points[i]["price"])
 
 
-def validate_impulse(points: List[Dict], direction: str) -> Tuple[bool, List[str]]:
-    """
-    Validate Elliott Impulse 1-5 using 6 pivots (0..5) representing:
-    LONG  : L0-H1-L2-H3-L4-H5
-    SHORT : H0-L1-H2-L3-H4-L5
+# ─────────────────────────────────────────────
+# RULE STATS: นับว่ากฎไหนถูกตรวจ/ตีตกบ่อยแค่ไหน (เปิดเฉพาะตอนต้องการ)
+# ─────────────────────────────────────────────
 
-    direction: "LONG" or "SHORT"
-    Returns (pass, reasons)
+class RuleStats:
+    """
+    สถิติต่อกฎ: evaluated / rejected / seconds
+    ใช้คู่กับ collect_rule_stats() และใช้จัดลำดับกฎสำหรับ fail_fast
     """
-    reasons: List[str] = []
-    direction = (direction or "").upper().strip()
 
+    def __init__(self) -> None:
+        self.rules: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, rejected: bool, seconds: float) -> None:
+        row = self.rules.get(name)
+        if row is None:
+            row = self.rules[name] = {"evaluated": 0, "rejected": 0, "seconds": 0.0}
+        row["evaluated"] += 1
+        if rejected:
+            row["rejected"] += 1
+        row["seconds"] += seconds
+
+    def rejection_rate(self, name: str) -> float:
+        row = self.rules.get(name)
+        if not row or not row["evaluated"]:
+            return 0.0
+        return row["rejected"] / row["evaluated"]
+
+    def _cost_per_reject(self, name: str) -> float:
+        row = self.rules.get(name)
+        if not row or not row["rejected"]:
+            return float("inf")
+        # เวลาเฉลี่ยต่อครั้ง / โอกาสตีตก → ต่ำสุดควรตรวจก่อน
+        return (row["seconds"] / row["evaluated"]) / (row["rejected"] / row["evaluated"])
+
+    def order(self, names: Sequence[str]) -> List[str]:
+        """เรียงกฎ: ถูก + ตีตกบ่อยก่อน (กฎที่ยังไม่มีข้อมูล/ไม่เคยตีตก คงลำดับเดิมไว้ท้าย)"""
+        return sorted(names, key=self._cost_per_reject)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        for name, row in self.rules.items():
+            n = row["evaluated"]
+            out[name] = {
+                "evaluated": n,
+                "rejected": row["rejected"],
+                "reject_rate": round(row["rejected"] / n, 4) if n else 0.0,
+                "avg_us": round(row["seconds"] / n * 1e6, 3) if n else 0.0,
+            }
+        return out
+
+
+_ACTIVE_RULE_STATS: ContextVar[Optional[RuleStats]] = ContextVar("wave_rule_stats", default=None)
+
+
+@contextmanager
+def collect_rule_stats(stats: Optional[RuleStats] = None) -> Iterator[RuleStats]:
+    """ภายใน scope นี้ validate_impulse / validate_abc จะบันทึกสถิติต่อกฎลง stats"""
+    stats = stats if stats is not None else RuleStats()
+    token = _ACTIVE_RULE_STATS.set(stats)
+    try:
+        yield stats
+    finally:
+        _ACTIVE_RULE_STATS.reset(token)
+
+
+# rule = (name, check) — check(points, direction) คืนข้อความเมื่อผิดกฎ / None เมื่อผ่าน
+Rule = Tuple[str, Callable[[List[Dict], str], Optional[str]]]
+
+
+def _run_rules(
+    rules: Sequence[Rule],
+    points: List[Dict],
+    direction: str,
+    fail_fast: bool,
+    stats: Optional[RuleStats],
+) -> List[str]:
+    reasons: List[str] = []
+    for name, check in rules:
+        if stats is None:
+            reason = check(points, direction)
+        else:
+            t0 = perf_counter()
+            reason = check(points, direction)
+            stats.record(name, reason is not None, perf_counter() - t0)
+        if reason is not None:
+            reasons.append(reason)
+            if fail_fast:
+                break
+    return reasons
+
+
+def _ordered_rules(rules: Sequence[Rule], order: Optional[Sequence[str]]) -> List[Rule]:
+    """จัดลำดับตาม order (ชื่อที่ไม่รู้จักข้าม / กฎที่ไม่อยู่ใน order ต่อท้ายตามลำดับเดิม)"""
+    if not order:
+        return list(rules)
+    by_name = dict(rules)
+    picked = [(n, by_name[n]) for n in dict.fromkeys(order) if n in by_name]
+    seen = {n for n, _ in picked}
+    return picked + [r for r in rules if r[0] not in seen]
+
+
+_IMPULSE_PATTERN = {"LONG": ["L", "H", "L", "H", "L", "H"], "SHORT": ["H", "L", "H", "L", "H", "L"]}
+_ABC_PATTERN = {"DOWN": ["H", "L", "H", "L"], "UP": ["L", "H", "L", "H"]}
+
+
+def _impulse_structure(points: List[Dict], direction: str) -> Optional[str]:
     if len(points) != 6:
-        return False, ["Impulse ต้องใช้ pivot 6 จุด (0..5)"]
-
+        return "Impulse ต้องใช้ pivot 6 จุด (0..5)"
     if not _is_alternating_types(points):
-        return False, ["ชนิด pivot ไม่สลับ H/L ต่อเนื่อง"]
+        return "ชนิด pivot ไม่สลับ H/L ต่อเนื่อง"
+    expected = _IMPULSE_PATTERN.get(direction)
+    if expected is None:
+        return "direction ต้องเป็น LONG หรือ SHORT"
+    if [p["type"] for p in points] != expected:
+        return f"Impulse {direction} ต้องเป็น pattern {''.join(expected)}"
+    return None
 
-    # Assign pivots
-    p0, p1, p2, p3, p4, p5 = points
 
+def _wave1_len(points: List[Dict], direction: str) -> float:
     if direction == "LONG":
-        expected = ["L", "H", "L", "H", "L", "H"]
-    elif direction == "SHORT":
-        expected = ["H", "L", "H", "L", "H", "L"]
-    else:
-        return False, ["direction ต้องเป็น LONG หรือ SHORT"]
+        return _price(points, 1) - _price(points, 0)
+    return _price(points, 0) - _price(points, 1)
 
-    if [p["type"] for p in points] != expected:
-        return False, [f"Impulse {direction} ต้องเป็น pattern {''.join(expected)}"]
 
+def _rule_wave2_start(points: List[Dict], direction: str) -> Optional[str]:
     # Rule 1: Wave 2 must not retrace beyond start of Wave 1
     # LONG: p2 must be above p0
     # SHORT: p2 must be below p0
     if direction == "LONG":
-        if _price(points, 2) <= _price(points, 0):
-            reasons.append("ผิดกฎ: Wave2 หลุดจุดเริ่ม Wave1 (invalid)")
+        broken = _price(points, 2) <= _price(points, 0)
     else:
-        if _price(points, 2) >= _price(points, 0):
-            reasons.append("ผิดกฎ: Wave2 หลุดจุดเริ่ม Wave1 (invalid)")
+        broken = _price(points, 2) >= _price(points, 0)
+    return "ผิดกฎ: Wave2 หลุดจุดเริ่ม Wave1 (invalid)" if broken else None
+
 
+def _rule_wave3_shortest(points: List[Dict], direction: str) -> Optional[str]:
     # Rule 2: Wave 3 must not be the shortest among 1,3,5
     # Measure wave lengths by absolute price move
     w1 = abs(_price(points, 1) - _price(points, 0))
     w3 = abs(_price(points, 3) - _price(points, 2))
     w5 = abs(_price(points, 5) - _price(points, 4))
+    return "ผิดกฎ: Wave3 สั้นสุด (invalid)" if w3 <= min(w1, w5) else None
 
-    if w3 <= min(w1, w5):
-        reasons.append("ผิดกฎ: Wave3 สั้นสุด (invalid)")
 
+def _rule_wave4_overlap(points: List[Dict], direction: str) -> Optional[str]:
     # Rule 3: Wave 4 must not overlap Wave 1 (classic impulse)
     # LONG: wave4 low (p4) must be above wave1 high (p1)
     # SHORT: wave4 high (p4) must be below wave1 low (p1)
     if direction == "LONG":
-        if _price(points, 4) <= _price(points, 1):
-            reasons.append("ผิดกฎ: Wave4 overlap Wave1 (invalid)")
+        broken = _price(points, 4) <= _price(points, 1)
     else:
-        if _price(points, 4) >= _price(points, 1):
-            reasons.append("ผิดกฎ: Wave4 overlap Wave1 (invalid)")
+        broken = _price(points, 4) >= _price(points, 1)
+    return "ผิดกฎ: Wave4 overlap Wave1 (invalid)" if broken else None
+
+
+def _rule_wave1_zero(points: List[Dict], direction: str) -> Optional[str]:
+    # ---- Fibonacci validation ---- (ต้องกันหารศูนย์)
+    if _wave1_len(points, direction) == 0:
+        return "Wave1 length = 0 (คำนวณ Fib ไม่ได้)"
+    return None
+
+
+def _rule_wave2_fib(points: List[Dict], direction: str) -> Optional[str]:
+    # Wave2 retracement (Wave1 = 0 ให้ _rule_wave1_zero รายงาน)
+    if _wave1_len(points, direction) == 0:
+        return None
+    wave2_retrace = fib_retracement(_price(points, 0), _price(points, 1), _price(points, 2))
+    if wave2_retrace is None or not fib_zone_match(wave2_retrace):
+        return "Wave2 retrace ไม่อยู่ในช่วง 0.382–0.786"
+    return None
 
-    # ---- Fibonacci validation ----
-    # Wave2 retracement (ต้องกันหารศูนย์)
-    if direction == "LONG":
-        wave1_len = _price(points, 1) - _price(points, 0)
-    else:
-        wave1_len = _price(points, 0) - _price(points, 1)
 
+def _rule_wave3_ext(points: List[Dict], direction: str) -> Optional[str]:
+    # Wave3 extension
+    wave1_len = _wave1_len(points, direction)
     if wave1_len == 0:
-        reasons.append("Wave1 length = 0 (คำนวณ Fib ไม่ได้)")
-    else:
-        wave2_retrace = fib_retracement(_price(points, 0), _price(points, 1), _price(points, 2))
-        if wave2_retrace is None or not fib_zone_match(wave2_retrace):
-            reasons.append("Wave2 retrace ไม่อยู่ในช่วง 0.382–0.786")
+        return None
+    w3 = abs(_price(points, 3) - _price(points, 2))
+    if w3 / abs(wave1_len) < 1.0:
+        return "Wave3 extension < 1.0 (อ่อนเกิน)"
+    return None
+
+
+# ตรวจโครงสร้าง (จำนวน/สลับ H-L/direction/pattern) ก่อนกฎราคาเสมอ
+_IMPULSE_STRUCTURE: Tuple[Rule, ...] = (("impulse_structure", _impulse_structure),)
+
+# กฎราคา — ลำดับนี้ = ลำดับ reasons ในโหมดปกติ
+IMPULSE_RULES: Tuple[Rule, ...] = (
+    ("wave2_start", _rule_wave2_start),
+    ("wave3_shortest", _rule_wave3_shortest),
+    ("wave4_overlap", _rule_wave4_overlap),
+    ("wave1_zero", _rule_wave1_zero),
+    ("wave2_fib", _rule_wave2_fib),
+    ("wave3_ext", _rule_wave3_ext),
+)
+IMPULSE_RULE_NAMES: Tuple[str, ...] = tuple(name for name, _ in IMPULSE_RULES)
+
+
+def validate_impulse(
+    points: List[Dict],
+    direction: str,
+    fail_fast: bool = False,
+    order: Optional[Sequence[str]] = None,
+) -> Tuple[bool, List[str]]:
+    """
+    Validate Elliott Impulse 1-5 using 6 pivots (0..5) representing:
+    LONG  : L0-H1-L2-H3-L4-H5
+    SHORT : H0-L1-H2-L3-H4-L5
+
+    direction: "LONG" or "SHORT"
+    fail_fast: หยุดที่กฎแรกที่ไม่ผ่าน (reasons ของ window ที่ตกจะเหลือข้อเดียว)
+    order: ลำดับชื่อกฎราคา (เช่น RuleStats.order(IMPULSE_RULE_NAMES)) ใช้คู่กับ fail_fast
+    Returns (pass, reasons)
+    """
+    direction = (direction or "").upper().strip()
 
-        # Wave3 extension
-        wave3_targets = fib_extension(_price(points, 0), _price(points, 1), _price(points, 2))
-        wave3_ext = w3 / abs(wave1_len)
-        if wave3_ext < 1.0:
-            reasons.append("Wave3 extension < 1.0 (อ่อนเกิน)")
+    stats = _ACTIVE_RULE_STATS.get()
+
+    reasons = _run_rules(_IMPULSE_STRUCTURE, points, direction, True, stats)
+    if reasons:
+        return False, reasons
+
+    rules = _ordered_rules(IMPULSE_RULES, order) if fail_fast else IMPULSE_RULES
+    reasons = _run_rules(rules, points, direction, fail_fast, stats)
 
     ok = len(reasons) == 0
     return ok, reasons
 
 
-def validate_abc(points: List[Dict], direction: str) -> Tuple[bool, List[str]]:
-    reasons: List[str] = []
-    direction = (direction or "").upper().strip()
-
+def _abc_structure(points: List[Dict], direction: str) -> Optional[str]:
     if len(points) != 4:
-        return False, ["ABC ต้องใช้ pivot 4 จุด (0..3)"]
-
+        return "ABC ต้องใช้ pivot 4 จุด (0..3)"
     if not _is_alternating_types(points):
-        return False, ["ชนิด pivot ไม่สลับ H/L ต่อเนื่อง"]
+        return "ชนิด pivot ไม่สลับ H/L ต่อเนื่อง"
+    expected = _ABC_PATTERN.get(direction)
+    if expected is None:
+        return "direction ต้องเป็น UP หรือ DOWN"
+    if [p["type"] for p in points] != expected:
+        return f"ABC {direction} ต้องเป็น pattern {''.join(expected)}"
+    return None
 
-    p0, p1, p2, p3 = points
 
+def _rule_c_beyond_a(points: List[Dict], direction: str) -> Optional[str]:
+    # ✅ HARD block: DOWN → C ต้องทำ low ต่ำกว่า A / UP → C ต้องทำ high สูงกว่า A
     if direction == "DOWN":
-        expected = ["H", "L", "H", "L"]
-        if [p["type"] for p in points] != expected:
-            return False, [f"ABC DOWN ต้องเป็น pattern {''.join(expected)}"]
-
-        # ✅ HARD block: C ต้องทำ low ต่ำกว่า A
         if _price(points, 3) >= _price(points, 1):
-            return False, ["C ไม่ทำ low ต่ำกว่า A (invalid)"]
+            return "C ไม่ทำ low ต่ำกว่า A (invalid)"
+    elif _price(points, 3) <= _price(points, 1):
+        return "C ไม่ทำ high สูงกว่า A (invalid)"
+    return None
 
-    elif direction == "UP":
-        expected = ["L", "H", "L", "H"]
-        if [p["type"] for p in points] != expected:
-            return False, [f"ABC UP ต้องเป็น pattern {''.join(expected)}"]
 
-        # ✅ HARD block: C ต้องทำ high สูงกว่า A
-        if _price(points, 3) <= _price(points, 1):
-            return False, ["C ไม่ทำ high สูงกว่า A (invalid)"]
+def _b_retrace(points: List[Dict]) -> Optional[float]:
+    a_len = abs(_price(points, 1) - _price(points, 0))
+    if a_len == 0:
+        return None
+    return abs((_price(points, 2) - _price(points, 1)) / a_len)
 
-    else:
-        return False, ["direction ต้องเป็น UP หรือ DOWN"]
 
+def _rule_b_retrace(points: List[Dict], direction: str) -> Optional[str]:
+    # ✅ HARD block: B retrace ไม่อยู่ใน zone ที่รู้จัก (A = 0 ผ่านพร้อม warning)
+    b_retrace = _b_retrace(points)
+    if b_retrace is None or 0.382 <= b_retrace <= 0.618 or b_retrace >= 0.8:
+        return None
+    return "ABC: B retrace ไม่ชัด — ไม่ใช่ Zigzag หรือ Flat"
+
+
+def _abc_warnings(points: List[Dict]) -> List[str]:
+    """warning ของ ABC ที่ผ่านกฎ hard ทั้งหมดแล้ว"""
     a_len = abs(_price(points, 1) - _price(points, 0))
     if a_len == 0:
-        reasons.append("Wave A length = 0 (คำนวณ Fib ไม่ได้)")
-        return True, reasons
+        return ["Wave A length = 0 (คำนวณ Fib ไม่ได้)"]
 
+    reasons: List[str] = []
     b_retrace = abs((_price(points, 2) - _price(points, 1)) / a_len)
-
     if 0.382 <= b_retrace <= 0.618:
         reasons.append("ABC: คล้าย Zigzag (B retrace 0.382–0.618)")
-    elif b_retrace >= 0.8:
-        reasons.append("ABC: คล้าย Flat (B retrace >= 0.8)")
     else:
-        # ✅ HARD block: B retrace ไม่อยู่ใน zone ที่รู้จัก
-        return False, ["ABC: B retrace ไม่ชัด — ไม่ใช่ Zigzag หรือ Flat"]
+        reasons.append("ABC: คล้าย Flat (B retrace >= 0.8)")
 
     c_len = abs(_price(points, 3) - _price(points, 2))
     c_ext = c_len / a_len
@@ -154,5 +315,293 @@ def validate_abc(points: List[Dict], direction: str) -> Tuple[bool, List[str]]:
         reasons.append("ABC: Wave C สั้นกว่า A (อ่อน)")
     elif c_ext >= 1.618:
         reasons.append("ABC: Wave C ยืดแรง (>=1.618)")
+    return reasons
+
+
+_ABC_STRUCTURE: Tuple[Rule, ...] = (("abc_structure", _abc_structure),)
+
+ABC_RULES: Tuple[Rule, ...] = (
+    ("c_beyond_a", _rule_c_beyond_a),
+    ("b_retrace", _rule_b_retrace),
+)
+ABC_RULE_NAMES: Tuple[str, ...] = tuple(name for name, _ in ABC_RULES)
+
+
+def validate_abc(
+    points: List[Dict],
+    direction: str,
+    fail_fast: bool = False,
+    order: Optional[Sequence[str]] = None,
+) -> Tuple[bool, List[str]]:
+    """
+    ABC ใช้ 4 pivots (DOWN: H-L-H-L / UP: L-H-L-H)
+    กฎ hard หยุดที่ข้อแรกที่ไม่ผ่านเสมอ — fail_fast + order แค่เปลี่ยนลำดับตรวจ
+    window ที่ผ่านได้ warning ชุดเดิมทุกโหมด
+    """
+    direction = (direction or "").upper().strip()
+
+    stats = _ACTIVE_RULE_STATS.get()
+
+    reasons = _run_rules(_ABC_STRUCTURE, points, direction, True, stats)
+    if reasons:
+        return False, reasons
+
+    rules = _ordered_rules(ABC_RULES, order) if fail_fast else ABC_RULES
+    reasons = _run_rules(rules, points, direction, True, stats)
+    if reasons:
+        return False, reasons
+
+    return True, _abc_warnings(points)
+
+
+# ─────────────────────────────────────────────
+# BATCH: ตรวจทุก window ของ pivot chain พร้อมกัน
+# ─────────────────────────────────────────────
+
+def _windows(arr: np.ndarray, size: int) -> List[np.ndarray]:
+    """คืน view ของตำแหน่ง 0..size-1 ในทุก sliding window (ความยาว len-size+1)"""
+    m = len(arr) - size + 1
+    return [arr[k : k + m] for k in range(size)]
+
+
+def _impulse_mask(p: np.ndarray, is_h: np.ndarray, is_l: np.ndarray, direction: str) -> np.ndarray:
+    if len(p) < 6:
+        return np.zeros(0, dtype=bool)
 
-    return True, reasons
\ No newline at end of file
+    p0, p1, p2, p3, p4, p5 = _windows(p, 6)
+    h = _windows(is_h, 6)
+    l = _windows(is_l, 6)
+
+    if direction == "LONG":
+        pattern = l[0] & h[1] & l[2] & h[3] & l[4] & h[5]
+        wave2_ok = p2 > p0
+        wave4_ok = p4 > p1
+        wave1_len = p1 - p0
+    else:
+        pattern = h[0] & l[1] & h[2] & l[3] & h[4] & l[5]
+        wave2_ok = p2 < p0
+        wave4_ok = p4 < p1
+        wave1_len = p0 - p1
+
+    w1 = np.abs(p1 - p0)
+    w3 = np.abs(p3 - p2)
+    w5 = np.abs(p5 - p4)
+    wave3_ok = w3 > np.minimum(w1, w5)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # ต้องคำนวณลำดับเดียวกับ fib_retracement(p0, p1, p2) ให้ได้ค่าเท่ากันทุก bit
+        retrace = (p1 - p2) / (p1 - p0)
+        wave3_ext = w3 / np.abs(wave1_len)
+
+    levels = np.fromiter(FIB_ZONE_LEVELS.values(), dtype=float)
+    in_zone = (np.abs(retrace[:, None] - levels[None, :]) <= FIB_ZONE_TOLERANCE).any(axis=1)
+    retrace_ok = (retrace >= 0) & (retrace <= 1.0) & in_zone
+
+    return (
+        pattern
+        & wave2_ok
+        & wave3_ok
+        & wave4_ok
+        & (wave1_len != 0)
+        & retrace_ok
+        & (wave3_ext >= 1.0)
+    )
+
+
+def _abc_mask(
+    p: np.ndarray,
+    is_h: np.ndarray,
+    is_l: np.ndarray,
+    direction: str,
+) -> Tuple[np.ndarray, np.ndarray]:
+    if len(p) < 4:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=int)
+
+    p0, p1, p2, p3 = _windows(p, 4)
+    h = _windows(is_h, 4)
+    l = _windows(is_l, 4)
+
+    if direction == "DOWN":
+        pattern = h[0] & l[1] & h[2] & l[3]
+        c_ok = p3 < p1
+    else:
+        pattern = l[0] & h[1] & l[2] & h[3]
+        c_ok = p3 > p1
+
+    a_len = np.abs(p1 - p0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b_retrace = np.abs((p2 - p1) / a_len)
+        c_ext = np.abs(p3 - p2) / a_len
+
+    zigzag = (b_retrace >= 0.382) & (b_retrace <= 0.618)
+    flat = b_retrace >= 0.8
+    no_fib = a_len == 0
+
+    ok = pattern & c_ok & (no_fib | zigzag | flat)
+
+    # จำนวน warning = len(reasons) ของ validate_abc สำหรับ window ที่ผ่าน
+    c_warn = (c_ext < 1.0) | (c_ext >= 1.618)
+    warn = np.where(no_fib, 1, 1 + c_warn.astype(int))
+    return ok, np.where(ok, warn, 0)
+
+
+def validate_windows_batch(prices: Sequence[float], types: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    ตรวจทุก sliding window ของ pivot chain ในครั้งเดียวด้วย array operation
+    ผลต้องตรงกับ validate_impulse / validate_abc ทีละ window ทุกกรณี
+
+    prices/types: ราคาและชนิด ("H"/"L") ของ pivot เรียงตาม chain
+    Returns dict (index ของ array = start index ของ window):
+      impulse_long / impulse_short : bool mask ยาว n-5
+      abc_down / abc_up            : bool mask ยาว n-3
+      *_warn                       : จำนวน reasons ของ window ที่ผ่าน (0 ถ้าไม่ผ่าน)
+
+    ไม่สร้างข้อความ reasons — ให้ผู้เรียกเรียก validator ตัวเดิมเฉพาะ window ที่เลือกแล้ว
+    """
+    p = np.asarray([float(x) for x in prices], dtype=float)
+    t = np.asarray(list(types), dtype=object)
+    is_h = t == "H"
+    is_l = t == "L"
+
+    impulse_long = _impulse_mask(p, is_h, is_l, "LONG")
+    impulse_short = _impulse_mask(p, is_h, is_l, "SHORT")
+    abc_down, abc_down_warn = _abc_mask(p, is_h, is_l, "DOWN")
+    abc_up, abc_up_warn = _abc_mask(p, is_h, is_l, "UP")
+
+    return {
+        "impulse_long": impulse_long,
+        "impulse_short": impulse_short,
+        "impulse_long_warn": np.zeros(len(impulse_long), dtype=int),
+        "impulse_short_warn": np.zeros(len(impulse_short), dtype=int),
+        "abc_down": abc_down,
+        "abc_up": abc_up,
+        "abc_down_warn": abc_down_warn,
+        "abc_up_warn": abc_up_warn,
+    }
+
+
+# ─────────────────────────────────────────────
+# MEMO: แชร์ผลตรวจ window ภายใน 1 รอบสแกน
+# ─────────────────────────────────────────────
+
+_MASK_KEYS = {
+    (6, "LONG"): "impulse_long",
+    (6, "SHORT"): "impulse_short",
+    (4, "DOWN"): "abc_down",
+    (4, "UP"): "abc_up",
+}
+
+Validator = Callable[[List[Dict], str], Tuple[bool, List[str]]]
+
+
+class WindowValidationMemo:
+    """
+    memo ผลตรวจ window ของ pivot chain เดียว key = (start, length, direction)
+    ใช้ร่วมกันระหว่าง label_pivot_chain / _determine_wave_position /
+    _find_impulse_sequence / _find_abc_sequence ใน scan เดียวกัน
+
+    - window ที่ batch mask ตัดทิ้ง → คืน (False, []) โดยไม่เรียก validator
+      (ผู้เรียกทุกตัวใช้ reasons เฉพาะ window ที่ผ่าน)
+    - window ที่ผ่าน mask → เรียก validator ครั้งเดียว แล้วเก็บผลไว้
+    """
+
+    def __init__(self, pivots: List[Dict], stats: Optional[Dict[str, int]] = None):
+        self.pivots = pivots
+        self._results: Dict[Tuple[int, int, str], Tuple[bool, List[str]]] = {}
+        self._batch: Optional[Dict[str, np.ndarray]] = None
+        # stats แชร์ข้าม chain ที่ bind ต่อกันมา เพื่อให้นับรวมทั้ง scan
+        self.stats = stats if stats is not None else {
+            "validated": 0,
+            "cache_hits": 0,
+            "mask_skipped": 0,
+        }
+
+    def bind(self, pivots: List[Dict]) -> "WindowValidationMemo":
+        """คืน memo ของ chain นี้ — ถ้าเป็น chain เดิม (pivot object ชุดเดียวกัน) ใช้ตัวเดิม"""
+        if pivots is self.pivots:
+            return self
+        if len(pivots) == len(self.pivots) and all(a is b for a, b in zip(pivots, self.pivots)):
+            return self
+        return WindowValidationMemo(pivots, stats=self.stats)
+
+    def masks(self) -> Dict[str, np.ndarray]:
+        if self._batch is None:
+            self._batch = validate_windows_batch(
+                [p["price"] for p in self.pivots],
+                [p["type"] for p in self.pivots],
+            )
+        return self._batch
+
+    def passing(self, length: int, direction: str) -> List[int]:
+        """start index ของ window ที่ผ่าน mask (นับ window ที่เหลือเป็น mask_skipped)"""
+        mask = self.masks()[_MASK_KEYS[(length, direction)]]
+        idx = np.flatnonzero(mask).tolist()
+        self.stats["mask_skipped"] += len(mask) - len(idx)
+        return idx
+
+    def lookup(self, start: int, length: int, direction: str) -> Optional[Tuple[bool, List[str]]]:
+        result = self._results.get((start, length, direction))
+        if result is not None:
+            self.stats["cache_hits"] += 1
+        return result
+
+    def store(self, start: int, length: int, direction: str, result: Tuple[bool, List[str]]) -> None:
+        self.stats["validated"] += 1
+        self._results[(start, length, direction)] = result
+
+    def validate(
+        self,
+        start: int,
+        length: int,
+        direction: str,
+        validator: Optional[Validator] = None,
+    ) -> Tuple[bool, List[str]]:
+        cached = self.lookup(start, length, direction)
+        if cached is not None:
+            return cached
+
+        mask = self.masks()[_MASK_KEYS[(length, direction)]]
+        if 0 <= start < len(mask) and not mask[start]:
+            self.stats["mask_skipped"] += 1
+            return False, []
+
+        if validator is None:
+            validator = validate_impulse if length == 6 else validate_abc
+        result = validator(self.pivots[start : start + length], direction)
+        self.store(start, length, direction, result)
+        return result
+
+    def summary(self) -> Dict[str, int]:
+        out = dict(self.stats)
+        out["avoided"] = out["cache_hits"] + out["mask_skipped"]
+        return out
+
+
+_ACTIVE_MEMO: ContextVar[Optional[WindowValidationMemo]] = ContextVar("wave_window_memo", default=None)
+
+
+@contextmanager
+def shared_window_validation(pivots: List[Dict]) -> Iterator[WindowValidationMemo]:
+    """
+    เปิด scope ของ 1 รอบสแกน: ทุกการตรวจ window ภายใน scope ใช้ memo ตัวเดียวกัน
+    """
+    memo = WindowValidationMemo(pivots)
+    token = _ACTIVE_MEMO.set(memo)
+    try:
+        yield memo
+    finally:
+        _ACTIVE_MEMO.reset(token)
+
+
+def current_window_memo() -> Optional[WindowValidationMemo]:
+    """memo ของ scan scope ปัจจุบัน (None ถ้าไม่ได้อยู่ใน shared_window_validation)"""
+    return _ACTIVE_MEMO.get()
+
+
+def window_memo_for(pivots: List[Dict], memo: Optional[WindowValidationMemo] = None) -> WindowValidationMemo:
+    """memo ที่ส่งมาตรง ๆ > memo ของ scope ปัจจุบัน > memo ใหม่เฉพาะ call นี้"""
+    if memo is None:
+        memo = _ACTIVE_MEMO.get()
+    if memo is None:
+        return WindowValidationMemo(pivots)
+    return memo.bind(pivots)
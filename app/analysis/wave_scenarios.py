@@ -5,7 +5,14 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from app.analysis.wave_rules import validate_impulse, validate_abc
+from app.analysis.wave_counts import clean_alternating, find_wave_counts
+from app.analysis.wave_rules import (
+    WindowValidationMemo,
+    validate_impulse,
+    validate_abc,
+    window_memo_for,
+)
+from app.config.wave_settings import MAX_SCENARIOS, WAVE_COUNT_ALTERNATES
 
 # ─────────────────────────────────────────────
 # HELPERS
@@ -93,12 +100,14 @@ def _find_major_structure(pivots: List[Dict]) -> Dict:
 def _find_impulse_sequence(
     pivots: List[Dict],
     direction: str,
+    memo: Optional[WindowValidationMemo] = None,
 ) -> Optional[Dict]:
     """
     หา 5-wave impulse sequence ที่ valid ที่สุด
     สแกนจาก pivot ล่าสุดย้อนกลับไป
     """
     direction = direction.upper()
+    memo = window_memo_for(pivots, memo)
 
     best_result = None
 
@@ -108,7 +117,7 @@ def _find_impulse_sequence(
         if len(window) < 6:
             continue
 
-        ok, warnings = validate_impulse(window, direction)
+        ok, warnings = memo.validate(i, 6, direction, validate_impulse)
         if ok:
             best_result = {
                 "pivots": window,
@@ -124,19 +133,21 @@ def _find_impulse_sequence(
 def _find_abc_sequence(
     pivots: List[Dict],
     direction: str,
+    memo: Optional[WindowValidationMemo] = None,
 ) -> Optional[Dict]:
     """
     หา ABC correction sequence ที่ valid ที่สุด
     direction: "UP" = bullish ABC (long setup), "DOWN" = bearish ABC (short setup)
     """
     direction = direction.upper()
+    memo = window_memo_for(pivots, memo)
 
     for i in range(len(pivots) - 4, max(-1, len(pivots) - 20), -1):
         window = pivots[i: i + 4]
         if len(window) < 4:
             continue
 
-        ok, warnings = validate_abc(window, direction)
+        ok, warnings = memo.validate(i, 4, direction, validate_abc)
         if ok:
             return {
                 "pivots": window,
@@ -151,6 +162,7 @@ def _determine_wave_position(
     pivots: List[Dict],
     structure: Dict,
     primary_context: Optional[Dict] = None,
+    memo: Optional[WindowValidationMemo] = None,
 ) -> Dict:
     if not pivots or len(pivots) < 6:
         return {"position": "UNKNOWN", "entry_type": None}
@@ -162,20 +174,9 @@ def _determine_wave_position(
     last_pivot = pivots[-1]
 
     # ── clean pivots ให้ H/L สลับกันก่อน ──
-    clean: List[Dict] = []
-    for p in pivots:
-        if not clean:
-            clean.append(p)
-            continue
-        if p["type"] == clean[-1]["type"]:
-            # เอา extreme
-            if p["type"] == "H" and p["price"] > clean[-1]["price"]:
-                clean[-1] = p
-            elif p["type"] == "L" and p["price"] < clean[-1]["price"]:
-                clean[-1] = p
-        else:
-            clean.append(p)
-    pivots = clean
+    pivots = clean_alternating(pivots)
+    # clean ที่ไม่มี pivot ถูกรวม = chain เดิม → ใช้ memo เดียวกับ wave_labeler ได้
+    memo = window_memo_for(pivots, memo)
 
     # ─────────────────────────────────────────────
     # STEP 1: หา impulse sequence จริงๆ ด้วย validate_impulse
@@ -189,7 +190,7 @@ def _determine_wave_position(
         window = pivots[i: i + 6]
         if len(window) < 6:
             continue
-        ok, warnings = validate_impulse(window, direction_to_scan)
+        ok, warnings = memo.validate(i, 6, direction_to_scan, validate_impulse)
         if ok:
             found_impulse = {
                 "pivots": window,
@@ -216,7 +217,7 @@ def _determine_wave_position(
         # pivot ล่าสุดอยู่หลัง impulse จบ = คาด ABC correction
         if last_pivot_idx > last_imp_idx:
             abc_dir = "DOWN" if direction_to_scan == "LONG" else "UP"
-            abc = _find_abc_sequence(pivots, abc_dir)
+            abc = _find_abc_sequence(pivots, abc_dir, memo=memo)
             if abc:
                 abc_pivots = abc["pivots"]
                 a_len = abs(abc_pivots[1]["price"] - abc_pivots[0]["price"])
@@ -465,49 +466,26 @@ def normalize_scores(scenarios: List[Dict]) -> List[Dict]:
 # MAIN: build_scenarios
 # ─────────────────────────────────────────────
 
-def build_scenarios(
+def _scenario_from_position(
     pivots: List[Dict],
-    macro_trend: str = "NEUTRAL",
-    rsi14: float = 50.0,
-    volume_spike: bool = False,
-    symbol: str = "BTCUSDT",
-) -> List[Dict]:
-    scenarios: List[Dict] = []
-
-    if not pivots or len(pivots) < 4:
-        return []
-
-    # ── Step 1: Primary Wave bias จาก btc_cycle ──
-    primary: Dict = {}
-    try:
-        from app.analysis.btc_cycle import get_primary_bias
-        primary = get_primary_bias(symbol)
-    except Exception:
-        pass
-
-    primary_bias        = primary.get("bias", "NEUTRAL")
-    primary_note        = primary.get("note", "")
-    primary_fib_targets = primary.get("fib_targets", {})
-    primary_wave        = primary.get("wave", "?")
-    primary_degree      = primary.get("degree", "?")
-
-    # ── Step 2: Major structure จาก 1D ──
-    structure   = _find_major_structure(pivots)
-    major_trend = structure.get("major_trend", "UNKNOWN")
-
-    if major_trend == "UNKNOWN":
-        return []
-
-    # ── Step 3: Wave position จาก 1D ──
-    wave_pos   = _determine_wave_position(pivots, structure, primary_context=primary)
+    wave_pos: Dict,
+    major_trend: str,
+    primary: Dict,
+    macro_trend: str,
+    rsi14: float,
+    volume_spike: bool,
+) -> Dict:
     position   = wave_pos.get("position", "UNKNOWN")
     entry_type = wave_pos.get("entry_type")
     direction  = wave_pos.get("direction")
     fib_ratio  = wave_pos.get("fib_ratio")
     note       = wave_pos.get("note", "")
 
-    if position == "UNKNOWN" or not entry_type or not direction:
-        return []
+    primary_bias        = primary.get("bias", "NEUTRAL")
+    primary_note        = primary.get("note", "")
+    primary_fib_targets = primary.get("fib_targets", {})
+    primary_wave        = primary.get("wave", "?")
+    primary_degree      = primary.get("degree", "?")
 
     # ── Step 4: Filter ด้วย Primary Wave bias ──
     warnings = []
@@ -589,7 +567,7 @@ def build_scenarios(
             or (lows_all[-1]["price"] if lows_all else None)  # fallback: last L pivot
         )
 
-    scenario = {
+    return {
         "type":          sc_type,
         "phase":         phase,
         "direction":     direction,
@@ -607,11 +585,74 @@ def build_scenarios(
         "is_fallback":   False,
     }
 
-    if score >= 50:
-        scenarios.append(scenario)
+
+def build_scenarios(
+    pivots: List[Dict],
+    macro_trend: str = "NEUTRAL",
+    rsi14: float = 50.0,
+    volume_spike: bool = False,
+    symbol: str = "BTCUSDT",
+    memo: Optional[WindowValidationMemo] = None,
+    alternate_counts: Optional[bool] = None,
+) -> List[Dict]:
+    """
+    scenario หลักจาก _determine_wave_position + count ทางเลือกจาก find_wave_counts
+    alternate_counts: None = ตาม WAVE_COUNT_ALTERNATES (ค่า default ปิด), False = เฉพาะ scenario หลักแบบเดิม
+    คืนไม่เกิน MAX_SCENARIOS
+    """
+    scenarios: List[Dict] = []
+    if alternate_counts is None:
+        alternate_counts = WAVE_COUNT_ALTERNATES
+
+    if not pivots or len(pivots) < 4:
+        return []
+
+    # ── Step 1: Primary Wave bias จาก btc_cycle (cache ต่อแท่ง 1W ที่ปิด / point-in-time ใน backtest) ──
+    primary: Dict = {}
+    try:
+        from app.analysis.btc_cycle import get_cached_primary_bias
+        primary = get_cached_primary_bias(symbol)
+    except Exception:
+        pass
+
+    # ── Step 2: Major structure จาก 1D ──
+    structure   = _find_major_structure(pivots)
+    major_trend = structure.get("major_trend", "UNKNOWN")
+
+    if major_trend == "UNKNOWN":
+        return []
+
+    # ── Step 3: Wave position จาก 1D ──
+    positions: List[Dict] = []
+    wave_pos = _determine_wave_position(pivots, structure, primary_context=primary, memo=memo)
+    if wave_pos.get("position", "UNKNOWN") != "UNKNOWN" and wave_pos.get("entry_type") and wave_pos.get("direction"):
+        positions.append(wave_pos)
+
+    # ── Step 3b: count ทางเลือก (ตำแหน่ง/ทิศที่ต่างจาก scenario หลัก) ──
+    if alternate_counts:
+        seen = {(wp["position"], wp["direction"]) for wp in positions}
+        for count in find_wave_counts(pivots, top_k=MAX_SCENARIOS, memo=memo):
+            wp = count.wave_pos
+            key = (wp.get("position"), wp.get("direction"))
+            if not wp.get("entry_type") or key in seen:
+                continue
+            seen.add(key)
+            positions.append(dict(wp, count=count.kind, count_segments=count.segments))
+
+    for wp in positions:
+        scenario = _scenario_from_position(
+            pivots, wp, major_trend, primary, macro_trend, rsi14, volume_spike,
+        )
+        if wp.get("count"):
+            scenario["is_alternate"] = True
+            scenario["count"] = wp.get("count")
+            scenario["count_segments"] = wp.get("count_segments")
+            scenario["reasons"].append(f"Alternate count: {' → '.join(wp.get('count_segments') or [])}")
+        if scenario["score"] >= 50:
+            scenarios.append(scenario)
 
     if not scenarios:
         return []
 
     scenarios.sort(key=lambda x: x["score"], reverse=True)
-    return normalize_scores(scenarios[:3])
\ No newline at end of file
+    return normalize_scores(scenarios[:MAX_SCENARIOS])
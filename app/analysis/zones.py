@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 from app.analysis.pivot import find_fractal_pivots, filter_pivots
@@ -50,15 +56,263 @@ def _merge_clusters(levels: List[float], tol_pct: float) -> List[List[float]]:
     return clusters
 
 
+class _AnchorClusters:
+    """
+    anchor clustering แบบเดียวกับ _merge_clusters แต่เพิ่ม/ลบราคาทีละตัวได้
+    values เรียงไว้, starts = index ของ anchor แต่ละ cluster
+    เพิ่ม/ลบแล้ว fold ใหม่ตั้งแต่ cluster ที่กระทบ จนเจอ anchor ที่ตรงกับของเดิม (ที่เหลือเหมือนเดิม)
+    """
+
+    def __init__(self, tol_pct: float, levels: Optional[List[float]] = None) -> None:
+        self.tol_pct = tol_pct
+        self.values: List[float] = sorted(float(x) for x in (levels or []))
+        self.starts: List[int] = []
+        self._refold([], [])
+
+    def insert(self, v: float) -> None:
+        v = float(v)
+        p = bisect_right(self.values, v)
+        self.values.insert(p, v)
+        k = bisect_left(self.starts, p)
+        self._refold(self.starts[:k], [s + 1 for s in self.starts[k:]])
+
+    def remove(self, v: float) -> bool:
+        v = float(v)
+        p = bisect_left(self.values, v)
+        if p == len(self.values) or self.values[p] != v:
+            return False
+        del self.values[p]
+        k = bisect_left(self.starts, p)
+        self._refold(self.starts[:k], [s - 1 for s in self.starts[k:] if s != p])
+        return True
+
+    def clusters(self) -> List[List[float]]:
+        ends = self.starts[1:] + [len(self.values)]
+        return [self.values[s:e] for s, e in zip(self.starts, ends)]
+
+    def _refold(self, head: List[int], tail: List[int]) -> None:
+        values = self.values
+        n = len(values)
+        if n == 0:
+            self.starts = []
+            return
+        starts = list(head) if head else [0]
+        anchor = values[starts[-1]]
+        i = starts[-1] + 1
+        j = 0
+        while i < n:
+            v = values[i]
+            tol = abs(anchor) * (self.tol_pct / 100.0)
+            if abs(v - anchor) <= tol:
+                i += 1
+                continue
+            while j < len(tail) and tail[j] < i:
+                j += 1
+            if j < len(tail) and tail[j] == i:
+                starts.extend(tail[j:])
+                break
+            starts.append(i)
+            anchor = v
+            i += 1
+        self.starts = starts
+
+
+class ZoneIndex:
+    """
+    โซน S/R ต่อ symbol
+    - cluster ราคา pivot ต่อฝั่ง (H/L) แบบ incremental — ผลเท่ากับ _merge_clusters
+      ราคาชุดเดิม = ใช้ cluster เดิม, pivot ใหม่/หาย = แทรก/ลบเฉพาะตัวที่เปลี่ยน
+    - level ของโซนเรียงไว้ → nearest support/resist ด้วย bisect แทนการ filter + sort ทุกครั้ง
+    """
+
+    def __init__(self, tol_pct: float = 0.35, zones: Optional[List[Dict]] = None) -> None:
+        self.tol_pct = tol_pct
+        self._sides: Dict[str, _AnchorClusters] = {}
+        self._counts: Dict[str, Counter] = {}
+        self._levels: List[float] = []
+        self._orders: List[int] = []
+        self._zones: List[Dict] = []
+        self.stats = {"reused": 0, "updated": 0, "clustered": 0}
+        if zones:
+            self.set_zones(zones)
+
+    @classmethod
+    def from_zones(cls, zones: Optional[List[Dict]]) -> "ZoneIndex":
+        index = cls()
+        index.set_zones(zones or [])
+        return index
+
+    # ── clustering ──
+
+    def insert(self, price: float, ptype: str) -> None:
+        """เพิ่มราคา pivot หนึ่งจุด (ptype "H"/"L") เข้า cluster ของฝั่งนั้น"""
+        side = self._side(ptype, self.tol_pct)
+        side.insert(price)
+        self._counts[ptype][float(price)] += 1
+
+    def clusters(self, ptype: str, levels: List[float], tol_pct: float) -> List[List[float]]:
+        """cluster ของราคาชุด levels — ต่างจากรอบก่อนไม่มาก = แทรก/ลบเฉพาะส่วนต่าง"""
+        target = Counter(float(x) for x in levels)
+        side = self._sides.get(ptype)
+        if side is not None and side.tol_pct == tol_pct:
+            current = self._counts[ptype]
+            added = target - current
+            removed = current - target
+            if not added and not removed:
+                self.stats["reused"] += 1
+                return side.clusters()
+            changed = sum(added.values()) + sum(removed.values())
+            if changed <= len(levels) // 2:
+                for v, cnt in removed.items():
+                    for _ in range(cnt):
+                        side.remove(v)
+                for v, cnt in added.items():
+                    for _ in range(cnt):
+                        side.insert(v)
+                self._counts[ptype] = target
+                self.stats["updated"] += 1
+                return side.clusters()
+
+        self.stats["clustered"] += 1
+        self._sides[ptype] = _AnchorClusters(tol_pct, list(target.elements()))
+        self._counts[ptype] = target
+        return self._sides[ptype].clusters()
+
+    def _side(self, ptype: str, tol_pct: float) -> _AnchorClusters:
+        side = self._sides.get(ptype)
+        if side is None:
+            side = self._sides[ptype] = _AnchorClusters(tol_pct)
+            self._counts[ptype] = Counter()
+        return side
+
+    # ── query ──
+
+    def set_zones(self, zones: List[Dict]) -> None:
+        entries = []
+        for order, z in enumerate(zones):
+            lvl = float(z.get("level", 0) or 0)
+            if lvl == lvl:  # NaN ไม่เข้า index (เทียบอะไรก็ False เหมือนเดิม)
+                entries.append((lvl, order, z))
+        entries.sort(key=lambda e: (e[0], e[1]))
+        self._levels = [e[0] for e in entries]
+        self._orders = [e[1] for e in entries]
+        self._zones = [e[2] for e in entries]
+
+    def nearest(self, price: float) -> Dict:
+        """เหมือน nearest_support_resist — level == price ไม่นับทั้งสองฝั่ง"""
+        price = float(price)
+        i = bisect_left(self._levels, price)
+        j = bisect_right(self._levels, price)
+        sup = self._pick(range(i - 1, -1, -1), price)
+        res = self._pick(range(j, len(self._levels)), price)
+
+        sup = dict(self._zones[sup]) if sup is not None else None
+        res = dict(self._zones[res]) if res is not None else None
+        if sup:
+            sup["side"] = "SUPPORT"
+        if res:
+            res["side"] = "RESIST"
+        return {"support": sup, "resist": res}
+
+    def nearest_levels(self, prices) -> Tuple[np.ndarray, np.ndarray]:
+        """level ของ support/resist ใกล้สุดสำหรับราคาหลายจุด (ไม่มี = NaN)"""
+        prices = np.asarray(prices, dtype=float)
+        levels = np.asarray(self._levels, dtype=float)
+        sup = np.full(prices.shape, np.nan)
+        res = np.full(prices.shape, np.nan)
+        if len(levels):
+            i = np.searchsorted(levels, prices, side="left") - 1
+            j = np.searchsorted(levels, prices, side="right")
+            ok = (i >= 0) & ~np.isnan(prices)
+            sup[ok] = levels[i[ok]]
+            ok = (j < len(levels)) & ~np.isnan(prices)
+            res[ok] = levels[j[ok]]
+        return sup, res
+
+    def _pick(self, candidates: range, price: float) -> Optional[int]:
+        # ระยะเท่ากันอยู่ติดกัน → เลือกตัวที่มาก่อนใน list เดิม (เหมือน stable sort)
+        best: Optional[int] = None
+        best_dist = 0.0
+        for k in candidates:
+            dist = abs(self._levels[k] - price)
+            if best is None:
+                best, best_dist = k, dist
+                continue
+            if dist != best_dist:
+                break
+            if self._orders[k] < self._orders[best]:
+                best = k
+        return best
+
+
+_ZONE_CACHES: Dict[str, ZoneIndex] = {}
+_ZONE_CACHES_LOCK = threading.Lock()
+
+
+def zone_cache(key: str) -> ZoneIndex:
+    """ZoneIndex ต่อ key (เช่น "BTCUSDT:1d") — อยู่ข้าม scan ใน process เดียวกัน"""
+    with _ZONE_CACHES_LOCK:
+        cache = _ZONE_CACHES.get(key)
+        if cache is None:
+            cache = _ZONE_CACHES[key] = ZoneIndex()
+        return cache
+
+
+def drop_zone_cache(key: str) -> None:
+    """ทิ้ง ZoneIndex ของ key (cluster กับ count อาจไม่ตรงกันถ้าโดนตัดกลางทาง) → scan หน้าคิดใหม่"""
+    with _ZONE_CACHES_LOCK:
+        _ZONE_CACHES.pop(key, None)
+
+
+_ACTIVE_PIVOTS: ContextVar[Optional[Tuple[pd.DataFrame, List[Dict], float, Optional[ZoneIndex]]]] = (
+    ContextVar("zone_pivots", default=None)
+)
+
+
+@contextmanager
+def shared_pivots(
+    df: pd.DataFrame,
+    pivots: List[Dict],
+    min_pct_move: float = 1.5,
+    cache: Optional[ZoneIndex] = None,
+) -> Iterator[None]:
+    """
+    ภายใน scope นี้ build_zones_from_pivots(df) ใช้ pivots ที่หามาแล้ว
+    (find_fractal_pivots + filter_pivots(min_pct_move) บน df ตัวเดียวกัน) แทนการหาใหม่
+    df คนละตัวหรือ min_pct_move ไม่ตรง → หา pivot เองเหมือนเดิม
+    """
+    token = _ACTIVE_PIVOTS.set((df, pivots, min_pct_move, cache))
+    try:
+        yield
+    finally:
+        _ACTIVE_PIVOTS.reset(token)
+
+
+def _zone_pivots(
+    df: pd.DataFrame, min_pct_move: float, pivots: Optional[List[Dict]]
+) -> Tuple[List[Dict], Optional[ZoneIndex]]:
+    active = _ACTIVE_PIVOTS.get()
+    cache = None
+    if active is not None and active[0] is df:
+        cache = active[3]
+        if pivots is None and active[2] == min_pct_move:
+            pivots = active[1]
+    if pivots is None:
+        pivots = find_fractal_pivots(df, left=2, right=2)
+        pivots = filter_pivots(pivots, min_pct_move=min_pct_move)
+    return pivots, cache
+
+
 def build_zones_from_pivots(
     df: pd.DataFrame,
     min_pct_move: float = 1.5,
     tol_pct: float = 0.35,
     min_touches: int = 2,
     max_zones: int = 8,
+    pivots: Optional[List[Dict]] = None,
 ) -> List[Dict]:
     """
-    - หา pivots จาก fractal
+    - หา pivots จาก fractal (ส่ง pivots ที่ filter แล้วมา หรืออยู่ใน shared_pivots = ข้ามขั้นนี้)
     - เอา pivot prices มาคลัสเตอร์เป็นโซน
     - โซนที่ touches สูงจะสำคัญกว่า
     """
@@ -67,14 +321,17 @@ def build_zones_from_pivots(
 
     close = _safe_float(df["close"].iloc[-1], 0.0)
 
-    pivots = find_fractal_pivots(df, left=2, right=2)
-    pivots = filter_pivots(pivots, min_pct_move=min_pct_move)
+    pivots, cache = _zone_pivots(df, min_pct_move, pivots)
 
     highs = [float(p["price"]) for p in pivots if p.get("type") == "H"]
     lows = [float(p["price"]) for p in pivots if p.get("type") == "L"]
 
-    high_clusters = _merge_clusters(highs, tol_pct=tol_pct)
-    low_clusters = _merge_clusters(lows, tol_pct=tol_pct)
+    if cache is not None:
+        high_clusters = cache.clusters("H", highs, tol_pct)
+        low_clusters = cache.clusters("L", lows, tol_pct)
+    else:
+        high_clusters = _merge_clusters(highs, tol_pct=tol_pct)
+        low_clusters = _merge_clusters(lows, tol_pct=tol_pct)
 
     zones: List[Zone] = []
 
@@ -119,7 +376,10 @@ def build_zones_from_pivots(
     zones.sort(key=_score, reverse=True)
     zones = zones[:max_zones]
 
-    return [z.__dict__ for z in zones]
+    result = [z.__dict__ for z in zones]
+    if cache is not None:
+        cache.set_zones(result)
+    return result
 
 
 def nearest_support_resist(zones: list, price: float) -> dict:
@@ -127,32 +387,4 @@ def nearest_support_resist(zones: list, price: float) -> dict:
     คืน SR ใกล้สุดใต้/เหนือราคา
     ไม่เชื่อ side เดิม — คำนวณใหม่จากตำแหน่งราคา
     """
-    price = float(price)
-
-    below = []
-    above = []
-
-    for z in (zones or []):
-        lvl = float(z.get("level", 0) or 0)
-        # FIX: strict comparison เพื่อไม่ให้ level เดียวกับ price
-        # ปรากฏในทั้ง support และ resist พร้อมกัน
-        if lvl < price:
-            below.append(z)
-        elif lvl > price:
-            above.append(z)
-
-    below.sort(key=lambda z: abs(float(z.get("level", 0) or 0) - price))
-    above.sort(key=lambda z: abs(float(z.get("level", 0) or 0) - price))
-
-    sup = dict(below[0]) if below else None
-    res = dict(above[0]) if above else None
-
-    if sup:
-        sup["side"] = "SUPPORT"
-    if res:
-        res["side"] = "RESIST"
-
-    return {
-        "support": sup,
-        "resist": res,
-    }
\ No newline at end of file
+    return ZoneIndex.from_zones(zones).nearest(price)
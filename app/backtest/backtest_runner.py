@@ -1,25 +1,28 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from collections import Counter
 
 import pandas as pd
 
-from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle
+from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle, bar_close_time, bar_close_times
+from app.analysis.btc_cycle import PrimaryBiasProvider, fetch_weekly, use_primary_bias
 from app.analysis.pivot import find_fractal_pivots, filter_pivots
 from app.analysis.wave_scenarios import build_scenarios
-from app.risk.risk_manager import build_trade_plan
+from app.risk.risk_manager import build_trade_plan, trade_plan_columns, trade_plan_reason
 from app.indicators.ema import add_ema
 from app.indicators.rsi import add_rsi
 from app.indicators.atr import add_atr
 from app.indicators.volume import add_volume_ma, volume_spike
 from app.indicators.trend_filter import trend_filter_ema, allow_direction
 from app.analysis.context_gate import apply_context_gate
-from app.analysis.market_regime import detect_market_regime
-from app.analysis.macro_bias import compute_macro_bias
+from app.analysis.market_regime import detect_market_regime, market_regime_series
+from app.analysis.macro_bias import compute_macro_bias, macro_bias_series
 from app.config.wave_settings import MIN_CONFIDENCE_BACKTEST, ABC_CONFIRM_BUFFER, MIN_CONFIDENCE_LIVE
-from app.analysis.multi_tf import get_mtf_summary
+from app.analysis.multi_tf import mtf_asof
+from app.analysis.wave_engine import SIDEWAY_CONFIDENCE, sideway_setup_series
+from app.risk.portfolio_risk import PortfolioRisk
 
 logger = logging.getLogger(__name__)
 
@@ -114,23 +117,69 @@ def _simulate_one_trade(
 
     return {"result": "OPEN", "exit": None, "bars": len(df) - start_i}
 
-def _get_scenarios(sub: pd.DataFrame, macro_trend: str, rsi14: float, is_vol_spike: bool) -> List[Dict]:
+def _load_weekly(symbol: str) -> Optional[pd.DataFrame]:
+    """ดึง 1W ครั้งเดียวต่อ backtest (ใช้ทั้ง primary bias และ weekly permit — ไม่เรียก network ใน loop)"""
+    try:
+        df_1w = fetch_weekly(symbol)
+    except Exception as e:
+        logger.warning(f"[{symbol}] โหลด 1W ไม่ได้ -> primary bias NEUTRAL / weekly permit ทั้งสองทาง ({e})")
+        return None
+    return df_1w if df_1w is not None and len(df_1w) > 0 else None
+
+
+def _primary_provider(symbol: str, df_1w: Optional[pd.DataFrame]) -> PrimaryBiasProvider:
+    """bias แบบ point-in-time ต่อแท่งจาก 1W ที่โหลดไว้แล้ว"""
+    weekly = {symbol: df_1w} if df_1w is not None else {}
+    return PrimaryBiasProvider(weekly=weekly, allow_fetch=False)
+
+
+def _weekly_permit_table(df: pd.DataFrame, df_1w: Optional[pd.DataFrame], symbol: str) -> List[Dict]:
+    """
+    MTF summary ของทุกแท่ง ณ เวลาปิดแท่ง (mtf_asof — ใช้เฉพาะแท่ง 1W ที่ปิดแล้ว ไม่มี lookahead)
+    แถว i = แท่ง i; ไม่ส่ง 4H เพราะ _mirror_live_filters อ่านแค่ weekly_permit_*
+    """
+    close_times = bar_close_times(df)
+    if close_times is None:
+        return [{} for _ in range(len(df))]
+    return mtf_asof(close_times, df_1w, None, symbol=symbol).to_dict("records")
+
+
+def _macro_bias_table(df: pd.DataFrame) -> List[Dict]:
+    """macro bias ของทุกแท่งในรอบเดียว — แถว i = compute_macro_bias(detect_market_regime(df[:i+1]))"""
+    regimes = market_regime_series(df)
+    rsi = df["rsi14"] if "rsi14" in df.columns else pd.Series(50.0, index=df.index)
+    return macro_bias_series(regimes, rsi).to_dict("records")
+
+
+def _get_scenarios(
+    sub: pd.DataFrame,
+    macro_trend: str,
+    rsi14: float,
+    is_vol_spike: bool,
+    symbol: str = "BTCUSDT",
+    primary: Optional[PrimaryBiasProvider] = None,
+    macro_bias: Optional[Dict] = None,
+) -> List[Dict]:
     pivots = find_fractal_pivots(sub)
     pivots = filter_pivots(pivots, min_pct_move=1.5)
     if len(pivots) < 4:
         return []
 
-    scenarios = build_scenarios(
-        pivots,
-        macro_trend=macro_trend,
-        rsi14=rsi14,
-        volume_spike=is_vol_spike,
-    )
+    primary = primary if primary is not None else PrimaryBiasProvider(allow_fetch=False)
+    with use_primary_bias(primary, as_of=bar_close_time(sub)):
+        scenarios = build_scenarios(
+            pivots,
+            macro_trend=macro_trend,
+            rsi14=rsi14,
+            volume_spike=is_vol_spike,
+            symbol=symbol,
+        )
     if not scenarios:
         return []
 
-    regime = detect_market_regime(sub)
-    macro_bias = compute_macro_bias(regime, rsi14=rsi14)
+    if macro_bias is None:
+        regime = detect_market_regime(sub)
+        macro_bias = compute_macro_bias(regime, rsi14=rsi14)
 
     gated: List[Dict] = []
     for sc in scenarios:
@@ -170,13 +219,14 @@ def _safe_entry_time(t: Dict):
         return pd.Timestamp.min.tz_localize("UTC")
     return v
 
-def _mirror_live_filters(sub: pd.DataFrame, symbol: str, direction: str) -> bool:
+def _mirror_live_filters(sub: pd.DataFrame, mtf: Dict, direction: str) -> bool:
     """
     คืน True = ผ่าน filter, False = ควร skip
     รวม weekly_permit + trend_ok ไว้ที่เดียว ใช้ใน backtest_symbol และ backtest_symbol_trades
+    mtf = แถวของ _weekly_permit_table ณ แท่งนี้ (ไม่มี = permit ทั้งสองทาง)
     """
     # weekly_permit (HARD block เหมือน live)
-    mtf = get_mtf_summary(symbol) or {}
+    mtf = mtf or {}
     weekly_permit_long = bool(mtf.get("weekly_permit_long", True))
     weekly_permit_short = bool(mtf.get("weekly_permit_short", True))
 
@@ -232,6 +282,10 @@ def backtest_symbol(
     trades: List[Dict] = []
     in_position = False
     skip_until_bar = 0
+    df_1w = _load_weekly(symbol)
+    primary = _primary_provider(symbol, df_1w)
+    macro_table = _macro_bias_table(df)
+    mtf_table = _weekly_permit_table(df, df_1w, symbol)
 
     if not min_rr or float(min_rr) <= 0:
         try:
@@ -252,7 +306,9 @@ def backtest_symbol(
 
         atr = float(sub["atr14"].iloc[-1])
 
-        scenarios = _get_scenarios(sub, macro_trend, rsi14, is_vol_spike)
+        scenarios = _get_scenarios(
+            sub, macro_trend, rsi14, is_vol_spike, symbol, primary, macro_bias=macro_table[i]
+        )
         if not scenarios:
             continue
 
@@ -260,7 +316,7 @@ def backtest_symbol(
         direction = sc["direction"]
 
         # --- Mirror live filters ---
-        if not _mirror_live_filters(sub, symbol, direction):
+        if not _mirror_live_filters(sub, mtf_table[i], direction):
             continue
 
         trade_plan = build_trade_plan(sc, current_price=last_close, min_rr=min_rr)
@@ -367,6 +423,10 @@ def backtest_symbol_trades(
     trades: List[Dict] = []
     in_position = False
     skip_until_bar = 0
+    df_1w = _load_weekly(symbol)
+    primary = _primary_provider(symbol, df_1w)
+    macro_table = _macro_bias_table(df)
+    mtf_table = _weekly_permit_table(df, df_1w, symbol)
 
     if not min_rr or float(min_rr) <= 0:
         try:
@@ -387,7 +447,9 @@ def backtest_symbol_trades(
 
         atr = float(sub["atr14"].iloc[-1])
        
-        scenarios = _get_scenarios(sub, macro_trend, rsi14, is_vol_spike)
+        scenarios = _get_scenarios(
+            sub, macro_trend, rsi14, is_vol_spike, symbol, primary, macro_bias=macro_table[i]
+        )
         if not scenarios:
             continue
 
@@ -395,7 +457,7 @@ def backtest_symbol_trades(
         direction = sc["direction"]
 
         # --- Mirror live filters ---
-        if not _mirror_live_filters(sub, symbol, direction):
+        if not _mirror_live_filters(sub, mtf_table[i], direction):
             continue
 
         conf = float(sc.get("confidence") or sc.get("score") or 0)
@@ -515,10 +577,144 @@ def backtest_symbol_trades(
     return {"symbol": symbol, "trades": trades, "data": df}
 
 
+# ---------------------------------------------------------------------------
+# backtest_sideway_trades
+# ---------------------------------------------------------------------------
+
+def backtest_sideway_trades(
+    symbol: str,
+    df: Optional[pd.DataFrame] = None,
+    interval: str = "1d",
+    limit: int = 1000,
+    min_rr: float = 2.0,
+    weekly_permit_long=True,
+    weekly_permit_short=True,
+) -> Dict:
+    """
+    range-trading branch (run_sideway_engine) ทั้งช่วง — mode / กรอบ / เงื่อนไขเข้า / trade plan
+    คิดครั้งเดียวทุกแท่ง (sideway_setup_series + trade_plan_columns) ไม่ตัด frame ทีละแท่ง
+    เข้าที่ close ของแท่งสัญญาณ (plan ของ sideway engine triggered ทันที) ทีละ position
+    permit = bool เดียวหรือ series ต่อแท่ง
+    """
+    if df is None:
+        df = _prepare_df(symbol, interval, limit)
+    if df is None or len(df) <= _START_BAR:
+        return {"symbol": symbol, "trades": []}
+
+    setups = sideway_setup_series(df, weekly_permit_long, weekly_permit_short)
+    sideway = setups["mode"].to_numpy() == "SIDEWAY"
+    close = df["close"].astype(float).to_numpy()
+    n = len(df)
+    plans = {}
+    for direction, col in (("LONG", "long_setup"), ("SHORT", "short_setup")):
+        plan = trade_plan_columns(
+            ["SIDEWAY_RANGE"] * n,
+            [direction] * n,
+            close,
+            min_rr=min_rr,
+            range_low=setups["range_low"].fillna(0.0).to_numpy(),
+            range_high=setups["range_high"].fillna(0.0).to_numpy(),
+            atr=setups["atr"].fillna(0.0).to_numpy(),
+        )
+        plan["enter"] = setups[col].to_numpy() & sideway & plan["valid"]
+        plans[direction] = plan
+
+    trades: List[Dict] = []
+    skip_until_bar = 0
+    for i in range(_START_BAR, n - 1):
+        if i < skip_until_bar:
+            continue
+        direction = next((d for d in ("LONG", "SHORT") if plans[d]["enter"][i]), None)
+        if direction is None:
+            continue
+        plan = plans[direction]
+        trade_plan = {"direction": direction}
+        trade_plan.update({k: float(plan[k][i]) for k in ("entry", "sl", "tp1", "tp2", "tp3")})
+        trade_plan["valid"] = True
+        trade_plan["reason"] = trade_plan_reason(plan["code"][i], "SIDEWAY_RANGE", plan["rr"][i], plan["sl_pct"][i], min_rr)
+
+        entry = trade_plan["entry"]
+        sim = _simulate_one_trade(
+            df=df,
+            start_i=i + 1,
+            direction=direction,
+            entry=entry,
+            sl=trade_plan["sl"],
+            tp1=trade_plan["tp1"],
+            tp2=trade_plan["tp2"],
+            tp3=trade_plan["tp3"],
+        )
+        trades.append({
+            "trade_plan": trade_plan,
+            "symbol": symbol,
+            "entry_index": i,
+            "direction": direction,
+            "confidence": SIDEWAY_CONFIDENCE,
+            "entry": entry,
+            "sl": trade_plan["sl"],
+            "tp3": trade_plan["tp3"],
+            "result": sim["result"],
+            "bars_held": sim["bars"],
+            "r_multiple": _r_multiple(direction, entry, trade_plan["sl"], trade_plan["tp3"], sim["result"]),
+        })
+        skip_until_bar = (i + 1) + int(sim["bars"]) + 1
+
+    return {"symbol": symbol, "trades": trades}
+
+
 # ---------------------------------------------------------------------------
 # portfolio_simulator
 # ---------------------------------------------------------------------------
 
+def _filter_by_portfolio_risk(
+    trades: List[Dict],
+    closes: Dict[str, pd.Series],
+    max_vol_pct: float,
+    risk_pct: float,
+) -> Tuple[List[Dict], int]:
+    """
+    เดินตามเวลาเข้า: ป้อนราคาปิดถึงแท่งที่เข้า → ปิด position ที่ออกไปแล้ว → เช็ค marginal risk (O(k))
+    weight ของแต่ละไม้ = notional ที่เสี่ยง risk_pct ของ equity ตามระยะ SL
+    trade ที่ไม่มี entry_time ผ่านโดยไม่เช็ค
+    """
+    risk = PortfolioRisk(symbols=list(closes), max_vol_pct=max_vol_pct)
+    table = pd.DataFrame(closes).sort_index()
+    bar_times = list(table.index)
+    rows = [r.dropna().to_dict() for _, r in table.iterrows()]
+    fed = 0
+    open_: List[Tuple] = []  # (exit_time, symbol, weight)
+    kept: List[Dict] = []
+    skipped = 0
+
+    for t in trades:
+        entry_time = t.get("entry_time")
+        if entry_time is None or pd.isna(entry_time):
+            kept.append(t)
+            continue
+        while fed < len(bar_times) and bar_times[fed] <= entry_time:
+            risk.returns.update(rows[fed], bar_time=bar_times[fed])
+            fed += 1
+        still_open = []
+        for exit_time, sym, w in open_:
+            if exit_time is not None and exit_time <= entry_time:
+                risk.remove_position(sym, w)
+            else:
+                still_open.append((exit_time, sym, w))
+        open_ = still_open
+
+        entry, sl = float(t["entry"]), float(t["sl"])
+        sl_frac = abs(entry - sl) / entry if entry > 0 else 0.0
+        notional = risk_pct / sl_frac if sl_frac > 0 else 0.0
+        if not risk.check(t["symbol"], t["direction"], notional, 1.0)["allowed"]:
+            skipped += 1
+            continue
+        weight = -notional if t["direction"] == "SHORT" else notional
+        risk.add_position(t["symbol"], weight)
+        open_.append((t.get("exit_time"), t["symbol"], weight))
+        kept.append(t)
+    return kept, skipped
+
+
 def portfolio_simulator(
     symbols: List[str],
     interval: str = "1d",
@@ -527,8 +723,15 @@ def portfolio_simulator(
     min_rr: float = 2.0,
     min_confidence: float = 60.0,
     return_trades_detail: bool = False,
+    max_portfolio_vol_pct: Optional[float] = None,
+    risk_pct: float = 0.02,
 ) -> Dict:
+    """
+    max_portfolio_vol_pct = เปิดใช้ portfolio risk: ข้ามไม้ที่ทำให้ vol รายแท่งของพอร์ต
+    (ตาม covariance ของ return ข้าม symbols) เกิน % ของ equity เหมือน live executor
+    """
     all_trades: List[Dict] = []
+    closes: Dict[str, pd.Series] = {}
 
     try:
         import sqlite3
@@ -550,8 +753,14 @@ def portfolio_simulator(
             min_confidence=min_confidence,
         )
         all_trades.extend(res["trades"])
+        data = res.get("data")
+        if data is not None and len(data):
+            closes[s] = data.set_index("open_time")["close"].astype(float)
 
     all_trades.sort(key=_safe_entry_time)
+    skipped_by_risk = 0
+    if max_portfolio_vol_pct is not None and closes:
+        all_trades, skipped_by_risk = _filter_by_portfolio_risk(all_trades, closes, max_portfolio_vol_pct, risk_pct)
 
     closed = [t for t in all_trades if t["result"] in ("WIN", "LOSS", "BE")]
     wins = sum(1 for t in closed if t["result"] == "WIN")
@@ -582,6 +791,7 @@ def portfolio_simulator(
         "be": bes,
         "equity_R": round(equity, 2),
         "max_drawdown_R": round(max_dd, 2),
+        "skipped_by_portfolio_risk": skipped_by_risk,
         "trades_detail": closed if return_trades_detail else None,
     }
 
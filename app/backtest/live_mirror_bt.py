@@ -8,8 +8,13 @@ from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 
+from app.analysis.btc_cycle import PrimaryBiasProvider
+from app.analysis.multi_tf import mtf_asof
+from app.analysis.wave_engine import AnalysisContext, analyze, prepare_frame
+from app.analysis.wave_labeler import IncrementalWaveLabeler
+from app.analysis.zones import ZoneIndex
 from app.config.wave_settings import BARS, TIMEFRAME
-from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle
+from app.data.binance_fetcher import bar_close_time, bar_close_times, fetch_ohlcv, drop_unclosed_candle
 from app.indicators.atr import add_atr
 from app.indicators.ema import add_ema
 
@@ -172,43 +177,32 @@ def _load_df_from_api(symbol: str, interval: str, limit: int) -> Optional[pd.Dat
     df = fetch_ohlcv(symbol, interval=interval, limit=limit)
     return drop_unclosed_candle(df)
 
-def _patch_live_for_offline(
+def _offline_context(
+    symbol: str,
     sub_df: pd.DataFrame,
     df_4h: Optional[pd.DataFrame],
     df_1w: Optional[pd.DataFrame],
-) -> None:
+    primary: PrimaryBiasProvider,
+    mtf: Optional[Dict] = None,
+    labeler: Optional[IncrementalWaveLabeler] = None,
+    zone_index: Optional[ZoneIndex] = None,
+) -> AnalysisContext:
     """
-    Patch ทุก namespace ที่เรียก fetch_ohlcv ให้ใช้ข้อมูล historical ณ bar i
-
-    slice MTF ด้วย timestamp ป้องกัน lookahead bias
+    context ของแท่ง i สำหรับ analyze() — ไม่ต้อง patch fetch ของ module ไหน
+    mtf = แถวของ mtf_asof ที่คิดไว้แล้ว; None = ให้ analyze คิดจาก 4H/1W ที่ปิดแล้ว ณ เวลาปิดแท่ง
+    labeler / zone_index = state ของ run นี้เอง (ไม่ใช้ตัวกลางของ live scan)
     """
-    import app.analysis.wave_engine as we_mod
-    import app.analysis.multi_tf as mtf_mod
-    import app.data.binance_fetcher as bf_mod
-
-    current_ts = sub_df.index[-1]
-
-    def _patched_fetch(symbol, interval=TIMEFRAME, limit=BARS):
-        if interval == TIMEFRAME:
-            return sub_df.copy()
-
-        if interval == "4h":
-            if df_4h is not None and len(df_4h) > 0:
-                sliced = df_4h[df_4h.index <= current_ts].tail(int(limit)).copy()
-                return sliced if len(sliced) > 0 else pd.DataFrame()
-            return pd.DataFrame()
-
-        if interval == "1w":
-            if df_1w is not None and len(df_1w) > 0:
-                sliced = df_1w[df_1w.index <= current_ts].tail(int(limit)).copy()
-                return sliced if len(sliced) > 0 else pd.DataFrame()
-            return pd.DataFrame()
-
-        return pd.DataFrame()
-
-    we_mod.fetch_ohlcv = _patched_fetch
-    mtf_mod.fetch_ohlcv = _patched_fetch
-    bf_mod.fetch_ohlcv = _patched_fetch
+    return AnalysisContext(
+        symbol=symbol,
+        df=prepare_frame(sub_df.copy()),
+        mtf=mtf,
+        df_4h=df_4h,
+        df_1w=df_1w,
+        primary=primary,
+        as_of=bar_close_time(sub_df),
+        labeler=labeler,
+        zone_index=zone_index,
+    )
 
 def run_symbol_bt(
     symbol: str,
@@ -249,7 +243,18 @@ def run_symbol_bt(
     else:
         print("[MTF] WARNING: --csv1w ไม่ได้ระบุ → weekly_permit=True/True ตลอด")
 
-    from app.analysis.wave_engine import analyze_symbol as live_analyze_symbol
+    primary = PrimaryBiasProvider(
+        weekly={symbol: df_1w} if df_1w is not None and len(df_1w) > 0 else None,
+        allow_fetch=False,
+    )
+
+    # MTF permit/confirm ทั้งช่วงครั้งเดียว — as-of ตามเวลาปิดแท่ง 1D (ใช้เฉพาะแท่ง 4H/1W ที่ปิดแล้ว)
+    daily_close = bar_close_times(df)
+    loop_range = range(250, len(df) - 2)
+    mtf_rows: Dict[int, Dict] = {}
+    if daily_close is not None and len(loop_range) > 0:
+        mtf_table = mtf_asof(daily_close[loop_range.start : loop_range.stop], df_1w, df_4h, symbol=symbol)
+        mtf_rows = {i: row for i, row in zip(loop_range, mtf_table.to_dict("records"))}
 
     trades: List[Trade] = []
 
@@ -269,8 +274,11 @@ def run_symbol_bt(
 
     skip_until = 0
     window_len = int(limit) if limit else BARS
+    # cache ข้ามแท่งของ run นี้ — ไม่แชร์กับ live scan ของ symbol เดียวกัน
+    labeler = IncrementalWaveLabeler()
+    zone_index = ZoneIndex()
 
-    for i in range(250, len(df) - 2):
+    for i in loop_range:
         dbg["bars"] += 1
 
         if i < skip_until:
@@ -279,9 +287,12 @@ def run_symbol_bt(
         start = max(0, (i + 1) - window_len)
         sub = df.iloc[start : i + 1].copy()
 
-        _patch_live_for_offline(sub, df_4h, df_1w)
-
-        out = live_analyze_symbol(symbol)
+        # core เดียวกับ live โดยไม่มี I/O — primary bias จาก 1W ที่ปิดแล้ว ณ เวลาปิดแท่ง i
+        # side effect (log / signal) ไม่ทำใน backtest
+        out = analyze(_offline_context(
+            symbol, sub, df_4h, df_1w, primary, mtf=mtf_rows.get(i),
+            labeler=labeler, zone_index=zone_index,
+        )).result
         if not out:
             dbg["out_none"] += 1
             continue
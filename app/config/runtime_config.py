@@ -0,0 +1,112 @@
+# app/config/runtime_config.py
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field, fields
+from typing import Mapping, Optional
+
+
+def _text(env: Mapping[str, str], name: str, default: str = "") -> str:
+    return (env.get(name) or default).strip()
+
+
+def _number(env: Mapping[str, str], name: str, default: float) -> float:
+    """ค่าว่าง/แปลงไม่ได้ = default (ไม่ให้ env พิมพ์ผิดทำ job ล้ม)"""
+    try:
+        s = _text(env, name)
+        return float(s) if s else float(default)
+    except ValueError:
+        return float(default)
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """
+    ค่าจาก environment ที่ hot path ใช้ — อ่านครั้งเดียว (get_config) แล้วแชร์ทั้ง process
+    แก้ env ระหว่างรัน → ต้องเรียก reload_config() เอง
+    field ที่ metadata secret=True ไม่เข้า content_hash()
+    """
+
+    # VPS (execute / log / position status)
+    vps_url: str = ""
+    exec_token: str = field(default="", metadata={"secret": True})
+
+    # telegram
+    telegram_bot_token: str = field(default="", metadata={"secret": True})
+    telegram_chat_id: str = ""
+    telegram_topic_id: str = ""
+    topic_normal_id: str = ""
+
+    # trade plan: จำกัด TP3 ไม่เกินกี่ R (0 = ไม่จำกัด)
+    max_tp_r: float = 0.0
+
+    # fallback scenario ของ scheduler (%)
+    entry_trigger_pct: float = 0.30
+    sl_pct: float = 3.0
+    tp1_pct: float = 3.0
+    tp2_pct: float = 5.0
+    tp3_pct: float = 7.0
+
+    # position watcher
+    tp1_weight: float = 0.30
+    tp2_weight: float = 0.30
+    tp3_weight: float = 0.40
+    watch_interval_sec: float = 5.0
+
+    @classmethod
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "RuntimeConfig":
+        env = os.environ if env is None else env
+        return cls(
+            vps_url=_text(env, "VPS_URL"),
+            exec_token=_text(env, "EXEC_TOKEN"),
+            telegram_bot_token=_text(env, "TELEGRAM_BOT_TOKEN"),
+            telegram_chat_id=_text(env, "TELEGRAM_CHAT_ID"),
+            telegram_topic_id=_text(env, "TELEGRAM_TOPIC_ID"),
+            topic_normal_id=_text(env, "TOPIC_NORMAL_ID"),
+            max_tp_r=_number(env, "MAX_TP_R", 0.0),
+            entry_trigger_pct=_number(env, "ENTRY_TRIGGER_PCT", 0.30),
+            sl_pct=_number(env, "SL_PCT", 3.0),
+            tp1_pct=_number(env, "TP1_PCT", 3.0),
+            tp2_pct=_number(env, "TP2_PCT", 5.0),
+            tp3_pct=_number(env, "TP3_PCT", 7.0),
+            tp1_weight=_number(env, "TP1_WEIGHT", 0.30),
+            tp2_weight=_number(env, "TP2_WEIGHT", 0.30),
+            tp3_weight=_number(env, "TP3_WEIGHT", 0.40),
+            watch_interval_sec=_number(env, "WATCH_INTERVAL_SEC", 5.0),
+        )
+
+    def content_hash(self) -> str:
+        """hash ของค่าที่ไม่ใช่ secret — ใช้ประกอบ key ของ cache / result store"""
+        items = sorted(
+            (f.name, repr(getattr(self, f.name))) for f in fields(self) if not f.metadata.get("secret")
+        )
+        return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()[:12]
+
+
+_CONFIG: Optional[RuntimeConfig] = None
+_LOCK = threading.Lock()
+
+
+def get_config() -> RuntimeConfig:
+    """snapshot ปัจจุบัน (โหลดจาก env ครั้งแรกที่เรียก)"""
+    config = _CONFIG
+    if config is None:
+        with _LOCK:
+            config = _CONFIG or reload_config()
+    return config
+
+
+def reload_config(env: Optional[Mapping[str, str]] = None) -> RuntimeConfig:
+    """อ่าน env ใหม่แล้วแทน snapshot ทั้งก้อน (ผู้ที่ถือ snapshot เดิมไว้ยังเห็นค่าเดิม)"""
+    global _CONFIG
+    _CONFIG = RuntimeConfig.from_env(env)
+    return _CONFIG
+
+
+def install_config(config: RuntimeConfig) -> RuntimeConfig:
+    """ใช้ snapshot ที่ส่งมาแทนการอ่าน env (worker รับ snapshot ของ parent — env ของ forkserver ค้างตั้งแต่ start)"""
+    global _CONFIG
+    _CONFIG = config
+    return _CONFIG
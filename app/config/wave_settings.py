@@ -1,11 +1,15 @@
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
 TIMEFRAME = "1d"
+# primary timeframe ที่ live engine สแกน (เช่น ["1d", "4h"]) — แต่ละตัวรันเมื่อแท่งของตัวเองปิด
+# cache / pivot state / position key แยกต่อ timeframe; TIMEFRAME = ค่า default ของ job/API
+TIMEFRAMES = ["1d"]
 BARS = 1000
 
 TIMEZONE = ZoneInfo("Asia/Bangkok")
-RUN_HOUR = 7
-RUN_MINUTE = 5
+# scheduler loop: รันหลังแท่งของแต่ละ timeframe ปิดกี่นาที (1D ปิด 07:00 ไทย → รัน 07:05 เหมือนเดิม)
+RUN_DELAY_MIN = 5
 
 SYMBOLS = [
     "BTCUSDT",
@@ -20,6 +24,18 @@ SYMBOLS = [
     "DOTUSDT",
 ]
 MAX_RETRY = 3
+# process สำหรับวิเคราะห์หลาย symbol พร้อมกัน (0 = ตามจำนวน core) / timeout ต่อ symbol (วินาที)
+ANALYZE_WORKERS = 0
+ANALYZE_TIMEOUT_SEC = 120
+# --- Portfolio risk: covariance ของ return รายวันข้าม SYMBOLS ---
+# ไม่ให้เปิด position ใหม่ถ้า volatility รายวันของพอร์ต (1σ, % ของ equity) เกิน MAX_PORTFOLIO_VOL_PCT
+PORTFOLIO_COV_WINDOW = 90
+PORTFOLIO_MIN_BARS = 30
+MAX_PORTFOLIO_VOL_PCT = 8.0
+# signal ใน outbox (ส่งไป VPS /execute) เก่ากว่านี้ = FAILED "expired" ไม่ส่ง — ไม่เกิน 1 แท่งของ primary timeframe ที่สั้นสุด
+SIGNAL_MAX_AGE_SEC = 3600
+# decision trace รายวัน (record ต่อ symbol × scenario ต่อ scan) — "" = ปิด
+DECISION_TRACE_DIR = str(Path(__file__).resolve().parents[2] / "data" / "decisions")
 # --- Position sizing (fixed notional per trade) ---
 DEFAULT_NOTIONAL_USDT = 3.5
 
@@ -36,6 +52,12 @@ FRACTAL_LEFT = 2
 FRACTAL_RIGHT = 2
 
 MAX_SCENARIOS = 3
+# alternate wave counts (beam search ย้อนจาก pivot ล่าสุด)
+# ปิดเป็นค่า default: count ทางเลือกใช้ pivot น้อยกว่าทางหลัก (IN_WAVE_2 จาก 3 pivot) แต่ trigger เป็น signal จริงได้
+WAVE_COUNT_ALTERNATES = False
+WAVE_COUNT_BEAM_WIDTH = 8
+WAVE_COUNT_MAX_DEPTH = 4
+WAVE_COUNT_TIME_BUDGET_MS = 25.0
 MIN_RR = 1.5
 MIN_CONFIDENCE_LIVE = 65.0
 MIN_CONFIDENCE_BACKTEST = 60.0
@@ -1,5 +1,6 @@
 import logging
 import time
+from typing import Any, Optional
 
 import pandas as pd
 import requests
@@ -85,3 +86,48 @@ def drop_unclosed_candle(df: pd.DataFrame) -> pd.DataFrame:
     except Exception as e:
         logger.error(f"drop_unclosed_candle error: {e}")
         return df.copy()
+
+
+def to_utc(ts: Any) -> pd.Timestamp:
+    """Timestamp เป็น UTC (ไม่มี tz = ถือว่าเป็น UTC อยู่แล้ว)"""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+
+def bar_close_time(df: pd.DataFrame) -> Optional[pd.Timestamp]:
+    """
+    เวลาปิดของแท่งสุดท้าย (open ของแท่งสุดท้าย + interval)
+    รองรับทั้ง column open_time และ DatetimeIndex — คืน None ถ้าไม่มี timestamp
+    """
+    if df is None or len(df) < 2:
+        return None
+
+    if "open_time" in df.columns:
+        opens = pd.DatetimeIndex(pd.to_datetime(df["open_time"].iloc[-2:], utc=True))
+    elif isinstance(df.index, pd.DatetimeIndex):
+        opens = df.index[-2:]
+        opens = opens.tz_localize("UTC") if opens.tz is None else opens.tz_convert("UTC")
+    else:
+        return None
+
+    last_open, prev_open = opens[-1], opens[-2]
+    return last_open + (last_open - prev_open)
+
+
+def bar_close_times(df: pd.DataFrame) -> Optional[pd.DatetimeIndex]:
+    """
+    เวลาปิดของทุกแท่ง (open + interval ปกติของ frame = median ของระยะห่าง open)
+    รองรับทั้ง column open_time และ DatetimeIndex — คืน None ถ้าไม่มี timestamp หรือมีไม่ถึง 2 แท่ง
+    """
+    if df is None or len(df) < 2:
+        return None
+
+    if "open_time" in df.columns:
+        opens = pd.DatetimeIndex(pd.to_datetime(df["open_time"], utc=True))
+    elif isinstance(df.index, pd.DatetimeIndex):
+        opens = df.index.tz_localize("UTC") if df.index.tz is None else df.index.tz_convert("UTC")
+    else:
+        return None
+
+    interval = pd.Series(opens).diff().median()
+    return opens + interval
@@ -8,6 +8,11 @@ from dotenv import load_dotenv
 load_dotenv()
 os.environ["TZ"] = "Asia/Bangkok"
 
+from app.config.runtime_config import get_config, reload_config
+
+# อ่าน env ครั้งเดียวหลัง load_dotenv — แก้ env ระหว่างรันใช้ POST /config/reload
+reload_config()
+
 import time
 
 # -------- BALANCE CACHE --------
@@ -27,7 +32,7 @@ from flask import Flask, request
 import requests
 
 from app.scheduler.daily_wave_scheduler import run_daily_wave_job, run_trend_watch_job
-from app.config.wave_settings import TIMEFRAME
+from app.config.wave_settings import TIMEFRAME, TIMEFRAMES
 from app.state.position_manager import save_armed_signal, get_active
 from app.trading.binance_trader import get_balance, get_open_positions
 from app.trading.trade_executor import execute_signal
@@ -40,10 +45,15 @@ from app.performance.dashboard import perf_bp
 app.register_blueprint(perf_bp)
 # หลังจาก app = Flask(__name__) และ register blueprint แล้ว ใส่:
 from app.trading.position_watcher import start_position_watcher
+from app.services.signal_dispatcher import signal_dispatcher
 
 if (os.getenv("ENABLE_WATCHER", "1").strip() == "1"):
     start_position_watcher()
 
+# ฝั่งที่ส่ง signal ไป VPS: ส่งของที่ค้างในคิวจากรอบก่อน (process restart) ต่อทันที
+if get_config().vps_url.startswith("http"):
+    signal_dispatcher()
+
 DASHBOARD_HTML = """<!DOCTYPE html>
 <html lang="th">
 <head>
@@ -148,6 +158,8 @@ pre::-webkit-scrollbar-thumb{background:var(--dim);border-radius:2px}
     <form method="POST" action="/dashboard/run">
       <input type="hidden" name="token" value="TOKEN_PLACEHOLDER">
       <button class="run-btn" type="submit">▶ MANUAL RUN</button>
+      <label><input type="checkbox" name="force" value="1"> force (คำนวณใหม่)</label>
+      <select name="tf">TF_OPTIONS_PLACEHOLDER</select>
     </form>
   </div>
 
@@ -216,7 +228,7 @@ def dashboard():
             amt = p["positionAmt"]
             pnl = float(p["unRealizedProfit"])
             entry = p.get("entryPrice", "-")
-            db_pos = get_active(sym, TIMEFRAME)
+            db_pos = next((p for p in (get_active(sym, tf) for tf in TIMEFRAMES) if p), None)
             sl = f"{db_pos.sl:,.4f}" if db_pos else "-"
             tp1 = f"{db_pos.tp1:,.4f}" if db_pos else "-"
             tp2 = f"{db_pos.tp2:,.4f}" if db_pos else "-"
@@ -245,6 +257,9 @@ def dashboard():
 
     html = html.replace("LOG_PLACEHOLDER", log)
     html = html.replace("TOKEN_PLACEHOLDER", token)
+    html = html.replace("TF_OPTIONS_PLACEHOLDER", "".join(
+        f'<option value="{tf}"{" selected" if tf == TIMEFRAME else ""}>{tf.upper()}</option>' for tf in TIMEFRAMES
+    ))
 
     return html
 
@@ -256,7 +271,12 @@ def dashboard_run():
     if token != expected:
         return "FORBIDDEN", 403
 
-    threading.Thread(target=run_daily_wave_job).start()
+    force = (request.form.get("force") or "").strip() == "1"
+    try:
+        timeframe = _timeframe_arg(request.form.get("tf") or "")
+    except ValueError as e:
+        return str(e), 400
+    threading.Thread(target=run_daily_wave_job, kwargs={"force": force, "timeframe": timeframe}).start()
     return f'<meta http-equiv="refresh" content="3;url=/dashboard?token={token}">Running...'
 
 
@@ -328,9 +348,28 @@ def debug_ip():
     return {"ok": True, "ipv4": ipv4}, 200
 
 
+def _force_flag() -> bool:
+    """?force=1 = วิเคราะห์ใหม่แม้ยังไม่มีแท่งใหม่ปิด"""
+    return (request.args.get("force") or "").strip().lower() in ("1", "true", "yes")
+
+
+def _timeframe_arg(value: str = None) -> str:
+    """?tf=4h = primary timeframe ของรอบนี้ (ต้องอยู่ใน TIMEFRAMES) — ไม่ระบุ = TIMEFRAME"""
+    tf = (value if value is not None else request.args.get("tf") or "").strip().lower()
+    if not tf:
+        return TIMEFRAME
+    if tf not in TIMEFRAMES:
+        raise ValueError(f"timeframe {tf} not in {TIMEFRAMES}")
+    return tf
+
+
 @app.route("/trend-watch", methods=["POST"])
 def trend_watch():
-    run_trend_watch_job(min_conf=65.0)
+    try:
+        timeframe = _timeframe_arg()
+    except ValueError as e:
+        return str(e), 400
+    run_trend_watch_job(min_conf=65.0, force=_force_flag(), timeframe=timeframe)
     return "OK", 200
 
 
@@ -340,20 +379,42 @@ def run_daily():
     got = (request.headers.get("X-CRON-TOKEN") or "").strip()
     if expected and got != expected:
         return "FORBIDDEN", 403
-    run_daily_wave_job()
+    try:
+        timeframe = _timeframe_arg()
+    except ValueError as e:
+        return str(e), 400
+    run_daily_wave_job(force=_force_flag(), timeframe=timeframe)
     return "OK", 200
 
 
 @app.route("/log", methods=["POST"])
 def receive_log():
+    """รับ log เดี่ยว {"msg": ...} หรือเป็น batch {"msgs": [...]} จาก log shipper"""
     expected = (os.getenv("EXEC_TOKEN") or "").strip()
     got = (request.headers.get("X-EXEC-TOKEN") or "").strip()
     if expected and got != expected:
         return "FORBIDDEN", 403
     payload = request.get_json(silent=True) or {}
-    msg = payload.get("msg", "")
-    print(f"[RAILWAY] {msg}", flush=True)
-    return {"ok": True}, 200
+    msgs = payload.get("msgs")
+    if not isinstance(msgs, list):
+        msgs = [payload.get("msg", "")]
+    for msg in msgs:
+        print(f"[RAILWAY] {msg}", flush=True)
+    return {"ok": True, "n": len(msgs)}, 200
+
+
+@app.route("/config/reload", methods=["POST"])
+def config_reload():
+    """
+    อ่าน .env ใหม่ (override ค่าเดิมใน os.environ) แล้วสร้าง config snapshot ใหม่
+    worker ของ analysis pool รับ snapshot นี้ไปกับงานถัดไป / ผลใน result store ที่ hash ไม่ตรงจะถูกคำนวณใหม่
+    """
+    expected = (os.getenv("EXEC_TOKEN") or "").strip()
+    got = (request.headers.get("X-EXEC-TOKEN") or "").strip()
+    if expected and got != expected:
+        return "FORBIDDEN", 403
+    load_dotenv(override=True)
+    return {"ok": True, "config_hash": reload_config().content_hash()}, 200
 
 
 # ✅ FIX: ใส่ token กันคนสุ่มยิง attach SL/TP
@@ -387,12 +448,13 @@ def debug_attach(symbol: str):
     return "NO ACTIVE POSITION", 404
 
 if __name__ == "__main__":
+    cli_tf = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--tf=")), "")
     if len(sys.argv) > 1 and sys.argv[1] == "run":
         print("Manual Run Mode...")
-        run_daily_wave_job()
+        run_daily_wave_job(force="--force" in sys.argv, timeframe=_timeframe_arg(cli_tf))
     elif len(sys.argv) > 1 and sys.argv[1] == "trend-watch":
         print("Manual Trend Watch Mode...")
-        run_trend_watch_job(min_conf=65.0)
+        run_trend_watch_job(min_conf=65.0, force="--force" in sys.argv, timeframe=_timeframe_arg(cli_tf))
     else:
         debug = (os.getenv("FLASK_DEBUG") or "0").strip() == "1"
         app.run(host="0.0.0.0", port=8080, debug=debug)
\ No newline at end of file
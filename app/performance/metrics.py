@@ -148,6 +148,7 @@ def compute_metrics(positions: Optional[List[Dict]] = None) -> Dict:
         "sharpe_ratio": sharpe,
         "profit_factor": profit_factor,
         "avg_rr": avg_rr,
+        "r_multiples": r_multiples,
         "equity_curve": equity_curve,
         "equity_curve_usdt": equity_curve_usdt,
         "symbol_stats": symbol_stats,
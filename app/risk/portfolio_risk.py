@@ -0,0 +1,291 @@
+# app/risk/portfolio_risk.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config.wave_settings import (
+    MAX_PORTFOLIO_VOL_PCT,
+    PORTFOLIO_COV_WINDOW,
+    PORTFOLIO_MIN_BARS,
+    SYMBOLS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────
+# ROLLING COVARIANCE (update ทีละแท่ง)
+# ─────────────────────────────────────────────
+
+class ReturnCovariance:
+    """
+    covariance ของ log return รายแท่งข้าม symbols ใน window ล่าสุด
+    - update() ทีละแท่งที่ปิด: บวกแท่งใหม่ / ลบแท่งที่หลุด window ออกจากผลรวมสะสม → O(N²) ไม่คำนวณทั้ง window ใหม่
+    - symbol ที่ไม่มีราคาในแท่งนั้น = ไม่มี return แท่งนั้น (และแท่งถัดไป) — covariance คิดแบบ pairwise
+    - cov(a, b) อ่านค่าเดียว O(1)
+    """
+
+    def __init__(self, symbols: Iterable[str], window: int = PORTFOLIO_COV_WINDOW) -> None:
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.window = int(window)
+        n = len(self.symbols)
+        self._returns = np.full((self.window, n), np.nan)  # ring buffer
+        self._pos = 0
+        self.bars = 0
+        self._sum = np.zeros((n, n))    # [i, j] = Σ r_i ของแท่งที่ i และ j มี return
+        self._prod = np.zeros((n, n))   # [i, j] = Σ r_i·r_j
+        self._pairs = np.zeros((n, n))  # [i, j] = จำนวนแท่งที่มีทั้งคู่
+        self._last_close = np.full(n, np.nan)
+        self.last_bar: Optional[pd.Timestamp] = None
+        self.version = 0
+
+    def _accumulate(self, r: np.ndarray, sign: float) -> None:
+        valid = np.isfinite(r)
+        x = np.where(valid, r, 0.0)
+        m = valid.astype(float)
+        self._sum += sign * np.outer(x, m)
+        self._prod += sign * np.outer(x, x)
+        self._pairs += sign * np.outer(m, m)
+
+    def update(self, closes: Mapping[str, float], bar_time: Any = None) -> bool:
+        """ราคาปิดของแท่งที่เพิ่งปิด {symbol: close} — แท่งเดิม/เก่ากว่า last_bar = ไม่ทำอะไร"""
+        if bar_time is not None:
+            bar_time = pd.Timestamp(bar_time)
+            if self.last_bar is not None and bar_time <= self.last_bar:
+                return False
+            self.last_bar = bar_time
+
+        price = np.array([float(closes.get(s) or np.nan) for s in self.symbols])
+        price[~(price > 0)] = np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = np.log(price / self._last_close)
+        self._last_close = price
+        if not np.isfinite(r).any():
+            return False
+
+        if self.bars == self.window:
+            self._accumulate(self._returns[self._pos], -1.0)
+        self._returns[self._pos] = r
+        self._accumulate(r, 1.0)
+        self._pos = (self._pos + 1) % self.window
+        self.bars = min(self.bars + 1, self.window)
+        self.version += 1
+        return True
+
+    def observations(self, symbol: str) -> int:
+        i = self.index.get(symbol)
+        return 0 if i is None else int(round(self._pairs[i, i]))
+
+    def cov(self, a: str, b: str) -> float:
+        """covariance ของ return a กับ b (ข้อมูลไม่พอ = nan)"""
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return float("nan")
+        n = self._pairs[i, j]
+        if n < 2:
+            return float("nan")
+        return float((self._prod[i, j] - self._sum[i, j] * self._sum[j, i] / n) / (n - 1))
+
+    def matrix(self) -> np.ndarray:
+        """covariance ทั้ง matrix (ใช้ตรวจ/แสดงผล — check ไม่ต้องใช้)"""
+        n = self._pairs
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = (self._prod - self._sum * self._sum.T / n) / (n - 1)
+        cov[n < 2] = np.nan
+        return cov
+
+
+# ─────────────────────────────────────────────
+# PORTFOLIO RISK
+# ─────────────────────────────────────────────
+
+class PortfolioRisk:
+    """
+    ความเสี่ยงรวมของ position ที่เปิดอยู่ — weight = notional / equity (SHORT ติดลบ)
+    variance ของพอร์ต wᵀΣw เก็บ cache ไว้ (คิดใหม่ O(k²) เฉพาะเมื่อมีแท่งใหม่)
+    check() ของ position ใหม่ใช้ cov กับ k position ที่เปิดอยู่ → O(k)
+    """
+
+    def __init__(
+        self,
+        symbols: Iterable[str] = SYMBOLS,
+        window: int = PORTFOLIO_COV_WINDOW,
+        max_vol_pct: float = MAX_PORTFOLIO_VOL_PCT,
+        min_bars: int = PORTFOLIO_MIN_BARS,
+    ) -> None:
+        self.returns = ReturnCovariance(symbols, window)
+        self.max_vol_pct = float(max_vol_pct)
+        self.min_bars = int(min_bars)
+        self.positions: Dict[str, float] = {}
+        self._variance: Optional[float] = None
+        self._variance_version = -1
+        self._lock = threading.Lock()
+
+    def _cov(self, a: str, b: str) -> float:
+        c = self.returns.cov(a, b)
+        return 0.0 if np.isnan(c) else c
+
+    def _exposure(self, symbol: str) -> float:
+        """(Σw)_symbol = Σ_i cov(symbol, i)·w_i — O(k)"""
+        return sum(self._cov(symbol, s) * w for s, w in self.positions.items())
+
+    def variance(self) -> float:
+        if self._variance is None or self._variance_version != self.returns.version:
+            self._variance = sum(w * self._exposure(s) for s, w in self.positions.items())
+            self._variance_version = self.returns.version
+        return max(self._variance, 0.0)
+
+    def marginal_variance(self, symbol: str, weight: float) -> float:
+        """variance ที่เพิ่มขึ้นถ้าเพิ่ม weight ใน symbol: 2x(Σw)_j + x²Σ_jj"""
+        return 2.0 * weight * self._exposure(symbol) + weight * weight * self._cov(symbol, symbol)
+
+    def add_position(self, symbol: str, weight: float) -> None:
+        with self._lock:
+            if self._variance is not None and self._variance_version == self.returns.version:
+                self._variance += self.marginal_variance(symbol, weight)
+            self.positions[symbol] = self.positions.get(symbol, 0.0) + weight
+
+    def remove_position(self, symbol: str, weight: Optional[float] = None) -> None:
+        """ลด weight ของ symbol (None = ปิดทั้งหมด)"""
+        with self._lock:
+            held = self.positions.get(symbol)
+            if held is None:
+                return
+            weight = held if weight is None else weight
+            if self._variance is not None and self._variance_version == self.returns.version:
+                self._variance += self.marginal_variance(symbol, -weight)
+            left = held - weight
+            if abs(left) > 1e-12:
+                self.positions[symbol] = left
+            else:
+                del self.positions[symbol]
+
+    def set_positions(self, weights: Mapping[str, float]) -> None:
+        with self._lock:
+            self.positions = {s: float(w) for s, w in weights.items() if w}
+            self._variance = None
+
+    def check(self, symbol: str, direction: str, notional: float, equity: float) -> Dict:
+        """
+        เปิด position ใหม่แล้ว volatility รายแท่ง (1σ, % ของ equity) ของพอร์ตเกิน max_vol_pct ไหม
+        ข้อมูลไม่พอ (< min_bars แท่ง) / equity <= 0 → allowed พร้อม reason
+        """
+        out = {"allowed": True, "vol_pct_before": None, "vol_pct_after": None,
+               "limit_pct": self.max_vol_pct, "reason": ""}
+        if equity <= 0 or notional <= 0:
+            out["reason"] = "ไม่มี equity/notional → ไม่เช็ค"
+            return out
+        bars = self.returns.observations(symbol)
+        if bars < self.min_bars:
+            out["reason"] = f"ข้อมูล return ไม่พอ ({bars} < {self.min_bars} แท่ง) → ไม่เช็ค"
+            return out
+
+        weight = notional / equity * (-1.0 if (direction or "").upper() == "SHORT" else 1.0)
+        with self._lock:
+            before = self.variance()
+            after = max(before + self.marginal_variance(symbol, weight), 0.0)
+        out["vol_pct_before"] = round(float(np.sqrt(before)) * 100, 4)
+        out["vol_pct_after"] = round(float(np.sqrt(after)) * 100, 4)
+        # ลดความเสี่ยงรวม (เช่น hedge) ผ่านเสมอ
+        if after > before and out["vol_pct_after"] > self.max_vol_pct:
+            out["allowed"] = False
+            out["reason"] = f"portfolio vol {out['vol_pct_after']:.2f}% > {self.max_vol_pct}%"
+        else:
+            out["reason"] = f"portfolio vol {out['vol_pct_after']:.2f}% ≤ {self.max_vol_pct}%"
+        return out
+
+
+# ─────────────────────────────────────────────
+# LIVE: sync แท่ง 1D จาก Binance (ใช้ใน position watcher)
+# ─────────────────────────────────────────────
+
+_SYNC_RETRY_SEC = 600.0
+
+
+def sync_daily_closes(
+    risk: PortfolioRisk,
+    fetch: Optional[Callable[..., pd.DataFrame]] = None,
+    now: Any = None,
+) -> int:
+    """
+    ดึงแท่ง 1D ที่ปิดแล้วแต่ยังไม่ได้ป้อน (ครั้งแรก = ย้อนหลังเต็ม window) แล้ว update ทีละแท่ง
+    ยังไม่มีแท่งใหม่ปิด = ไม่ยิง request — คืนจำนวนแท่งที่ป้อน
+    """
+    from app.analysis.result_store import expected_close
+
+    cov = risk.returns
+    closed_at = expected_close(pd.Timestamp.now(tz="UTC") if now is None else now, "1d")
+    if cov.last_bar is not None and cov.last_bar >= closed_at - pd.Timedelta(days=1):
+        return 0
+
+    if fetch is None:
+        from app.data.binance_fetcher import fetch_ohlcv as fetch
+    if cov.last_bar is None:
+        limit = cov.window + 2
+    else:
+        limit = int((closed_at - cov.last_bar) / pd.Timedelta(days=1)) + 2
+
+    frames = {}
+    for symbol in cov.symbols:
+        df = fetch(symbol, interval="1d", limit=limit)
+        if df is None or len(df) == 0:
+            continue
+        df = df[df["open_time"] < closed_at]
+        frames[symbol] = df.set_index("open_time")["close"]
+    if not frames:
+        return 0
+
+    table = pd.DataFrame(frames).sort_index()
+    fed = 0
+    with risk._lock:
+        for bar_time, row in table.iterrows():
+            fed += cov.update(row.dropna().to_dict(), bar_time=bar_time)
+    return fed
+
+
+_RISK: Optional[PortfolioRisk] = None
+_RISK_LOCK = threading.Lock()
+_next_sync = 0.0
+
+
+def portfolio_risk() -> PortfolioRisk:
+    global _RISK
+    with _RISK_LOCK:
+        if _RISK is None:
+            _RISK = PortfolioRisk()
+        return _RISK
+
+
+def sync_portfolio_risk() -> int:
+    """sync แท่ง 1D ของ portfolio_risk() — ล้มเหลว = รอ _SYNC_RETRY_SEC ก่อนลองใหม่ (เรียกจาก watcher loop)"""
+    global _next_sync
+    if time.time() < _next_sync:
+        return 0
+    try:
+        return sync_daily_closes(portfolio_risk())
+    except Exception as e:
+        logger.warning(f"portfolio risk sync failed: {e}")
+        _next_sync = time.time() + _SYNC_RETRY_SEC
+        return 0
+
+
+def position_weights(positions: Iterable[Any], equity: float) -> Dict[str, float]:
+    """
+    weight ต่อ symbol = notional / equity (SHORT ติดลบ)
+    positions = object ที่มี symbol / direction / entry / remaining_qty (หรือ qty) เช่น Position ของ position_manager
+    """
+    weights: Dict[str, float] = {}
+    if equity <= 0:
+        return weights
+    for p in positions:
+        qty = float(getattr(p, "remaining_qty", 0.0) or getattr(p, "qty", 0.0) or 0.0)
+        sign = -1.0 if (getattr(p, "direction", "") or "").upper() == "SHORT" else 1.0
+        weights[p.symbol] = weights.get(p.symbol, 0.0) + sign * qty * float(p.entry) / equity
+    return weights
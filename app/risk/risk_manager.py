@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-import os
 import logging
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config.runtime_config import get_config
 from app.config.wave_settings import MIN_RR as _DEFAULT_MIN_RR
 
 logger = logging.getLogger(__name__)
@@ -68,18 +71,13 @@ def _check_sl_distance(entry: float, sl: float, direction: str) -> Optional[str]
 def _cap_tp3_by_max_r(entry: float, sl: float, tp3: float, direction: str) -> float:
     """
     จำกัด TP3 ไม่ให้เกิน MAX_TP_R (หน่วยเป็น R)
-    เปิดใช้ด้วย env: MAX_TP_R=3 (หรือ 2.5, 4 ฯลฯ)
+    เปิดใช้ด้วย env: MAX_TP_R=3 (หรือ 2.5, 4 ฯลฯ) — อ่านจาก config snapshot (get_config)
 
     หมายเหตุ:
     - ไม่แตะ tp1/tp2
     - ใช้ risk จาก |entry-sl| หลังปรับ sr แล้วเท่านั้น
     """
-    try:
-        s = (os.getenv("MAX_TP_R", "") or "").strip()
-        max_r = float(s) if s else 0.0
-    except Exception:
-        max_r = 0.0
-
+    max_r = get_config().max_tp_r
     if not max_r or max_r <= 0:
         return float(tp3)
 
@@ -357,6 +355,294 @@ def build_trade_plan(
 
     return trade
 
+
+# =========================
+# BATCH PLANNER (columnar)
+# =========================
+# reason code ของ trade_plan_columns — ข้อความจริงดู trade_plan_reason()
+PLAN_OK = 0
+PLAN_OK_FIB = 1            # ABC: valid (fib+sr)
+PLAN_RR_LOW = 2
+PLAN_RANGE_INVALID = 3
+PLAN_SIDEWAY_DIRECTION = 4
+PLAN_ABC_PIVOTS = 5
+PLAN_ABC_DOWN_ABOVE_SL = 6
+PLAN_ABC_UP_BELOW_SL = 7
+PLAN_FIB_INVALID = 8
+PLAN_IMPULSE_PIVOTS = 9
+PLAN_IMPULSE_LONG_ENTRY = 10
+PLAN_IMPULSE_DIRECTION = 11
+PLAN_SL_ENTRY = 12         # entry <= 0
+PLAN_SL_NEAR = 13
+PLAN_SL_FAR = 14
+PLAN_SR_SL_ENTRY = 15      # เหมือน 12-14 แต่เช็คหลังปรับ SL ตาม SR
+PLAN_SR_SL_NEAR = 16
+PLAN_SR_SL_FAR = 17
+_PLAN_PENDING = -1
+
+_KIND_SIDEWAY, _KIND_ABC_DOWN, _KIND_ABC_UP, _KIND_IMPULSE = 0, 1, 2, 3
+_SL_PREFIX = {"SIDEWAY_RANGE": "SIDEWAY", "ABC_DOWN": "ABC_DOWN", "ABC_UP": "ABC_UP"}  # อื่น ๆ = IMPULSE
+_REASON_TEXT = {
+    PLAN_RANGE_INVALID: "SIDEWAY: range ไม่ valid",
+    PLAN_SIDEWAY_DIRECTION: "SIDEWAY: direction ไม่ถูกต้อง",
+    PLAN_ABC_PIVOTS: "ABC: pivots ไม่พอ",
+    PLAN_ABC_DOWN_ABOVE_SL: "ABC_DOWN: ราคาเหนือ SL แล้ว (invalid)",
+    PLAN_ABC_UP_BELOW_SL: "ABC_UP: ราคาต่ำกว่า SL แล้ว (invalid)",
+    PLAN_FIB_INVALID: "fib_invalid: targets<=0 (base_len>anchor)",
+    PLAN_IMPULSE_PIVOTS: "IMPULSE: pivots ไม่พอ",
+    PLAN_IMPULSE_LONG_ENTRY: "IMPULSE LONG: entry <= sl",
+    PLAN_IMPULSE_DIRECTION: "IMPULSE: direction ไม่ถูกต้อง",
+}
+
+
+def _plan_kind(stype: np.ndarray) -> np.ndarray:
+    return np.select(
+        [stype == "SIDEWAY_RANGE", stype == "ABC_DOWN", stype == "ABC_UP"],
+        [_KIND_SIDEWAY, _KIND_ABC_DOWN, _KIND_ABC_UP],
+        default=_KIND_IMPULSE,
+    )
+
+
+def _sl_distance_columns(entry: np.ndarray, sl: np.ndarray):
+    """_check_sl_distance ต่อแถว → (code 0/SL_ENTRY/SL_NEAR/SL_FAR, sl_pct)"""
+    sl_pct = np.abs(entry - sl) / entry * 100
+    bad_entry = entry <= 0
+    near = ~bad_entry & (sl_pct + 1e-9 < MIN_SL_PCT)
+    far = ~bad_entry & ~near & (sl_pct > MAX_SL_PCT)
+    code = np.select([bad_entry, near, far], [PLAN_SL_ENTRY, PLAN_SL_NEAR, PLAN_SL_FAR], default=0)
+    return code, sl_pct
+
+
+def _cap_tp3_columns(entry: np.ndarray, sl: np.ndarray, tp3: np.ndarray, direction: np.ndarray, max_r: float) -> np.ndarray:
+    """_cap_tp3_by_max_r ต่อแถว"""
+    if not max_r or max_r <= 0:
+        return tp3
+    risk = np.abs(entry - sl)
+    is_long = direction == "LONG"
+    r_tp3 = np.where(is_long, tp3 - entry, entry - tp3) / risk
+    over = (risk > 0) & (is_long | (direction == "SHORT")) & (r_tp3 > max_r)
+    return np.where(over, np.where(is_long, entry + risk * max_r, entry - risk * max_r), tp3)
+
+
+def _column(values: Any, n: int, fill: float = 0.0) -> np.ndarray:
+    if values is None:
+        return np.full(n, fill, dtype=float)
+    return np.broadcast_to(np.asarray(values, dtype=float), (n,))
+
+
+def trade_plan_columns(
+    stype: Sequence[str],
+    direction: Sequence[str],
+    price: Any,
+    min_rr: float = _DEFAULT_MIN_RR,
+    range_low: Any = None,
+    range_high: Any = None,
+    atr: Any = None,
+    pivot0: Any = None,
+    pivot1: Any = None,
+    pivot2: Any = None,
+    pivot_prev: Any = None,
+    n_pivots: Any = None,
+    swing_low: Any = None,
+    swing_high: Any = None,
+    support: Any = None,
+    resist: Any = None,
+) -> Dict[str, np.ndarray]:
+    """
+    build_trade_plan ของหลาย scenario ในรอบเดียว (ทุกคอลัมน์ยาวเท่ากัน หรือเป็นค่าเดียว)
+    - ค่าที่ไม่มี (None / 0) = เหมือน key ที่ไม่มีใน scenario / sr
+    - pivot0-2 = pivots[0..2], pivot_prev = pivots[-2], n_pivots = len(pivots)
+    คืน entry/sl/tp1-3, valid, has_levels (False = scalar คืน None), code (PLAN_*), rr, sl_pct
+    แถว i ตรงกับ build_trade_plan ทุกค่า
+    """
+    stype = np.array([(s or "").upper() for s in stype], dtype=object)
+    direction = np.array([(d or "").upper() for d in direction], dtype=object)
+    n = len(stype)
+    price = _column(price, n)
+    kind = _plan_kind(stype)
+    is_long = direction == "LONG"
+    is_short = direction == "SHORT"
+    piv0, piv1, piv2, piv_prev = (_column(v, n, np.nan) for v in (pivot0, pivot1, pivot2, pivot_prev))
+    n_pivots = _column(n_pivots, n)
+    support, resist = _column(support, n), _column(resist, n)
+
+    code = np.full(n, _PLAN_PENDING, dtype=np.int8)
+    sl_pct = np.full(n, np.nan)
+
+    def fail(mask: np.ndarray, value) -> None:
+        hit = (code == _PLAN_PENDING) & mask
+        code[hit] = np.broadcast_to(value, (n,))[hit]
+
+    def check_sl(mask: np.ndarray, sl: np.ndarray, after_sr: bool = False) -> None:
+        err, pct = _sl_distance_columns(entry, sl)
+        hit = (code == _PLAN_PENDING) & mask & (err > 0)
+        sl_pct[hit] = pct[hit]
+        fail(mask & (err > 0), err + (PLAN_SR_SL_ENTRY - PLAN_SL_ENTRY) * after_sr)
+
+    entry = price.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # SIDEWAY_RANGE
+        sw = kind == _KIND_SIDEWAY
+        low, high = _column(range_low, n), _column(range_high, n)
+        atr_sw = _column(atr, n)
+        atr_sw = np.where(atr_sw != 0, atr_sw, price * 0.01)
+        span = high - low
+        fail(sw & ((low <= 0) | (high <= low)), PLAN_RANGE_INVALID)
+        fail(sw & ~(is_long | is_short), PLAN_SIDEWAY_DIRECTION)
+        sw_sl = np.where(is_long, low - atr_sw * 0.5, high + atr_sw * 0.5)
+        sw_tp1 = np.where(is_long, low + span * 0.382, high - span * 0.382)
+        sw_tp2 = np.where(is_long, low + span * 0.618, high - span * 0.618)
+        sw_tp3 = np.where(is_long, high - atr_sw * 0.3, low + atr_sw * 0.3)
+        check_sl(sw, sw_sl)
+
+        # ABC: SL = pivot C, TP = fib extension ของขา A จาก C
+        down = kind == _KIND_ABC_DOWN
+        up = kind == _KIND_ABC_UP
+        abc = down | up
+        fail(abc & (n_pivots < 3), PLAN_ABC_PIVOTS)
+        fail(down & (price >= piv2), PLAN_ABC_DOWN_ABOVE_SL)
+        fail(up & (price <= piv2), PLAN_ABC_UP_BELOW_SL)
+        check_sl(abc, piv2)
+        a_len = np.abs(piv0 - piv1)
+        abc_tp1 = np.where(down, piv2 - a_len * 1.0, piv2 + a_len * 1.0)
+        abc_tp2 = np.where(down, piv2 - a_len * 1.618, piv2 + a_len * 1.618)
+        abc_tp3 = np.where(down, piv2 - a_len * 2.0, piv2 + a_len * 2.0)
+        fail(abc & ((a_len <= 0) | (abc_tp1 <= 0) | (abc_tp2 <= 0) | (abc_tp3 <= 0)), PLAN_FIB_INVALID)
+        abc_sl = np.where(down & (resist != 0) & (resist < piv2), resist, piv2)
+        abc_sl = np.where(up & (support != 0) & (support > piv2), support, abc_sl)
+        check_sl(abc, abc_sl, after_sr=True)
+
+        # IMPULSE: SL ที่ swing ล่าสุด, TP = 1.0/1.618/2.0 R
+        im = kind == _KIND_IMPULSE
+        fail(im & (n_pivots < 2), PLAN_IMPULSE_PIVOTS)
+        swing_low, swing_high = _column(swing_low, n), _column(swing_high, n)
+        sl_long = np.where(swing_low != 0, swing_low, piv_prev)
+        sl_short = np.where(swing_high != 0, swing_high, piv_prev)
+        sl_short = np.where(sl_short <= entry, entry * (1 + (MIN_SL_PCT / 100.0)), sl_short)
+        fail(im & is_long & (entry <= sl_long), PLAN_IMPULSE_LONG_ENTRY)
+        fail(im & ~(is_long | is_short), PLAN_IMPULSE_DIRECTION)
+        im_sl0 = np.where(is_long, sl_long, sl_short)
+        check_sl(im, im_sl0)
+        risk = np.abs(entry - im_sl0)
+        im_tp1 = np.where(is_long, entry + risk * 1.0, entry - risk * 1.0)
+        im_tp2 = np.where(is_long, entry + risk * 1.618, entry - risk * 1.618)
+        im_tp3 = np.where(is_long, entry + risk * 2.0, entry - risk * 2.0)
+        filled = im & (code == _PLAN_PENDING)  # scalar ใส่ค่าลง trade ก่อนปรับ SR
+        im_sl = np.where(is_long & (support != 0) & (support > im_sl0), support, im_sl0)
+        im_sl = np.where(is_short & (resist != 0) & (resist < im_sl0), resist, im_sl)
+        check_sl(im, im_sl, after_sr=True)
+
+        sl = np.select([sw, abc], [sw_sl, abc_sl], default=im_sl)
+        tp1 = np.select([sw, abc], [sw_tp1, abc_tp1], default=im_tp1)
+        tp2 = np.select([sw, abc], [sw_tp2, abc_tp2], default=im_tp2)
+        tp3_raw = np.select([sw, abc], [sw_tp3, abc_tp3], default=im_tp3)
+        tp3 = _cap_tp3_columns(entry, sl, tp3_raw, direction, get_config().max_tp_r)
+
+        reward = np.abs(tp2 - entry)
+        risk = np.abs(entry - sl)
+        rr = np.where(risk == 0, 0.0, reward / risk)
+
+    pending = code == _PLAN_PENDING
+    valid = pending & (rr >= min_rr)
+    code[valid] = np.where(abc, PLAN_OK_FIB, PLAN_OK)[valid]
+    code[pending & ~valid] = PLAN_RR_LOW
+    rr = np.where(pending, rr, np.nan)
+
+    nan = np.full(n, np.nan)
+    keep = valid | filled
+    return {
+        "entry": np.where(keep, entry, nan),
+        "sl": np.where(valid, sl, np.where(filled, im_sl0, nan)),
+        "tp1": np.where(keep, tp1, nan),
+        "tp2": np.where(keep, tp2, nan),
+        "tp3": np.where(valid, tp3, np.where(filled, tp3_raw, nan)),
+        "valid": valid,
+        "has_levels": keep,
+        "code": code,
+        "rr": rr,
+        "sl_pct": sl_pct,
+    }
+
+
+def trade_plan_reason(code: int, stype: str, rr: float, sl_pct: float, min_rr: float) -> str:
+    """ข้อความ reason ของ build_trade_plan จาก code ของ trade_plan_columns"""
+    code = int(code)
+    if code == PLAN_OK:
+        return f"RR(TP2)={round(float(rr), 2)} ≥ {min_rr}"
+    if code == PLAN_OK_FIB:
+        return f"RR(TP2)={round(float(rr), 2)} ≥ {min_rr} (fib+sr)"
+    if code == PLAN_RR_LOW:
+        return f"RR(TP2) ต่ำ ({round(float(rr), 2)})"
+    if code in _REASON_TEXT:
+        return _REASON_TEXT[code]
+
+    prefix = _SL_PREFIX.get((stype or "").upper(), "IMPULSE")
+    if code >= PLAN_SR_SL_ENTRY:
+        prefix += "(after SR)"
+        code -= PLAN_SR_SL_ENTRY - PLAN_SL_ENTRY
+    if code == PLAN_SL_ENTRY:
+        err = "entry <= 0"
+    elif code == PLAN_SL_NEAR:
+        err = f"SL ใกล้เกินไป ({sl_pct:.2f}% < {MIN_SL_PCT}%)"
+    else:
+        err = f"SL ไกลเกินไป ({sl_pct:.2f}% > {MAX_SL_PCT}%)"
+    return f"{prefix}: {err}"
+
+
+def scenario_plan_columns(scenarios: Sequence[Dict], sr: Any = None) -> Dict[str, Any]:
+    """
+    แปลง scenario dict (+ sr dict เดียว หรือ list ต่อ scenario) เป็นคอลัมน์สำหรับ trade_plan_columns
+    ค่าที่ falsy ใน dict (None / 0) → 0 เหมือนที่ build_trade_plan ใช้ `or`
+    """
+    srs = sr if isinstance(sr, (list, tuple)) else [sr] * len(scenarios)
+    cols: Dict[str, list] = {k: [] for k in (
+        "stype", "direction", "range_low", "range_high", "atr", "pivot0", "pivot1", "pivot2",
+        "pivot_prev", "n_pivots", "swing_low", "swing_high", "support", "resist",
+    )}
+    for sc, sr_i in zip(scenarios, srs):
+        pivots = sc.get("pivots") or []
+        sr_i = sr_i or {}
+        cols["stype"].append(sc.get("type"))
+        cols["direction"].append(sc.get("direction"))
+        for key in ("range_low", "range_high", "atr", "swing_low", "swing_high"):
+            cols[key].append(float(sc.get(key) or 0))
+        for i, key in enumerate(("pivot0", "pivot1", "pivot2")):
+            cols[key].append(float(pivots[i]["price"]) if len(pivots) > i else np.nan)
+        cols["pivot_prev"].append(float(pivots[-2]["price"]) if len(pivots) >= 2 else np.nan)
+        cols["n_pivots"].append(len(pivots))
+        cols["support"].append(float((sr_i.get("support") or {}).get("level") or 0))
+        cols["resist"].append(float((sr_i.get("resist") or {}).get("level") or 0))
+    return cols
+
+
+def build_trade_plans(
+    scenarios: Sequence[Dict],
+    current_price: Any,
+    min_rr: float = _DEFAULT_MIN_RR,
+    sr: Any = None,
+) -> List[Dict]:
+    """
+    build_trade_plan หลาย scenario (ราคา / sr เดียว หรือ list ต่อ scenario) ผ่าน trade_plan_columns
+    แล้วแปลงกลับเป็น dict แบบเดียวกับ scalar — sweep ที่ใช้แค่ตัวเลขเรียก trade_plan_columns ตรง ๆ เร็วกว่า
+    """
+    if not scenarios:
+        return []
+    cols = scenario_plan_columns(scenarios, sr)
+    out = trade_plan_columns(price=current_price, min_rr=min_rr, **cols)
+    out = {k: v.tolist() for k, v in out.items()}
+    plans = []
+    for i, stype in enumerate(cols["stype"]):
+        trade = {"direction": (cols["direction"][i] or "").upper()}
+        for key in ("entry", "sl", "tp1", "tp2", "tp3"):
+            trade[key] = out[key][i] if out["has_levels"][i] else None
+        trade["valid"] = out["valid"][i]
+        trade["reason"] = trade_plan_reason(out["code"][i], stype, out["rr"][i], out["sl_pct"][i], min_rr)
+        if out["code"][i] == PLAN_FIB_INVALID:
+            logger.warning(f"fib_extension: invalid targets ({stype}) -> fib_invalid")
+        plans.append(trade)
+    return plans
+
+
 def recalculate_from_fill(
     direction: str,
     actual_entry: float,
@@ -1,26 +1,30 @@
 import time
-import os
 import requests as req
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.config.wave_settings import (
     SYMBOLS,
-    RUN_HOUR,
-    RUN_MINUTE,
-    TIMEZONE,
+    RUN_DELAY_MIN,
     MAX_RETRY,
     TIMEFRAME,
+    TIMEFRAMES,
     MIN_CONFIDENCE_LIVE,
+    ANALYZE_WORKERS,
+    ANALYZE_TIMEOUT_SEC,
 )
-from app.analysis.wave_engine import analyze_symbol
+from app.config.runtime_config import get_config
+from app.analysis.result_store import expected_close
+from app.analysis.stage_timer import StageTimings, collect_stage_timings
+from app.analysis.wave_engine import analyze_symbol, analyze_symbols
 from app.services.telegram_reporter import format_symbol_report, send_message
 from app.state.position_manager import get_active, get_armed_signal, save_armed_signal
 
 def _check_position_from_vps(symbol: str) -> bool:
     """ถาม VPS ว่ามี position เปิดอยู่ไหม"""
     try:
-        vps_url = (os.getenv("VPS_URL", "") or "").rstrip("/")
-        exec_token = os.getenv("EXEC_TOKEN", "") or ""
+        config = get_config()
+        vps_url = config.vps_url.rstrip("/")
+        exec_token = config.exec_token
         if not vps_url or not exec_token:
             return False
 
@@ -54,7 +58,9 @@ def _fallback_scenarios(analysis: dict) -> list:
     fallback เมื่อ wave_engine ไม่คืน scenarios
     - valid: บังคับ True (เพื่อให้มีโอกาสส่งเมื่อ triggered)
     - triggered: ราคาใกล้ entry ภายใน ENTRY_TRIGGER_PCT (%)
+    - % ของ SL/TP มาจาก config snapshot (get_config) ไม่อ่าน env ทุกครั้ง
     """
+    config = get_config()
     wl = ((analysis.get("wave_label") or {}).get("label") or {}) if analysis else {}
     direction = (wl.get("direction") or "").upper()
     conf = float(wl.get("confidence") or 0)
@@ -79,15 +85,15 @@ def _fallback_scenarios(analysis: dict) -> list:
     if not entry:
         entry = price
 
-    trigger_pct = float(os.getenv("ENTRY_TRIGGER_PCT", "0.30"))  # default 0.30%
+    trigger_pct = config.entry_trigger_pct  # default 0.30%
     dist = _pct_near(price, entry)
     triggered = (dist <= trigger_pct) if (price and entry) else False
 
     # % มาตรฐาน: SL 3%, TP 3/5/7
-    sl_pct = float(os.getenv("SL_PCT", "3.0"))
-    tp1_pct = float(os.getenv("TP1_PCT", "3.0"))
-    tp2_pct = float(os.getenv("TP2_PCT", "5.0"))
-    tp3_pct = float(os.getenv("TP3_PCT", "7.0"))
+    sl_pct = config.sl_pct
+    tp1_pct = config.tp1_pct
+    tp2_pct = config.tp2_pct
+    tp3_pct = config.tp3_pct
 
     if direction == "SHORT":
         stop_loss = entry * (1.0 + sl_pct / 100.0)
@@ -118,13 +124,45 @@ def _fallback_scenarios(analysis: dict) -> list:
     }
     return [sc]
 
-def run_daily_wave_job():
-    print(f"=== START DAILY WAVE JOB | tf={TIMEFRAME} | symbols={len(SYMBOLS)} ===", flush=True)
+def _analyze_batch(symbols, force: bool = False, timeframe: str = TIMEFRAME) -> dict:
+    """
+    วิเคราะห์ทุก symbol พร้อมกันก่อนเข้า loop — {symbol: SymbolAnalysis}
+    ยังไม่มีแท่งใหม่ปิด = ใช้ผลที่เก็บไว้ (force=True = คำนวณใหม่)
+    """
+    batch = analyze_symbols(
+        symbols, workers=ANALYZE_WORKERS or None, timeout=ANALYZE_TIMEOUT_SEC,
+        fn=analyze_symbol, bypass_cache=force, timeframe=timeframe,
+    )
+    return {a.symbol: a for a in batch}
+
+
+def _take_analysis(batch: dict, symbol: str, timings: StageTimings = None, timeframe: str = TIMEFRAME):
+    """ผลจากรอบ batch (ครั้งแรก) — error ให้ retry ตามเดิม, retry วิเคราะห์ใหม่ทีละตัว"""
+    pre = batch.pop(symbol, None)
+    if pre is None:
+        with collect_stage_timings(timings):
+            return analyze_symbol(symbol, bypass_cache=True, timeframe=timeframe)
+    if pre.error:
+        raise RuntimeError(pre.error)
+    return pre.result
+
+
+def _print_timings(job: str, timings: StageTimings) -> None:
+    """เวลาต่อขั้นรวมทั้งรอบ (ทุก symbol) — ใช้หาว่ารอบไหนช้าเพราะขั้นอะไร"""
+    if timings.stages:
+        print(f"⏱ {job} stages total={timings.total_ms():.1f}ms | {timings.summary()}", flush=True)
+
+
+def run_daily_wave_job(force: bool = False, timeframe: str = TIMEFRAME):
+    print(f"=== START DAILY WAVE JOB | tf={timeframe} | symbols={len(SYMBOLS)} ===", flush=True)
     print("✅ Binance: SKIP (LOCAL MODE)", flush=True)
 
     found = 0
     found_symbols = []
     errors = 0
+    run_timings = StageTimings()
+    with collect_stage_timings(run_timings):
+        batch = _analyze_batch(SYMBOLS, force=force, timeframe=timeframe)
 
     for symbol in SYMBOLS:
         print(f"[{symbol}] start", flush=True)
@@ -132,17 +170,17 @@ def run_daily_wave_job():
 
         while retry < MAX_RETRY:
             try:
-                analysis = analyze_symbol(symbol)
+                analysis = _take_analysis(batch, symbol, run_timings, timeframe)
                 if not analysis:
                     print(f"[{symbol}] no analysis -> skip", flush=True)
                     break
 
-                db_active = get_active(symbol, TIMEFRAME)
+                db_active = get_active(symbol, timeframe)
                 if db_active:
                     print(f"[{symbol}] DB มี ACTIVE อยู่แล้ว ข้ามไป", flush=True)
                     break
 
-                db_armed = get_armed_signal(symbol, TIMEFRAME)
+                db_armed = get_armed_signal(symbol, timeframe)
                 if db_armed:
                     print(f"[{symbol}] DB มี ARMED อยู่แล้ว ข้ามไป", flush=True)
                     break
@@ -180,7 +218,7 @@ def run_daily_wave_job():
 
                     save_armed_signal(
                         symbol=symbol,
-                        timeframe=TIMEFRAME,
+                        timeframe=timeframe,
                         direction=direction,
                         trigger_price=entry,
                         trade_plan={
@@ -224,7 +262,7 @@ def run_daily_wave_job():
                 time.sleep(2)
 
     summary = []
-    summary.append(f"🕖 DAILY SUMMARY ({TIMEFRAME.upper()})")
+    summary.append(f"🕖 DAILY SUMMARY ({timeframe.upper()})")
     summary.append(f"สแกน: {len(SYMBOLS)} เหรียญ")
     summary.append(f"พบสัญญาณ: {found} เหรียญ")
     summary.append(f"ไม่พบสัญญาณ: {len(SYMBOLS) - found} เหรียญ")
@@ -236,25 +274,29 @@ def run_daily_wave_job():
     summary.append("")
     summary.append("────────────────────")
     summary.append("🔵 SYSTEM: ELLIOTT-WAVE")
-    summary.append("Engine: 1D")
+    summary.append(f"Engine: {timeframe.upper()}")
 
-    send_message("\n".join(summary), topic_id=os.getenv("TOPIC_NORMAL_ID"))
+    send_message("\n".join(summary), topic_id=get_config().topic_normal_id or None)
+    _print_timings("DAILY WAVE", run_timings)
     print("=== END DAILY WAVE JOB ===", flush=True)
 
-def run_trend_watch_job(min_conf: float = 65.0):
+def run_trend_watch_job(min_conf: float = 65.0, force: bool = False, timeframe: str = TIMEFRAME):
     from datetime import datetime
     import pytz
 
-    print(f"=== START TREND WATCH | tf={TIMEFRAME} | min_conf={min_conf} ===", flush=True)
+    print(f"=== START TREND WATCH | tf={timeframe} | min_conf={min_conf} ===", flush=True)
 
     picks = []
     errors = 0
+    run_timings = StageTimings()
+    with collect_stage_timings(run_timings):
+        batch = _analyze_batch(SYMBOLS, force=force, timeframe=timeframe)
 
     for symbol in SYMBOLS:
         retry = 0
         while retry < MAX_RETRY:
             try:
-                analysis = analyze_symbol(symbol)
+                analysis = _take_analysis(batch, symbol, run_timings, timeframe)
                 if not analysis:
                     break
 
@@ -301,7 +343,7 @@ def run_trend_watch_job(min_conf: float = 65.0):
     now = datetime.now(pytz.timezone("Asia/Bangkok")).strftime("%Y-%m-%d %H:%M")
 
     lines = []
-    lines.append("📡 TREND WATCH (1D)")
+    lines.append(f"📡 TREND WATCH ({timeframe.upper()})")
     lines.append(f"เกณฑ์: Conf >= {int(min_conf)} | จำนวนที่น่าจับตา: {len(picks)}")
     lines.append("")
 
@@ -334,27 +376,54 @@ def run_trend_watch_job(min_conf: float = 65.0):
     lines.append("────────────────────")
     lines.append(f"📅 {now}")
     lines.append("🔵 SYSTEM: ELLIOTT-WAVE")
-    lines.append("Engine: 1D")
+    lines.append(f"Engine: {timeframe.upper()}")
 
-    send_message("\n".join(lines), topic_id=os.getenv("TOPIC_NORMAL_ID"))
+    send_message("\n".join(lines), topic_id=get_config().topic_normal_id or None)
+    _print_timings("TREND WATCH", run_timings)
     print("=== END TREND WATCH ===", flush=True)
 
-def start_scheduler_loop():
+POLL_SEC = 20
+
+
+def due_timeframes(
+    now,
+    last_closes: dict,
+    timeframes=None,
+    delay_min: float = RUN_DELAY_MIN,
+    poll_sec: float = POLL_SEC,
+) -> list:
     """
-    Loop เช็คเวลา RUN_HOUR:RUN_MINUTE ไทย แล้วรันวันละครั้ง
+    timeframe ที่มีแท่งใหม่ปิดตั้งแต่รอบที่แล้ว และผ่านไป delay_min นาทีหลังปิด (อัปเดต last_closes)
+    timeframe ที่ยังไม่เคยเห็น:
+    - แท่งเพิ่งปิดไม่เกิน delay_min + poll_sec (restart ช่วงรอ delay) = ยังไม่ได้รัน → รันเมื่อครบ delay
+    - ปิดนานกว่านั้น = จำแท่งปัจจุบันไว้เฉยๆ (เริ่ม process กลางแท่ง ไม่รันย้อน)
     """
-    print("Wave Scheduler Started...", flush=True)
-
-    last_run_date = None  # กันรันซ้ำทั้งวัน
+    due = []
+    for tf in (timeframes or TIMEFRAMES):
+        close = expected_close(now, tf)
+        age = (now - close).total_seconds()
+        if tf not in last_closes:
+            last_closes[tf] = None if age < delay_min * 60 + poll_sec else close
+        if close != last_closes[tf] and age >= delay_min * 60:
+            last_closes[tf] = close
+            due.append(tf)
+    return due
+
+
+def start_scheduler_loop(timeframes=None):
+    """
+    Loop รัน daily wave job ของแต่ละ primary timeframe เมื่อแท่งของ timeframe นั้นปิด (+RUN_DELAY_MIN)
+    1D = 07:05 ไทยเหมือนเดิม; 4H = ทุก 4 ชั่วโมง — ผล 1W/4H MTF ใช้ร่วมกันผ่าน cache
+    """
+    timeframes = list(timeframes or TIMEFRAMES)
+    print(f"Wave Scheduler Started... timeframes={timeframes}", flush=True)
 
+    last_closes: dict = {}
     while True:
-        now = datetime.now(TIMEZONE)
-
-        if now.hour == RUN_HOUR and now.minute == RUN_MINUTE:
-            today = now.date()
-            if last_run_date != today:
-                run_daily_wave_job()
-                last_run_date = today
-            time.sleep(60)  # กันรันซ้ำในนาทีเดียวกัน
-
-        time.sleep(20)
\ No newline at end of file
+        now = datetime.now(timezone.utc)
+        for tf in due_timeframes(now, last_closes, timeframes):
+            try:
+                run_daily_wave_job(timeframe=tf)
+            except Exception as e:
+                print(f"[SCHEDULER] {tf} job error: {e}", flush=True)
+        time.sleep(POLL_SEC)
@@ -0,0 +1,209 @@
+# app/services/log_shipper.py
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import requests as req
+
+from app.config.runtime_config import get_config
+
+logger = logging.getLogger(__name__)
+
+SPILL_PATH = Path(os.getenv("LOG_SPILL_PATH", str(Path(__file__).resolve().parents[2] / "data" / "log_spill.jsonl")))
+
+
+def _vps() -> tuple:
+    config = get_config()
+    return config.vps_url, config.exec_token
+
+
+class LogShipper:
+    """
+    ส่ง log ไป {VPS_URL}/log แบบรวม batch ด้วย thread เบื้องหลัง — ship() ไม่ block เสมอ
+    - queue เต็ม / ส่งไม่สำเร็จ → เขียนต่อท้ายไฟล์ spill (เกิน max_spill_bytes = ทิ้ง)
+    - ส่ง batch สำเร็จเมื่อไร ค่อยส่งของใน spill ตามไป
+    - ไม่มี VPS_URL = ไม่ทำอะไร (เหมือน _send_log เดิม)
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 5000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        timeout: float = 5.0,
+        spill_path: Optional[Path] = SPILL_PATH,
+        max_spill_bytes: int = 5_000_000,
+    ) -> None:
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_queue)
+        self._batch_size = int(batch_size)
+        self._flush_interval = float(flush_interval)
+        self._timeout = float(timeout)
+        self._spill_path = Path(spill_path) if spill_path else None
+        self._max_spill_bytes = int(max_spill_bytes)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self.stats = {"queued": 0, "sent": 0, "batches": 0, "failed": 0, "spilled": 0, "dropped": 0}
+
+    # ---------- producer ----------
+    def ship(self, msg: str) -> bool:
+        """เข้าคิว (True) / ลง spill หรือทิ้งเมื่อคิวเต็ม (False) — ไม่ block"""
+        if not _vps()[0]:
+            return False
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(str(msg))
+        except queue.Full:
+            self._spill([str(msg)])
+            return False
+        with self._lock:
+            self.stats["queued"] += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """รอให้คิวว่าง (ใช้ตอนปิดโปรแกรม/เทสต์) — คืน False ถ้าหมดเวลา"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # ---------- worker ----------
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-shipper", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self._post(batch):
+                    self._drain_spill()
+                else:
+                    self._spill(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _post(self, msgs: List[str]) -> bool:
+        url, token = _vps()
+        if not url:
+            with self._lock:
+                self.stats["dropped"] += len(msgs)
+            return True
+        try:
+            r = req.post(
+                f"{url}/log",
+                json={"msgs": msgs},
+                headers={"X-EXEC-TOKEN": token},
+                timeout=self._timeout,
+            )
+            if r is not None and getattr(r, "status_code", 200) >= 400:
+                raise RuntimeError(f"HTTP {r.status_code}")
+        except Exception as e:
+            logger.debug(f"log batch ส่งไม่สำเร็จ ({len(msgs)} ข้อความ): {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+            return False
+        with self._lock:
+            self.stats["sent"] += len(msgs)
+            self.stats["batches"] += 1
+        return True
+
+    # ---------- spill ----------
+    def _spill(self, msgs: List[str]) -> None:
+        path = self._spill_path
+        with self._spill_lock:
+            size = path.stat().st_size if path is not None and path.exists() else 0
+            if path is None or size >= self._max_spill_bytes:
+                with self._lock:
+                    self.stats["dropped"] += len(msgs)
+                return
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with path.open("a", encoding="utf-8") as f:
+                    for m in msgs:
+                        f.write(json.dumps(m, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.debug(f"เขียน log spill ไม่ได้: {e}")
+                with self._lock:
+                    self.stats["dropped"] += len(msgs)
+                return
+        with self._lock:
+            self.stats["spilled"] += len(msgs)
+
+    def _drain_spill(self) -> None:
+        """
+        ส่งของใน spill ตามไป — ย้ายไฟล์เป็น .draining ก่อน (ship ที่ spill ระหว่างนี้ลงไฟล์ใหม่ได้ไม่ block)
+        - บรรทัดที่อ่าน JSON ไม่ได้ → ข้าม + log (ไม่ทำให้ thread ตาย / ไม่ทิ้งบรรทัดอื่น)
+        - ลบ .draining หลังส่งครบ / ส่วนที่ยังไม่ได้ส่งกลับลง spill แล้วเท่านั้น
+          process ตายกลางทาง → .draining ค้างไว้ ส่งซ้ำรอบหน้า (ได้ซ้ำดีกว่าหาย)
+        """
+        path = self._spill_path
+        if path is None:
+            return
+        draining = path.with_name(path.name + ".draining")
+        with self._spill_lock:
+            if not draining.exists():
+                if not path.exists():
+                    return
+                try:
+                    os.replace(path, draining)
+                except OSError:
+                    return
+        try:
+            lines = draining.read_text(encoding="utf-8", errors="replace").splitlines()
+        except OSError:
+            return
+        msgs: List[str] = []
+        bad = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                msgs.append(str(json.loads(line)))
+            except ValueError:
+                bad += 1
+        if bad:
+            logger.warning(f"log spill: ข้าม {bad} บรรทัดที่อ่านไม่ได้ ({draining})")
+            with self._lock:
+                self.stats["dropped"] += bad
+        for i in range(0, len(msgs), self._batch_size):
+            if not self._post(msgs[i : i + self._batch_size]):
+                self._spill(msgs[i:])
+                break
+        try:
+            draining.unlink()
+        except OSError:
+            pass
+
+_SHIPPER = LogShipper()
+atexit.register(_SHIPPER.flush, 2.0)
+
+
+def log_shipper() -> LogShipper:
+    return _SHIPPER
+
+
+def ship_log(msg: str) -> bool:
+    return _SHIPPER.ship(msg)
@@ -0,0 +1,275 @@
+# app/services/signal_dispatcher.py
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import requests as req
+
+from app.config.runtime_config import get_config
+from app.config.wave_settings import SIGNAL_MAX_AGE_SEC, TIMEFRAMES
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = Path(
+    os.getenv("SIGNAL_OUTBOX_DB", str(Path(__file__).resolve().parents[2] / "data" / "signal_outbox.db"))
+)
+
+PENDING, SENDING, SENT, FAILED = "PENDING", "SENDING", "SENT", "FAILED"
+
+_BAR_SEC = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def default_max_age() -> float:
+    """อายุสูงสุดของ signal ในคิว = SIGNAL_MAX_AGE_SEC แต่ไม่เกิน 1 แท่งของ primary timeframe ที่สั้นสุด"""
+    bars = [int(tf[:-1]) * _BAR_SEC[tf[-1].lower()] for tf in TIMEFRAMES if tf[-1].lower() in _BAR_SEC]
+    return float(min([SIGNAL_MAX_AGE_SEC, *bars]))
+
+
+def _vps() -> tuple:
+    config = get_config()
+    return config.vps_url, config.exec_token
+
+
+def dedupe_key(symbol: str, direction: str, trade_plan: Dict) -> str:
+    entry = trade_plan.get("entry")
+    entry = round(float(entry), 8) if entry is not None else None
+    return f"{symbol.upper()}|{direction.upper()}|{entry}"
+
+
+class SignalDispatcher:
+    """
+    คิวส่ง signal ไป {VPS_URL}/execute — submit() ไม่ block, worker thread ส่งพร้อมกันได้หลายตัว
+    - outbox อยู่ใน SQLite → process restart แล้วของที่ค้าง (PENDING/SENDING) ถูกส่งต่อ
+    - ส่งไม่สำเร็จ (network / HTTP 5xx) → retry แบบ exponential backoff จนครบ max_attempts
+      HTTP 4xx = ปฏิเสธถาวร ไม่ retry
+    - dedupe ด้วย (symbol, direction, entry): มีในคิวอยู่แล้วหรือส่งไปแล้วภายใน dedupe_ttl = ไม่ส่งซ้ำ
+    - รายการที่ค้างนานกว่า max_age (None = default_max_age()) → FAILED last_error="expired" ไม่ส่ง
+      (entry / SL / TP เก่าแล้ว เช่นหลัง downtime)
+    """
+
+    def __init__(
+        self,
+        db_path: Path = OUTBOX_PATH,
+        workers: int = 2,
+        max_attempts: int = 5,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        timeout: float = 10.0,
+        dedupe_ttl: float = 24 * 3600,
+        max_age: Optional[float] = None,
+        clock: Optional[Callable[[], float]] = None,
+    ) -> None:
+        self._db_path = Path(db_path)
+        self._workers = max(1, int(workers))
+        self._max_attempts = int(max_attempts)
+        self._base_delay = float(base_delay)
+        self._max_delay = float(max_delay)
+        self._timeout = float(timeout)
+        self._dedupe_ttl = float(dedupe_ttl)
+        self._max_age = float(max_age) if max_age is not None else default_max_age()
+        self._clock = clock or time.time
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._threads: List[threading.Thread] = []
+        self._in_flight = 0
+        self.stats = {"submitted": 0, "deduped": 0, "sent": 0, "retries": 0, "failed": 0, "expired": 0}
+        self._init_db()
+
+    # ---------- storage ----------
+    def _conn(self) -> sqlite3.Connection:
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self._db_path), timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self) -> None:
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS signal_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedupe_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_key ON signal_outbox (dedupe_key)")
+            # ค้างกลางการส่งตอน process ตาย → ส่งใหม่ (at-least-once) ถ้ายังไม่หมดอายุ
+            self._expire(conn, (PENDING, SENDING))
+            conn.execute("UPDATE signal_outbox SET status=? WHERE status=?", (PENDING, SENDING))
+            conn.commit()
+
+    def _expire(self, conn: sqlite3.Connection, statuses: tuple) -> int:
+        """รายการใน statuses ที่เก่ากว่า max_age → FAILED "expired" (ไม่ commit เอง)"""
+        marks = ", ".join("?" * len(statuses))
+        cur = conn.execute(
+            f"UPDATE signal_outbox SET status=?, last_error=? WHERE status IN ({marks}) AND created_at<?",
+            (FAILED, "expired", *statuses, self._clock() - self._max_age),
+        )
+        if cur.rowcount > 0:
+            self.stats["expired"] += cur.rowcount
+            logger.warning(f"signal หมดอายุ (> {self._max_age:.0f}s) ไม่ส่ง {cur.rowcount} รายการ")
+        return cur.rowcount
+
+    # ---------- producer ----------
+    def submit(self, symbol: str, direction: str, trade_plan: Dict) -> bool:
+        """เข้าคิว (True) / ซ้ำกับของที่มีอยู่ (False)"""
+        key = dedupe_key(symbol, direction, trade_plan)
+        now = self._clock()
+        payload = json.dumps({"symbol": symbol, "direction": direction, "trade_plan": trade_plan}, default=str)
+        with self._lock:
+            with self._conn() as conn:
+                dup = conn.execute(
+                    "SELECT 1 FROM signal_outbox WHERE dedupe_key=? AND "
+                    "(status IN (?, ?) OR (status=? AND created_at>=?)) LIMIT 1",
+                    (key, PENDING, SENDING, SENT, now - self._dedupe_ttl),
+                ).fetchone()
+                if dup is not None:
+                    self.stats["deduped"] += 1
+                    return False
+                conn.execute(
+                    "INSERT INTO signal_outbox (dedupe_key, payload, status, attempts, next_at, created_at) "
+                    "VALUES (?, ?, ?, 0, ?, ?)",
+                    (key, payload, PENDING, now, now),
+                )
+                conn.commit()
+            self.stats["submitted"] += 1
+            self._wake.notify()
+        self.start()
+        return True
+
+    def pending(self) -> List[Dict]:
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT * FROM signal_outbox WHERE status IN (?, ?) ORDER BY id", (PENDING, SENDING)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """รอจนไม่มีรายการที่ถึงกำหนดส่งค้างอยู่ (รายการที่รอ backoff ไม่นับ)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                busy = self._in_flight > 0 or self._due_count() > 0
+            if not busy:
+                return True
+            time.sleep(0.01)
+        return False
+
+    # ---------- workers ----------
+    def start(self) -> None:
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self._workers:
+                t = threading.Thread(target=self._run, name=f"signal-dispatch-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _due_count(self) -> int:
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM signal_outbox WHERE status=? AND next_at<=?", (PENDING, self._clock())
+            ).fetchone()
+        return int(row[0])
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        with self._conn() as conn:
+            self._expire(conn, (PENDING,))
+            row = conn.execute(
+                "SELECT * FROM signal_outbox WHERE status=? AND next_at<=? ORDER BY next_at, id LIMIT 1",
+                (PENDING, self._clock()),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE signal_outbox SET status=? WHERE id=?", (SENDING, row["id"]))
+            conn.commit()
+        return row
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                row = self._claim()
+                if row is None:
+                    self._wake.wait(timeout=1.0)
+                    continue
+                self._in_flight += 1
+            try:
+                self._deliver(row)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def _deliver(self, row: sqlite3.Row) -> None:
+        payload = json.loads(row["payload"])
+        symbol = payload.get("symbol")
+        attempts = int(row["attempts"]) + 1
+        error, permanent = self._post(payload)
+
+        with self._lock:
+            with self._conn() as conn:
+                if error is None:
+                    conn.execute("UPDATE signal_outbox SET status=?, attempts=? WHERE id=?", (SENT, attempts, row["id"]))
+                    self.stats["sent"] += 1
+                    logger.info(f"[{symbol}] ส่ง signal ไป VPS สำเร็จ")
+                elif permanent or attempts >= self._max_attempts:
+                    conn.execute(
+                        "UPDATE signal_outbox SET status=?, attempts=?, last_error=? WHERE id=?",
+                        (FAILED, attempts, error, row["id"]),
+                    )
+                    self.stats["failed"] += 1
+                    logger.error(f"[{symbol}] ส่ง signal ไป VPS ล้มเหลว (attempt {attempts}): {error}")
+                else:
+                    delay = min(self._max_delay, self._base_delay * (2 ** (attempts - 1)))
+                    conn.execute(
+                        "UPDATE signal_outbox SET status=?, attempts=?, next_at=?, last_error=? WHERE id=?",
+                        (PENDING, attempts, self._clock() + delay, error, row["id"]),
+                    )
+                    self.stats["retries"] += 1
+                    logger.warning(f"[{symbol}] ส่ง signal ไม่สำเร็จ retry ใน {delay:.0f}s: {error}")
+                conn.commit()
+
+    def _post(self, payload: Dict) -> tuple:
+        """(error หรือ None, เป็น error ถาวรไหม)"""
+        url, token = _vps()
+        if not url.startswith("http"):
+            return "VPS_URL not set", False
+        try:
+            r = req.post(f"{url}/execute", json=payload, headers={"X-EXEC-TOKEN": token}, timeout=self._timeout)
+        except Exception as e:
+            return str(e), False
+        status = getattr(r, "status_code", 200) if r is not None else 200
+        if status >= 500:
+            return f"HTTP {status}", False
+        if status >= 400:
+            return f"HTTP {status}", True
+        return None, False
+
+
+_DISPATCHER: Optional[SignalDispatcher] = None
+_DISPATCHER_LOCK = threading.Lock()
+
+
+def signal_dispatcher() -> SignalDispatcher:
+    """dispatcher กลาง — สร้างครั้งแรกที่ใช้ แล้วส่งของค้างจากรอบก่อนต่อทันที"""
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is None:
+            _DISPATCHER = SignalDispatcher()
+            _DISPATCHER.start()
+            atexit.register(_DISPATCHER.flush, 2.0)
+        return _DISPATCHER
+
+
+def dispatch_signal(symbol: str, direction: str, trade_plan: Dict) -> bool:
+    return signal_dispatcher().submit(symbol, direction, trade_plan)
@@ -1,19 +1,18 @@
 # app/services/telegram_reporter.py
-import os
 import requests
 
+from app.config.runtime_config import get_config
+
 
 def _tg_api_url(method: str, token: str) -> str:
     return f"https://api.telegram.org/bot{token}/{method}"
 
 
 def send_message(text: str, topic_id: str | int | None = None) -> None:
-    TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
-    TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "").strip()
-
-    # รองรับหลายชื่อ env
-    TELEGRAM_TOPIC_ID = (os.getenv("TELEGRAM_TOPIC_ID") or "").strip()
-    TELEGRAM_TOPIC_ID = TELEGRAM_TOPIC_ID.strip()
+    config = get_config()
+    TELEGRAM_BOT_TOKEN = config.telegram_bot_token
+    TELEGRAM_CHAT_ID = config.telegram_chat_id
+    TELEGRAM_TOPIC_ID = config.telegram_topic_id
 
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         print("\n====== TELEGRAM PREVIEW ======")
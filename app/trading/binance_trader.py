@@ -232,6 +232,14 @@ def get_open_positions() -> list:
     return [p for p in positions if float(p.get("positionAmt", 0)) != 0]
 
 
+def find_live_position(symbol: str) -> dict | None:
+    """position ที่เปิดอยู่จริงบน Binance ของ symbol นี้ (ไม่มี = None)"""
+    for p in get_open_positions():
+        if p.get("symbol") == symbol and float(p.get("positionAmt", 0)) != 0:
+            return p
+    return None
+
+
 def cancel_order(symbol: str, order_id: int) -> dict:
     api_key, secret = _get_keys()
     params: dict[str, Any] = {
@@ -1,5 +1,11 @@
 # app/trading/position_sizer.py
 
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
 def calculate_quantity(balance: float, risk_pct: float, entry: float, sl: float) -> float:
     """
     balance  = เงินในพอร์ต (USDT)
@@ -16,4 +22,172 @@ def calculate_quantity(balance: float, risk_pct: float, entry: float, sl: float)
         return 0.0
 
     qty = risk_amount / sl_distance
-    return round(qty, 6)
\ No newline at end of file
+    return round(qty, 6)
+
+
+# ─────────────────────────────────────────────
+# Monte Carlo: risk-of-ruin / drawdown / risk fraction
+# ─────────────────────────────────────────────
+# แต่ละไม้ equity *= (1 + f * R) — f คือ risk_pct เดียวกับ calculate_quantity
+# สุ่ม R แบบ bootstrap จากผลจริง (backtest / compute_metrics) เป็นเมทริกซ์ (paths × trades)
+# แล้วคำนวณบน log-equity: cumsum → running peak → drawdown ทั้งเมทริกซ์ในครั้งเดียว
+
+RUIN_LEVEL = 0.5  # equity เหลือ ≤ 50% ของทุนตั้งต้นเมื่อไหร่ = ruin
+MC_CHUNK_PATHS = 10_000  # สุ่มทีละก้อน (10k × 100 ไม้ ≈ 8MB float64) — ก้อนเล็กอยู่ใน cache เร็วกว่าก้อนใหญ่
+DEFAULT_RISK_FRACTIONS = (0.0025, 0.005, 0.01, 0.015, 0.02, 0.03, 0.04, 0.05, 0.075, 0.1)
+_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+_EQUITY_FLOOR = 1e-300
+
+
+def r_multiples_from(source: Any) -> np.ndarray:
+    """
+    ดึง R-multiple ออกมาเป็น numpy array จากแหล่งที่มีในระบบ
+    - dict จาก metrics.compute_metrics (key "r_multiples")
+    - dict ผล backtest ที่มี "trades"
+    - list ของ trade dict ("r_multiple") / object ที่มี attribute r_multiple (live_mirror_bt)
+    - list / array ของตัวเลข
+    ค่า None / NaN / inf ถูกตัดทิ้ง
+    """
+    if isinstance(source, dict):
+        if "r_multiples" in source:
+            source = source["r_multiples"]
+        else:
+            source = source.get("trades") or []
+
+    values: List[float] = []
+    for item in source if source is not None else []:
+        if isinstance(item, dict):
+            item = item.get("r_multiple")
+        elif hasattr(item, "r_multiple"):
+            item = item.r_multiple
+        if item is None:
+            continue
+        try:
+            values.append(float(item))
+        except (TypeError, ValueError):
+            continue
+
+    arr = np.asarray(values, dtype=float)
+    return arr[np.isfinite(arr)]
+
+
+def max_risk_fraction(r_multiples: Sequence[float]) -> float:
+    """f สูงสุดที่ไม้เสียหนักสุดยังไม่ทำให้ equity ≤ 0 (1 / |R ต่ำสุด|) — ไม่มีไม้ขาดทุน = inf"""
+    r = np.asarray(r_multiples, dtype=float)
+    worst = float(r.min()) if r.size else 0.0
+    return math.inf if worst >= 0 else 1.0 / -worst
+
+
+def _path_stats(
+    log_growth: np.ndarray,
+    n_paths: int,
+    n_trades: int,
+    log_ruin: float,
+    rng: np.random.Generator,
+    chunk_paths: int,
+) -> np.ndarray:
+    """
+    สุ่ม path ทีละก้อนแล้วเก็บแค่สถิติต่อ path — คืน (len(log_growth), 3, n_paths):
+    [0] log equity สุดท้าย, [1] max drawdown (log), [2] ruin (1/0)
+    ทุก f ใช้ index ชุดเดียวกัน (common random numbers) → เทียบ f กันได้โดย noise ไม่กลบ
+    """
+    n_f = log_growth.shape[0]
+    out = np.empty((n_f, 3, n_paths), dtype=float)
+
+    for start in range(0, n_paths, chunk_paths):
+        stop = min(start + chunk_paths, n_paths)
+        idx = rng.integers(0, log_growth.shape[1], size=(stop - start, n_trades))
+
+        for k in range(n_f):
+            cum = np.cumsum(log_growth[k][idx], axis=1)
+            peak = np.maximum(np.maximum.accumulate(cum, axis=1), 0.0)
+            out[k, 0, start:stop] = cum[:, -1]
+            out[k, 1, start:stop] = (peak - cum).max(axis=1)
+            out[k, 2, start:stop] = cum.min(axis=1) <= log_ruin
+
+    return out
+
+
+def _summarize(risk_fraction: float, stats: np.ndarray, n_trades: int) -> Dict[str, Any]:
+    final_log, dd_log, ruined = stats
+    dd_pct = -np.expm1(-dd_log) * 100.0  # log drawdown → % จาก peak
+    final_q = np.exp(np.quantile(final_log, (0.05, 0.5)))
+    dd_q = np.quantile(dd_pct, _QUANTILES)
+
+    return {
+        "risk_fraction": risk_fraction,
+        "risk_of_ruin": round(float(ruined.mean()), 6),
+        "max_dd_pct": {f"p{int(q * 100)}": round(float(v), 3) for q, v in zip(_QUANTILES, dd_q)},
+        "final_equity_p5": round(float(final_q[0]), 6),
+        "final_equity_median": round(float(final_q[1]), 6),
+        "log_growth_per_trade": float(final_log.mean()) / n_trades,
+    }
+
+
+def simulate_risk_fractions(
+    r_multiples: Any,
+    risk_fractions: Iterable[float] = DEFAULT_RISK_FRACTIONS,
+    n_paths: int = 100_000,
+    n_trades: int = 100,
+    ruin_level: float = RUIN_LEVEL,
+    seed: Optional[int] = None,
+    chunk_paths: int = MC_CHUNK_PATHS,
+) -> List[Dict[str, Any]]:
+    """
+    Monte Carlo หลาย risk fraction พร้อมกัน → list สถิติต่อ f (เรียงตามที่ส่งมา)
+    r_multiples: อะไรก็ได้ที่ r_multiples_from รับ
+    ruin_level: สัดส่วนของทุนตั้งต้น (0.5 = equity เคยลงถึงครึ่งหนึ่ง)
+    f เกิน max_risk_fraction → path ที่สุ่มโดนไม้เสียหนักสุด equity เหลือ 0 (ruin, drawdown 100%)
+    """
+    r = r_multiples_from(r_multiples)
+    fractions = [float(f) for f in risk_fractions]
+    if r.size == 0 or not fractions or n_paths <= 0 or n_trades <= 0:
+        return []
+
+    # ไม้ที่ทำ equity ≤ 0 → floor ที่ 1e-300 (log ≈ -690) แทน -inf ให้ quantile / mean ยังเป็นตัวเลข
+    log_growth = np.log(np.maximum(1.0 + np.outer(fractions, r), _EQUITY_FLOOR))
+
+    rng = np.random.default_rng(seed)
+    log_ruin = math.log(ruin_level) if ruin_level > 0 else -math.inf
+    stats = _path_stats(log_growth, n_paths, n_trades, log_ruin, rng, max(1, int(chunk_paths)))
+    return [_summarize(f, stats[k], n_trades) for k, f in enumerate(fractions)]
+
+
+def simulate_risk_of_ruin(
+    r_multiples: Any,
+    risk_fraction: float,
+    n_paths: int = 100_000,
+    n_trades: int = 100,
+    ruin_level: float = RUIN_LEVEL,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Monte Carlo ที่ risk fraction เดียว (เช่น trade_executor.RISK_PCT) — ไม่มีข้อมูล R → {}"""
+    rows = simulate_risk_fractions(r_multiples, [risk_fraction], n_paths, n_trades, ruin_level, seed)
+    return rows[0] if rows else {}
+
+
+def optimal_risk_fraction(
+    r_multiples: Any,
+    risk_fractions: Iterable[float] = DEFAULT_RISK_FRACTIONS,
+    max_ruin: float = 0.01,
+    n_paths: int = 100_000,
+    n_trades: int = 100,
+    ruin_level: float = RUIN_LEVEL,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    เลือก f ที่ log growth ต่อไม้สูงสุด (Kelly เชิงประจักษ์) โดย risk_of_ruin ≤ max_ruin
+    ค่า f ที่ได้ใช้เป็น risk_pct ของ calculate_quantity ได้ตรง ๆ
+    ไม่มี f ไหนผ่าน / edge ติดลบ (growth ≤ 0 ทุกตัว) → risk_fraction = 0.0
+    """
+    rows = simulate_risk_fractions(r_multiples, risk_fractions, n_paths, n_trades, ruin_level, seed)
+    ok = [row for row in rows if row["risk_of_ruin"] <= max_ruin and row["log_growth_per_trade"] > 0]
+    best = max(ok, key=lambda row: row["log_growth_per_trade"]) if ok else None
+
+    return {
+        "risk_fraction": best["risk_fraction"] if best else 0.0,
+        "best": best,
+        "max_ruin": max_ruin,
+        "n_samples": int(r_multiples_from(r_multiples).size),
+        "table": rows,
+    }
@@ -1,14 +1,15 @@
 # app/trading/position_watcher.py
-import os
 import time
 import threading
 
 from app.state.position_manager import list_armed_signals, clear_armed_signal
 from app.trading.trade_executor import execute_signal
-from app.config.wave_settings import TIMEFRAME
+from app.config.runtime_config import get_config
+from app.risk.portfolio_risk import sync_portfolio_risk
+from app.config.wave_settings import TIMEFRAMES
 from app.state.position_manager import list_active_positions, _key, _save_position, asdict  # type: ignore
 from app.trading.binance_trader import (
-    get_open_positions,
+    find_live_position as _find_live_position,
     get_mark_price,
     close_market_reduce_only,
     adjust_quantity,
@@ -17,16 +18,6 @@ from app.trading.binance_trader import (
 
 _T = None
 
-W1 = float(os.getenv("TP1_WEIGHT", "0.30"))
-W2 = float(os.getenv("TP2_WEIGHT", "0.30"))
-W3 = float(os.getenv("TP3_WEIGHT", "0.40"))
-WATCH_SEC = float(os.getenv("WATCH_INTERVAL_SEC", "5"))
-
-def _find_live_position(symbol: str):
-    for p in get_open_positions():
-        if p.get("symbol") == symbol and float(p.get("positionAmt", 0)) != 0:
-            return p
-    return None
 
 def _close_qty(symbol: str, close_side: str, qty: float, pos_side: str | None):
     qty = adjust_quantity(symbol, qty)
@@ -44,14 +35,19 @@ def _armed_triggered(direction: str, mark: float, trigger: float) -> bool:
     return False
 
 def _loop():
-    print(f"[WATCHER] start loop timeframe={TIMEFRAME} interval={WATCH_SEC}", flush=True)
+    print(f"[WATCHER] start loop timeframes={TIMEFRAMES} interval={get_config().watch_interval_sec}", flush=True)
     while True:
+        # TP weight / interval จาก config snapshot — reload_config() มีผลรอบถัดไป
+        config = get_config()
         try:
+            # covariance ของ portfolio risk: ป้อนแท่ง 1D ที่เพิ่งปิด (ไม่มีแท่งใหม่ = ไม่ยิง request)
+            sync_portfolio_risk()
+
             # =========================
             # ARMED SIGNALS (pending trigger)
             # =========================
-            armed = list_armed_signals(TIMEFRAME)
-            for s in armed:
+            armed = [(tf, s) for tf in TIMEFRAMES for s in list_armed_signals(tf)]
+            for tf, s in armed:
                 sym = (s.get("symbol") or "").upper()
                 direction = (s.get("direction") or "").upper()
                 trigger_price = float(s.get("trigger_price") or 0.0)
@@ -62,7 +58,7 @@ def _loop():
                 # ถ้ามี position อยู่แล้ว → เคลียร์ ARMED กันซ้ำ
                 live = _find_live_position(sym)
                 if live:
-                    clear_armed_signal(sym, TIMEFRAME)
+                    clear_armed_signal(sym, tf)
                     continue
 
                 try:
@@ -77,14 +73,15 @@ def _loop():
                     payload = {
                         "symbol": sym,
                         "direction": direction,
+                        "timeframe": tf,
                         "trade_plan": s.get("trade_plan") or {},
                         "meta": s.get("meta") or {},
                     }
                     execute_signal(payload)
                     # เคลียร์เพื่อไม่ยิงซ้ำทุก 5 วิ
-                    clear_armed_signal(sym, TIMEFRAME)
+                    clear_armed_signal(sym, tf)
 
-            actives = list_active_positions(TIMEFRAME)
+            actives = [pos for tf in TIMEFRAMES for pos in list_active_positions(tf)]
             for pos in actives:
                 sym = pos.symbol
 
@@ -158,7 +155,7 @@ def _loop():
 
                 tp1_hit = (mark >= pos.tp1) if direction == "LONG" else (mark <= pos.tp1)
                 if (not pos.tp1_hit) and tp1_hit:
-                    q = min(cur_qty, pos.qty * W1)
+                    q = min(cur_qty, pos.qty * config.tp1_weight)
                     if _close_qty(sym, close_side, q, pos_side):
                         pos.tp1_hit = True
                         pos.remaining_qty = max(0.0, pos.remaining_qty - q)
@@ -166,7 +163,7 @@ def _loop():
 
                 tp2_hit = (mark >= pos.tp2) if direction == "LONG" else (mark <= pos.tp2)
                 if (not pos.tp2_hit) and tp2_hit:
-                    q = min(cur_qty, pos.qty * W2)
+                    q = min(cur_qty, pos.qty * config.tp2_weight)
                     if _close_qty(sym, close_side, q, pos_side):
                         pos.tp2_hit = True
                         pos.remaining_qty = max(0.0, pos.remaining_qty - q)
@@ -186,7 +183,7 @@ def _loop():
             import traceback
             print("WATCHER_ERROR:", e, flush=True)
             print(traceback.format_exc(), flush=True)
-        time.sleep(WATCH_SEC)
+        time.sleep(config.watch_interval_sec)
 
 def start_position_watcher():
     global _T
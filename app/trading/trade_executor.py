@@ -16,11 +16,13 @@ from app.trading.binance_trader import (
     set_leverage,
     set_margin_type,
     adjust_quantity,
+    find_live_position,
 )
 
 from app.trading.position_sizer import calculate_quantity
-from app.state.position_manager import lock_new_position, get_active
-from app.config.wave_settings import TIMEFRAME
+from app.state.position_manager import lock_new_position, get_active, list_active_positions
+from app.config.wave_settings import TIMEFRAME, TIMEFRAMES
+from app.risk.portfolio_risk import portfolio_risk, position_weights
 
 RISK_PCT = 0.02
 MIN_NOTIONAL_USDT = 20.0
@@ -69,10 +71,35 @@ def _recalculate_plan(direction: str, actual_entry: float, sl: float, tp_rr: flo
     }
 
 
+def _portfolio_risk_ok(symbol: str, direction: str, notional: float, balance: float) -> bool:
+    """เช็ค volatility รวมของพอร์ตเมื่อเพิ่ม position นี้ (correlation กับ position ที่เปิดอยู่)"""
+    risk = portfolio_risk()
+    actives = [pos for tf in TIMEFRAMES for pos in list_active_positions(tf)]
+    risk.set_positions(position_weights(actives, balance))
+    check = risk.check(symbol, direction, notional, balance)
+    print(f"[{symbol}] portfolio risk: {check['reason']}", flush=True)
+    return bool(check["allowed"])
+
+
+def _active_on_any_timeframe(symbol: str, timeframe: str):
+    """
+    position ใน DB ของ symbol นี้จาก timeframe ใดก็ได้
+    key แยกต่อ timeframe แต่ Binance (ONEWAY) มี position สุทธิเดียวต่อ symbol
+    → 4H เปิดทับ 1D = เพิ่ม size ให้ position เดิม และ watcher จะปิด TP/ย้าย SL ซ้ำสองรอบ
+    """
+    for tf in dict.fromkeys([timeframe, *TIMEFRAMES]):
+        pos = get_active(symbol, tf)
+        if pos:
+            return pos
+    return None
+
+
 def execute_signal(signal: dict) -> bool:
     symbol     = signal["symbol"]
     direction  = signal["direction"]
     trade_plan = signal["trade_plan"]
+    # position key แยกต่อ primary timeframe (4H ไม่ชน 1D)
+    timeframe  = signal.get("timeframe") or trade_plan.get("timeframe") or TIMEFRAME
 
     entry_est = float(trade_plan["entry"])
     sl_orig   = float(trade_plan["sl"])
@@ -80,9 +107,10 @@ def execute_signal(signal: dict) -> bool:
 
     open_side = "BUY" if direction == "LONG" else "SELL"
 
-    # ── กันเปิดซ้ำ ──
-    if get_active(symbol, TIMEFRAME):
-        print(f"⚠️ [{symbol}] มี position อยู่แล้ว")
+    # ── กันเปิดซ้ำ (ทุก timeframe — position บน exchange มีตัวเดียวต่อ symbol) ──
+    active = _active_on_any_timeframe(symbol, timeframe)
+    if active:
+        print(f"⚠️ [{symbol}] มี position อยู่แล้ว (tf={active.timeframe})")
         return False
 
     # ✅ DRY RUN
@@ -92,11 +120,22 @@ def execute_signal(signal: dict) -> bool:
         if quantity <= 0:
             print(f"❌ [{symbol}] quantity = 0")
             return False
+        if not _portfolio_risk_ok(symbol, direction, quantity * entry_est, balance):
+            return False
         print("🧪 DRY_RUN=1 → ไม่ยิงออเดอร์จริง")
         print(f"[{symbol}] side={open_side} balance={balance} qty={quantity} entry_est={entry_est} sl={sl_orig} tp2={tp2_orig}")
         return True
 
     # ── ของจริง ──
+    try:
+        live = find_live_position(symbol)
+    except Exception as e:
+        print(f"❌ [{symbol}] เช็ค position บน Binance ไม่ได้ → skip: {e}", flush=True)
+        return False
+    if live:
+        print(f"⚠️ [{symbol}] มี position บน Binance อยู่แล้ว (amt={live.get('positionAmt')})")
+        return False
+
     balance = get_balance()
 
     fixed_notional = FIXED_NOTIONAL_USDT.get(symbol)
@@ -117,6 +156,10 @@ def execute_signal(signal: dict) -> bool:
     if notional > max_notional and entry_est > 0:
         quantity = round(max_notional / entry_est, 6)
 
+    # ── CAP ความเสี่ยงรวมของพอร์ต ──
+    if not _portfolio_risk_ok(symbol, direction, quantity * entry_est, balance):
+        return False
+
     # ── เตรียม leverage / margin ──
     set_margin_type(symbol, "ISOLATED")
     set_leverage(symbol, LEVERAGE)
@@ -188,7 +231,7 @@ def execute_signal(signal: dict) -> bool:
 
     lock_new_position(
         symbol=symbol,
-        timeframe=TIMEFRAME,
+        timeframe=timeframe,
         direction=direction,
         trade_plan={
             "entry": actual_entry,
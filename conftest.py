@@ -0,0 +1,18 @@
+import pytest
+
+from app.analysis import decision_trace
+from app.config.runtime_config import reload_config
+
+
+@pytest.fixture(autouse=True)
+def _runtime_config_snapshot():
+    # config snapshot อ่านจาก env ณ ต้น test และไม่ค้างค่าที่ test ตั้งไว้ไปยัง test ถัดไป
+    reload_config()
+    yield
+    reload_config()
+
+
+@pytest.fixture(autouse=True)
+def _decision_trace_dir(tmp_path, monkeypatch):
+    # scan ใน test เขียน decision trace ลง tmp ไม่ใช่ data/decisions
+    monkeypatch.setattr(decision_trace, "_TRACE", decision_trace.DecisionTrace(str(tmp_path / "decisions")))
@@ -15,7 +15,8 @@ import pandas as pd
 logging.basicConfig(level=logging.WARNING)
 
 # ---- import จากระบบจริง ----
-from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle
+from app.data.binance_fetcher import fetch_ohlcv, drop_unclosed_candle, bar_close_time
+from app.analysis.btc_cycle import PrimaryBiasProvider, fetch_weekly, use_primary_bias
 from app.analysis.pivot import find_fractal_pivots, filter_pivots
 from app.analysis.wave_scenarios import build_scenarios
 from app.risk.risk_manager import build_trade_plan
@@ -25,8 +26,8 @@ from app.indicators.atr import add_atr
 from app.indicators.volume import add_volume_ma, volume_spike
 from app.indicators.trend_filter import trend_filter_ema, allow_direction
 from app.analysis.context_gate import apply_context_gate
-from app.analysis.market_regime import detect_market_regime
-from app.analysis.macro_bias import compute_macro_bias
+from app.analysis.market_regime import market_regime_series
+from app.analysis.macro_bias import macro_bias_series
 from app.config.wave_settings import ABC_CONFIRM_BUFFER
 
 _START_BAR = 250
@@ -84,6 +85,14 @@ def run_backtest_with_flags(symbol: str, interval="1d", limit=1000, min_rr=2.0)
     skipped = Counter()
     in_position = False
     skip_until_bar = 0
+    # 1W ดึงครั้งเดียว → primary bias point-in-time ต่อแท่ง
+    df_1w = fetch_weekly(symbol)
+    primary = PrimaryBiasProvider(
+        weekly={symbol: df_1w} if df_1w is not None and len(df_1w) > 0 else None,
+        allow_fetch=False,
+    )
+    # regime/macro bias ทุกแท่งคำนวณครั้งเดียว (point-in-time เหมือนเรียกบน sub)
+    macro_table = macro_bias_series(market_regime_series(df), df["rsi14"]).to_dict("records")
 
     for i in range(_START_BAR, len(df) - 1):
         if in_position or i < skip_until_bar:
@@ -110,15 +119,15 @@ def run_backtest_with_flags(symbol: str, interval="1d", limit=1000, min_rr=2.0)
             skipped["PIVOT_COUNT"] += 1
             continue
 
-        scenarios = build_scenarios(pivots, macro_trend=macro_trend,
-                                    rsi14=rsi14, volume_spike=is_vol)
+        with use_primary_bias(primary, as_of=bar_close_time(sub)):
+            scenarios = build_scenarios(pivots, macro_trend=macro_trend,
+                                        rsi14=rsi14, volume_spike=is_vol, symbol=symbol)
         if not scenarios:
             skipped["NO_SCENARIO"] += 1
             continue
 
         # --- F_MIN_CONFIDENCE / F_MACRO_BIAS via context_gate ---
-        regime     = detect_market_regime(sub)
-        macro_bias = compute_macro_bias(regime, rsi14=rsi14)
+        macro_bias = dict(macro_table[i])
 
         # ถ้าปิด F_MACRO_BIAS → บังคับ allow ทั้งคู่
         if not FLAGS["F_MACRO_BIAS"]:
@@ -1,4 +1,13 @@
-from app.analysis.wave_rules import validate_impulse, validate_abc
+import random
+
+from app.analysis.wave_rules import (
+    IMPULSE_RULE_NAMES,
+    RuleStats,
+    collect_rule_stats,
+    validate_abc,
+    validate_impulse,
+    validate_windows_batch,
+)
 
 
 def _p(price, ptype):
@@ -163,4 +172,126 @@ class TestABCUp:
             _p(145, "L"),
         ]
         ok, reasons = validate_abc(points, "UP")
-        assert ok is False
\ No newline at end of file
+        assert ok is False
+
+
+# ─────────────────────────────────────────────
+# BATCH
+# ─────────────────────────────────────────────
+
+def _random_chain(rng, n):
+    levels = [80, 90, 100, 105, 110, 120, 125, 130, 140, 150, 160]
+    chain = []
+    for i in range(n):
+        ptype = ("H" if i % 2 else "L") if rng.random() < 0.85 else rng.choice("HL")
+        price = rng.choice(levels) if rng.random() < 0.5 else rng.uniform(50, 200)
+        chain.append(_p(price, ptype))
+    return chain
+
+
+class TestValidateWindowsBatch:
+    def test_empty_chain(self):
+        out = validate_windows_batch([], [])
+        assert len(out["impulse_long"]) == 0
+        assert len(out["abc_up"]) == 0
+
+    def test_mask_lengths(self):
+        chain = _random_chain(random.Random(0), 10)
+        out = validate_windows_batch([p["price"] for p in chain], [p["type"] for p in chain])
+        assert len(out["impulse_short"]) == 5
+        assert len(out["abc_down"]) == 7
+
+    def test_matches_scalar_validators(self):
+        """ผล batch ต้องตรงกับ validator เดิมทุก window ทั้ง pass และจำนวน reasons"""
+        rng = random.Random(42)
+        for _ in range(300):
+            chain = _random_chain(rng, rng.randint(0, 25))
+            out = validate_windows_batch([p["price"] for p in chain], [p["type"] for p in chain])
+
+            for i in range(max(0, len(chain) - 5)):
+                for direction, key in (("LONG", "impulse_long"), ("SHORT", "impulse_short")):
+                    ok, reasons = validate_impulse(chain[i:i + 6], direction)
+                    assert bool(out[key][i]) is ok
+                    if ok:
+                        assert out[key + "_warn"][i] == len(reasons)
+
+            for i in range(max(0, len(chain) - 3)):
+                for direction, key in (("DOWN", "abc_down"), ("UP", "abc_up")):
+                    ok, reasons = validate_abc(chain[i:i + 4], direction)
+                    assert bool(out[key][i]) is ok
+                    if ok:
+                        assert out[key + "_warn"][i] == len(reasons)
+
+
+# ─────────────────────────────────────────────
+# RULE STATS / FAIL FAST
+# ─────────────────────────────────────────────
+
+class TestRuleStats:
+    def test_counts_evaluated_and_rejected(self):
+        points = [
+            _p(100, "L"), _p(150, "H"),
+            _p(90, "L"),  # ❌ wave2 หลุดจุดเริ่ม
+            _p(200, "H"),
+            _p(160, "L"), _p(240, "H"),
+        ]
+        with collect_rule_stats() as stats:
+            validate_impulse(points, "LONG")
+        summary = stats.summary()
+        assert summary["wave2_start"]["evaluated"] == 1
+        assert summary["wave2_start"]["rejected"] == 1
+        assert summary["wave4_overlap"]["rejected"] == 0
+        assert set(IMPULSE_RULE_NAMES) <= set(summary)
+
+    def test_no_stats_outside_scope(self):
+        stats = RuleStats()
+        with collect_rule_stats(stats):
+            pass
+        validate_abc([_p(160, "H"), _p(130, "L"), _p(150, "H"), _p(110, "L")], "DOWN")
+        assert stats.rules == {}
+
+    def test_order_puts_frequent_rejecter_first(self):
+        stats = RuleStats()
+        for _ in range(10):
+            stats.record("wave3_ext", rejected=False, seconds=1e-6)
+            stats.record("wave2_fib", rejected=True, seconds=1e-6)
+        order = stats.order(IMPULSE_RULE_NAMES)
+        assert order[0] == "wave2_fib"
+        assert sorted(order) == sorted(IMPULSE_RULE_NAMES)
+
+
+class TestFailFast:
+    def test_stops_at_first_failure(self):
+        points = [
+            _p(100, "L"), _p(150, "H"),
+            _p(90, "L"),
+            _p(200, "H"),
+            _p(140, "L"),  # ❌ overlap wave1 ด้วย
+            _p(240, "H"),
+        ]
+        ok, reasons = validate_impulse(points, "LONG")
+        assert ok is False and len(reasons) >= 2
+        ok_fast, reasons_fast = validate_impulse(
+            points, "LONG", fail_fast=True, order=["wave4_overlap", "wave2_start"]
+        )
+        assert ok_fast is False
+        assert len(reasons_fast) == 1 and "Wave4" in reasons_fast[0]
+
+    def test_same_result_for_random_windows(self):
+        rng = random.Random(11)
+        order = list(reversed(IMPULSE_RULE_NAMES))
+        for _ in range(500):
+            imp = _random_chain(rng, 6)
+            for direction in ("LONG", "SHORT"):
+                full = validate_impulse(imp, direction)
+                fast = validate_impulse(imp, direction, fail_fast=True, order=order)
+                assert fast[0] == full[0]
+                if full[0]:
+                    assert fast == full
+            abc = _random_chain(rng, 4)
+            for direction in ("UP", "DOWN"):
+                full = validate_abc(abc, direction)
+                fast = validate_abc(abc, direction, fail_fast=True, order=["b_retrace", "c_beyond_a"])
+                assert fast[0] == full[0]
+                if full[0]:
+                    assert fast == full
@@ -0,0 +1,35 @@
+# tests/unit/test_backtest_runner.py
+import numpy as np
+import pandas as pd
+
+from app.backtest import backtest_runner as br
+
+
+def _frame(start, freq, close):
+    return pd.DataFrame({
+        "open_time": pd.date_range(start, periods=len(close), freq=freq, tz="UTC"),
+        "open": close, "high": close, "low": close, "close": close, "volume": 1.0,
+    })
+
+
+def test_weekly_permit_table_is_point_in_time():
+    df_1w = _frame("2015-01-05", "7D", np.linspace(1000.0, 100.0, 300))
+    df = _frame("2019-06-01", "1D", np.full(400, 100.0))
+    table = br._weekly_permit_table(df, df_1w, "BTCUSDT")
+
+    assert len(table) == len(df)
+    close_250 = df_1w["open_time"].iloc[249] + pd.Timedelta(days=7)
+    day_close = df["open_time"] + pd.Timedelta(days=1)
+    before = int((day_close < close_250).sum())
+    assert 0 < before < len(df)
+    assert table[before - 1]["weekly_permit_long"] is True
+    assert table[before]["weekly_trend"] == "BEAR"
+    assert table[before]["weekly_permit_long"] is False
+
+
+def test_mirror_live_filters_reads_given_row():
+    sub = pd.DataFrame({"ema50": [110.0, 111.0], "ema200": [100.0, 101.0]})
+
+    assert br._mirror_live_filters(sub, {"weekly_permit_long": True}, "LONG") is True
+    assert br._mirror_live_filters(sub, {"weekly_permit_long": False}, "LONG") is False
+    assert br._mirror_live_filters(sub, {}, "LONG") is True
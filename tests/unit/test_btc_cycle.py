@@ -6,6 +6,8 @@ from unittest.mock import patch
 from app.analysis.btc_cycle import (
     _calc_atr, _find_weekly_pivots, _count_primary_waves,
     _get_current_wave, analyze_primary_wave, get_primary_bias,
+    PrimaryBiasProvider, closed_weekly_bars, get_cached_primary_bias,
+    last_closed_week_open, primary_bias_at, primary_wave_series, use_primary_bias,
 )
 
 
@@ -170,4 +172,122 @@ class TestGetPrimaryBias:
         with patch("app.analysis.btc_cycle.analyze_primary_wave", return_value=mock):
             result = get_primary_bias()
         assert result["bias"] == "BULLISH"
-        assert result["direction"] == "UP"
\ No newline at end of file
+        assert result["direction"] == "UP"
+
+def _weekly_df(n=60):
+    df = _make_df(n)
+    # Binance 1W เปิดวันจันทร์ 00:00 UTC
+    df["open_time"] = pd.date_range("2023-01-02", periods=n, freq="7D", tz="UTC")
+    return df
+
+
+class TestClosedWeeklyBars:
+    def test_open_week_excluded(self):
+        df = _weekly_df(10)
+        # แท่งสุดท้ายเปิด 2023-03-06 → ปิด 2023-03-13
+        assert len(closed_weekly_bars(df, "2023-03-12")) == 9
+        assert len(closed_weekly_bars(df, "2023-03-13")) == 10
+
+    def test_last_closed_week_open(self):
+        # พุธ 2024-05-15 → สัปดาห์ที่ปิดล่าสุดเปิด จันทร์ 2024-05-06
+        ts = last_closed_week_open(pd.Timestamp("2024-05-15 10:00", tz="UTC"))
+        assert ts == pd.Timestamp("2024-05-06", tz="UTC")
+
+
+def _swing_df(n=120):
+    # คลื่นใหญ่ amplitude โต + noise → มี pivot ผ่าน ATR filter หลายจุด
+    rng = np.random.default_rng(7)
+    closes = 100 * np.exp(0.5 * np.sin(np.arange(n) / 6.0) + np.cumsum(rng.normal(0, 0.02, n)))
+    df = pd.DataFrame({
+        "open":  closes,
+        "high":  closes * (1 + np.abs(rng.normal(0, 0.02, n))),
+        "low":   closes * (1 - np.abs(rng.normal(0, 0.02, n))),
+        "close": closes,
+        "volume": [1000.0] * n,
+    })
+    df["open_time"] = pd.date_range("2020-01-06", periods=n, freq="7D", tz="UTC")
+    return df
+
+
+class TestPrimaryWaveSeries:
+    def test_matches_analyze_on_every_prefix(self):
+        df = _swing_df()
+        series = primary_wave_series(df)
+        assert len(series) == len(df)
+        assert (series["bias"] != "NEUTRAL").any()
+        for t in range(len(df)):
+            result = analyze_primary_wave("BTCUSDT", df.iloc[: t + 1]) if t + 1 >= 20 else {}
+            bias = primary_bias_at(series, t)
+            assert bias["bias"] == (result.get("bias") or "NEUTRAL")
+            assert bias["wave"] == result.get("wave", "?")
+            if result:
+                assert bias["fib_targets"] == result["fib_targets"]
+                assert bias["note"] == result["note"]
+
+    def test_short_frame_is_neutral(self):
+        series = primary_wave_series(_swing_df(19))
+        assert (series["bias"] == "NEUTRAL").all()
+        assert primary_bias_at(series, 18)["wave"] == "?"
+        assert primary_bias_at(series, 99)["bias"] == "NEUTRAL"
+
+    def test_no_lookahead(self):
+        df = _swing_df()
+        full = primary_wave_series(df)
+        head = primary_wave_series(df.iloc[:70])
+        pd.testing.assert_frame_equal(full.iloc[:70], head)
+
+
+class TestPrimaryBiasProvider:
+    def test_computed_once_per_weekly_close(self):
+        provider = PrimaryBiasProvider(weekly={"BTCUSDT": _weekly_df()}, allow_fetch=False)
+        with patch("app.analysis.btc_cycle.primary_wave_series", wraps=primary_wave_series) as mock:
+            for day in range(7):
+                provider.get("BTCUSDT", as_of=pd.Timestamp("2023-12-04", tz="UTC") + pd.Timedelta(days=day))
+        assert mock.call_count == 1
+        assert provider.stats["computed"] == 1
+        assert provider.stats["hits"] == 6
+
+    def test_point_in_time_slice(self):
+        df = _swing_df()
+        provider = PrimaryBiasProvider(weekly={"BTCUSDT": df}, allow_fetch=False)
+        for as_of in ["2020-09-01", "2021-06-15 12:00", "2022-01-03"]:
+            closed = closed_weekly_bars(df, as_of)
+            expected = analyze_primary_wave("BTCUSDT", closed) if len(closed) >= 20 else {}
+            result = provider.get("BTCUSDT", as_of=as_of)
+            assert result["bias"] == (expected.get("bias") or "NEUTRAL")
+            assert result["wave"] == expected.get("wave", "?")
+
+    def test_injected_frame_never_fetches(self):
+        provider = PrimaryBiasProvider(weekly={"BTCUSDT": _weekly_df(5)}, allow_fetch=False)
+        with patch("app.data.binance_fetcher.fetch_ohlcv", side_effect=AssertionError("network")):
+            result = provider.get("BTCUSDT", as_of="2024-01-01")
+            other = provider.get("ETHUSDT", as_of="2024-01-01")
+        assert result["bias"] == "NEUTRAL"
+        assert other["bias"] == "NEUTRAL"
+
+    def test_live_failure_not_cached(self):
+        provider = PrimaryBiasProvider()
+        with patch("app.analysis.btc_cycle.analyze_primary_wave", return_value={}) as mock:
+            provider.get("BTCUSDT")
+            provider.get("BTCUSDT")
+        assert mock.call_count == 2
+
+    def test_scope_overrides_default(self):
+        provider = PrimaryBiasProvider()
+        mock = {"wave": "3", "direction": "UP", "bias": "BULLISH", "fib_targets": {}}
+        with patch("app.analysis.btc_cycle.analyze_primary_wave", return_value=mock):
+            with use_primary_bias(provider, as_of="2023-12-05"):
+                result = get_cached_primary_bias("BTCUSDT")
+        assert result["bias"] == "BULLISH"
+        assert provider.stats["computed"] == 1
+
+    def test_pin_computes_once_then_never_fetches(self):
+        provider = PrimaryBiasProvider()
+        mock = {"wave": "3", "direction": "UP", "bias": "BULLISH", "fib_targets": {}}
+        with patch("app.analysis.btc_cycle.analyze_primary_wave", return_value=mock) as analyze:
+            pinned = provider.pin("BTCUSDT", as_of="2023-12-05")
+        with patch("app.analysis.btc_cycle.analyze_primary_wave", side_effect=AssertionError("network")):
+            with use_primary_bias(pinned, as_of="2023-12-05"):
+                assert get_cached_primary_bias("BTCUSDT")["bias"] == "BULLISH"
+                assert get_cached_primary_bias("ETHUSDT")["bias"] == "NEUTRAL"
+        assert analyze.call_count == 1
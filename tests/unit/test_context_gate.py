@@ -1,4 +1,7 @@
-from app.analysis.context_gate import apply_context_gate
+import pandas as pd
+import pytest
+
+from app.analysis.context_gate import apply_context_gate, context_gate_series
 
 
 def _scenario(direction="LONG", confidence=70.0):
@@ -74,4 +77,29 @@ class TestContextGate:
                 _macro("NEUTRAL", 30.0, allow_long=True, allow_short=True),
                 min_confidence=65.0,
             )
-            assert result is not None, f"{direction} ควรผ่านใน NEUTRAL macro"
\ No newline at end of file
+            assert result is not None, f"{direction} ควรผ่านใน NEUTRAL macro"
+
+
+class TestContextGateSeries:
+    def test_rows_match_apply_context_gate(self):
+        macros = [
+            _macro("LONG", 60.0, allow_long=True, allow_short=False),
+            _macro("LONG", 60.0, allow_long=True, allow_short=False),
+            _macro("SHORT", 70.0, allow_long=False, allow_short=True),
+            _macro("NEUTRAL", 30.0),
+        ]
+        directions = ["LONG", "SHORT", "LONG", "short"]
+        confidences = [70.0, 80.0, 50.0, 60.0]
+        series = context_gate_series(directions, confidences, pd.DataFrame(macros), min_confidence=65.0)
+        assert series["allowed"].tolist() == [True, False, False, False]
+        assert series["gate_reason"].tolist() == [
+            "", "BLOCKED_BY_MACRO(LONG)", "BLOCKED_BY_MACRO(SHORT)", "LOW_CONF(60.0)",
+        ]
+        for i, (d, c) in enumerate(zip(directions, confidences)):
+            single = apply_context_gate(_scenario(d, c), macros[i], min_confidence=65.0)
+            if single is not None:
+                assert single["context_score"] == series["context_score"].iloc[i]
+
+    def test_length_mismatch_raises(self):
+        with pytest.raises(ValueError):
+            context_gate_series(["LONG"], [70.0, 80.0], pd.DataFrame([_macro()]))
@@ -3,6 +3,8 @@ import pytest
 from unittest.mock import patch, MagicMock
 import os
 
+from app.config.runtime_config import reload_config
+
 
 def _make_analysis(symbol="BTCUSDT", conf=90.0, direction="SHORT", price=100.0, triggered=True):
     return {
@@ -61,6 +63,7 @@ class TestCheckPositionFromVps:
     def test_no_vps_url_returns_false(self):
         from app.scheduler.daily_wave_scheduler import _check_position_from_vps
         with patch.dict(os.environ, {"VPS_URL": "", "EXEC_TOKEN": ""}):
+            reload_config()
             assert _check_position_from_vps("BTCUSDT") is False
 
     def test_vps_active_true(self):
@@ -70,12 +73,14 @@ class TestCheckPositionFromVps:
         mock_resp.json.return_value = {"active": True}
         with patch.dict(os.environ, {"VPS_URL": "http://fake", "EXEC_TOKEN": "tok"}), \
              patch("app.scheduler.daily_wave_scheduler.req.get", return_value=mock_resp):
+            reload_config()
             assert _check_position_from_vps("BTCUSDT") is True
 
     def test_vps_exception_returns_false(self):
         from app.scheduler.daily_wave_scheduler import _check_position_from_vps
         with patch.dict(os.environ, {"VPS_URL": "http://fake", "EXEC_TOKEN": "tok"}), \
              patch("app.scheduler.daily_wave_scheduler.req.get", side_effect=Exception("timeout")):
+            reload_config()
             assert _check_position_from_vps("BTCUSDT") is False
 
 
@@ -150,4 +155,52 @@ class TestRunDailyWaveJob:
              patch("app.scheduler.daily_wave_scheduler._check_position_from_vps", return_value=False), \
              patch("app.scheduler.daily_wave_scheduler.save_armed_signal"):
             run_daily_wave_job()
-        assert mock_send.call_count >= 2  # signal + summary
\ No newline at end of file
+        assert mock_send.call_count >= 2  # signal + summary
+
+class TestTimeframes:
+    def test_due_timeframes_on_each_close(self):
+        import pandas as pd
+        from app.scheduler.daily_wave_scheduler import due_timeframes
+
+        last = {}
+        ts = lambda s: pd.Timestamp(s, tz="UTC")
+        assert due_timeframes(ts("2024-01-01 03:00"), last, ["1d", "4h"], delay_min=5) == []
+        assert due_timeframes(ts("2024-01-01 04:02"), last, ["1d", "4h"], delay_min=5) == []
+        assert due_timeframes(ts("2024-01-01 04:05"), last, ["1d", "4h"], delay_min=5) == ["4h"]
+        assert due_timeframes(ts("2024-01-01 04:06"), last, ["1d", "4h"], delay_min=5) == []
+        assert due_timeframes(ts("2024-01-02 00:05"), last, ["1d", "4h"], delay_min=5) == ["1d", "4h"]
+
+    def test_started_two_minutes_after_close_runs_at_delay(self):
+        import pandas as pd
+        from app.scheduler.daily_wave_scheduler import due_timeframes
+
+        last = {}
+        ts = lambda s: pd.Timestamp(s, tz="UTC")
+        assert due_timeframes(ts("2024-01-01 00:02"), last, ["1d", "4h"], delay_min=5, poll_sec=20) == []
+        assert due_timeframes(ts("2024-01-01 00:04:40"), last, ["1d", "4h"], delay_min=5, poll_sec=20) == []
+        assert due_timeframes(ts("2024-01-01 00:05"), last, ["1d", "4h"], delay_min=5, poll_sec=20) == ["1d", "4h"]
+        assert due_timeframes(ts("2024-01-01 00:05:20"), last, ["1d", "4h"], delay_min=5, poll_sec=20) == []
+
+    def test_started_after_delay_window_does_not_rerun(self):
+        import pandas as pd
+        from app.scheduler.daily_wave_scheduler import due_timeframes
+
+        last = {}
+        ts = lambda s: pd.Timestamp(s, tz="UTC")
+        assert due_timeframes(ts("2024-01-01 00:05:10"), last, ["4h"], delay_min=5, poll_sec=20) == ["4h"]
+        last = {}
+        assert due_timeframes(ts("2024-01-01 00:06"), last, ["4h"], delay_min=5, poll_sec=20) == []
+
+    def test_daily_job_uses_timeframe_for_positions(self):
+        from app.scheduler.daily_wave_scheduler import run_daily_wave_job
+        with patch("app.scheduler.daily_wave_scheduler.analyze_symbol", return_value=_make_analysis()) as mock_an, \
+             patch("app.scheduler.daily_wave_scheduler.send_message") as mock_send, \
+             patch("app.scheduler.daily_wave_scheduler.get_active", return_value=None) as mock_active, \
+             patch("app.scheduler.daily_wave_scheduler.get_armed_signal", return_value=None), \
+             patch("app.scheduler.daily_wave_scheduler._check_position_from_vps", return_value=False), \
+             patch("app.scheduler.daily_wave_scheduler.save_armed_signal") as mock_save:
+            run_daily_wave_job(timeframe="4h")
+        assert mock_an.call_args.kwargs.get("timeframe") == "4h"
+        assert {c.args[1] for c in mock_active.call_args_list} == {"4h"}
+        assert mock_save.call_args.kwargs["timeframe"] == "4h"
+        assert "(4H)" in mock_send.call_args[0][0]
@@ -0,0 +1,123 @@
+# tests/unit/test_decision_trace.py
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.analysis import decision_trace as dt
+from app.analysis.decision_trace import (
+    DECISION_DTYPE,
+    DecisionTrace,
+    blocked_by,
+    decision_records,
+)
+
+AS_OF = pd.Timestamp("2026-07-01 00:00", tz="UTC")
+
+
+def _trend_result(weekly_ok=True, valid=True):
+    plan = {"entry": 100.0, "sl": 95.0, "tp1": 105.0, "tp2": 110.0, "tp3": 120.0, "valid": valid,
+            "allowed_to_trade": weekly_ok and valid, "triggered": False, "trend_ok": True, "volume_ok": False}
+    return {
+        "mode": "TREND", "price": 101.0,
+        "scenarios": [
+            {"type": "ABC_UP", "direction": "LONG", "confidence": 72.0, "probability": 0.6,
+             "context_score": 1.5, "weekly_ok": weekly_ok, "mtf_ok": False, "context_allowed": True,
+             "trade_plan": plan},
+            {"type": "IMPULSE", "direction": "SHORT", "confidence": 66.0, "weekly_ok": True,
+             "mtf_ok": True, "context_allowed": False, "trade_plan": {"valid": False}},
+        ],
+    }
+
+
+class TestDecisionRecords:
+    def test_trend_scenarios(self):
+        rec = decision_records("BTCUSDT", "1d", AS_OF, _trend_result(weekly_ok=False))
+        assert rec.dtype == DECISION_DTYPE
+        assert rec["type"].tolist() == [b"ABC_UP", b"IMPULSE"]
+        assert rec["rank"].tolist() == [0, 1]
+        assert rec["weekly_ok"].tolist() == [False, True]
+        assert rec["context_allowed"].tolist() == [True, False]
+        assert rec["valid"].tolist() == [True, False]
+        assert rec["allowed"].tolist() == [False, False]
+        assert rec["rr"][0] == pytest.approx(2.0)
+        assert math.isnan(rec["rr"][1]) and math.isnan(rec["entry"][1])
+        assert rec["as_of"][0] == AS_OF.value // 1_000_000
+
+    def test_sideway_defaults_and_empty_scan(self):
+        sideway = {"mode": "SIDEWAY", "price": 91.0, "scenarios": [
+            {"type": "SIDEWAY_RANGE", "direction": "LONG", "confidence": 65.0,
+             "trade_plan": {"entry": 91.0, "sl": 89.5, "tp2": 100.0, "valid": True, "triggered": True}},
+        ]}
+        rec = decision_records("ETHUSDT", "1d", AS_OF, sideway)
+        assert rec["weekly_ok"][0] and rec["allowed"][0] and rec["triggered"][0]
+
+        empty = decision_records("ETHUSDT", "1d", AS_OF, {"mode": "TREND", "scenarios": []})
+        assert len(empty) == 1 and empty["rank"][0] == -1 and empty["type"][0] == b""
+        assert len(decision_records("ETHUSDT", "1d", AS_OF, None)) == 0
+
+
+class TestDecisionTrace:
+    def test_roundtrip_daily_files(self, tmp_path):
+        trace = DecisionTrace(str(tmp_path))
+        assert trace.record("BTCUSDT", "1d", AS_OF, _trend_result()) == 2
+        assert trace.record("BTCUSDT", "1d", AS_OF + pd.Timedelta(days=1), _trend_result(weekly_ok=False)) == 2
+        assert trace.days() == ["2026-07-01", "2026-07-02"]
+
+        assert len(trace.load()) == 4
+        assert len(trace.load(start="2026-07-02")) == 2
+        df = trace.frame(end="2026-07-01")
+        assert df["symbol"].tolist() == ["BTCUSDT", "BTCUSDT"]
+        assert df["as_of"].iloc[0] == AS_OF
+
+    def test_truncated_tail_is_ignored(self, tmp_path):
+        trace = DecisionTrace(str(tmp_path))
+        trace.record("BTCUSDT", "1d", AS_OF, _trend_result())
+        with open(trace.path("2026-07-01"), "ab") as fh:
+            fh.write(b"\x00" * 10)
+        assert len(trace.load()) == 2
+
+    def test_disabled_and_write_error(self, tmp_path):
+        assert DecisionTrace("").record("BTCUSDT", "1d", AS_OF, _trend_result()) == 0
+        blocker = tmp_path / "file"
+        blocker.write_text("x")
+        trace = DecisionTrace(str(blocker))
+        assert trace.record("BTCUSDT", "1d", AS_OF, _trend_result()) == 0
+        assert trace.stats["errors"] == 1
+
+
+def test_blocked_by_counts_valid_setups(tmp_path):
+    trace = DecisionTrace(str(tmp_path))
+    trace.record("BTCUSDT", "1d", AS_OF, _trend_result(weekly_ok=False))
+    trace.record("ETHUSDT", "1d", AS_OF, _trend_result(weekly_ok=True))
+    rec = trace.load()
+    assert blocked_by(rec, "weekly_ok") == {"valid": 2, "blocked": 1}
+    assert blocked_by(rec, "weekly_ok", symbol="ETHUSDT") == {"valid": 1, "blocked": 0}
+    assert blocked_by(rec, "mtf_ok", direction="LONG") == {"valid": 2, "blocked": 2}
+
+
+def test_analyze_symbol_records_scan(monkeypatch):
+    from app.analysis import wave_engine
+    from app.analysis.result_store import AnalysisStore
+
+    df = pd.DataFrame({"open_time": pd.date_range("2026-01-01", periods=300, freq="D", tz="UTC")})
+    ctx = wave_engine.AnalysisContext(symbol="BTCUSDT", df=df)
+    monkeypatch.setattr(wave_engine, "load_context", lambda symbol, timeframe: ctx)
+    monkeypatch.setattr(wave_engine, "analyze", lambda c: wave_engine.AnalysisResult(_trend_result()))
+    monkeypatch.setattr(wave_engine, "bar_close_time", lambda d: AS_OF)
+    monkeypatch.setattr(wave_engine, "analysis_store", lambda: AnalysisStore())
+
+    wave_engine.analyze_symbol("BTCUSDT", bypass_cache=True)
+    rec = dt.decision_trace().load()
+    assert rec["symbol"].tolist() == [b"BTCUSDT", b"BTCUSDT"]
+    assert np.all(rec["timeframe"] == b"1d")
+
+
+def test_default_dir_does_not_depend_on_cwd():
+    from pathlib import Path
+
+    from app.config.wave_settings import DECISION_TRACE_DIR
+
+    assert Path(DECISION_TRACE_DIR).is_absolute()
+    assert Path(DECISION_TRACE_DIR).parent == Path(dt.__file__).resolve().parents[2] / "data"
@@ -0,0 +1,143 @@
+# tests/unit/test_log_shipper.py
+import json
+import threading
+
+import pytest
+
+from app.config.runtime_config import reload_config
+from app.services import log_shipper as ls
+from app.services.log_shipper import LogShipper
+
+
+class _Resp:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def vps(monkeypatch):
+    monkeypatch.setenv("VPS_URL", "http://vps")
+    monkeypatch.setenv("EXEC_TOKEN", "tok")
+    reload_config()
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    state = {"calls": [], "fail": False, "gate": None}
+
+    def fake_post(url, json=None, headers=None, timeout=None):
+        if state["gate"] is not None:
+            state["gate"].wait(5)
+        if state["fail"]:
+            raise ConnectionError("down")
+        state["calls"].append((url, json, headers))
+        return _Resp()
+
+    monkeypatch.setattr(ls.req, "post", fake_post)
+    return state
+
+
+def _sent(posts):
+    return [m for _, body, _ in posts["calls"] for m in body["msgs"]]
+
+
+def test_batches_messages(vps, posts, tmp_path):
+    gate = threading.Event()
+    posts["gate"] = gate
+    shipper = LogShipper(batch_size=50, spill_path=tmp_path / "spill.jsonl")
+    for i in range(120):
+        assert shipper.ship(f"m{i}")
+    gate.set()
+    assert shipper.flush()
+
+    assert _sent(posts) == [f"m{i}" for i in range(120)]
+    assert all(len(body["msgs"]) <= 50 for _, body, _ in posts["calls"])
+    assert posts["calls"][0][0] == "http://vps/log"
+    assert posts["calls"][0][2] == {"X-EXEC-TOKEN": "tok"}
+    assert shipper.stats["sent"] == 120
+
+
+def test_no_vps_url_is_noop(monkeypatch, posts, tmp_path):
+    monkeypatch.setenv("VPS_URL", "")
+    reload_config()
+    shipper = LogShipper(spill_path=tmp_path / "spill.jsonl")
+    assert shipper.ship("x") is False
+    assert shipper.flush()
+    assert posts["calls"] == []
+
+
+def test_failed_batch_spills_then_drains(vps, posts, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    shipper = LogShipper(spill_path=spill)
+    posts["fail"] = True
+    shipper.ship("a")
+    shipper.ship("b")
+    assert shipper.flush()
+    assert [json.loads(line) for line in spill.read_text().splitlines()] == ["a", "b"]
+
+    posts["fail"] = False
+    shipper.ship("c")
+    assert shipper.flush()
+    assert _sent(posts) == ["c", "a", "b"]
+    assert not spill.exists()
+
+
+def test_full_queue_spills_without_blocking(vps, posts, tmp_path):
+    gate = threading.Event()
+    posts["gate"] = gate
+    spill = tmp_path / "spill.jsonl"
+    shipper = LogShipper(max_queue=2, batch_size=1, spill_path=spill)
+    results = [shipper.ship(f"m{i}") for i in range(10)]
+
+    assert results.count(False) >= 7
+    assert shipper.stats["spilled"] == results.count(False)
+    gate.set()
+    assert shipper.flush()
+
+
+def test_spill_cap_drops(vps, posts, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    shipper = LogShipper(spill_path=spill, max_spill_bytes=1)
+    posts["fail"] = True
+    shipper.ship("a")
+    assert shipper.flush()
+    shipper.ship("b")
+    assert shipper.flush()
+    assert shipper.stats["spilled"] == 1
+    assert shipper.stats["dropped"] == 1
+
+
+def test_drain_skips_corrupt_lines(vps, posts, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text('"a"\n{not json\n"b"\n"c"', encoding="utf-8")
+    shipper = LogShipper(spill_path=spill)
+    shipper.ship("d")
+    assert shipper.flush()
+
+    assert _sent(posts) == ["d", "a", "b", "c"]
+    assert shipper.stats["dropped"] == 1
+    assert not spill.exists()
+    assert not (tmp_path / "spill.jsonl.draining").exists()
+
+
+def test_drain_keeps_unsent_remainder(vps, posts, tmp_path, monkeypatch):
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text("".join(json.dumps(m) + "\n" for m in ["a", "b", "c"]), encoding="utf-8")
+    shipper = LogShipper(batch_size=1, spill_path=spill)
+    ok = iter([True, False])
+    monkeypatch.setattr(shipper, "_post", lambda msgs: next(ok))
+    shipper._drain_spill()
+
+    assert [json.loads(line) for line in spill.read_text().splitlines()] == ["b", "c"]
+    assert not (tmp_path / "spill.jsonl.draining").exists()
+
+
+def test_drain_resumes_leftover_draining_file(vps, posts, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    (tmp_path / "spill.jsonl.draining").write_text('"old"\n', encoding="utf-8")
+    shipper = LogShipper(spill_path=spill)
+    shipper.ship("new")
+    assert shipper.flush()
+
+    assert _sent(posts) == ["new", "old"]
+    assert not (tmp_path / "spill.jsonl.draining").exists()
@@ -1,4 +1,6 @@
-from app.analysis.macro_bias import compute_macro_bias
+import pandas as pd
+
+from app.analysis.macro_bias import compute_macro_bias, macro_bias_series
 
 
 def _regime(regime="TREND", trend="BULL", vol="MID",
@@ -96,4 +98,22 @@ class TestMacroBiasVolPenalty:
     def test_none_regime_returns_neutral(self):
         """regime=None → fallback NEUTRAL"""
         result = compute_macro_bias(None, rsi14=50.0)  # type: ignore[arg-type]
-        assert result["bias"] == "NEUTRAL"
\ No newline at end of file
+        assert result["bias"] == "NEUTRAL"
+
+
+class TestMacroBiasSeries:
+    def test_rows_match_compute_macro_bias(self):
+        regimes = [
+            _regime("TREND", "BULL", trend_strength=80.0, vol_score=20.0),
+            _regime("TREND", "BEAR", trend_strength=40.0, vol_score=80.0),
+            _regime("TREND", "NEUTRAL"),
+            _regime("RANGE", "NEUTRAL", vol_score=0.0),
+            _regime("CHOP", vol="HIGH", vol_score=90.0),
+        ]
+        rsi = [60.0, 40.0, 0.0, 35.0, 50.0]
+        series = macro_bias_series(pd.DataFrame(regimes), rsi)
+        for i, (regime, r) in enumerate(zip(regimes, rsi)):
+            assert series.iloc[i].to_dict() == compute_macro_bias(regime, rsi14=r)
+
+    def test_empty(self):
+        assert macro_bias_series(pd.DataFrame(), []).empty
@@ -1,7 +1,8 @@
 # tests/unit/test_market_regime.py
+import numpy as np
 import pytest
 import pandas as pd
-from app.analysis.market_regime import detect_market_regime, _safe_float, _pct
+from app.analysis.market_regime import detect_market_regime, market_regime_series, _safe_float, _pct
 
 
 def _make_df(n=250, ema50=110.0, ema200=100.0, atr=2.0, rsi=55.0, close=120.0):
@@ -105,4 +106,39 @@ class TestDetectMarketRegime:
     def test_trend_strength_in_range(self):
         df = _make_df()
         result = detect_market_regime(df)
-        assert 0.0 <= result["trend_strength"] <= 100.0
\ No newline at end of file
+        assert 0.0 <= result["trend_strength"] <= 100.0
+
+def _random_df(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    df = pd.DataFrame({"close": close})
+    df["ema50"] = df["close"].ewm(span=20).mean()
+    df["ema200"] = df["close"].ewm(span=120).mean()
+    df["atr14"] = np.abs(rng.normal(1.5, 1.0, n))
+    df["rsi14"] = rng.uniform(30, 70, n)
+    df.loc[rng.random(n) < 0.05, "rsi14"] = np.nan
+    return df
+
+
+class TestMarketRegimeSeries:
+    def test_rows_match_last_bar_on_every_prefix(self):
+        df = _random_df()
+        series = market_regime_series(df)
+        assert len(series) == len(df)
+        for i in range(240, len(df) + 1):
+            expected = detect_market_regime(df.iloc[:i])
+            row = series.iloc[i - 1]
+            for key, value in expected.items():
+                if isinstance(value, float) and np.isnan(value):
+                    assert np.isnan(row[key])
+                else:
+                    assert row[key] == value, (i, key)
+
+    def test_short_rows_are_chop(self):
+        series = market_regime_series(_make_df(260))
+        assert (series["regime"].iloc[:249] == "CHOP").all()
+        assert series["notes"].iloc[248] == "len<250"
+        assert series["notes"].iloc[249] != "len<250"
+
+    def test_empty_frame(self):
+        assert market_regime_series(_make_df(0)).empty
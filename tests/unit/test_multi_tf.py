@@ -125,4 +125,126 @@ class TestGetMtfSummary:
         from app.analysis.multi_tf import get_mtf_summary
         with patch("app.analysis.multi_tf._prepare_df", return_value=_make_df(100)):
             result = get_mtf_summary("ETHUSDT")
-        assert result["symbol"] == "ETHUSDT"
\ No newline at end of file
+        assert result["symbol"] == "ETHUSDT"
+
+def _timed_df(n, freq, end):
+    df = _make_df(n)
+    df["open_time"] = pd.date_range(end=pd.Timestamp(end, tz="UTC"), periods=n, freq=freq)
+    return df
+
+
+class TestMTFService:
+    # แท่ง 1W ล่าสุดที่ปิด เปิด 2024-05-06 (ปิด 05-13), แท่ง 4H ล่าสุด เปิด 05-15 04:00 (ปิด 08:00)
+    def _frames(self, symbol, interval, limit):
+        if interval == "1w":
+            return _timed_df(300, "7D", "2024-05-06")
+        return _timed_df(300, "4h", "2024-05-15 04:00")
+
+    def _service(self, now):
+        from app.analysis.multi_tf import MTFService
+        clock = {"now": pd.Timestamp(now, tz="UTC")}
+        return MTFService(clock=lambda: clock["now"]), clock
+
+    def test_cached_until_next_close(self):
+        service, clock = self._service("2024-05-15 09:00")
+        with patch("app.analysis.multi_tf._prepare_df", side_effect=self._frames) as mock:
+            first = service.summary("BTCUSDT")
+            second = service.summary("BTCUSDT")
+        assert mock.call_count == 2
+        assert first == second
+        assert service.timings["BTCUSDT"]["summary_cached"] is True
+        assert service.timings["BTCUSDT"]["weekly"] == "hit"
+
+    def test_new_4h_close_refetches_only_4h(self):
+        service, clock = self._service("2024-05-15 09:00")
+        h4_end = {"ts": "2024-05-15 04:00"}
+
+        def _frames(symbol, interval, limit):
+            if interval == "1w":
+                return self._frames(symbol, interval, limit)
+            return _timed_df(300, "4h", h4_end["ts"])
+
+        with patch("app.analysis.multi_tf._prepare_df", side_effect=_frames) as mock:
+            service.summary("BTCUSDT")
+            clock["now"] = pd.Timestamp("2024-05-15 12:00", tz="UTC")
+            h4_end["ts"] = "2024-05-15 08:00"
+            service.summary("BTCUSDT")
+        assert [c.args[1] for c in mock.call_args_list] == ["1w", "4h", "4h"]
+        assert service.timings["BTCUSDT"]["weekly"] == "hit"
+        assert service.timings["BTCUSDT"]["h4"] == "stored"
+
+    def test_historical_frames_not_cached(self):
+        # ข้อมูลย้อนหลัง (backtest) — แท่งถัดไปปิดไปนานแล้ว → คำนวณใหม่ทุกครั้ง
+        service, _ = self._service("2025-01-01")
+        with patch("app.analysis.multi_tf._prepare_df", side_effect=self._frames) as mock:
+            service.summary("BTCUSDT")
+            service.summary("BTCUSDT")
+        assert mock.call_count == 4
+        assert service.stats["summary_hits"] == 0
+
+    def test_batch_summaries(self):
+        service, _ = self._service("2024-05-15 09:00")
+
+        def _frames(symbol, interval, limit):
+            if symbol == "BADUSDT":
+                raise RuntimeError("boom")
+            return self._frames(symbol, interval, limit)
+
+        with patch("app.analysis.multi_tf._prepare_df", side_effect=_frames):
+            result = service.summaries(["BTCUSDT", "ETHUSDT", "BADUSDT", "BTCUSDT"], workers=3)
+        assert list(result) == ["BTCUSDT", "ETHUSDT", "BADUSDT"]
+        assert result["ETHUSDT"]["symbol"] == "ETHUSDT"
+        assert result["BADUSDT"] == {}
+        assert set(service.timings) == {"BTCUSDT", "ETHUSDT"}
+
+
+def _trending_frame(n, freq, start, seed):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0.002, 0.02, n)))
+    df = pd.DataFrame({
+        "open": closes,
+        "high": closes * (1 + np.abs(rng.normal(0, 0.01, n))),
+        "low": closes * (1 - np.abs(rng.normal(0, 0.01, n))),
+        "close": closes,
+        "volume": [1000.0] * n,
+    })
+    df["open_time"] = pd.date_range(start, periods=n, freq=freq, tz="UTC")
+    return df
+
+
+class TestPointInTimeSeries:
+    def _prepared(self, df):
+        from app.indicators.ema import add_ema
+        return add_ema(df, lengths=(50, 200))
+
+    def test_matches_summary_on_closed_bars(self):
+        from app.analysis.multi_tf import _summarize, mtf_asof
+        from app.data.binance_fetcher import bar_close_times
+        dfw = _trending_frame(270, "7D", "2019-01-07", seed=1)
+        df4 = _trending_frame(1500, "4h", "2023-10-01", seed=2)
+        times = pd.date_range("2024-01-05 10:00", periods=12, freq="17h", tz="UTC")
+        table = mtf_asof(times, dfw, df4, symbol="BTCUSDT")
+
+        wc, hc = bar_close_times(dfw), bar_close_times(df4)
+        for t, row in zip(times, table.to_dict("records")):
+            expected = _summarize(
+                "BTCUSDT",
+                self._prepared(dfw[wc <= t].tail(300)),
+                self._prepared(df4[hc <= t].tail(800)),
+            )
+            assert row == expected
+
+    def test_open_weekly_candle_not_used(self):
+        from app.analysis.multi_tf import weekly_permit_series
+        dfw = _trending_frame(260, "7D", "2019-01-07", seed=3)
+        series = weekly_permit_series(dfw)
+        # index = เวลาปิด (open + 7 วัน) → as-of join ใช้แท่งที่ปิดแล้วเท่านั้น
+        assert series.index[-1] == dfw["open_time"].iloc[-1] + pd.Timedelta(days=7)
+        assert not series["weekly_ok"].iloc[248] and series["weekly_ok"].iloc[249]
+
+    def test_missing_frames_permit_both(self):
+        from app.analysis.multi_tf import mtf_asof
+        table = mtf_asof(["2024-01-01"], None, None, symbol="BTCUSDT")
+        row = table.iloc[0]
+        assert row["weekly_permit_long"] and row["weekly_permit_short"]
+        assert row["notes"] == "weekly len<250"
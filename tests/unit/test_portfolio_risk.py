@@ -0,0 +1,137 @@
+# tests/unit/test_portfolio_risk.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.backtest.backtest_runner import _filter_by_portfolio_risk
+from app.risk.portfolio_risk import PortfolioRisk, ReturnCovariance, position_weights, sync_daily_closes
+
+SYMS = ["AAA", "BBB", "CCC"]
+
+
+def _closes(n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    common = rng.normal(0, 0.02, n)
+    rets = np.column_stack([
+        common + rng.normal(0, 0.005, n),
+        common + rng.normal(0, 0.005, n),
+        rng.normal(0, 0.03, n),
+    ])
+    idx = pd.date_range("2024-01-01", periods=n, freq="D", tz="UTC")
+    return pd.DataFrame(100 * np.exp(np.cumsum(rets, axis=0)), index=idx, columns=SYMS)
+
+
+def _feed(cov, closes):
+    for t, row in closes.iterrows():
+        cov.update(row.dropna().to_dict(), bar_time=t)
+
+
+class TestReturnCovariance:
+    def test_rolling_matches_full_recompute(self):
+        closes = _closes()
+        cov = ReturnCovariance(SYMS, window=30)
+        _feed(cov, closes)
+        expected = np.log(closes).diff().iloc[-30:].cov().to_numpy()
+        np.testing.assert_allclose(cov.matrix(), expected, rtol=1e-9, atol=1e-15)
+        assert cov.cov("AAA", "CCC") == pytest.approx(expected[0, 2], rel=1e-9)
+
+    def test_missing_prices_are_pairwise(self):
+        closes = _closes(60)
+        closes.iloc[20:23, 2] = np.nan
+        cov = ReturnCovariance(SYMS, window=90)
+        _feed(cov, closes)
+        expected = np.log(closes).diff().cov().to_numpy()
+        np.testing.assert_allclose(cov.matrix(), expected, rtol=1e-9)
+        assert cov.observations("CCC") == 55
+
+    def test_old_bar_ignored(self):
+        cov = ReturnCovariance(SYMS, window=10)
+        t = pd.Timestamp("2024-01-02", tz="UTC")
+        assert cov.update({"AAA": 1.0}, bar_time=t) is False  # ยังไม่มี return
+        assert cov.update({"AAA": 1.1}, bar_time=t) is False
+        assert cov.update({"AAA": 1.1}, bar_time=t + pd.Timedelta(days=1)) is True
+
+
+class TestPortfolioRisk:
+    def _risk(self, **kw):
+        risk = PortfolioRisk(SYMS, window=60, min_bars=20, **kw)
+        _feed(risk.returns, _closes())
+        return risk
+
+    def test_incremental_variance_matches_quadratic_form(self):
+        risk = self._risk()
+        risk.variance()
+        risk.add_position("AAA", 0.5)
+        risk.add_position("CCC", -0.3)
+        risk.add_position("BBB", 0.2)
+        risk.remove_position("AAA", 0.2)
+        w = np.array([0.3, 0.2, -0.3])
+        assert risk.variance() == pytest.approx(w @ risk.returns.matrix() @ w, rel=1e-9)
+
+    def test_check_matches_full_portfolio(self):
+        risk = self._risk(max_vol_pct=100.0)
+        risk.set_positions({"AAA": 0.5})
+        check = risk.check("BBB", "LONG", notional=0.5, equity=1.0)
+        w = np.array([0.5, 0.5, 0.0])
+        assert check["allowed"] is True
+        assert check["vol_pct_after"] == pytest.approx(np.sqrt(w @ risk.returns.matrix() @ w) * 100, abs=1e-4)
+
+    def test_correlated_position_blocked_hedge_allowed(self):
+        risk = self._risk()
+        risk.set_positions({"AAA": 3.0})
+        vol_now = risk.check("AAA", "LONG", 1e-9, 1.0)["vol_pct_after"]
+        risk.max_vol_pct = vol_now * 1.1
+
+        assert risk.check("BBB", "LONG", 3.0, 1.0)["allowed"] is False
+        assert risk.check("BBB", "SHORT", 3.0, 1.0)["allowed"] is True
+
+    def test_not_enough_history_allows(self):
+        risk = PortfolioRisk(SYMS, min_bars=30)
+        check = risk.check("AAA", "LONG", 10.0, 1.0)
+        assert check["allowed"] is True
+        assert check["vol_pct_after"] is None
+
+    def test_position_weights(self):
+        class P:
+            def __init__(self, symbol, direction, entry, qty):
+                self.symbol, self.direction, self.entry, self.remaining_qty = symbol, direction, entry, qty
+
+        w = position_weights([P("AAA", "LONG", 100.0, 2.0), P("BBB", "SHORT", 10.0, 5.0)], equity=400.0)
+        assert w == {"AAA": 0.5, "BBB": -0.125}
+
+
+def test_sync_daily_closes_feeds_new_bars_only():
+    closes = _closes(40)
+    calls = []
+
+    def fake_fetch(symbol, interval="1d", limit=1000):
+        calls.append(limit)
+        df = closes[[symbol]].rename(columns={symbol: "close"}).reset_index(names="open_time")
+        return df.iloc[-limit:]
+
+    risk = PortfolioRisk(SYMS, window=30)
+    now = closes.index[-1] + pd.Timedelta(hours=3)  # แท่งสุดท้ายยังไม่ปิด
+    assert sync_daily_closes(risk, fetch=fake_fetch, now=now) == 30
+    assert risk.returns.last_bar == closes.index[-2]
+
+    n_calls = len(calls)
+    assert sync_daily_closes(risk, fetch=fake_fetch, now=now) == 0
+    assert len(calls) == n_calls
+
+    assert sync_daily_closes(risk, fetch=fake_fetch, now=now + pd.Timedelta(days=1)) == 1
+
+
+def test_portfolio_simulator_filter_skips_correlated_overlap():
+    closes = _closes()
+    series = {s: closes[s] for s in SYMS}
+    t = closes.index
+
+    def trade(sym, i, exit_i):
+        return {"symbol": sym, "direction": "LONG", "entry": 100.0, "sl": 95.0,
+                "entry_time": t[i], "exit_time": t[exit_i], "result": "WIN", "r_multiple": 1.0}
+
+    trades = [trade("AAA", 60, 70), trade("BBB", 62, 72), trade("BBB", 80, 90)]
+    # ไม้ละ 0.4 ของ equity (risk 2% / SL 5%) — AAA+BBB พร้อมกันเกิน 1.2%
+    kept, skipped = _filter_by_portfolio_risk(trades, series, max_vol_pct=1.2, risk_pct=0.02)
+    assert skipped == 1
+    assert [(k["symbol"], k["entry_time"]) for k in kept] == [("AAA", t[60]), ("BBB", t[80])]
@@ -1,6 +1,18 @@
 # tests/unit/test_position_sizer.py
+import math
+
+import numpy as np
 import pytest
-from app.trading.position_sizer import calculate_quantity
+
+from app.performance.metrics import compute_metrics
+from app.trading.position_sizer import (
+    calculate_quantity,
+    max_risk_fraction,
+    optimal_risk_fraction,
+    r_multiples_from,
+    simulate_risk_fractions,
+    simulate_risk_of_ruin,
+)
 
 
 class TestCalculateQuantity:
@@ -34,4 +46,89 @@ class TestCalculateQuantity:
 
     def test_zero_balance_returns_zero(self):
         result = calculate_quantity(0.0, 0.01, 100.0, 90.0)
-        assert result == 0.0
\ No newline at end of file
+        assert result == 0.0
+
+
+# ─────────────────────────────────────────────
+# Monte Carlo
+# ─────────────────────────────────────────────
+
+class TestRMultiplesFrom:
+    def test_sources(self):
+        class Trade:
+            r_multiple = 1.5
+
+        assert r_multiples_from([1, "2", None, float("nan")]).tolist() == [1.0, 2.0]
+        assert r_multiples_from({"trades": [{"r_multiple": -1.0}, {"result": "OPEN"}]}).tolist() == [-1.0]
+        assert r_multiples_from([Trade()]).tolist() == [1.5]
+        assert r_multiples_from(None).size == 0
+
+    def test_from_compute_metrics(self):
+        pos = [
+            {"status": "CLOSED", "entry": 100, "sl": 90, "tp1_hit": True, "sl_hit": True},
+            {"status": "CLOSED", "entry": 100, "sl": 90, "sl_hit": True},
+        ]
+        m = compute_metrics(pos)
+        assert r_multiples_from(m).tolist() == pytest.approx([-0.4, -1.0])
+
+    def test_max_risk_fraction(self):
+        assert max_risk_fraction([-2.0, 1.0]) == 0.5
+        assert max_risk_fraction([0.5, 1.0]) == math.inf
+
+
+class TestSimulateRiskFractions:
+    def test_matches_naive_loop(self):
+        r = np.array([-1.0, -0.4, 0.5, 2.0])
+        f, n_paths, n_trades, ruin = 0.2, 200, 12, 0.7
+        out = simulate_risk_fractions(r, [f], n_paths, n_trades, ruin_level=ruin, seed=3)[0]
+
+        idx = np.random.default_rng(3).integers(0, r.size, size=(n_paths, n_trades))
+        ruined, dds, finals = 0, [], []
+        for row in idx:
+            eq, peak, dd, hit = 1.0, 1.0, 0.0, False
+            for i in row:
+                eq *= 1 + f * r[i]
+                peak = max(peak, eq)
+                dd = max(dd, 1 - eq / peak)
+                hit = hit or eq <= ruin
+            ruined += hit
+            dds.append(dd * 100)
+            finals.append(math.log(eq))
+
+        assert out["risk_of_ruin"] == pytest.approx(ruined / n_paths)
+        assert out["max_dd_pct"]["p95"] == pytest.approx(np.quantile(dds, 0.95), abs=1e-3)
+        assert out["final_equity_median"] == pytest.approx(math.exp(np.quantile(finals, 0.5)), rel=1e-5)
+        assert out["log_growth_per_trade"] == pytest.approx(np.mean(finals) / n_trades)
+
+    def test_same_seed_reproducible(self):
+        r = [-1.0, 1.0, 2.0]
+        a = simulate_risk_fractions(r, [0.01, 0.05], n_paths=1000, n_trades=50, seed=1)
+        b = simulate_risk_fractions(r, [0.01, 0.05], n_paths=1000, n_trades=50, seed=1, chunk_paths=1000)
+        assert a == b
+
+    def test_oversized_fraction_is_ruin(self):
+        out = simulate_risk_of_ruin([-1.0] * 5, 1.0, n_paths=10, n_trades=3)
+        assert out["risk_of_ruin"] == 1.0
+        assert out["final_equity_median"] == 0.0
+        assert out["max_dd_pct"]["p50"] == pytest.approx(100.0)
+
+    def test_empty_input(self):
+        assert simulate_risk_fractions([], [0.01]) == []
+        assert simulate_risk_of_ruin([], 0.01) == {}
+
+
+class TestOptimalRiskFraction:
+    def test_picks_highest_growth_within_ruin_limit(self):
+        r = [-1.0, -1.0, -1.0, 0.3, 1.0, 2.2] * 10
+        out = optimal_risk_fraction(r, max_ruin=0.01, n_paths=20_000, seed=1)
+        best = out["best"]
+        assert out["risk_fraction"] == best["risk_fraction"] > 0
+        assert best["risk_of_ruin"] <= 0.01
+        ok = [row for row in out["table"] if row["risk_of_ruin"] <= 0.01]
+        assert best["log_growth_per_trade"] == max(row["log_growth_per_trade"] for row in ok)
+        assert out["n_samples"] == 60
+
+    def test_negative_edge_returns_zero(self):
+        out = optimal_risk_fraction([-1.0, -1.0, 0.5], n_paths=2000, seed=1)
+        assert out["risk_fraction"] == 0.0
+        assert out["best"] is None
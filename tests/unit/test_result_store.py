@@ -0,0 +1,72 @@
+# tests/unit/test_result_store.py
+import pandas as pd
+
+from app.analysis import result_store
+from app.analysis.result_store import AnalysisStore, config_hash, expected_close
+
+
+def _clock(ts):
+    return lambda: pd.Timestamp(ts, tz="UTC")
+
+
+class TestExpectedClose:
+    def test_daily_floor(self):
+        assert expected_close("2024-03-05 13:20", "1d") == pd.Timestamp("2024-03-05", tz="UTC")
+
+    def test_4h_floor(self):
+        assert expected_close("2024-03-05 13:20", "4h") == pd.Timestamp("2024-03-05 12:00", tz="UTC")
+
+    def test_weekly_monday(self):
+        # 2024-03-07 = พฤหัส → แท่ง 1W ล่าสุดปิดจันทร์ 2024-03-04
+        assert expected_close("2024-03-07 09:00", "1w") == pd.Timestamp("2024-03-04", tz="UTC")
+
+
+class TestAnalysisStore:
+    def test_hit_until_next_close(self):
+        now = {"ts": "2024-03-05 08:00"}
+        store = AnalysisStore(clock=lambda: pd.Timestamp(now["ts"], tz="UTC"))
+        store.put("BTCUSDT", "1d", pd.Timestamp("2024-03-05", tz="UTC"), {"price": 1.0})
+
+        assert store.get("BTCUSDT", "1d") == (True, {"price": 1.0})
+        now["ts"] = "2024-03-05 23:59"
+        assert store.get("BTCUSDT", "1d")[0] is True
+        now["ts"] = "2024-03-06 00:01"
+        assert store.get("BTCUSDT", "1d") == (False, None)
+        assert store.stats == {"hits": 2, "misses": 1, "stored": 1}
+
+    def test_returns_copy(self):
+        store = AnalysisStore(clock=_clock("2024-03-05 08:00"))
+        store.put("BTCUSDT", "1d", "2024-03-05", {"scenarios": []})
+        store.get("BTCUSDT", "1d")[1]["scenarios"].append("x")
+        assert store.get("BTCUSDT", "1d")[1] == {"scenarios": []}
+
+    def test_stale_frame_not_served(self):
+        # ข้อมูลที่ดึงมายังไม่มีแท่งล่าสุด → ครั้งหน้าต้องคำนวณใหม่
+        store = AnalysisStore(clock=_clock("2024-03-05 00:00:30"))
+        store.put("BTCUSDT", "1d", "2024-03-04", {"price": 1.0})
+        assert store.get("BTCUSDT", "1d")[0] is False
+
+    def test_config_change_invalidates(self, monkeypatch):
+        store = AnalysisStore(clock=_clock("2024-03-05 08:00"))
+        store.put("BTCUSDT", "1d", "2024-03-05", {"price": 1.0})
+        before = config_hash()
+        monkeypatch.setattr("app.config.wave_settings.MIN_RR", 9.9)
+        assert config_hash() != before
+        assert store.get("BTCUSDT", "1d")[0] is False
+
+    def test_no_timestamp_not_stored(self):
+        store = AnalysisStore(clock=_clock("2024-03-05 08:00"))
+        store.put("BTCUSDT", "1d", None, {"price": 1.0})
+        assert store.get("BTCUSDT", "1d")[0] is False
+
+    def test_invalidate(self):
+        store = AnalysisStore(clock=_clock("2024-03-05 08:00"))
+        store.put("BTCUSDT", "1d", "2024-03-05", {})
+        store.put("ETHUSDT", "1d", "2024-03-05", {})
+        store.invalidate("BTCUSDT")
+        assert store.get("BTCUSDT", "1d")[0] is False
+        assert store.get("ETHUSDT", "1d")[0] is True
+
+
+def test_module_store_singleton():
+    assert result_store.analysis_store() is result_store.analysis_store()
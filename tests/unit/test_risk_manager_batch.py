@@ -0,0 +1,113 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.config.runtime_config import reload_config
+from app.risk.risk_manager import (
+    PLAN_OK,
+    PLAN_OK_FIB,
+    PLAN_RANGE_INVALID,
+    PLAN_SR_SL_NEAR,
+    build_trade_plan,
+    build_trade_plans,
+    trade_plan_columns,
+)
+
+
+def _random_scenario(rnd):
+    def level():
+        r = rnd.random()
+        if r < 0.1:
+            return None
+        if r < 0.15:
+            return 0
+        return round(rnd.uniform(50, 150), rnd.choice([0, 2]))
+
+    sc = {
+        "type": rnd.choice(["SIDEWAY_RANGE", "ABC_DOWN", "ABC_UP", "IMPULSE", "", None]),
+        "direction": rnd.choice(["LONG", "SHORT", "long", "", None]),
+        "pivots": [{"price": round(rnd.uniform(80, 120), 2)} for _ in range(rnd.randint(0, 5))],
+    }
+    for key in ("range_low", "range_high", "atr", "swing_low", "swing_high"):
+        if rnd.random() < 0.7:
+            sc[key] = level()
+    return sc
+
+
+def _random_sr(rnd):
+    if rnd.random() < 0.3:
+        return None
+    return {
+        "support": {"level": rnd.choice([None, 0, rnd.uniform(80, 120)])},
+        "resist": {"level": rnd.choice([None, 0, rnd.uniform(80, 120)])},
+    }
+
+
+def _same(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        if isinstance(a[key], float) and math.isnan(a[key]):
+            assert math.isnan(b[key])
+        else:
+            assert a[key] == b[key], key
+
+
+# ─────────────────────────────────────────────
+# batch == scalar
+# ─────────────────────────────────────────────
+
+@pytest.mark.parametrize("max_tp_r", ["", "1.2"])
+def test_batch_matches_scalar_exactly(max_tp_r):
+    reload_config({"MAX_TP_R": max_tp_r})
+    rnd = random.Random(7)
+    for _ in range(300):
+        scenarios = [_random_scenario(rnd) for _ in range(rnd.randint(1, 5))]
+        prices = [rnd.choice([0.0, rnd.uniform(80, 120)]) for _ in scenarios]
+        srs = [_random_sr(rnd) for _ in scenarios]
+        min_rr = rnd.choice([0.5, 1.5, 2])
+
+        batch = build_trade_plans(scenarios, prices, min_rr=min_rr, sr=srs)
+        for sc, price, sr, plan in zip(scenarios, prices, srs, batch):
+            _same(build_trade_plan(sc, price, min_rr=min_rr, sr=sr), plan)
+
+
+def test_single_sr_and_price_broadcast():
+    scenarios = [
+        {"type": "IMPULSE", "direction": "LONG", "pivots": [{"price": 90}, {"price": 95}], "swing_low": 95},
+        {"type": "IMPULSE", "direction": "SHORT", "pivots": [{"price": 110}, {"price": 105}], "swing_high": 105},
+    ]
+    sr = {"support": {"level": 96.0}, "resist": {"level": 104.0}}
+    batch = build_trade_plans(scenarios, 100.0, min_rr=1.5, sr=sr)
+    assert batch == [build_trade_plan(sc, 100.0, min_rr=1.5, sr=sr) for sc in scenarios]
+
+
+# ─────────────────────────────────────────────
+# columns
+# ─────────────────────────────────────────────
+
+class TestTradePlanColumns:
+    def test_sideway_rows(self):
+        out = trade_plan_columns(
+            ["SIDEWAY_RANGE"] * 3,
+            ["LONG", "SHORT", "LONG"],
+            np.array([91.0, 109.0, 100.0]),
+            min_rr=1.5,
+            range_low=[90.0, 90.0, 110.0],
+            range_high=[110.0, 110.0, 90.0],
+            atr=1.0,
+        )
+        assert out["valid"].tolist() == [True, True, False]
+        assert out["code"].tolist()[:2] == [PLAN_OK, PLAN_OK]
+        assert out["code"][2] == PLAN_RANGE_INVALID
+        assert math.isnan(out["entry"][2])
+        assert out["sl"][0] == pytest.approx(89.5)
+
+    def test_abc_code_and_sr_recheck(self):
+        pivots = dict(pivot0=80.0, pivot1=100.0, pivot2=90.0, n_pivots=3)
+        out = trade_plan_columns(["ABC_UP", "ABC_UP"], ["LONG", "LONG"], 95.0, min_rr=1.5,
+                                 support=[0.0, 94.5], **pivots)
+        assert out["code"][0] == PLAN_OK_FIB
+        assert out["code"][1] == PLAN_SR_SL_NEAR
+        assert out["sl_pct"][1] == pytest.approx(0.5 / 95 * 100)
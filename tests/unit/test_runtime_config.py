@@ -0,0 +1,67 @@
+# tests/unit/test_runtime_config.py
+import dataclasses
+
+import pytest
+
+from app.analysis.result_store import config_hash
+from app.config.runtime_config import RuntimeConfig, get_config, install_config, reload_config
+from app.risk.risk_manager import _cap_tp3_by_max_r
+
+
+class TestRuntimeConfig:
+    def test_defaults_from_empty_env(self):
+        cfg = RuntimeConfig.from_env({})
+        assert cfg == RuntimeConfig()
+        assert cfg.max_tp_r == 0.0
+        assert cfg.entry_trigger_pct == pytest.approx(0.30)
+
+    def test_parses_and_strips_values(self):
+        cfg = RuntimeConfig.from_env({"VPS_URL": " http://vps ", "MAX_TP_R": "3", "SL_PCT": "2.5"})
+        assert cfg.vps_url == "http://vps"
+        assert cfg.max_tp_r == 3.0
+        assert cfg.sl_pct == 2.5
+
+    def test_bad_number_falls_back_to_default(self):
+        assert RuntimeConfig.from_env({"MAX_TP_R": "abc", "TP1_PCT": ""}) == RuntimeConfig()
+
+    def test_frozen(self):
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            RuntimeConfig().max_tp_r = 2.0
+
+
+class TestContentHash:
+    def test_same_values_same_hash(self):
+        assert RuntimeConfig.from_env({"MAX_TP_R": "3"}).content_hash() == RuntimeConfig(max_tp_r=3.0).content_hash()
+
+    def test_value_change_changes_hash(self):
+        assert RuntimeConfig(max_tp_r=3.0).content_hash() != RuntimeConfig().content_hash()
+
+    def test_secrets_not_hashed(self):
+        assert RuntimeConfig(exec_token="a").content_hash() == RuntimeConfig(exec_token="b").content_hash()
+
+
+class TestSnapshot:
+    def test_env_change_needs_reload(self, monkeypatch):
+        monkeypatch.setenv("MAX_TP_R", "2")
+        reload_config()
+        before = get_config()
+        monkeypatch.setenv("MAX_TP_R", "4")
+        assert get_config() is before
+        assert _cap_tp3_by_max_r(100.0, 90.0, 200.0, "LONG") == pytest.approx(120.0)
+
+        reload_config()
+        assert get_config().max_tp_r == 4.0
+        assert _cap_tp3_by_max_r(100.0, 90.0, 200.0, "LONG") == pytest.approx(140.0)
+
+    def test_reload_changes_result_store_hash(self):
+        reload_config({})
+        h1 = config_hash()
+        reload_config({"MAX_TP_R": "3"})
+        assert config_hash() != h1
+        reload_config({})
+        assert config_hash() == h1
+
+    def test_install_config_replaces_snapshot(self):
+        cfg = RuntimeConfig(max_tp_r=7.0)
+        assert install_config(cfg) is cfg
+        assert get_config() is cfg
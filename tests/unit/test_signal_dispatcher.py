@@ -0,0 +1,189 @@
+# tests/unit/test_signal_dispatcher.py
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.config.runtime_config import reload_config
+from app.services import signal_dispatcher as sd
+from app.services.signal_dispatcher import SignalDispatcher, dedupe_key
+
+
+class _Resp:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def vps(monkeypatch):
+    monkeypatch.setenv("VPS_URL", "http://vps")
+    monkeypatch.setenv("EXEC_TOKEN", "tok")
+    reload_config()
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    state = {"calls": [], "results": [], "gate": None}
+
+    def fake_post(url, json=None, headers=None, timeout=None):
+        if state["gate"] is not None:
+            state["gate"].wait(5)
+        state["calls"].append((url, json, headers))
+        result = state["results"].pop(0) if state["results"] else _Resp(200)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(sd.req, "post", fake_post)
+    return state
+
+
+def _plan(entry=100.0):
+    return {"entry": entry, "sl": 95.0, "tp3": 120.0}
+
+
+def _status(db):
+    with sqlite3.connect(str(db)) as conn:
+        return [r[0] for r in conn.execute("SELECT status FROM signal_outbox ORDER BY id")]
+
+
+def test_submit_posts_execute(vps, posts, tmp_path):
+    d = SignalDispatcher(db_path=tmp_path / "o.db")
+    assert d.submit("BTCUSDT", "LONG", _plan())
+    assert d.flush()
+
+    url, body, headers = posts["calls"][0]
+    assert url == "http://vps/execute"
+    assert body == {"symbol": "BTCUSDT", "direction": "LONG", "trade_plan": _plan()}
+    assert headers == {"X-EXEC-TOKEN": "tok"}
+    assert _status(tmp_path / "o.db") == ["SENT"]
+
+
+def test_dedupe_by_symbol_direction_entry(vps, posts, tmp_path):
+    d = SignalDispatcher(db_path=tmp_path / "o.db")
+    assert d.submit("BTCUSDT", "LONG", _plan(100.0))
+    assert d.flush()
+    assert not d.submit("BTCUSDT", "LONG", _plan(100.0))
+    assert d.submit("BTCUSDT", "LONG", _plan(101.0))
+    assert d.submit("BTCUSDT", "SHORT", _plan(100.0))
+    assert d.flush()
+    assert len(posts["calls"]) == 3
+    assert d.stats["deduped"] == 1
+    assert dedupe_key("btcusdt", "long", {"entry": 1}) == "BTCUSDT|LONG|1.0"
+
+
+def test_dedupe_expires_after_ttl(vps, posts, tmp_path):
+    now = {"t": 1000.0}
+    d = SignalDispatcher(db_path=tmp_path / "o.db", dedupe_ttl=60, clock=lambda: now["t"])
+    d.submit("BTCUSDT", "LONG", _plan())
+    assert d.flush()
+    now["t"] += 61
+    assert d.submit("BTCUSDT", "LONG", _plan())
+    assert d.flush()
+
+
+def test_retry_with_backoff_then_sent(vps, posts, tmp_path):
+    posts["results"] = [ConnectionError("down"), _Resp(502)]
+    d = SignalDispatcher(db_path=tmp_path / "o.db", base_delay=0.01, max_delay=0.02)
+    d.submit("BTCUSDT", "LONG", _plan())
+    deadline = time.monotonic() + 5
+    while _status(tmp_path / "o.db") != ["SENT"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert _status(tmp_path / "o.db") == ["SENT"]
+    assert len(posts["calls"]) == 3
+    assert d.stats["retries"] == 2
+
+
+def test_client_error_is_not_retried(vps, posts, tmp_path):
+    posts["results"] = [_Resp(403)]
+    d = SignalDispatcher(db_path=tmp_path / "o.db", base_delay=0.01)
+    d.submit("BTCUSDT", "LONG", _plan())
+    assert d.flush()
+    assert _status(tmp_path / "o.db") == ["FAILED"]
+    assert len(posts["calls"]) == 1
+
+
+def test_gives_up_after_max_attempts(vps, posts, tmp_path):
+    posts["results"] = [ConnectionError("down")] * 5
+    d = SignalDispatcher(db_path=tmp_path / "o.db", max_attempts=2, base_delay=0.0)
+    d.submit("BTCUSDT", "LONG", _plan())
+    assert d.flush()
+    assert _status(tmp_path / "o.db") == ["FAILED"]
+    assert len(posts["calls"]) == 2
+
+
+def test_pending_survives_restart(vps, posts, tmp_path):
+    db = tmp_path / "o.db"
+    posts["results"] = [ConnectionError("down")]
+    first = SignalDispatcher(db_path=db, base_delay=3600)
+    first.submit("BTCUSDT", "LONG", _plan())
+    assert first.flush()
+    assert len(first.pending()) == 1
+    # รายการที่ค้างกลางการส่งตอน process ตาย
+    with sqlite3.connect(str(db)) as conn:
+        conn.execute("UPDATE signal_outbox SET status='SENDING', next_at=0")
+
+    restarted = SignalDispatcher(db_path=db)
+    assert [p["status"] for p in restarted.pending()] == ["PENDING"]
+    restarted.start()
+    assert restarted.flush()
+    assert _status(db) == ["SENT"]
+    assert not restarted.submit("BTCUSDT", "LONG", _plan())
+
+
+def test_workers_send_concurrently(vps, posts, tmp_path):
+    gate = threading.Event()
+    posts["gate"] = gate
+    d = SignalDispatcher(db_path=tmp_path / "o.db", workers=3)
+    for entry in (1.0, 2.0, 3.0):
+        assert d.submit("BTCUSDT", "LONG", _plan(entry))
+    deadline = time.monotonic() + 5
+    while d._in_flight < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert d._in_flight == 3
+    gate.set()
+    assert d.flush()
+    assert len(posts["calls"]) == 3
+
+
+def test_expired_row_not_posted_after_restart(vps, posts, tmp_path):
+    db = tmp_path / "o.db"
+    now = {"t": 1000.0}
+    posts["results"] = [ConnectionError("down")]
+    first = SignalDispatcher(db_path=db, base_delay=3600, max_age=600, clock=lambda: now["t"])
+    first.submit("BTCUSDT", "LONG", _plan())
+    assert first.flush()
+    with sqlite3.connect(str(db)) as conn:
+        conn.execute("UPDATE signal_outbox SET status='SENDING', next_at=0")
+
+    now["t"] += 601
+    restarted = SignalDispatcher(db_path=db, max_age=600, clock=lambda: now["t"])
+    restarted.start()
+    assert restarted.flush()
+    assert restarted.pending() == []
+    assert len(posts["calls"]) == 1
+    with sqlite3.connect(str(db)) as conn:
+        assert conn.execute("SELECT status, last_error FROM signal_outbox").fetchall() == [("FAILED", "expired")]
+    assert restarted.stats["expired"] == 1
+
+
+def test_pending_expires_before_claim(vps, posts, tmp_path):
+    now = {"t": 1000.0}
+    posts["results"] = [ConnectionError("down")]
+    d = SignalDispatcher(db_path=tmp_path / "o.db", base_delay=100, max_age=50, clock=lambda: now["t"])
+    d.submit("BTCUSDT", "LONG", _plan())
+    assert d.flush()
+    now["t"] += 101
+    assert d.flush()
+    assert _status(tmp_path / "o.db") == ["FAILED"]
+    assert len(posts["calls"]) == 1
+
+
+def test_default_max_age_capped_by_primary_bar(monkeypatch):
+    monkeypatch.setattr(sd, "SIGNAL_MAX_AGE_SEC", 8 * 3600)
+    monkeypatch.setattr(sd, "TIMEFRAMES", ["1d", "4h"])
+    assert sd.default_max_age() == 4 * 3600
+    monkeypatch.setattr(sd, "TIMEFRAMES", ["1d"])
+    assert sd.default_max_age() == 8 * 3600
@@ -0,0 +1,86 @@
+# tests/unit/test_stage_timer.py
+import time
+
+import pytest
+
+from app.analysis.stage_timer import (
+    StageTimings,
+    analysis_deadline,
+    collect_stage_timings,
+    record_stage_timings,
+    stage,
+)
+
+
+def test_stage_is_noop_outside_scope():
+    with stage("fetch"):
+        pass
+    timings = StageTimings()
+    with collect_stage_timings(timings):
+        pass
+    assert timings.stages == {}
+
+
+def test_records_ms_and_calls_per_stage():
+    with collect_stage_timings() as timings:
+        for _ in range(3):
+            with stage("trade_plan"):
+                pass
+        with stage("fetch"):
+            pass
+
+    out = timings.as_dict()
+    assert out["trade_plan"]["calls"] == 3
+    assert out["fetch"]["calls"] == 1
+    assert all(row["ms"] >= 0 for row in out.values())
+
+
+def test_stage_records_even_when_body_raises():
+    with collect_stage_timings() as timings:
+        try:
+            with stage("label"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    assert timings.as_dict()["label"]["calls"] == 1
+
+
+def test_nested_scope_merges_into_outer():
+    run = StageTimings()
+    with collect_stage_timings(run):
+        for _ in range(2):
+            with collect_stage_timings() as per_symbol:
+                with stage("pivots"):
+                    pass
+            assert per_symbol.as_dict()["pivots"]["calls"] == 1
+        # เวลาจาก worker process
+        record_stage_timings({"pivots": {"ms": 5.0, "calls": 1}, "fetch": {"ms": 2.5, "calls": 1}})
+
+    out = run.as_dict()
+    assert out["pivots"]["calls"] == 3
+    assert out["fetch"] == {"ms": 2.5, "calls": 1}
+    assert run.total_ms() >= 7.5
+
+
+def test_merged_and_summary_sorted_by_time():
+    total = StageTimings.merged([
+        {"zones": {"ms": 1.0, "calls": 1}},
+        None,
+        {"fetch": {"ms": 10.0, "calls": 2}, "zones": {"ms": 2.0, "calls": 1}},
+    ])
+    assert total.as_dict() == {"zones": {"ms": 3.0, "calls": 2}, "fetch": {"ms": 10.0, "calls": 2}}
+    assert total.summary() == "fetch=10.0ms×2 zones=3.0ms×2"
+
+
+def test_deadline_checked_only_between_stages():
+    done = []
+    with analysis_deadline(0.01):
+        with stage("label"):
+            time.sleep(0.02)
+            done.append("label")  # ขั้นที่เริ่มไปแล้วทำจนจบ
+        with pytest.raises(TimeoutError):
+            with stage("zones"):
+                done.append("zones")
+    assert done == ["label"]
+    with stage("zones"):
+        pass
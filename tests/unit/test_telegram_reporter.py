@@ -2,6 +2,8 @@
 import pytest
 import os
 from unittest.mock import patch, MagicMock
+
+from app.config.runtime_config import reload_config
 from app.services.telegram_reporter import _tg_api_url, _fmt_price, format_symbol_report, send_message
 
 
@@ -77,6 +79,7 @@ class TestFormatSymbolReport:
 class TestSendMessage:
     def test_no_token_prints_preview(self, capsys):
         with patch.dict(os.environ, {"TELEGRAM_BOT_TOKEN": "", "TELEGRAM_CHAT_ID": ""}):
+            reload_config()
             send_message("test message")
         captured = capsys.readouterr()
         assert "TELEGRAM PREVIEW" in captured.out
@@ -87,6 +90,7 @@ class TestSendMessage:
         mock_resp.raise_for_status.return_value = None
         with patch.dict(os.environ, {"TELEGRAM_BOT_TOKEN": "TOKEN", "TELEGRAM_CHAT_ID": "123"}), \
              patch("app.services.telegram_reporter.requests.post", return_value=mock_resp) as mock_post:
+            reload_config()
             send_message("hello")
         mock_post.assert_called_once()
 
@@ -95,6 +99,7 @@ class TestSendMessage:
         mock_resp.raise_for_status.return_value = None
         with patch.dict(os.environ, {"TELEGRAM_BOT_TOKEN": "TOKEN", "TELEGRAM_CHAT_ID": "123"}), \
              patch("app.services.telegram_reporter.requests.post", return_value=mock_resp) as mock_post:
+            reload_config()
             send_message("hello", topic_id=42)
         payload = mock_post.call_args[1]["json"]
         assert payload["message_thread_id"] == 42
\ No newline at end of file
@@ -1,3 +1,6 @@
+import pytest
+
+from app.state import position_manager
 from app.trading import trade_executor
 
 
@@ -13,4 +16,46 @@ def test_build_plan_valid():
     assert plan["valid"] is True
     assert plan["entry"] > plan["sl"]
     assert plan["tp1"] > plan["entry"]
-    assert plan["tp2"] > plan["tp1"]
\ No newline at end of file
+    assert plan["tp2"] > plan["tp1"]
+
+# ─────────────────────────────────────────────
+# กันเปิดซ้ำข้าม timeframe (ONEWAY = position เดียวต่อ symbol)
+# ─────────────────────────────────────────────
+
+
+def _signal(timeframe):
+    return {"symbol": "BTCUSDT", "direction": "LONG", "timeframe": timeframe,
+            "trade_plan": {"entry": 100.0, "sl": 95.0, "tp1": 105.0, "tp2": 110.0, "tp3": 115.0}}
+
+
+@pytest.fixture
+def live_executor(tmp_path, monkeypatch):
+    monkeypatch.setattr(position_manager, "DB_PATH", tmp_path / "positions.db")
+    position_manager._init_db()
+    monkeypatch.setattr(trade_executor, "TIMEFRAMES", ["1d", "4h"])
+    monkeypatch.setattr(trade_executor, "DRY_RUN", False)
+    calls = []
+
+    def _no_order(*a, **k):
+        calls.append(a)
+        raise AssertionError("ไม่ควรยิงออเดอร์")
+
+    monkeypatch.setattr(trade_executor, "get_balance", _no_order)
+    monkeypatch.setattr(trade_executor, "open_market_order", _no_order)
+    return calls
+
+
+def test_4h_signal_refused_when_1d_position_active(live_executor, monkeypatch):
+    monkeypatch.setattr(trade_executor, "find_live_position", lambda symbol: None)
+    assert position_manager.lock_new_position("BTCUSDT", "1d", "LONG", _signal("1d")["trade_plan"])
+
+    assert trade_executor.execute_signal(_signal("4h")) is False
+    assert live_executor == []
+
+
+def test_refused_when_exchange_has_live_position(live_executor, monkeypatch):
+    monkeypatch.setattr(trade_executor, "find_live_position",
+                        lambda symbol: {"symbol": symbol, "positionAmt": "0.01"})
+
+    assert trade_executor.execute_signal(_signal("4h")) is False
+    assert live_executor == []
@@ -1,7 +1,7 @@
 # tests/unit/test_trend_detector.py
 import pytest
 import pandas as pd
-from app.analysis.trend_detector import detect_market_mode
+from app.analysis.trend_detector import detect_market_mode, market_mode_series
 
 
 def _make_df(ema50=110.0, ema200=100.0, atr=2.0, close=100.0):
@@ -51,4 +51,20 @@ class TestDetectMarketMode:
         df = _make_df()
         result = detect_market_mode(df)
         assert isinstance(result, str)
-        assert result in ("TREND", "SIDEWAY")
\ No newline at end of file
+        assert result in ("TREND", "SIDEWAY")
+
+
+class TestMarketModeSeries:
+    def test_matches_scalar_per_bar(self):
+        df = pd.DataFrame({
+            "close":  [100.0, 100.0, 100.0, 100.0],
+            "ema50":  [100.2, 110.0, 100.1, 100.3],
+            "ema200": [100.0, 100.0, 100.0, 100.0],
+            "atr14":  [1.0, 1.0, 5.0, float("nan")],
+        })
+        modes = market_mode_series(df)
+        assert list(modes) == [detect_market_mode(df.iloc[: i + 1]) for i in range(len(df))]
+
+    def test_no_ema_columns_all_trend(self):
+        df = pd.DataFrame({"close": [100.0, 101.0]})
+        assert list(market_mode_series(df)) == ["TREND", "TREND"]
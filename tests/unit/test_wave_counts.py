@@ -0,0 +1,107 @@
+# tests/unit/test_wave_counts.py
+import pytest
+
+from app.analysis.wave_counts import clean_alternating, find_wave_counts
+from app.analysis.wave_scenarios import build_scenarios
+
+
+def _pivot(price, ptype, index=0):
+    return {"price": float(price), "type": ptype, "index": index}
+
+
+def _chain(*points):
+    return [_pivot(price, ptype, i) for i, (price, ptype) in enumerate(points)]
+
+
+def _abc_then_wave2():
+    # ABC DOWN (200→150→180→100) แล้วเริ่ม impulse ใหม่ L100-H150-L120
+    return _chain(
+        (200, "H"), (150, "L"), (180, "H"), (100, "L"),
+        (150, "H"), (120, "L"),
+    )
+
+
+class TestCleanAlternating:
+    def test_merges_same_type_keeps_extreme(self):
+        chain = _chain((100, "L"), (90, "L"), (150, "H"), (160, "H"), (120, "L"))
+        clean = clean_alternating(chain)
+        assert [p["price"] for p in clean] == [90, 160, 120]
+
+
+class TestFindWaveCounts:
+    def test_empty_and_short_chain(self):
+        assert find_wave_counts([]) == []
+        assert find_wave_counts(_chain((100, "L"), (150, "H"))) == []
+
+    def test_wave2_root_with_abc_context(self):
+        counts = find_wave_counts(_abc_then_wave2())
+        w2 = next(c for c in counts if c.kind == "IMPULSE_W2")
+        assert w2.direction == "LONG"
+        assert w2.wave_pos["position"] == "IN_WAVE_2"
+        assert w2.wave_pos["wave_2_low"] == 120
+        assert w2.segments == ["ABC_DOWN", "IMPULSE_W2_LONG"]
+        assert w2.start_index == 0
+        assert w2.end_index == 5
+
+    def test_wave4_root(self):
+        chain = _chain((100, "L"), (150, "H"), (120, "L"), (200, "H"), (170, "L"))
+        counts = find_wave_counts(chain)
+        w4 = next(c for c in counts if c.kind == "IMPULSE_W4")
+        assert w4.wave_pos["position"] == "IN_WAVE_4"
+        assert w4.wave_pos["wave_4_low"] == 170
+        assert w4.warnings == []
+
+    def test_wave4_overlap_pruned(self):
+        # wave4 (140) overlap wave1 high (150) → ไม่ใช่ IN_WAVE_4
+        chain = _chain((100, "L"), (150, "H"), (120, "L"), (200, "H"), (140, "L"))
+        assert all(c.kind != "IMPULSE_W4" for c in find_wave_counts(chain, top_k=10))
+
+    def test_ranked_and_top_k(self):
+        counts = find_wave_counts(_abc_then_wave2(), top_k=10)
+        scores = [c.score for c in counts]
+        assert scores == sorted(scores, reverse=True)
+        assert len(find_wave_counts(_abc_then_wave2(), top_k=1)) == 1
+
+    def test_zero_budget_returns_roots_only(self):
+        counts = find_wave_counts(_abc_then_wave2(), time_budget_ms=0.0)
+        assert counts
+        assert all(len(c.segments) == 1 for c in counts)
+
+    def test_context_raises_score(self):
+        with_context = find_wave_counts(_abc_then_wave2())
+        roots_only = find_wave_counts(_abc_then_wave2(), max_depth=0)
+        a = next(c for c in with_context if c.kind == "IMPULSE_W2")
+        b = next(c for c in roots_only if c.kind == "IMPULSE_W2")
+        assert a.score > b.score
+
+
+class TestBuildScenariosAlternates:
+    @pytest.fixture(autouse=True)
+    def _no_primary_bias(self, monkeypatch):
+        monkeypatch.setattr("app.analysis.btc_cycle.get_cached_primary_bias", lambda symbol: {})
+
+    def test_alternates_flagged_and_capped(self):
+        # 5 pivots → _determine_wave_position ยังไม่ทำงาน แต่ count หาเจอ
+        pivots = _chain((100, "L"), (150, "H"), (120, "L"), (200, "H"), (170, "L"))
+        result = build_scenarios(
+            pivots, macro_trend="BULL", rsi14=55, symbol="BTCUSDT", alternate_counts=True,
+        )
+        assert 0 < len(result) <= 3
+        assert all(sc["is_alternate"] and sc["count_segments"] for sc in result)
+        w4 = next(sc for sc in result if sc["wave_position"] == "IN_WAVE_4")
+        assert w4["direction"] == "LONG"
+        assert w4["swing_low"] == 170
+
+    def test_disable_alternates(self):
+        pivots = _chain((100, "L"), (150, "H"), (120, "L"), (200, "H"), (170, "L"))
+        result = build_scenarios(
+            pivots, macro_trend="BULL", rsi14=55, symbol="BTCUSDT", alternate_counts=False,
+        )
+        assert result == []
+
+    def test_alternates_off_by_default(self, monkeypatch):
+        # live path ไม่เปิด count ทางเลือกเว้นแต่ตั้ง WAVE_COUNT_ALTERNATES
+        pivots = _chain((100, "L"), (150, "H"), (120, "L"), (200, "H"), (170, "L"))
+        assert build_scenarios(pivots, macro_trend="BULL", rsi14=55, symbol="BTCUSDT") == []
+        monkeypatch.setattr("app.analysis.wave_scenarios.WAVE_COUNT_ALTERNATES", True)
+        assert build_scenarios(pivots, macro_trend="BULL", rsi14=55, symbol="BTCUSDT")
@@ -1,6 +1,25 @@
 import pandas as pd
+import pytest
 
 from app.analysis import wave_engine
+from app.config.runtime_config import reload_config
+from app.services import signal_dispatcher as sd
+from app.services.log_shipper import log_shipper
+
+
+@pytest.fixture(autouse=True)
+def _isolated_outbox(monkeypatch, tmp_path):
+    # outbox ของ signal แยกต่อเทสต์ (dedupe ไม่ข้ามเทสต์/ข้ามรอบ)
+    monkeypatch.setattr(sd, "_DISPATCHER", sd.SignalDispatcher(db_path=tmp_path / "outbox.db"))
+
+
+@pytest.fixture(autouse=True)
+def _no_primary_fetch(monkeypatch):
+    # load_context ไม่ไปดึง 1W จริง (เทสต์ที่ต้องการ bias แทน pin_primary_bias เอง)
+    monkeypatch.setattr(
+        wave_engine, "pin_primary_bias",
+        lambda symbol, as_of=None: wave_engine.PrimaryBiasProvider(allow_fetch=False, fixed={symbol: {}}),
+    )
 
 
 def _make_df(rows: int = 260, close: float = 100.0) -> pd.DataFrame:
@@ -34,8 +53,10 @@ def test_send_log_no_vps_url(monkeypatch):
     monkeypatch.setattr(wave_engine.req, "post", fake_post)
     monkeypatch.setenv("VPS_URL", "")
     monkeypatch.setenv("EXEC_TOKEN", "")
+    reload_config()
 
     wave_engine._send_log("hello")
+    assert log_shipper().flush()
 
     assert called["post"] == 0
 
@@ -53,12 +74,14 @@ def test_send_log_with_vps_url(monkeypatch):
     monkeypatch.setattr(wave_engine.req, "post", fake_post)
     monkeypatch.setenv("VPS_URL", "http://localhost:8000")
     monkeypatch.setenv("EXEC_TOKEN", "abc123")
+    reload_config()
 
     wave_engine._send_log("hello world")
+    assert log_shipper().flush()
 
     assert called["post"] == 1
     assert called["url"] == "http://localhost:8000/log"
-    assert called["json"] == {"msg": "hello world"}
+    assert called["json"] == {"msgs": ["hello world"]}
     assert called["headers"] == {"X-EXEC-TOKEN": "abc123"}
 
 
@@ -358,6 +381,7 @@ def test_analyze_symbol_abc_up_triggered(monkeypatch):
     monkeypatch.setattr(wave_engine.req, "post", fake_post)
     monkeypatch.setenv("VPS_URL", "http://localhost:8000")
     monkeypatch.setenv("EXEC_TOKEN", "abc123")
+    reload_config()
 
     monkeypatch.setattr(wave_engine, "fetch_ohlcv", lambda *a, **k: df)
     monkeypatch.setattr(wave_engine, "drop_unclosed_candle", lambda x: x)
@@ -444,6 +468,8 @@ def test_analyze_symbol_abc_up_triggered(monkeypatch):
 
     result = wave_engine.analyze_symbol("BTCUSDT")
     assert result is not None
+    assert log_shipper().flush()
+    assert sd.signal_dispatcher().flush()
 
     assert len(result["scenarios"]) == 1
     assert result["scenarios"][0]["trade_plan"]["triggered"] is True
@@ -468,6 +494,7 @@ def test_analyze_symbol_execute_skipped_when_bad_vps_url(monkeypatch):
     monkeypatch.setattr(wave_engine.req, "post", fake_post)
     monkeypatch.setenv("VPS_URL", "localhost:8000")
     monkeypatch.setenv("EXEC_TOKEN", "abc123")
+    reload_config()
 
     monkeypatch.setattr(wave_engine, "fetch_ohlcv", lambda *a, **k: df)
     monkeypatch.setattr(wave_engine, "drop_unclosed_candle", lambda x: x)
@@ -554,7 +581,405 @@ def test_analyze_symbol_execute_skipped_when_bad_vps_url(monkeypatch):
 
     result = wave_engine.analyze_symbol("BTCUSDT")
     assert result is not None
+    assert log_shipper().flush()
+    assert sd.signal_dispatcher().flush()
 
     assert len(result["scenarios"]) == 1
     assert result["scenarios"][0]["trade_plan"]["triggered"] is True
-    assert called["post"] >= 1
\ No newline at end of file
+    assert called["post"] >= 1
+
+def _patch_trend_pipeline(monkeypatch, build_scenarios=None):
+    pivots = [
+        {"type": "L", "price": 100, "index": 1, "degree": "intermediate"},
+        {"type": "H", "price": 120, "index": 2, "degree": "intermediate"},
+        {"type": "L", "price": 110, "index": 3, "degree": "intermediate"},
+        {"type": "H", "price": 130, "index": 4, "degree": "intermediate"},
+    ]
+    scenario = {
+        "type": "IMPULSE_LONG", "phase": "w3", "direction": "LONG",
+        "probability": 80, "confidence": 80, "pivots": pivots, "reasons": [],
+    }
+    monkeypatch.setattr(wave_engine, "trend_filter_ema", lambda x: "BULL")
+    monkeypatch.setattr(wave_engine, "volume_spike", lambda *a, **k: True)
+    monkeypatch.setattr(wave_engine, "detect_market_mode", lambda x: "TREND")
+    monkeypatch.setattr(wave_engine, "find_fractal_pivots", lambda x: pivots)
+    monkeypatch.setattr(wave_engine, "filter_pivots", lambda pivots, min_pct_move=None: pivots)
+    monkeypatch.setattr(wave_engine, "label_pivot_chain", lambda pivots: "IMPULSE")
+    monkeypatch.setattr(wave_engine, "build_zones_from_pivots", lambda df: [])
+    monkeypatch.setattr(wave_engine, "nearest_support_resist", lambda zones, price=None: {})
+    monkeypatch.setattr(
+        wave_engine, "build_scenarios", build_scenarios or (lambda *a, **k: [dict(scenario)])
+    )
+    monkeypatch.setattr(
+        wave_engine, "compute_macro_bias",
+        lambda regime, rsi14=50.0: {"bias": "LONG", "strength": 70, "allow_long": True, "allow_short": False},
+    )
+    monkeypatch.setattr(
+        wave_engine, "build_trade_plan",
+        lambda scenario, current_price, min_rr, sr=None: {"valid": True, "entry": 99.0, "sl": 95.0},
+    )
+
+
+_MTF_OK = {
+    "weekly_permit_long": True, "weekly_permit_short": True,
+    "h4_confirm_long": True, "h4_confirm_short": True,
+}
+
+
+def test_analyze_returns_effects_without_io(monkeypatch):
+    _patch_trend_pipeline(monkeypatch)
+
+    def no_io(*args, **kwargs):
+        raise AssertionError("analyze ต้องไม่ทำ I/O")
+
+    monkeypatch.setattr(wave_engine.req, "post", no_io)
+    monkeypatch.setattr(wave_engine, "fetch_ohlcv", no_io)
+    monkeypatch.setattr(wave_engine, "get_mtf_summary", no_io)
+
+    analysis = wave_engine.analyze(wave_engine.AnalysisContext("BTCUSDT", _make_df(), mtf=_MTF_OK))
+
+    assert analysis.result["scenarios"][0]["trade_plan"]["triggered"] is True
+    assert [e["kind"] for e in analysis.effects] == ["log", "signal"]
+    assert analysis.effects[1]["direction"] == "LONG"
+
+
+def test_analyze_short_frame_returns_none():
+    analysis = wave_engine.analyze(wave_engine.AnalysisContext("BTCUSDT", _make_df(rows=100), mtf={}))
+    assert analysis.result is None
+    assert analysis.effects == []
+
+
+def test_analyze_uses_context_primary_provider(monkeypatch):
+    from app.analysis import btc_cycle
+
+    seen = {}
+
+    class _Provider:
+        def get(self, symbol, as_of=None):
+            seen["as_of"] = as_of
+            return {"bias": "BULLISH"}
+
+    def fake_build(*args, **kwargs):
+        seen["bias"] = btc_cycle.get_cached_primary_bias(kwargs["symbol"])
+        return []
+
+    _patch_trend_pipeline(monkeypatch, build_scenarios=fake_build)
+    context = wave_engine.AnalysisContext(
+        "BTCUSDT", _make_df(), mtf=_MTF_OK, primary=_Provider(), as_of="2024-01-02",
+    )
+    wave_engine.analyze(context)
+
+    assert seen == {"as_of": "2024-01-02", "bias": {"bias": "BULLISH"}}
+
+
+def test_analyze_symbol_applies_effects_in_order(monkeypatch):
+    _patch_trend_pipeline(monkeypatch)
+    df = _make_df()
+    calls = []
+    monkeypatch.setattr(wave_engine, "fetch_ohlcv", lambda *a, **k: df)
+    monkeypatch.setattr(wave_engine, "drop_unclosed_candle", lambda x: x)
+    monkeypatch.setattr(wave_engine, "add_ema", lambda x, lengths=None: x)
+    monkeypatch.setattr(wave_engine, "add_rsi", lambda x, length=None: x)
+    monkeypatch.setattr(wave_engine, "add_atr", lambda x, length=None: x)
+    monkeypatch.setattr(wave_engine, "add_volume_ma", lambda x, length=None: x)
+    monkeypatch.setattr(wave_engine, "get_mtf_summary", lambda symbol: _MTF_OK)
+    monkeypatch.setattr(wave_engine, "_send_log", lambda msg: calls.append("log"))
+    monkeypatch.setattr(
+        wave_engine, "_try_send_vps", lambda symbol, direction, plan: calls.append(("signal", direction))
+    )
+
+    result = wave_engine.analyze_symbol("BTCUSDT")
+
+    assert result["scenarios"][0]["status"] == "READY"
+    assert calls == ["log", ("signal", "LONG")]
+
+
+def _batch_fn(symbol):
+    import time
+
+    if symbol == "BAD":
+        raise ValueError("boom")
+    if symbol == "SLOW":
+        time.sleep(5)
+    if symbol == "FAST":
+        return {"symbol": symbol}
+    time.sleep(0.05)
+    return {"symbol": symbol}
+
+
+def test_analyze_symbols_pool_keeps_order_and_isolates_errors():
+    symbols = ["AAA", "BAD", "FAST", "SLOW", "BBB"]
+    try:
+        out = wave_engine.analyze_symbols(symbols, workers=2, timeout=0.5, fn=_batch_fn)
+    finally:
+        wave_engine.shutdown_pool()
+
+    assert [a.symbol for a in out] == symbols
+    assert [a.result for a in out] == [
+        {"symbol": "AAA"}, None, {"symbol": "FAST"}, None, {"symbol": "BBB"},
+    ]
+    assert out[1].error == "ValueError: boom"
+    assert out[3].error.startswith("timeout")
+
+
+def test_analyze_symbols_inline_for_unpicklable_fn():
+    seen = []
+    out = wave_engine.analyze_symbols(["X", "Y"], workers=4, fn=lambda s: seen.append(s) or {"s": s})
+    assert seen == ["X", "Y"]
+    assert [a.result for a in out] == [{"s": "X"}, {"s": "Y"}]
+
+
+def test_analyze_symbols_applies_effects_in_submission_order(monkeypatch):
+    calls = []
+
+    def fake_analyze(context):
+        return wave_engine.AnalysisResult({"symbol": context.symbol}, [{"kind": "log", "msg": context.symbol}])
+
+    monkeypatch.setattr(
+        wave_engine, "load_context", lambda symbol, timeframe="1d": wave_engine.AnalysisContext(symbol, None)
+    )
+    monkeypatch.setattr(wave_engine, "analyze", fake_analyze)
+    monkeypatch.setattr(wave_engine, "_send_log", lambda msg: calls.append(msg))
+
+    out = wave_engine.analyze_symbols(["B", "A"], workers=1, fn=wave_engine.analyze_symbol)
+
+    assert [a.result for a in out] == [{"symbol": "B"}, {"symbol": "A"}]
+    assert calls == ["B", "A"]
+
+
+def test_analyze_symbol_reuses_stored_result_until_new_close(monkeypatch):
+    from app.analysis.result_store import AnalysisStore
+
+    df = _make_df()
+    df["open_time"] = pd.date_range("2023-01-01", periods=len(df), freq="1D", tz="UTC")
+    last_close = df["open_time"].iloc[-1] + pd.Timedelta(days=1)
+    now = {"ts": last_close + pd.Timedelta(hours=3)}
+    store = AnalysisStore(clock=lambda: now["ts"])
+    loads = []
+
+    def fake_load(symbol, timeframe="1d"):
+        loads.append(symbol)
+        return wave_engine.AnalysisContext(symbol, df, mtf={}, timeframe=timeframe)
+
+    monkeypatch.setattr(wave_engine, "analysis_store", lambda: store)
+    monkeypatch.setattr(wave_engine, "load_context", fake_load)
+    monkeypatch.setattr(
+        wave_engine, "analyze",
+        lambda context: wave_engine.AnalysisResult({"n": len(loads)}, [{"kind": "log", "msg": "x"}]),
+    )
+    sent = []
+    monkeypatch.setattr(wave_engine, "_send_log", lambda msg: sent.append(msg))
+
+    assert wave_engine.analyze_symbol("BTCUSDT") == {"n": 1}
+    assert wave_engine.analyze_symbol("BTCUSDT") == {"n": 1}
+    assert wave_engine.analyze_symbols(["BTCUSDT"], workers=1)[0].result == {"n": 1}
+    assert loads == ["BTCUSDT"] and sent == ["x"]
+
+    assert wave_engine.analyze_symbol("BTCUSDT", bypass_cache=True) == {"n": 2}
+    now["ts"] = last_close + pd.Timedelta(days=1, minutes=1)
+    assert wave_engine.analyze_symbol("BTCUSDT") == {"n": 3}
+
+
+def _patch_load(monkeypatch, df):
+    monkeypatch.setattr(wave_engine, "fetch_ohlcv", lambda *a, **k: df)
+    monkeypatch.setattr(wave_engine, "drop_unclosed_candle", lambda x: x)
+    monkeypatch.setattr(wave_engine, "prepare_frame", lambda x: x)
+    monkeypatch.setattr(wave_engine, "get_mtf_summary", lambda symbol: _MTF_OK)
+    monkeypatch.setattr(wave_engine, "apply_side_effects", lambda effects: None)
+
+
+def test_analyze_symbol_stage_timings_opt_in(monkeypatch):
+    _patch_trend_pipeline(monkeypatch)
+    _patch_load(monkeypatch, _make_df())
+
+    assert "timings" not in wave_engine.analyze_symbol("BTCUSDT")
+
+    result = wave_engine.analyze_symbol("BTCUSDT", timings=True)
+    timings = result["timings"]
+    for name in ("fetch", "indicators", "mtf", "mode", "pivots", "label", "zones", "scenarios", "gate"):
+        assert timings[name]["calls"] == 1, name
+    assert timings["trade_plan"]["calls"] == len(result["scenarios"])
+    assert all(row["ms"] >= 0 for row in timings.values())
+
+
+def test_sideway_engine_stage_timings(monkeypatch):
+    from app.analysis.stage_timer import collect_stage_timings
+
+    monkeypatch.setattr(wave_engine, "trend_filter_ema", lambda x: "NEUTRAL")
+    monkeypatch.setattr(wave_engine, "volume_spike", lambda *a, **k: False)
+    monkeypatch.setattr(wave_engine, "detect_market_mode", lambda x: "SIDEWAY")
+    _patch_load(monkeypatch, _make_df())
+
+    with collect_stage_timings() as run:
+        result = wave_engine.analyze_symbol("BTCUSDT", timings=True)
+
+    assert result["timings"]["sideway_range"]["calls"] == 1
+    assert "pivots" not in result["timings"]
+    assert run.as_dict().keys() == result["timings"].keys()
+
+
+def test_analyze_symbols_aggregates_stage_timings_once(monkeypatch):
+    from app.analysis.stage_timer import collect_stage_timings
+
+    _patch_trend_pipeline(monkeypatch)
+    _patch_load(monkeypatch, _make_df())
+
+    with collect_stage_timings() as run:
+        out = wave_engine.analyze_symbols(["AAA", "BBB"], workers=1, bypass_cache=True)
+
+    assert [a.timings["pivots"]["calls"] for a in out] == [1, 1]
+    assert run.as_dict()["pivots"]["calls"] == 2
+    assert run.as_dict()["fetch"]["calls"] == 2
+
+
+def test_analyze_symbol_scopes_state_per_timeframe(monkeypatch):
+    from app.analysis.result_store import AnalysisStore
+
+    _patch_trend_pipeline(monkeypatch)
+    df = _make_df()
+    df["open_time"] = pd.date_range("2023-01-01", periods=len(df), freq="4h", tz="UTC")
+    store = AnalysisStore(clock=lambda: df["open_time"].iloc[-1] + pd.Timedelta(hours=5))
+    fetched, labelers = [], []
+
+    def fake_fetch(symbol, interval=None, limit=None):
+        fetched.append(interval)
+        return df
+
+    real_labeler = wave_engine.incremental_labeler
+    monkeypatch.setattr(wave_engine, "incremental_labeler", lambda key: labelers.append(key) or real_labeler(key))
+    _patch_load(monkeypatch, df)
+    monkeypatch.setattr(wave_engine, "fetch_ohlcv", fake_fetch)
+    monkeypatch.setattr(wave_engine, "analysis_store", lambda: store)
+
+    h4 = wave_engine.analyze_symbol("BTCUSDT", timeframe="4h")
+    assert wave_engine.analyze_symbol("BTCUSDT", timeframe="4h") == h4
+
+    assert fetched == ["4h"]
+    assert labelers == ["BTCUSDT:4h"]
+    assert h4["timeframe"] == "4h"
+    assert h4["scenarios"][0]["trade_plan"]["timeframe"] == "4h"
+    # ผล 4H ที่เก็บไว้ไม่ถูกใช้แทน 1D
+    assert store.get("BTCUSDT", "1d") == (False, None)
+
+
+def test_analyze_symbols_inline_enforces_timeout():
+    out = wave_engine.analyze_symbols(["FAST", "SLOW"], workers=1, timeout=0.2, fn=_batch_fn)
+    assert out[0].result == {"symbol": "FAST"}
+    assert out[1].result is None
+    assert out[1].error.startswith("timeout")
+
+
+def test_pool_does_not_fork_threaded_parent():
+    try:
+        pool = wave_engine._pool(1)
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        wave_engine.shutdown_pool()
+
+
+def test_analyze_without_context_caches_leaves_live_state_alone(monkeypatch):
+    _patch_trend_pipeline(monkeypatch)
+    touched = []
+    monkeypatch.setattr(wave_engine, "incremental_labeler", lambda key: touched.append(key))
+    monkeypatch.setattr(wave_engine, "zone_cache", lambda key: touched.append(key))
+
+    ctx = wave_engine.AnalysisContext("BTCUSDT", _make_df(), mtf=_MTF_OK)
+    assert ctx.labeler is None and ctx.zone_index is None
+    assert wave_engine.analyze(ctx).result["scenarios"]
+    assert touched == []
+
+
+def test_load_context_attaches_live_caches(monkeypatch):
+    _patch_load(monkeypatch, _make_df())
+    ctx = wave_engine.load_context("BTCUSDT", timeframe="4h")
+    assert ctx.labeler is wave_engine.incremental_labeler("BTCUSDT:4h")
+    assert ctx.zone_index is wave_engine.zone_cache("BTCUSDT:4h")
+
+
+def test_load_context_pins_primary_bias(monkeypatch):
+    from app.analysis import btc_cycle
+
+    seen = {}
+    _patch_trend_pipeline(monkeypatch, build_scenarios=lambda *a, **k: seen.update(
+        bias=btc_cycle.get_cached_primary_bias(k["symbol"])) or [])
+    _patch_load(monkeypatch, _make_df())
+    bias = {"wave": "3", "direction": "UP", "bias": "BULLISH", "fib_targets": {}}
+    monkeypatch.setattr(btc_cycle, "analyze_primary_wave", lambda symbol, df_1w=None: bias)
+    monkeypatch.setattr(wave_engine, "pin_primary_bias", btc_cycle.pin_primary_bias)
+    btc_cycle._DEFAULT_PROVIDER.clear()
+
+    ctx = wave_engine.load_context("BTCUSDT")
+    monkeypatch.setattr(
+        btc_cycle, "analyze_primary_wave", lambda *a, **k: (_ for _ in ()).throw(AssertionError("network"))
+    )
+    btc_cycle._DEFAULT_PROVIDER.clear()
+    wave_engine.analyze(ctx)
+
+    assert seen["bias"]["bias"] == "BULLISH"
+
+
+def test_load_context_primary_failure_means_no_bias(monkeypatch):
+    _patch_load(monkeypatch, _make_df())
+    monkeypatch.setattr(wave_engine, "pin_primary_bias", lambda *a, **k: 1 / 0)
+    ctx = wave_engine.load_context("BTCUSDT")
+    assert ctx.primary.get("BTCUSDT") == {}
+
+
+def test_analyze_queries_cached_zone_index(monkeypatch):
+    from app.analysis import zones
+
+    _patch_trend_pipeline(monkeypatch)
+    monkeypatch.setattr(wave_engine, "build_zones_from_pivots",
+                        lambda df: zones.build_zones_from_pivots(df, min_touches=1))
+    monkeypatch.setattr(wave_engine, "nearest_support_resist", zones.nearest_support_resist)
+    plain = wave_engine.analyze(wave_engine.AnalysisContext("BTCUSDT", _make_df(), mtf=_MTF_OK)).result
+
+    def _no_rebuild(zones, price):
+        raise AssertionError("ควรใช้ zone_index ที่ cache ไว้")
+
+    monkeypatch.setattr(wave_engine, "nearest_support_resist", _no_rebuild)
+    index = zones.ZoneIndex()
+    cached = wave_engine.analyze(
+        wave_engine.AnalysisContext("BTCUSDT", _make_df(), mtf=_MTF_OK, zone_index=index)
+    ).result
+    assert plain["zones"] and (plain["sr"]["support"] or plain["sr"]["resist"])
+    assert cached["sr"] == plain["sr"]
+    assert cached["zones"] == plain["zones"]
+
+
+def _stalled_fn(symbol):
+    from app.analysis.stage_timer import stage
+
+    with stage("label"):
+        import time
+        time.sleep(0.05)
+    with stage("zones"):
+        return {"symbol": symbol}
+
+
+def test_timeout_drops_symbol_caches():
+    old_labeler = wave_engine.incremental_labeler("TOUT:1d")
+    old_zones = wave_engine.zone_cache("TOUT:1d")
+    out = wave_engine.analyze_symbols(["TOUT"], workers=1, timeout=0.01, fn=_stalled_fn)
+
+    assert out[0].error.startswith("timeout")
+    assert wave_engine.incremental_labeler("TOUT:1d") is not old_labeler
+    assert wave_engine.zone_cache("TOUT:1d") is not old_zones
+
+
+def _config_fn(symbol):
+    from app.config.runtime_config import get_config
+    return {"symbol": symbol, "max_tp_r": get_config().max_tp_r}
+
+
+def test_pool_workers_follow_config_reload():
+    try:
+        reload_config({"MAX_TP_R": "2"})
+        first = wave_engine.analyze_symbols(["A", "B"], workers=2, fn=_config_fn)
+        reload_config({"MAX_TP_R": "5"})
+        second = wave_engine.analyze_symbols(["A", "B"], workers=2, fn=_config_fn)
+    finally:
+        wave_engine.shutdown_pool()
+
+    assert [a.result["max_tp_r"] for a in first] == [2.0, 2.0]
+    assert [a.result["max_tp_r"] for a in second] == [5.0, 5.0]
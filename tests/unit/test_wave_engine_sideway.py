@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-from app.analysis.wave_engine import run_sideway_engine
+from app.analysis.wave_engine import run_sideway_engine, sideway_setup_series
 
 
 def test_sideway_no_range():
@@ -46,4 +47,41 @@ def test_sideway_short_setup():
 
     result = run_sideway_engine("BTCUSDT", df, base)
 
-    assert isinstance(result["scenarios"], list)
\ No newline at end of file
+    assert isinstance(result["scenarios"], list)
+
+
+def _range_df(n=150):
+    # แกว่งในกรอบ → มีทั้งแท่งชนแนวรับ/แนวต้าน
+    t = np.arange(n)
+    close = 100 + 8 * np.sin(t / 6)
+    return pd.DataFrame({
+        "close": close,
+        "low": close - 0.5,
+        "high": close + 0.5,
+        "atr14": np.where(t % 7 == 0, np.nan, 1.5),
+        "rsi14": 50 + 15 * np.sin(t / 6),
+    })
+
+
+def test_sideway_setup_series_matches_engine_per_bar():
+    df = _range_df()
+    setups = sideway_setup_series(df, weekly_permit_long=True, weekly_permit_short=False)
+
+    for i in range(len(df)):
+        base = {
+            "price": float(df["close"].iloc[i]),
+            "rsi14": float(df["rsi14"].iloc[i]),
+            "weekly_permit_long": True,
+            "weekly_permit_short": False,
+        }
+        result = run_sideway_engine("BTCUSDT", df.iloc[: i + 1], base)
+        directions = {sc["direction"] for sc in result["scenarios"]}
+        row = setups.iloc[i]
+        assert bool(row["long_setup"]) == ("LONG" in directions)
+        assert bool(row["short_setup"]) == ("SHORT" in directions)
+        if result["sideway"]["range_low"]:
+            assert row["range_low"] == result["sideway"]["range_low"]
+            assert row["range_high"] == result["sideway"]["range_high"]
+
+    assert setups["long_setup"].any()
+    assert not setups["short_setup"].any()
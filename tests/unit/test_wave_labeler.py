@@ -1,6 +1,13 @@
 # tests/unit/test_wave_labeler.py
 import pytest
-from app.analysis.wave_labeler import label_pivot_chain, _score_from_reasons
+from app.analysis.wave_labeler import (
+    IncrementalWaveLabeler,
+    incremental_labeling,
+    label_pivot_chain,
+    _score_from_reasons,
+)
+from app.analysis.wave_rules import WindowValidationMemo, shared_window_validation
+from app.analysis.wave_scenarios import _find_impulse_sequence
 from unittest.mock import patch
 
 
@@ -96,4 +103,94 @@ class TestLabelPivotChain:
              patch("app.analysis.wave_labeler.validate_abc", side_effect=lambda w, d: (d == "DOWN", [])):
             result = label_pivot_chain(pivots)
         if result["label"]:
-            assert result["label"]["pattern"] in ("ABC_DOWN", "ABC_UP", "IMPULSE_LONG", "IMPULSE_SHORT")
\ No newline at end of file
+            assert result["label"]["pattern"] in ("ABC_DOWN", "ABC_UP", "IMPULSE_LONG", "IMPULSE_SHORT")
+
+
+class TestSharedWindowValidation:
+    def test_scenarios_reuse_labeler_results(self):
+        pivots = _impulse_long_pivots()
+        with shared_window_validation(pivots) as memo:
+            label_pivot_chain(pivots)
+            validated = memo.stats["validated"]
+            found = _find_impulse_sequence(pivots, "LONG")
+        assert found is not None
+        assert memo.stats["validated"] == validated
+        assert memo.stats["cache_hits"] >= 1
+
+    def test_failing_windows_skipped_by_mask(self):
+        pivots = _impulse_long_pivots()
+        memo = WindowValidationMemo(pivots)
+        label_pivot_chain(pivots, memo=memo)
+        summary = memo.summary()
+        # 1 impulse window x2 ทิศ + 3 abc windows x2 ทิศ
+        assert summary["validated"] + summary["mask_skipped"] == 8
+        assert summary["avoided"] == summary["cache_hits"] + summary["mask_skipped"]
+
+    def test_memo_result_same_as_without(self):
+        pivots = _impulse_long_pivots() + [_pivot("L", 140, 6), _pivot("H", 170, 7)]
+        plain = label_pivot_chain(pivots)
+        with shared_window_validation(pivots):
+            shared = label_pivot_chain(pivots)
+        assert plain["label"] == shared["label"]
+
+    def test_bind_other_chain_gets_new_memo(self):
+        pivots = _impulse_long_pivots()
+        memo = WindowValidationMemo(pivots)
+        assert memo.bind(list(pivots)) is memo
+        other = memo.bind(pivots[:4])
+        assert other is not memo
+        assert other.stats is memo.stats
+
+
+def _growing_chain(n):
+    prices = [100, 120, 110, 140, 125, 160, 130, 150, 115, 145, 128, 170, 150, 185]
+    return [
+        _pivot("L" if i % 2 == 0 else "H", prices[i % len(prices)] + (i // len(prices)) * 5, i)
+        for i in range(n)
+    ]
+
+
+def _same(a, b):
+    return a["label"] == b["label"] and [m.__dict__ for m in a["matches"]] == [
+        m.__dict__ for m in b["matches"]
+    ]
+
+
+class TestIncrementalWaveLabeler:
+    def test_growing_chain_matches_full_scan(self):
+        labeler = IncrementalWaveLabeler()
+        for n in range(0, 30):
+            pivots = _growing_chain(n)
+            assert _same(labeler.update(pivots), label_pivot_chain(pivots))
+
+    def test_append_rescans_only_tail(self):
+        labeler = IncrementalWaveLabeler()
+        labeler.update(_growing_chain(28))
+        before = labeler.stats["windows_rescanned"]
+        labeler.update(_growing_chain(29))
+        # pivot ใหม่ 1 ตัว → impulse 5 windows + abc 3 windows สูงสุด
+        assert labeler.stats["windows_rescanned"] - before <= 8
+        assert labeler.stats["full_rescans"] == 1
+
+    def test_last_pivot_moved_matches_full_scan(self):
+        labeler = IncrementalWaveLabeler()
+        pivots = _growing_chain(20)
+        labeler.update(pivots)
+        moved = [dict(p) for p in pivots[:-1]] + [dict(pivots[-1], price=pivots[-1]["price"] * 1.2)]
+        assert _same(labeler.update(moved), label_pivot_chain(moved))
+
+    def test_head_dropped_window_slides(self):
+        labeler = IncrementalWaveLabeler()
+        full = _growing_chain(24)
+        labeler.update(full[:20])
+        slid = [dict(p, index=p["index"] - 2) for p in full[2:22]]
+        assert _same(labeler.update(slid), label_pivot_chain(slid))
+        assert labeler.stats["full_rescans"] == 1
+
+    def test_label_pivot_chain_uses_scope_labeler(self):
+        labeler = IncrementalWaveLabeler()
+        pivots = _growing_chain(12)
+        with incremental_labeling(labeler):
+            result = label_pivot_chain(pivots)
+        assert labeler.stats["updates"] == 1
+        assert _same(result, label_pivot_chain(pivots))
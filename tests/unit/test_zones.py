@@ -1,7 +1,11 @@
 # tests/unit/test_zones.py
 import pytest
+import numpy as np
 import pandas as pd
-from app.analysis.zones import _safe_float, _merge_clusters, nearest_support_resist, build_zones_from_pivots
+from app.analysis.zones import (
+    _safe_float, _merge_clusters, nearest_support_resist, build_zones_from_pivots,
+    ZoneIndex, _AnchorClusters, shared_pivots,
+)
 from unittest.mock import patch
 
 
@@ -118,4 +122,105 @@ class TestBuildZonesFromPivots:
             result = build_zones_from_pivots(df, min_touches=2)
         if result:
             for key in ["kind", "level", "low", "high", "touches", "side"]:
-                assert key in result[0]
\ No newline at end of file
+                assert key in result[0]
+
+class TestSharedPivots:
+    def _make_df(self, n=100):
+        closes = [100.0 + i * 0.1 for i in range(n)]
+        return pd.DataFrame({
+            "open": closes, "high": closes,
+            "low": closes, "close": closes, "volume": [1000.0] * n,
+        })
+
+    def _pivots(self):
+        return [{"type": "H", "price": 105.0}, {"type": "H", "price": 105.2},
+                {"type": "L", "price": 95.0}, {"type": "L", "price": 95.1}]
+
+    def test_precomputed_pivots_skip_detection(self):
+        df = self._make_df()
+        with patch("app.analysis.zones.find_fractal_pivots", side_effect=AssertionError("pivot pass")):
+            result = build_zones_from_pivots(df, pivots=self._pivots())
+            with shared_pivots(df, self._pivots()):
+                scoped = build_zones_from_pivots(df)
+        assert {z["side"] for z in result} == {"SUPPORT", "RESIST"}
+        assert scoped == result
+
+    def test_other_frame_or_filter_recomputes(self):
+        df = self._make_df()
+        with patch("app.analysis.zones.find_fractal_pivots", return_value=[]) as mock:
+            with shared_pivots(df, self._pivots()):
+                build_zones_from_pivots(self._make_df())
+                build_zones_from_pivots(df, min_pct_move=3.0)
+        assert mock.call_count == 2
+
+    def test_cache_reuses_unchanged_clusters(self):
+        df = self._make_df()
+        cache = ZoneIndex()
+        for _ in range(3):
+            with shared_pivots(df, self._pivots(), cache=cache):
+                zones = build_zones_from_pivots(df)
+        assert cache.stats == {"reused": 4, "updated": 0, "clustered": 2}
+        assert zones == build_zones_from_pivots(df, pivots=self._pivots())
+
+        new_pivots = self._pivots() + [{"type": "H", "price": 120.0}]
+        with shared_pivots(df, new_pivots, cache=cache):
+            build_zones_from_pivots(df)
+        assert cache.stats == {"reused": 5, "updated": 1, "clustered": 2}
+        # index ของ cache ใช้ตอบ nearest ได้ทันที
+        assert cache.nearest(100.0)["support"]["level"] == pytest.approx(95.05)
+
+
+class TestAnchorClusters:
+    def test_insert_matches_merge_clusters(self):
+        levels = [100.0, 100.2, 100.5, 101.0, 103.0]
+        clusters = _AnchorClusters(0.35, levels[:2])
+        for v in levels[2:]:
+            clusters.insert(v)
+        assert clusters.clusters() == _merge_clusters(levels, tol_pct=0.35)
+
+    def test_new_anchor_reshapes_following_clusters(self):
+        clusters = _AnchorClusters(1.0, [100.0, 101.5, 102.0])
+        assert clusters.clusters() == [[100.0], [101.5, 102.0]]
+        # 101.2 ไม่เข้า anchor 100 → เป็น anchor ใหม่ ดึง 101.5/102.0 เข้ามา
+        clusters.insert(101.2)
+        assert clusters.clusters() == [[100.0], [101.2, 101.5, 102.0]]
+        assert clusters.remove(101.2)
+        assert clusters.clusters() == [[100.0], [101.5, 102.0]]
+
+    def test_remove_missing_returns_false(self):
+        clusters = _AnchorClusters(1.0, [100.0])
+        assert clusters.remove(50.0) is False
+        assert clusters.clusters() == [[100.0]]
+
+
+class TestZoneIndex:
+    def _zones(self):
+        return [
+            {"level": 105.0, "side": "RESIST"},
+            {"level": 95.0, "side": "SUPPORT"},
+            {"level": 110.0, "side": "RESIST"},
+            {"level": 90.0, "side": "SUPPORT"},
+        ]
+
+    def test_nearest_matches_function(self):
+        index = ZoneIndex.from_zones(self._zones())
+        for price in (80.0, 92.0, 95.0, 100.0, 107.5, 120.0):
+            assert index.nearest(price) == nearest_support_resist(self._zones(), price=price)
+
+    def test_equal_level_keeps_first_zone(self):
+        zones = [{"level": 95.0, "name": "a"}, {"level": 95.0, "name": "b"}]
+        assert ZoneIndex.from_zones(zones).nearest(100.0)["support"]["name"] == "a"
+
+    def test_nearest_levels_vectorized(self):
+        index = ZoneIndex.from_zones(self._zones())
+        sup, res = index.nearest_levels([85.0, 100.0, 110.0])
+        assert np.isnan(sup[0]) and res[0] == 90.0
+        assert sup[1] == 95.0 and res[1] == 105.0
+        assert sup[2] == 105.0 and np.isnan(res[2])
+
+    def test_insert_pivot_prices(self):
+        index = ZoneIndex(tol_pct=0.35)
+        for price in (100.0, 100.2, 150.0):
+            index.insert(price, "H")
+        assert index.clusters("H", [100.0, 100.2, 150.0], 0.35) == [[100.0, 100.2], [150.0]]
+        assert index.stats["reused"] == 1